@@ -1,2 +1,20 @@
 # __init__.py
+from .base_connector import BaseConnector
+from .frame import QueryFrame, col, count, lit
+from .query_cache import QueryCache
+from .registry import get_connector, get_connector_class, register_connector
+from .routing import ReplicaRouter, get_router
 from .mysql_connector import MySQLConnector
+
+
+def __getattr__(name):
+    """Import the other connector classes lazily, so only the used driver has to be installed."""
+    lazy_classes = {
+        "ClickHouseConnector": "clickhouse",
+        "MSSQLConnector": "mssql",
+        "PostgreSQLConnector": "postgresql",
+        "SplunkConnector": "splunk",
+    }
+    if name in lazy_classes:
+        return get_connector_class(lazy_classes[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
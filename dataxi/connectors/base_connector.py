@@ -0,0 +1,749 @@
+# File: base_connector.py
+
+# Description: This Package defines the shared interface of all the Connector classes,
+#              so that a pipeline can drive any source/sink pair without per-backend glue.
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+
+import contextlib
+import datetime
+import decimal
+import re
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+
+from .frame import QueryFrame
+from .query_cache import cached_result
+
+
+# Load modes of bulk_insert() and the staged loads
+#   insert: plain INSERT
+#   upsert: INSERT updating the rows whose key already exists, batch by batch
+#   merge: load into a stage table, then merge it into the target by key
+#   replace_partitions: load into a stage table, then replace the target partitions found in it
+#   swap: load into a stage table, then atomically swap it with the target (full reload)
+LOAD_MODES = ("insert", "upsert", "merge", "replace_partitions", "swap")
+STAGED_LOAD_MODES = ("merge", "replace_partitions", "swap")
+
+
+def import_pyarrow():
+    """Import pyarrow lazily, since it is only required by the Arrow based interface."""
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError("pyarrow is required for stream()/query_arrow()/bulk_insert(). "
+                          "Please install it with: pip install 'dataxi[arrow]'") from e
+    return pyarrow
+
+
+def _typed_array(pa, values, arrow_type):
+    """Build the array with the declared type, falling back to inference and a cast for unexpected values."""
+    if arrow_type is None or pa.types.is_null(arrow_type):
+        return pa.array(values)
+    try:
+        return pa.array(values, type=arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        inferred = pa.array(values)
+        try:
+            return inferred.cast(arrow_type, safe=False)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            return inferred
+
+
+def rows_to_record_batch(rows, column_names, schema=None):
+    """Convert a list of rows (tuples or dictionaries) into a pyarrow RecordBatch.
+
+    Args:
+        rows: list of tuples or list of dictionaries fetched from a DB-API cursor.
+        column_names: column names of the rows, in cursor order.
+        schema: Arrow schema of the columns, e.g. from type_mapping.arrow_schema(), so every batch gets
+            the source column types instead of the types inferred from its values. Default is None.
+    """
+    pa = import_pyarrow()
+    if rows and isinstance(rows[0], dict):
+        column_names = list(rows[0].keys())
+        columns = [[row.get(col) for row in rows] for col in column_names]
+    else:
+        columns = list(zip(*rows)) if rows else [[] for _ in column_names]
+    if schema is None:
+        return pa.RecordBatch.from_arrays([pa.array(column) for column in columns], names=list(column_names))
+    types = [schema.field(col).type if col in schema.names else None for col in column_names]
+    return pa.RecordBatch.from_arrays([_typed_array(pa, column, arrow_type) for column, arrow_type in zip(columns, types)],
+                                      names=list(column_names))
+
+
+def to_column_rows(data):
+    """Normalize the insert data into column names and a list of tuples.
+
+    Args:
+        data: pyarrow Table/RecordBatch, pandas DataFrame, list of dictionaries or list of tuples.
+
+    Returns:
+        (column_names, rows). column_names is None for a list of tuples.
+    """
+    if hasattr(data, "to_pylist") and hasattr(data, "column_names"):
+        # pyarrow Table or RecordBatch
+        column_names = list(data.column_names)
+        rows = list(zip(*[column.to_pylist() for column in data.columns]))
+    elif hasattr(data, "itertuples"):
+        # pandas DataFrame, convert NaN and NaT to None
+        column_names = [str(col) for col in data.columns]
+        frame = data.astype(object).where(data.notna(), None)
+        rows = list(frame.itertuples(index=False, name=None))
+    elif data and isinstance(data[0], dict):
+        column_names = list(data[0].keys())
+        rows = [tuple(record.get(col) for col in column_names) for record in data]
+    else:
+        column_names = None
+        rows = [tuple(row) for row in data]
+    return column_names, rows
+
+
+_PLACEHOLDER = re.compile(r"%%|%s")
+
+
+def split_placeholders(query):
+    """Split a query with %s placeholders into the text around them, unescaping %%.
+
+    Returns:
+        List of the text segments, one more than the number of placeholders.
+    """
+    segments, current, pos = [], [], 0
+    for match in _PLACEHOLDER.finditer(query):
+        current.append(query[pos:match.start()])
+        if match.group() == "%%":
+            current.append("%")
+        else:
+            segments.append("".join(current))
+            current = []
+        pos = match.end()
+    current.append(query[pos:])
+    segments.append("".join(current))
+    return segments
+
+
+# connectors which ran a statement under a deadline, see interrupt_statements()
+_guarded_connectors = weakref.WeakSet()
+
+
+def interrupt_statements():
+    """Interrupt all the connectors of the process running statements, e.g. on Ctrl-C: the running statements
+    are cancelled on the server and the next statements of these connectors fail."""
+    for connector in list(_guarded_connectors):
+        connector.interrupt()
+
+
+class _Statement:
+    """Blocking call of a statement under a deadline, see BaseConnector._guard()."""
+    def __init__(self, query):
+        self.query = query
+        self.expired = False  # cancelled at its deadline
+        self.done = threading.Event()
+
+
+class PreparedStatement:
+    def __init__(self, connector, query):
+        """Initialize a statement prepared by BaseConnector.prepare().
+
+        This default binds the parameters in the DB-API driver (client side). Backends with server-side
+        prepared statements subclass it, so the server parses the statement once per connection.
+
+        Args:
+            connector: connector executing the statement.
+            query: query with %s placeholders (%% for a literal %).
+        """
+        self.connector = connector
+        self.query = query
+        self.segments = split_placeholders(query)
+        self.num_params = len(self.segments) - 1
+        self.executions = 0
+
+    def execute(self, params=None):
+        """Execute the statement with the parameters and return the result.
+
+        Args:
+            params: sequence of the values of the placeholders, in order. Default is None (no placeholders).
+        """
+        params = tuple(params or ())
+        if len(params) != self.num_params:
+            raise ValueError(f"The statement expects {self.num_params} parameters, got {len(params)}: {self.query}")
+        self.executions += 1
+        return self._execute(params)
+
+    def _execute(self, params):
+        """Execute the statement with the checked parameters."""
+        cursor = self.connector._connection().cursor()
+        try:
+            with self.connector._guard(self.query):
+                cursor.execute(self.query, params or None)
+                return cursor.fetchall() if cursor.description else []
+        finally:
+            cursor.close()
+
+    def close(self):
+        """Release the statement on the server."""
+
+
+class BaseConnector:
+    """Shared interface of all the Connector classes.
+
+    Subclasses implement _connection(), execute_query() and close(). stream(), query_arrow()
+    and bulk_insert() have DB-API 2.0 based defaults, which backends with a faster native path override.
+    The blocking calls run under _guard(), so deadline() and query_timeout cancel a runaway statement
+    with cancel(), which backends with a server-side kill override.
+    """
+    db_type = None
+    stream_batch_size = 10000  # Default number of rows per streamed batch
+    paramstyle = "%s"  # Placeholder used by the default bulk_insert()
+    conn_id = None
+    query_cache = None  # Opt-in QueryCache, see enable_cache()
+    compression = None  # Transport compression in use, see transport_stats()
+    wire_format = None  # Format of the data on the wire, see transport_stats()
+    wire_bytes = None  # Bytes received over the network, for the backends which can measure it
+    decoded_bytes = None  # Bytes of the same responses after decompression
+    metadata_ttl = 300  # Seconds the table metadata (statistics, limits) is kept by cached_metadata()
+    prepared_cache_size = 128  # Prepared statements kept per connection by prepare(), least recently used evicted
+    identifier_quotes = ('"', '"')  # Opening and closing quote of the identifiers, see quote_identifier()
+    connect_attempts = 5  # Connection attempts of get_connection() before giving up
+    router = None  # ReplicaRouter which chose the node of this connection, see routing
+    route_node = None  # Node of the router this connection is open on
+    limit_style = "limit"  # Row limit of the dialect: 'limit' (LIMIT n) or 'top' (SELECT TOP n)
+    backslash_escapes = False  # The string literals of the dialect treat the backslash as an escape character
+    string_prefix = ""  # Prefix of the string literals, e.g. N for the MS SQL unicode strings
+    boolean_literals = ("TRUE", "FALSE")  # Literals of True and False
+    query_timeout = None  # Seconds a statement may block before it is cancelled on the server, see deadline()
+    cancel_grace = 5  # Seconds a cancelled statement has to stop before the connection is reset
+    _deadline = None  # Absolute deadline of the next statements, see set_deadline()
+    _interrupted = False  # Set by interrupt(), the next statements fail
+    _statement = None  # _Statement blocking under _guard()
+
+    def _connection(self):
+        """Return the underlying DB-API connection (or client) object."""
+        raise NotImplementedError
+
+    def execute_query(self, query, params=None):
+        """Execute the query, binding the params to its %s placeholders, and return the result."""
+        raise NotImplementedError
+
+    def close(self):
+        """Close the connection."""
+        raise NotImplementedError
+
+    def set_deadline(self, deadline):
+        """Bound the next statements by an absolute deadline in time.time() seconds, e.g. the deadline of a job.
+
+        Args:
+            deadline: epoch seconds, None to remove the deadline.
+        """
+        self._deadline = deadline
+
+    @contextlib.contextmanager
+    def deadline(self, seconds):
+        """Bound the statements of the block by seconds from now, within the current deadline.
+
+        The statement running when the time is up is cancelled on the server and raises TimeoutError, the next ones
+        raise TimeoutError without being sent, so the retries of the caller cannot extend the block.
+
+        Args:
+            seconds: seconds of the block.
+        """
+        previous = self._deadline
+        deadline = time.time() + seconds
+        self._deadline = deadline if previous is None else min(previous, deadline)
+        try:
+            yield self
+        finally:
+            self._deadline = previous
+
+    def statement_deadline(self):
+        """Return the absolute deadline of a statement starting now, from deadline() and query_timeout, or None."""
+        limits = [limit for limit in (self._deadline, self.query_timeout and time.time() + self.query_timeout) if limit]
+        return min(limits) if limits else None
+
+    @contextlib.contextmanager
+    def _guard(self, query):
+        """Run a blocking call of the statement (execute, fetch, insert) under its deadline.
+
+        At the deadline, a timer thread calls cancel() and the call raises TimeoutError. A call still blocked
+        cancel_grace seconds later has its connection dropped by reset_connection(). Ctrl-C cancels the statement
+        on the server before propagating. The guard of a call nested in another one is a no-op.
+        """
+        if self._statement is not None:
+            yield
+            return
+        if self._interrupted:
+            raise Exception(f"[query_history]{type(self).__name__} was interrupted, the query is not sent: {query}")
+        deadline = self.statement_deadline()
+        if deadline is not None and deadline <= time.time():
+            raise TimeoutError(f"[query_history]Deadline exceeded, the query is not sent: {query}")
+        _guarded_connectors.add(self)
+        statement = self._statement = _Statement(query)
+        timer = None
+        if deadline is not None:
+            timer = threading.Timer(deadline - time.time(), self._expire, args=(statement,))
+            timer.daemon = True
+            timer.start()
+        try:
+            yield
+        except KeyboardInterrupt:
+            self._cancel_statement(statement)
+            raise
+        except Exception as e:
+            # also the server-side limits (e.g. max_execution_time) hitting the deadline first
+            if statement.expired or (deadline is not None and time.time() >= deadline):
+                raise TimeoutError(f"[query_history]Query cancelled at its deadline: {query}") from e
+            raise
+        finally:
+            statement.done.set()
+            self._statement = None
+            if timer is not None:
+                timer.cancel()
+
+    def _expire(self, statement):
+        """Cancel the statement at its deadline, then reset the connection if it does not stop."""
+        if statement.done.is_set():
+            return
+        statement.expired = True
+        print(f"[query_history]Deadline exceeded, cancelling the query: {statement.query}")
+        self._cancel_statement(statement)
+        if not statement.done.wait(self.cancel_grace):
+            print(f"[connect_history]Query still running {self.cancel_grace}s after its cancellation, resetting the connection.")
+            try:
+                self.reset_connection()
+            except Exception as e:
+                print(f"[connect_history]Reset of the connection failed: {e}")
+
+    def _cancel_statement(self, statement):
+        """Cancel the statement if it is still running, reporting the failures instead of raising them."""
+        if statement.done.is_set():
+            return
+        try:
+            self.cancel()
+        except Exception as e:
+            print(f"[query_history]Cancellation of the query failed: {e}")
+
+    def cancel(self):
+        """Cancel the running statement on the server, called from another thread than the blocked one.
+
+        This default resets the connection, backends with a server-side cancellation override it.
+        """
+        self.reset_connection()
+
+    def reset_connection(self):
+        """Drop the connection under a blocked statement so that its call fails."""
+        raise NotImplementedError(f"{type(self).__name__} cannot reset its connection.")
+
+    def interrupt(self):
+        """Cancel the running statement and make the next statements fail, e.g. on Ctrl-C or when a job is stopped."""
+        self._interrupted = True
+        statement = self._statement
+        if statement is not None:
+            self._cancel_statement(statement)
+
+    def quote_identifier(self, name):
+        """Quote a table or column name, part by part for a qualified name (database.table).
+
+        Parts already quoted are kept, so the function can be applied to user input more than once.
+        """
+        opening, closing = self.identifier_quotes
+        parts = []
+        for part in name.split("."):
+            if not (part.startswith(opening) and part.endswith(closing) and len(part) > 1):
+                part = opening + part.replace(closing, closing * 2) + closing
+            parts.append(part)
+        return ".".join(parts)
+
+    def literal(self, value):
+        """Format a Python value as a literal of the dialect, for the queries built from values (see frame())."""
+        if value is None:
+            return "NULL"
+        if isinstance(value, bool):
+            return self.boolean_literals[0] if value else self.boolean_literals[1]
+        if isinstance(value, (int, float, decimal.Decimal)):
+            return str(value)
+        if isinstance(value, datetime.datetime):
+            value = value.isoformat(sep=" ")
+        elif isinstance(value, datetime.date):
+            value = value.isoformat()
+        value = str(value)
+        if self.backslash_escapes:
+            value = value.replace("\\", "\\\\")
+        return f"{self.string_prefix}'" + value.replace("'", "''") + "'"
+
+    def frame(self, table=None, query=None):
+        """Return a lazy QueryFrame of a table or query, whose operations run on the server.
+
+        Args:
+            table: source table, 'table' or 'database.table'. Default is None.
+            query: source query, when table is not given. Default is None.
+        """
+        return QueryFrame(self, table=table, query=query)
+
+    def _prepare_statement(self, query):
+        """Return a new PreparedStatement of the query. Override for server-side prepared statements."""
+        return PreparedStatement(self, query)
+
+    def prepare(self, query):
+        """Return the prepared statement of the query, from the per-connection cache of prepared statements.
+
+        The cache keeps the prepared_cache_size most recently used statements, the evicted ones are released
+        on the server.
+
+        Args:
+            query: query with %s placeholders (%% for a literal %), e.g. 'SELECT * FROM users WHERE id = %s'.
+        """
+        statements = self.__dict__.setdefault("_prepared", OrderedDict())
+        statement = statements.get(query)
+        if statement is not None:
+            statements.move_to_end(query)
+            return statement
+        statement = statements[query] = self._prepare_statement(query)
+        print(f"[query_history]Prepared statement: {query}")
+        while len(statements) > self.prepared_cache_size:
+            _, evicted = statements.popitem(last=False)
+            evicted.close()
+        return statement
+
+    @cached_result
+    def execute_prepared(self, query, params=None):
+        """Execute the query as a cached prepared statement and return the result.
+
+        Unlike execute_query() nothing is logged per execution, for the high-QPS lookups.
+
+        Args:
+            query: query with %s placeholders (%% for a literal %).
+            params: sequence of the values of the placeholders. Default is None.
+        """
+        return self.prepare(query).execute(params)
+
+    def clear_prepared(self):
+        """Release all the prepared statements of this connection."""
+        statements = self.__dict__.get("_prepared", {})
+        while statements:
+            _, statement = statements.popitem()
+            try:
+                statement.close()
+            except Exception as e:
+                print(f"[query_history]Error while releasing a prepared statement: {e}")
+
+    def buffered_writer(self, table_name, **kwargs):
+        """Return a BufferedWriter coalescing the small writes into the table, closed with the connector.
+
+        Args:
+            table_name: target table.
+            **kwargs: keyword arguments for the BufferedWriter, e.g. max_rows, max_bytes, max_seconds.
+        """
+        from .buffered_writer import BufferedWriter
+
+        writer = BufferedWriter(self, table_name, **kwargs)
+        self.__dict__.setdefault("_writers", []).append(writer)
+        return writer
+
+    def close_writers(self):
+        """Flush and close the buffered writers of the connector, called by close()."""
+        for writer in self.__dict__.pop("_writers", []):
+            try:
+                writer.close()
+            except Exception as e:
+                print(f"[insert_history]Error while closing the buffered writer of {writer.table_name}: {e}")
+
+    def release_route(self):
+        """Give the routed node back to its router, called by close()."""
+        if self.router is not None:
+            self.router.release(self.route_node)
+            self.router = self.route_node = None
+
+    def cache_namespace(self):
+        """Return the identifier of this connection in the query cache keys."""
+        if self.conn_id:
+            return self.conn_id
+        params = getattr(self, "conn_params", {})
+        return f"{self.db_type}://{params.get('user')}@{params.get('host')}:{params.get('port')}/{params.get('database')}"
+
+    def enable_cache(self, cache=None, **kwargs):
+        """Enable the query result cache for the read queries of this connector.
+
+        Args:
+            cache: a QueryCache instance, which can be shared by several connectors. Default is None (create one).
+            **kwargs: keyword arguments for a new QueryCache, e.g. max_bytes, ttl, cache_dir.
+
+        Returns:
+            The QueryCache in use.
+        """
+        from .query_cache import QueryCache
+
+        self.query_cache = cache if cache is not None else QueryCache(**kwargs)
+        return self.query_cache
+
+    def disable_cache(self):
+        """Disable the query result cache."""
+        self.query_cache = None
+
+    def _ignore_transport_options(self, kwargs):
+        """Report the transport options given to a backend whose driver does not support them.
+
+        The CLI passes --compression and --wire-format to every connector of a transfer, so they are
+        reported and ignored instead of failing the transfer.
+        """
+        for option in ("compress", "wire_format"):
+            if kwargs.get(option):
+                print(f"[connect_history]The {self.__class__.__name__} driver does not support {option}="
+                      f"{kwargs[option]!r}, the data is transferred without it.")
+
+    def transport_stats(self):
+        """Return the transport settings and, when measured, the compression ratio of the received data."""
+        stats = {"compression": self.compression, "wire_format": self.wire_format}
+        if self.wire_bytes is not None:
+            stats["wire_bytes"] = self.wire_bytes
+            stats["decoded_bytes"] = self.decoded_bytes
+            stats["ratio"] = round(self.decoded_bytes / self.wire_bytes, 2) if self.wire_bytes else None
+        return stats
+
+    def _stream_cursor(self):
+        """Return the DB-API cursor used by stream(). Override to use a server-side cursor."""
+        return self._connection().cursor()
+
+    def column_types(self, table_name):
+        """Return the columns of the table as a list of (name, arrow_type, nullable), see type_mapping.
+
+        arrow_type is None for the column types without an Arrow mapping.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not report column types.")
+
+    def cached_metadata(self, key, loader):
+        """Return the metadata of the key, calling loader() at most once per metadata_ttl seconds.
+
+        Args:
+            key: metadata key, e.g. ('table_stats', table_name).
+            loader: function returning the metadata.
+        """
+        cache = self.__dict__.setdefault("_metadata_cache", {})
+        entry = cache.get(key)
+        if entry is None or time.time() - entry[0] > self.metadata_ttl:
+            entry = cache[key] = (time.time(), loader())
+        return entry[1]
+
+    def table_stats(self, table_name):
+        """Return the statistics of the table from the catalogue, without scanning it:
+        {"rows": approximate number of rows, None when the catalogue has no estimate yet, "bytes": approximate
+        data size}."""
+        raise NotImplementedError(f"{type(self).__name__} does not report table statistics.")
+
+    def estimate_rows(self, query):
+        """Return the number of rows the query is estimated to return by the query planner (EXPLAIN), or None."""
+        return None
+
+    def count_rows(self, table_name, where=None, exact=False):
+        """Return the number of rows of the table, approximate by default.
+
+        The approximate count reads the catalogue statistics (table_stats()) without a where, otherwise or when
+        the catalogue has no estimate the planner estimate (estimate_rows()), and falls back to the exact count
+        when the backend has neither.
+        The statistics lag the recent writes (e.g. InnoDB samples them), use exact=True for a COUNT(*) scan.
+
+        Args:
+            table_name: table name.
+            where: filter condition of the counted rows. Default is None.
+            exact: run SELECT COUNT(*). Default is False.
+        """
+        if not exact:
+            try:
+                rows = self.table_stats(table_name)["rows"] if where is None else None
+                if rows is None:
+                    query = f"SELECT * FROM {self.quote_identifier(table_name)}"
+                    rows = self.estimate_rows(query if where is None else f"{query} WHERE {where}")
+                if rows is not None:
+                    return int(rows)
+            except NotImplementedError:
+                pass
+            except Exception as e:
+                print(f"[query_history]Approximate count of {table_name} not available, counting it: {e}")
+        query = f"SELECT COUNT(*) FROM {self.quote_identifier(table_name)}"
+        if where is not None:
+            query += f" WHERE {where}"
+        row = self.execute_query(query)[0]
+        return int(next(iter(row.values())) if isinstance(row, dict) else row[0])
+
+    def batch_limits(self):
+        """Return the server limits of an insert batch: {"max_rows": int or None, "max_bytes": int or None}."""
+        return {}
+
+    def stream(self, query, batch_size=None, schema=None):
+        """Execute the query and yield the result as pyarrow RecordBatches.
+
+        Args:
+            query: query to be executed.
+            batch_size: number of rows per batch, or a function returning it before each fetch
+                (e.g. AdaptiveBatcher.next_size). Default is stream_batch_size.
+            schema: Arrow schema of the result columns, see type_mapping.arrow_schema(). Default is None (infer).
+        """
+        batch_size = batch_size or self.stream_batch_size
+        fetch_size = batch_size if callable(batch_size) else (lambda: batch_size)
+        cursor = self._stream_cursor()
+        try:
+            print(f"[query_history]Streaming query: {query}")
+            # each call is guarded on its own, the deadline bounds a stalled fetch and not the whole stream
+            with self._guard(query):
+                cursor.execute(query)
+                rows = cursor.fetchmany(fetch_size())
+            # read the description after the first fetch, since server-side cursors only fill it then
+            column_names = [desc[0] for desc in cursor.description]
+            num_records = 0
+            while rows:
+                num_records += len(rows)
+                yield rows_to_record_batch(rows, column_names, schema)
+                with self._guard(query):
+                    rows = cursor.fetchmany(fetch_size())
+            print(f"[query_history]Query streamed successfully. Number of records: {num_records}")
+        finally:
+            cursor.close()
+
+    @cached_result
+    def query_arrow(self, query):
+        """Execute the query and return the result as a pyarrow Table.
+
+        Args:
+            query: query to be executed.
+        """
+        pa = import_pyarrow()
+        batches = list(self.stream(query))
+        if not batches:
+            return pa.table({})
+        return pa.Table.from_batches(batches)
+
+    def _insert_cursor(self):
+        """Return the DB-API cursor used by bulk_insert()."""
+        return self._connection().cursor()
+
+    def _insert_columns(self, table_name):
+        """Return the column names of the target table, used when the data has no column names."""
+        raise NotImplementedError(f"{type(self).__name__} requires column names for bulk_insert().")
+
+    def _upsert_clause(self, column_names, key_columns):
+        """Return the SQL appended to INSERT ... VALUES to update the existing rows."""
+        raise NotImplementedError(f"{type(self).__name__} does not support the 'upsert' load mode.")
+
+    def bulk_insert(self, table_name, data, batch_size=None, mode="insert", key_columns=None):
+        """Insert the data into the target table and commit.
+
+        Args:
+            table_name: target table.
+            data: pyarrow Table/RecordBatch, pandas DataFrame, list of dictionaries or list of tuples.
+            batch_size: number of rows per executemany() call. Default is stream_batch_size.
+            mode: 'insert' or 'upsert' (update the rows whose key already exists). Default is 'insert'.
+            key_columns: key columns of the upsert, required by some backends. Default is None.
+
+        Returns:
+            Number of rows inserted.
+        """
+        if mode not in ("insert", "upsert"):
+            raise ValueError(f"bulk_insert() supports the 'insert' and 'upsert' modes, got '{mode}'. "
+                             f"Staged modes are run with staged_load().")
+        column_names, rows = to_column_rows(data)
+        if not rows:
+            return 0
+        if column_names is None:
+            column_names = self._insert_columns(table_name)
+        batch_size = batch_size or self.stream_batch_size
+        insert_query = (f"INSERT INTO {self.quote_identifier(table_name)} "
+                        f"({', '.join(self.quote_identifier(col) for col in column_names)}) "
+                        f"VALUES ({', '.join([self.paramstyle] * len(column_names))})")
+        if mode == "upsert":
+            insert_query += " " + self._upsert_clause(column_names, key_columns)
+
+        connection = self._connection()
+        cursor = self._insert_cursor()
+        try:
+            with self._guard(insert_query):
+                for start in range(0, len(rows), batch_size):
+                    cursor.executemany(insert_query, rows[start:start + batch_size])
+                connection.commit()
+        finally:
+            cursor.close()
+        print(f"[insert_history]Number of rows inserted into {table_name}: {len(rows)}")
+        if self.query_cache is not None:
+            self.query_cache.invalidate(table_name)
+        return len(rows)
+
+    def _execute_statement(self, statement):
+        """Execute a statement without result set (DDL/DML) and commit."""
+        connection = self._connection()
+        cursor = connection.cursor()
+        try:
+            with self._guard(statement):
+                cursor.execute(statement)
+                connection.commit()
+        finally:
+            cursor.close()
+
+    def create_stage_table(self, table_name):
+        """Create an empty stage table with the structure of the target table and return its name.
+
+        The identifiers are quoted on every path of the staged loads (stage creation, inserts, merge, drop), so a
+        mixed-case name is the same table everywhere, also on the backends folding the unquoted names.
+        """
+        stage_table = f"{table_name}__dataxi_stage_{uuid.uuid4().hex[:8]}"
+        self._execute_statement(self._create_stage_sql(self.quote_identifier(table_name),
+                                                       self.quote_identifier(stage_table)))
+        print(f"[insert_history]Created stage table: {stage_table}")
+        return stage_table
+
+    def _create_stage_sql(self, table_name, stage_table):
+        """Return the SQL creating the stage table, both names quoted."""
+        raise NotImplementedError(f"{type(self).__name__} does not support staged loads.")
+
+    def merge_stage_table(self, stage_table, table_name, mode="merge", key_columns=None):
+        """Apply the stage table to the target table with the staged load mode.
+
+        Args:
+            stage_table: stage table created by create_stage_table().
+            table_name: target table.
+            mode: 'merge', 'replace_partitions' or 'swap'. Default is 'merge'.
+            key_columns: key columns of the merge, required by some backends. Default is None.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support the '{mode}' load mode.")
+
+    def delete_rows(self, table_name, condition):
+        """Delete the rows of the table matching the SQL condition and commit."""
+        self._execute_statement(f"DELETE FROM {self.quote_identifier(table_name)} WHERE {condition}")
+        print(f"[insert_history]Deleted the rows of {table_name} where {condition}")
+        if self.query_cache is not None:
+            self.query_cache.invalidate(table_name)
+
+    def drop_table(self, table_name):
+        """Drop the table if it exists."""
+        self._execute_statement(f"DROP TABLE IF EXISTS {self.quote_identifier(table_name)}")
+
+    def staged_load(self, table_name, batches, mode="merge", key_columns=None):
+        """Load the batches into a stage table, then apply it to the target table with the load mode.
+
+        Args:
+            table_name: target table.
+            batches: iterable of pyarrow RecordBatches (or any bulk_insert() data).
+            mode: 'merge', 'replace_partitions' or 'swap'. Default is 'merge'.
+            key_columns: key columns of the merge, required by some backends. Default is None.
+
+        Returns:
+            Number of rows loaded.
+        """
+        stage_table = self.create_stage_table(table_name)
+        try:
+            num_rows = 0
+            for batch in batches:
+                num_rows += self.bulk_insert(stage_table, batch)
+            self.merge_stage_table(stage_table, table_name, mode=mode, key_columns=key_columns)
+        finally:
+            self.drop_table(stage_table)
+        if self.query_cache is not None:
+            self.query_cache.invalidate(table_name)
+        return num_rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,139 @@
+# File: buffered_writer.py
+
+# Description: This Package provides the buffered writer of the connectors, which coalesces the small writes of
+#              the producers into large bulk inserts, flushed by rows, bytes or age and on close, so a sink such
+#              as ClickHouse gets one part per flush instead of one per write.
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+
+import atexit
+import sys
+import threading
+import time
+
+from .base_connector import import_pyarrow, to_column_rows
+
+
+def _rows_nbytes(rows):
+    """Estimate the bytes of a list of tuples from a sample of the rows."""
+    sample = rows[:10]
+    if not sample:
+        return 0
+    return int(sum(sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row) for row in sample)
+               / len(sample) * len(rows))
+
+
+class BufferedWriter:
+    def __init__(self, connector, table_name, max_rows=100000, max_bytes=64 * 1024 * 1024, max_seconds=1.0,
+                 mode="insert", key_columns=None):
+        """Initialize the writer buffering the rows of a table until a flush.
+
+        A flush sends the buffered rows with one bulk_insert() when they reach max_rows or max_bytes, when the
+        oldest one waited max_seconds, on flush() and on close(). The flushes run in the thread of the write (the
+        connector is not shared with a background thread), so the age is checked on each write: a producer going
+        idle calls flush(). Closing the connector or exiting the interpreter closes the writer. A failed flush
+        keeps the rows buffered and raises.
+
+        Args:
+            connector: connector of the sink.
+            table_name: target table.
+            max_rows: buffered rows triggering a flush. Default is 100000.
+            max_bytes: buffered bytes (estimated for the rows which are not Arrow) triggering a flush. Default is 64 MB.
+            max_seconds: maximum seconds a row waits in the buffer while the writes go on, None to only flush by
+                size. Default is 1.0.
+            mode: load mode of bulk_insert(), 'insert' or 'upsert'. Default is 'insert'.
+            key_columns: key columns of the upsert. Default is None.
+        """
+        self.connector = connector
+        self.table_name = table_name
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.mode = mode
+        self.key_columns = key_columns
+        self.column_names = None
+        self.stats = {"writes": 0, "flushes": 0, "rows": 0}
+        self._tables = []  # buffered pyarrow Tables
+        self._rows = []  # buffered tuples of column_names
+        self._num_rows = 0
+        self._nbytes = 0
+        self._first_time = None  # time of the oldest buffered row
+        self._closed = False
+        self._lock = threading.RLock()
+        atexit.register(self.close)
+
+    def write(self, data):
+        """Buffer the data: pyarrow Table/RecordBatch, pandas DataFrame, list of dictionaries or list of tuples.
+
+        The tuples follow the columns of the first write with column names, or the table columns.
+        """
+        with self._lock:
+            if self._closed:
+                raise ValueError(f"The buffered writer of {self.table_name} is closed.")
+            if hasattr(data, "to_batches") or hasattr(data, "to_pylist"):
+                if not hasattr(data, "to_batches"):
+                    data = import_pyarrow().Table.from_batches([data])
+                num_rows, nbytes = data.num_rows, data.nbytes
+                if num_rows:
+                    self._tables.append(data)
+            else:
+                column_names, rows = to_column_rows(data)
+                if column_names is not None and column_names != self.column_names:
+                    if self._rows:
+                        # the rows of other columns are not appended to the buffered tuples, send these first
+                        self._flush()
+                    self.column_names = column_names
+                num_rows, nbytes = len(rows), _rows_nbytes(rows)
+                self._rows.extend(rows)
+            if not num_rows:
+                return
+            self.stats["writes"] += 1
+            self._num_rows += num_rows
+            self._nbytes += nbytes
+            if self._first_time is None:
+                self._first_time = time.time()
+            if self._num_rows >= self.max_rows or (self.max_bytes and self._nbytes >= self.max_bytes) \
+                    or (self.max_seconds and time.time() - self._first_time >= self.max_seconds):
+                self._flush()
+
+    def _flush(self):
+        """Send the buffered rows. The lock must be held."""
+        if self._tables:
+            pa = import_pyarrow()
+            table = pa.concat_tables(self._tables, promote_options="default") if len(self._tables) > 1 else self._tables[0]
+            self.connector.bulk_insert(self.table_name, table, mode=self.mode, key_columns=self.key_columns)
+            self.stats["rows"] += table.num_rows
+            self._tables = []
+            self.stats["flushes"] += 1
+        if self._rows:
+            data = [dict(zip(self.column_names, row)) for row in self._rows] if self.column_names else self._rows
+            self.connector.bulk_insert(self.table_name, data, batch_size=len(data), mode=self.mode,
+                                       key_columns=self.key_columns)
+            self.stats["rows"] += len(self._rows)
+            self._rows = []
+            self.stats["flushes"] += 1
+        self._num_rows = self._nbytes = 0
+        self._first_time = None
+
+    def flush(self):
+        """Send the buffered rows now."""
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        """Flush the buffered rows and close the writer."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            atexit.unregister(self.close)
+            self._flush()
+        print(f"[insert_history]Buffered writer of {self.table_name} closed: {self.stats['writes']} writes in "
+              f"{self.stats['flushes']} inserts, {self.stats['rows']} rows")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,509 @@
+# File: clickhouse_connector.py
+
+# Description: This Package aims to provide some reusable functions for connecting to ClickHouse.
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+# Change Log:
+
+# 2026.10.18:
+#     1. moved the ClickHouseConnector class from backup.py, added conn_id support
+#     2. added stream(), query_arrow(), bulk_insert() with the shared interface
+#     3. added the opt-in query result cache for execute_query(), query_df() and query_arrow()
+#     4. added batch_limits() from max_insert_block_size for the adaptive batching
+#     5. added the ReplacingMergeTree aware upsert/merge and the staged replace_partitions/swap load modes
+#     6. added column_types() from system.columns for the type mapping
+#     7. added the configurable transport compression (lz4/zstd/gzip) and the Arrow/Native wire formats
+#     8. added delete_rows() (lightweight DELETE) for the resumable transfers and the replication
+#     9. added table_stats() from system.parts and estimate_rows() from EXPLAIN ESTIMATE for the planner
+#     10. added the params binding of execute_query() and the prepared statements with server-side parameters
+#     11. added the read replica routing (host override of conn_id, connect_attempts, release on close)
+#     12. added the literals of the dialect for the lazy query frames (frame())
+#     13. added the async_insert mode for the small writes, and the buffered writer closed with the connector
+#     14. added the approximate count of count_table() from system.parts
+#     15. added the query deadlines: query_id and max_execution_time settings, KILL QUERY WHERE query_id
+
+
+import contextlib
+import datetime
+import decimal
+import math
+import time
+import uuid
+# becasue of the port default setting, use clickhouse_connect instead of clickhouse_driver
+from clickhouse_connect import get_client
+
+from ..cred_mgr import get_cred
+from .base_connector import BaseConnector, PreparedStatement, import_pyarrow, rows_to_record_batch, to_column_rows
+from .query_cache import cached_result
+
+
+# Wire formats of stream() and bulk_insert()
+#   arrow: ArrowStream results and Arrow inserts, no per-row conversion in Python
+#   native: ClickHouse Native columnar blocks, decoded by clickhouse_connect into Python columns
+WIRE_FORMATS = ("arrow", "native")
+
+
+def clickhouse_param_type(value):
+    """Return the ClickHouse type of a server-side query parameter from its Python value."""
+    if value is None:
+        return "Nullable(String)"
+    if isinstance(value, bool):
+        return "Bool"
+    if isinstance(value, int):
+        return "Int64"
+    if isinstance(value, float):
+        return "Float64"
+    if isinstance(value, decimal.Decimal):
+        return "Decimal(38, 12)"
+    if isinstance(value, datetime.datetime):
+        return "DateTime64(6)"
+    if isinstance(value, datetime.date):
+        return "Date"
+    return "String"
+
+
+class ClickHousePreparedStatement(PreparedStatement):
+    """Statement sent with server-side parameters ({p1:Type}), so the values are never formatted into the SQL.
+
+    The SQL of each combination of parameter types is built once and reused.
+    """
+    def __init__(self, connector, query):
+        super().__init__(connector, query)
+        self._sql = {}
+
+    def _execute(self, params):
+        types = tuple(clickhouse_param_type(value) for value in params)
+        sql = self._sql.get(types)
+        if sql is None:
+            sql = self._sql[types] = self.segments[0] + "".join(
+                f"{{p{i}:{param_type}}}" + segment for i, (param_type, segment) in enumerate(zip(types, self.segments[1:]), 1))
+        parameters = {f"p{i}": value for i, value in enumerate(params, 1)}
+        with self.connector._query(sql) as settings:
+            return self.connector.ch_client.query(sql, parameters=parameters or None, settings=settings).result_rows
+
+
+class ClickHouseConnector(BaseConnector):
+    db_type = "clickhouse"
+    identifier_quotes = ("`", "`")
+    backslash_escapes = True
+    _query_id = None  # query_id of the last query, see cancel()
+
+    def __init__(self, host=None, port=None, user=None, password=None, database=None, verify=False, conn_id=None,
+                 compress=True, wire_format="arrow", async_insert=False, wait_for_async_insert=True, **kwargs):
+        """Connects to the ClickHouse. The connection will be retried for 5 times if it fails.
+
+        Args:
+            host: ClickHouse host.
+            port: ClickHouse port.
+            user: ClickHouse user.
+            password: ClickHouse password.
+            database: ClickHouse database. Default is None.
+            verify: Validate the ClickHouse server TLS/SSL certificate. Default is False.
+            conn_id: Connection ID to load the credentials from the credential manager.
+            compress: HTTP compression of the query results and inserts, True (lz4), 'lz4', 'zstd', 'gzip', 'br' or False.
+                Default is True.
+            wire_format: format of stream() and bulk_insert(), 'arrow' or 'native'. Default is 'arrow'.
+            async_insert: small-write mode, the server buffers the inserts of all clients and writes them as one part
+                (async_insert setting), and insert() skips its sleep. Default is False.
+            wait_for_async_insert: with async_insert, an insert returns once its rows are written, False to return
+                once they are buffered, losing them if the server stops before its flush. Default is True.
+            **kwargs: Additional keyword arguments. Especially for db_type.
+        """
+        if wire_format not in WIRE_FORMATS:
+            raise ValueError(f"Invalid wire_format '{wire_format}', expected one of: {', '.join(WIRE_FORMATS)}.")
+        self.wire_format = wire_format
+        self.compression = ("lz4" if compress is True else compress) or None
+        self.async_insert = async_insert
+        self.wait_for_async_insert = wait_for_async_insert
+        if conn_id:
+            print(f"[connect_history]Connecting to ClickHouse with connection ID: {conn_id}")
+            cred_dict = get_cred(conn_id)
+            # an explicit host/port (e.g. a replica chosen by the router) overrides the stored primary
+            host, port = host or cred_dict.get("host"), port or cred_dict.get("port")
+            user, password = cred_dict.get("user"), cred_dict.get("password")
+            database = database or cred_dict.get("database")
+
+        self.conn_id = conn_id
+        self.connect_attempts = kwargs.get("connect_attempts", self.connect_attempts)
+        self.query_timeout = kwargs.get("query_timeout", self.query_timeout)
+        self.conn_params = dict(host=host, port=port, user=user, password=password, database=database, verify=verify,
+                                compress=compress)
+        self.get_connection(**self.conn_params)
+
+    def get_connection(self, host=None, port=None, user=None, password=None, database=None, verify=False, compress=True):
+        """Return the ClickHouse client object."""
+        if host is None and getattr(self, "flag_connected", False):
+            # Called without parameters on a connected object, return the existing connection
+            return self.ch_client, self.flag_connected
+        max_attempts = self.connect_attempts  # Set the maximum number of attempts
+        cur_attempt = 0  # Current attempt number
+        self.flag_connected = False  # Flag to indicate connection status
+
+        while cur_attempt < max_attempts and not self.flag_connected:
+            try:
+                cur_attempt += 1
+                print(f"[connect_history]Attempting to connect to ClickHouse, attempt number: {cur_attempt}.")
+                self.ch_client = get_client(host=host, port=port, username=user, password=password or '',
+                                            database=database, verify=verify, compress=compress)
+                print("[connect_history]Successfully connected to ClickHouse.")
+                self.flag_connected = True  # Mark as successfully connected
+            except Exception as e:
+                print(f"[connect_history]Exception thrown. connect_history for {cur_attempt} attempt: " + str(e))
+                time.sleep(10)  # Wait for 10 seconds before retrying
+
+        if not self.flag_connected:
+            raise Exception("[connect_history]Unable to connect to the ClickHouse.")
+        return self.ch_client, self.flag_connected
+
+    @cached_result
+    def execute_query(self, query, params=None):
+        """Execute the query and return the result.
+
+        Args:
+            query: ClickHouse query to be executed.
+            params: values bound to the query, a sequence for %s placeholders or a dictionary for %(name)s and
+                server-side {name:Type} placeholders. Default is None.
+
+        Returns:
+            The result of the query with the format of a list of tuples.
+        """
+        print(f"[query_history]Executing query: {query}")
+        with self._query(query) as settings:
+            result = self.ch_client.query(query, parameters=params, settings=settings).result_rows
+        print(f"[query_history]Query executed successfully. Number of records: {len(result)}")
+
+        return result
+
+    @cached_result
+    def query_df(self, query):
+        """Execute the query and return the result as a DataFrame.
+
+        Args:
+            query: ClickHouse query to be executed.
+
+        Returns:
+            The result of the query with the format of a DataFrame.
+        """
+        with self._query(query) as settings:
+            result = self.ch_client.query_df(query, settings=settings)
+
+        return result
+
+    def stream(self, query, batch_size=None, schema=None):
+        """Execute the query and yield the result as pyarrow RecordBatches, using the native Arrow stream.
+
+        Args:
+            query: ClickHouse query to be executed.
+            batch_size: rows per block, sent as the max_block_size setting (a function is evaluated once).
+                Default is None (server setting).
+            schema: Arrow schema of the result columns, only used by the 'native' wire format. Default is None.
+        """
+        if callable(batch_size):
+            batch_size = batch_size()
+        settings = {"max_block_size": int(batch_size)} if batch_size else {}
+        # the deadline bounds each block, a long stream is not cut by max_execution_time
+        settings["query_id"] = self._query_id = uuid.uuid4().hex
+        print(f"[query_history]Streaming query: {query}")
+        if self.wire_format == "arrow":
+            with self._guard(query):
+                stream = self.ch_client.query_arrow_stream(query, settings=settings)
+            with stream:
+                for batch in self._guarded_blocks(query, stream):
+                    yield batch
+        else:
+            with self._guard(query):
+                stream = self.ch_client.query_column_block_stream(query, settings=settings)
+            with stream:
+                column_names = stream.source.column_names
+                for block in self._guarded_blocks(query, stream):
+                    yield rows_to_record_batch(list(zip(*block)), column_names, schema)
+
+    def _guarded_blocks(self, query, stream):
+        """Yield the blocks of the stream, reading each one under the deadline."""
+        iterator = iter(stream)
+        while True:
+            with self._guard(query):
+                block = next(iterator, None)
+            if block is None:
+                return
+            yield block
+
+    @cached_result
+    def query_arrow(self, query):
+        """Execute the query and return the result as a pyarrow Table.
+
+        Args:
+            query: ClickHouse query to be executed.
+        """
+        print(f"[query_history]Executing query: {query}")
+        with self._query(query) as settings:
+            return self.ch_client.query_arrow(query, settings=settings)
+
+    def insert(self, table, data, column_names: list=None, database=None, mode=None):
+        """Insert the data into the ClickHouse table.
+
+        Args:
+            table: target table in ClickHouse.
+            data: data to be inserted.
+            column_names: column names of the target table. Default is None.
+            database: database name of the target table. Default is None.
+            mode: the mode of the data to be inserted. Default is None (support 'df').
+        """
+        kwargs = {}
+        if column_names is not None:
+            kwargs["column_names"] = column_names
+        if database is not None:
+            kwargs["database"] = database
+
+        with self._query(f"INSERT INTO {table}", self._insert_settings()) as settings:
+            if mode == 'df':
+                self.ch_client.insert_df(table, data, settings=settings, **kwargs)
+            else:
+                self.ch_client.insert(table, data, settings=settings, **kwargs)
+
+        if not self.async_insert:
+            # the synchronization of the distributed table takes time, querying immediately retrieves the values from the shd table, so add 3 sec sleep
+            time.sleep(3)
+
+    def _insert_settings(self):
+        """Return the settings of the inserts, the async_insert ones in the small-write mode."""
+        if not self.async_insert:
+            return {}
+        return {"async_insert": 1, "wait_for_async_insert": 1 if self.wait_for_async_insert else 0}
+
+    def bulk_insert(self, table_name, data, batch_size=None, mode="insert", key_columns=None):
+        """Insert the data into the ClickHouse table, without the sleep of insert().
+
+        Args:
+            table_name: target table in ClickHouse.
+            data: pyarrow Table/RecordBatch, pandas DataFrame, list of dictionaries or list of tuples.
+            batch_size: ignored, each call is sent as one insert block.
+            mode: 'insert' or 'upsert'. 'upsert' requires a Replacing/Collapsing MergeTree table, which keeps the
+                last version of each sorting key on merge (read it with FINAL). Default is 'insert'.
+            key_columns: ignored, the sorting key of the table is the upsert key.
+
+        Returns:
+            Number of rows inserted.
+        """
+        if mode == "upsert":
+            self._check_replacing_engine(table_name)
+        elif mode != "insert":
+            raise ValueError(f"bulk_insert() supports the 'insert' and 'upsert' modes, got '{mode}'. "
+                             f"Staged modes are run with staged_load().")
+        is_arrow = hasattr(data, "to_batches") or hasattr(data, "to_pylist")
+        with self._query(f"INSERT INTO {table_name}", self._insert_settings()) as settings:
+            if is_arrow and self.wire_format == "arrow":
+                # pyarrow Table or RecordBatch, sent in Arrow format without row conversion
+                if not hasattr(data, "to_batches"):
+                    data = import_pyarrow().Table.from_batches([data])
+                num_rows = data.num_rows
+                if num_rows:
+                    self.ch_client.insert_arrow(table_name, data, settings=settings)
+            elif is_arrow:
+                # Native format, sent column by column without building rows
+                num_rows = data.num_rows
+                if num_rows:
+                    self.ch_client.insert(table_name, [column.to_pylist() for column in data.columns],
+                                          column_names=list(data.column_names), column_oriented=True,
+                                          settings=settings)
+            else:
+                column_names, rows = to_column_rows(data)
+                num_rows = len(rows)
+                if num_rows:
+                    self.ch_client.insert(table_name, rows, column_names=column_names or '*', settings=settings)
+        print(f"[insert_history]Number of rows inserted into {table_name}: {num_rows}")
+        if self.query_cache is not None:
+            self.query_cache.invalidate(table_name)
+        return num_rows
+
+    def delete_rows(self, table_name, condition):
+        """Delete the rows of the ClickHouse table matching the condition with a lightweight DELETE.
+
+        The rows are only masked, instead of the parts being rewritten by an ALTER TABLE ... DELETE mutation, and
+        the merges drop them later. The statement waits until the rows are masked on all replicas.
+        """
+        statement = f"DELETE FROM {table_name} WHERE {condition}"
+        settings = {"mutations_sync": 2}
+        if "lightweight_deletes_sync" in self.ch_client.server_settings:
+            # the older servers reject the unknown setting, the client sends it when it is not in system.settings
+            settings["lightweight_deletes_sync"] = 2
+        with self._query(statement, settings) as settings:
+            self.ch_client.command(statement, settings=settings)
+        print(f"[insert_history]Deleted the rows of {table_name} where {condition}")
+        if self.query_cache is not None:
+            self.query_cache.invalidate(table_name)
+
+    def _prepare_statement(self, query):
+        """Return the prepared statement of the query, bound with server-side parameters."""
+        return ClickHousePreparedStatement(self, query)
+
+    def _split_table(self, table_name):
+        """Return (database, table) of a possibly database-qualified table name."""
+        if "." in table_name:
+            database, table = table_name.split(".", 1)
+            return database.strip("`"), table.strip("`")
+        database = self.ch_client.query("SELECT currentDatabase()").result_rows[0][0]
+        return database, table_name.strip("`")
+
+    def table_engine(self, table_name):
+        """Return the engine of the ClickHouse table."""
+        database, table = self._split_table(table_name)
+        result = self.ch_client.query("SELECT engine FROM system.tables WHERE database = {db:String} AND name = {tb:String}",
+                                      parameters={"db": database, "tb": table}).result_rows
+        if not result:
+            raise ValueError(f"Table {database}.{table} does not exist in ClickHouse.")
+        return result[0][0]
+
+    def column_types(self, table_name):
+        """Return the columns of the ClickHouse table as a list of (name, arrow_type, nullable)."""
+        from .type_mapping import clickhouse_arrow_type
+
+        database, table = self._split_table(table_name)
+        result = self.ch_client.query("SELECT name, type FROM system.columns WHERE database = {db:String} AND table = {tb:String} "
+                                      "ORDER BY position", parameters={"db": database, "tb": table}).result_rows
+        if not result:
+            raise ValueError(f"Table {database}.{table} does not exist in ClickHouse.")
+        return [(name, clickhouse_arrow_type(col_type), col_type.startswith("Nullable("))
+                for name, col_type in result]
+
+    def table_stats(self, table_name):
+        """Return the rows and uncompressed data size of the active parts of the ClickHouse table."""
+        def load():
+            database, table = self._split_table(table_name)
+            result = self.ch_client.query("SELECT count(), sum(rows), sum(data_uncompressed_bytes), sum(bytes_on_disk) "
+                                          "FROM system.parts WHERE database = {db:String} AND table = {tb:String} AND active",
+                                          parameters={"db": database, "tb": table}).result_rows
+            num_parts, rows, num_bytes, disk_bytes = result[0]
+            return {"rows": int(rows or 0), "bytes": int(num_bytes or 0), "disk_bytes": int(disk_bytes or 0),
+                    "parts": int(num_parts)}
+        return self.cached_metadata(("table_stats", table_name), load)
+
+    def estimate_rows(self, query):
+        """Return the rows of the granules EXPLAIN ESTIMATE selects, an upper bound after the primary key pruning."""
+        result = self.ch_client.query(f"EXPLAIN ESTIMATE {query}")
+        if "rows" not in result.column_names:
+            return None
+        index = result.column_names.index("rows")
+        return sum(int(row[index]) for row in result.result_rows)
+
+    def _check_replacing_engine(self, table_name):
+        """Raise ValueError if the table engine does not deduplicate rows by the sorting key."""
+        engine = self.table_engine(table_name)
+        if not any(name in engine for name in ("ReplacingMergeTree", "CollapsingMergeTree")):
+            raise ValueError(f"'upsert'/'merge' modes require a ReplacingMergeTree table, {table_name} uses {engine}. "
+                             f"Use the 'replace_partitions' or 'swap' mode instead.")
+
+    def _create_stage_sql(self, table_name, stage_table):
+        """Return the SQL creating the stage table with the same structure and engine."""
+        return f"CREATE TABLE {stage_table} AS {table_name}"
+
+    def _execute_statement(self, statement):
+        """Execute a statement without result set (DDL/DML)."""
+        with self._query(statement) as settings:
+            self.ch_client.command(statement, settings=settings)
+
+    def merge_stage_table(self, stage_table, table_name, mode="merge", key_columns=None):
+        """Apply the stage table to the ClickHouse table.
+
+        Args:
+            stage_table: stage table created by create_stage_table().
+            table_name: target table in ClickHouse.
+            mode: 'merge' (INSERT ... SELECT into a ReplacingMergeTree table), 'replace_partitions'
+                (ALTER TABLE ... REPLACE PARTITION for each partition of the stage table) or 'swap' (EXCHANGE TABLES).
+                Default is 'merge'.
+            key_columns: ignored, the sorting key of the table is the merge key.
+        """
+        if mode == "merge":
+            self._check_replacing_engine(table_name)
+            self._execute_statement(f"INSERT INTO {table_name} SELECT * FROM {stage_table}")
+            print(f"[insert_history]Merged {stage_table} into {table_name}")
+        elif mode == "replace_partitions":
+            database, table = self._split_table(stage_table)
+            partitions = self.ch_client.query(
+                "SELECT DISTINCT partition_id FROM system.parts WHERE database = {db:String} AND table = {tb:String} AND active",
+                parameters={"db": database, "tb": table}).result_rows
+            for (partition_id,) in partitions:
+                # REPLACE PARTITION copies the stage parts atomically, so a re-run converges to the same partition
+                self.ch_client.command(f"ALTER TABLE {table_name} REPLACE PARTITION ID '{partition_id}' FROM {stage_table}")
+            print(f"[insert_history]Replaced {len(partitions)} partitions of {table_name} from {stage_table}")
+        elif mode == "swap":
+            self.ch_client.command(f"EXCHANGE TABLES {table_name} AND {stage_table}")
+            print(f"[insert_history]Swapped {stage_table} with {table_name}")
+        else:
+            raise NotImplementedError(f"ClickHouseConnector does not support the '{mode}' load mode.")
+
+    def count_table(self,table,database=None,final=False,approx=False):
+        """Check the number of records in the table.
+
+        Args:
+            table: target table in ClickHouse.
+            database: database name of the target table. Default is None.
+            final: using FINAL keyword or not. Default is False.
+            approx: read the rows of the active parts from system.parts instead of counting, without FINAL the
+                rows not merged yet by a Replacing/Collapsing MergeTree are included. Default is False.
+        """
+        if database:
+            table = f"{database}.{table}"
+        if approx and not final:
+            return self.table_stats(table)["rows"]
+        record_count_query = f"SELECT COUNT(*) FROM {self.quote_identifier(table)}"
+        if final:
+            record_count_query += " FINAL"
+        with self._query(record_count_query) as settings:
+            result = self.ch_client.query(record_count_query, settings=settings).result_rows
+        table_cnt = result[0][0]
+
+        return table_cnt
+
+    def batch_limits(self):
+        """Return the insert batch limit from the server max_insert_block_size setting."""
+        if not hasattr(self, "_max_insert_block_size"):
+            result = self.ch_client.query("SELECT value FROM system.settings WHERE name = 'max_insert_block_size'").result_rows
+            self._max_insert_block_size = int(result[0][0]) if result else None
+        return {"max_rows": self._max_insert_block_size, "max_bytes": None}
+
+    @contextlib.contextmanager
+    def _query(self, query, settings=None):
+        """Run a call of the query under its deadline and yield its settings: a query_id for cancel() and, with a
+        deadline, max_execution_time so the server stops the query on its own as well."""
+        settings = dict(settings or {})
+        settings["query_id"] = self._query_id = uuid.uuid4().hex
+        deadline = self.statement_deadline()
+        if deadline is not None:
+            settings["max_execution_time"] = max(1, math.ceil(deadline - time.time()))
+        with self._guard(query):
+            yield settings
+
+    def cancel(self):
+        """Kill the running query with KILL QUERY WHERE query_id from a second client, the first one is blocked."""
+        query_id = self._query_id
+        if query_id is None:
+            return
+        params = self.conn_params
+        client = get_client(host=params["host"], port=params["port"], username=params["user"],
+                            password=params["password"] or '', database=params["database"], verify=params["verify"])
+        try:
+            client.command(f"KILL QUERY WHERE query_id = {self.literal(query_id)} ASYNC")
+        finally:
+            client.close()
+        print(f"[query_history]Killed the running ClickHouse query {query_id}.")
+
+    def reset_connection(self):
+        """Replace the client, the blocked call returns at the HTTP timeout of the old one."""
+        old_client = self.ch_client
+        self.flag_connected = False
+        self.get_connection(**self.conn_params)
+        old_client.close()
+        print("[connect_history]ClickHouse connection reset.")
+
+    def _connection(self):
+        """Return the clickhouse_connect client object."""
+        return self.ch_client
+
+    def close(self):
+        """Close the ClickHouse connection."""
+        self.close_writers()
+        self.release_route()
+        self.ch_client.close()
+        print("[connect_history]ClickHouse connection closed.")
@@ -1,31 +1,276 @@
-from .mysql_connector import MySQLConnector
+import argparse
+import sys
+
+from .base_connector import LOAD_MODES
+from .registry import get_connector
 
 
 class Connector:
-    def __init__(self, connector_type=None, **kwargs):
+    def __init__(self, connector_type=None, conn_id=None, **kwargs):
         """Connects to the database using the specified connector.
 
         Args:
-            connector_type: Type of connector to be used. Default is None.
+            connector_type: Type of connector to be used (or its alias). Default is None, which uses the db_type of conn_id.
+            conn_id: Connection ID to load the credentials from the credential manager. Default is None.
             **kwargs: Keyword arguments for the connector.
         """
-        if connector_type == 'mysql':
-            self.connector = MySQLConnector(**kwargs)
-        else:
-            raise ValueError(f"Connector type {connector_type} is not supported.")
+        self.connector = get_connector(conn_id=conn_id, db_type=connector_type, **kwargs)
 
     def get_connection(self):
         """Return the connection object."""
         return self.connector.get_connection()
 
-    def execute_query(self, query):
+    def execute_query(self, query, params=None):
         """Execute the query and return the result.
 
         Args:
             query: Query to be executed
+            params: Values bound to the placeholders of the query. Default is None.
         """
-        return self.connector.execute_query(query)
-    
-if __name__ == '__main__':
-    # Example usage
-    conn = 1
+        if params is None:
+            return self.connector.execute_query(query)
+        return self.connector.execute_query(query, params)
+
+    def __getattr__(self, name):
+        """Delegate the shared interface (stream, query_arrow, bulk_insert, close) to the connector."""
+        if name == "connector":
+            # not set yet (failed __init__, copy or unpickling), do not recurse into __getattr__
+            raise AttributeError(name)
+        return getattr(self.connector, name)
+
+
+def batch_size_arg(value):
+    """Parse the --batch-size value, a positive integer or 'auto'."""
+    if value == "auto":
+        return value
+    try:
+        size = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid batch size: '{value}', expected an integer or 'auto'")
+    if size <= 0:
+        raise argparse.ArgumentTypeError("batch size must be positive")
+    return size
+
+
+def print_plan(plan):
+    """Print the plan of a transfer, see TableTransfer.plan()."""
+    def size(value, unit="", digits=0):
+        return "unknown" if value is None else f"{value:,.{digits}f}{unit}"
+
+    throughput = plan["throughput"]
+    print(f"Plan: {plan['table']} -> {plan['dst_table']} ({plan['load_mode']})")
+    print(f"  rows:        {size(plan['rows'])} (from {plan['rows_source'] or 'no statistics'})")
+    print(f"  size:        {size(plan['bytes'] and plan['bytes'] / 1024 / 1024, ' MB', 1)}")
+    print(f"  partitions:  {len(plan['partitions'])}, parallelism {plan['parallelism']}")
+    for conditions in plan["partitions"]:
+        print(f"    - {' AND '.join(conditions) or '(whole table)'}")
+    print(f"  batch size:  {size(plan['batch_size'], ' rows')}")
+    if throughput:
+        print(f"  throughput:  {size(throughput['rows_per_second'], ' rows/s')} per partition "
+              f"(median of {throughput['runs']} runs of the same {throughput['scope']})")
+    else:
+        print("  throughput:  unknown, no transfer of this source/sink pair recorded yet")
+    print(f"  runtime:     {size(plan['estimated_seconds'], ' s', 1)}")
+
+
+def main():
+    # Import the operators here, since they import this package
+    from ..operators.progress import TransferProgress
+    from ..operators.scheduler import JobScheduler
+    from ..operators.fanout import FanOutTransfer, Sink
+    from ..operators.transfer import TableTransfer
+
+    # Create the top-level parser
+    parser = argparse.ArgumentParser(description="Dataxi data transfer CLI tool")
+    subparsers = parser.add_subparsers(dest="command", help="Available commands")
+
+    # Options of a table transfer, shared by the transfer and plan subcommands
+    transfer_options = argparse.ArgumentParser(add_help=False)
+    transfer_options.add_argument("--src", required=True, help="Source connection ID")
+    transfer_options.add_argument("--dst", required=True, help="Sink connection ID")
+    transfer_options.add_argument("--table", required=True, nargs="+", help="Source table(s) to copy")
+    transfer_options.add_argument("--tee", action="append", metavar="SINK",
+                                  help="Additional sink loaded from the same extraction, a conn_id or a .parquet path "
+                                       "({table} is replaced by the table name), repeatable. The source is read once")
+    transfer_options.add_argument("--dst-table", help="Sink table, only with a single --table. Default is the source table name")
+    transfer_options.add_argument("--where", help="Filter condition of the extraction query")
+    transfer_options.add_argument("--query", help="Custom extraction query, only with a single --table")
+    transfer_options.add_argument("-p", "--parallelism", default=1, type=int, help="Number of partitions copied concurrently, default is 1")
+    transfer_options.add_argument("--partition-column", help="Numeric or datetime column used to split the table for --parallelism")
+    transfer_options.add_argument("-b", "--batch-size", type=batch_size_arg,
+                                  help="Number of rows per batch, or 'auto' to tune it at runtime, default is the connector default")
+    transfer_options.add_argument("--incremental", metavar="COLUMN", help="Only copy rows whose COLUMN is greater than its maximum in the sink")
+    transfer_options.add_argument("--verify", action="store_true", help="Compare the source row count with the loaded rows")
+    transfer_options.add_argument("--load-mode", default="insert", choices=LOAD_MODES,
+                                  help="insert (default), upsert, or a staged mode: merge, replace_partitions (ClickHouse), swap")
+    transfer_options.add_argument("--key-columns", nargs="+", help="Key columns of the upsert/merge, required by PostgreSQL and MS SQL")
+    transfer_options.add_argument("--no-progress", action="store_true", help="Disable the live progress display")
+    transfer_options.add_argument("--resume", action="store_true",
+                                  help="Journal the progress under ~/.dataxi/journal and resume an interrupted run of the same transfer")
+    transfer_options.add_argument("--checkpoint-column", help="Column ordering each partition with --resume, default is --partition-column")
+    transfer_options.add_argument("--transform", action="append", metavar="MODULE:FUNCTION",
+                                  help="Function applied to each Arrow batch before the load, repeatable")
+    transfer_options.add_argument("--transform-processes", type=int, help="Processes running the transforms, default is the CPU count")
+    transfer_options.add_argument("--compression", choices=["lz4", "zstd", "gzip", "none"],
+                                  help="Transport compression of ClickHouse (lz4/zstd/gzip) and Splunk (gzip), reported as not supported "
+                                       "by MySQL, PostgreSQL and MS SQL. Default is lz4/gzip")
+    transfer_options.add_argument("--wire-format", choices=["arrow", "native"], help="ClickHouse wire format, default is arrow")
+    transfer_options.add_argument("--routing", choices=["round_robin", "least_connections", "latency"],
+                                  help="Read replica routing of a source credential listing replicas, default is its 'routing' or round_robin")
+    transfer_options.add_argument("--memory-budget", type=int, metavar="MB",
+                                  help="Maximum MB of batches buffered by the pipeline stages, the extraction waits above it")
+    transfer_options.add_argument("--memory-profile", action="store_true",
+                                  help="Sample the process RSS and report the peak memory of each stage")
+    transfer_options.add_argument("--profile", nargs="*", metavar="COLUMN",
+                                  help="Profile the extracted columns (all without names): nulls, min/max, distinct estimate, histogram")
+    transfer_options.add_argument("--timeout", type=float, metavar="SECONDS",
+                                  help="Seconds of each table transfer, its running statements are cancelled on the server at the deadline")
+    transfer_options.add_argument("--query-timeout", type=float, metavar="SECONDS",
+                                  help="Seconds a single statement (or a stalled fetch) may block before it is cancelled")
+    transfer_options.add_argument("--no-type-mapping", action="store_true",
+                                  help="Disable the conversion into the sink column types, leave it to the drivers")
+
+    # Subcommand to copy tables between two conn_ids
+    subparsers.add_parser("transfer", parents=[transfer_options], help="Copy tables from a source conn_id into a sink conn_id")
+
+    # Subcommand to estimate the transfers without copying
+    subparsers.add_parser("plan", parents=[transfer_options],
+                          help="Estimate rows, bytes, partitions, batch size and runtime of a transfer without copying (dry run)")
+
+    # Subcommands to distribute a transfer over workers sharing a coordinator
+    parser_submit = subparsers.add_parser("submit", parents=[transfer_options],
+                                          help="Queue the partitions of a transfer as tasks for the dataxi workers")
+    parser_submit.add_argument("--coordinator", help="Path of the SQLite coordinator file, default is ~/.dataxi/coordinator.db")
+    parser_submit.add_argument("--max-attempts", default=3, type=int, help="Leases of a task before it fails, default is 3")
+    parser_submit.add_argument("--wait", action="store_true", help="Wait until the workers finished the queued tasks")
+    parser_worker = subparsers.add_parser("worker", help="Run the transfer tasks queued in a coordinator")
+    parser_worker.add_argument("--coordinator", help="Path of the SQLite coordinator file, default is ~/.dataxi/coordinator.db")
+    parser_worker.add_argument("--worker-id", help="Identifier of the worker, default is the host name and process id")
+    parser_worker.add_argument("--lease-seconds", default=60, type=float,
+                               help="Lease of a task, renewed by heartbeats. A lost worker's task is leased again after it. Default is 60")
+    parser_worker.add_argument("--max-tasks", type=int, help="Stop after running this number of tasks")
+    parser_worker.add_argument("--exit-when-idle", action="store_true", help="Stop when no task is queued instead of polling")
+
+    # Subcommand to run a job file with the scheduler
+    parser_run = subparsers.add_parser("run", help="Run the table transfers of a YAML/JSON job file")
+    parser_run.add_argument("job_file", help="Path of the job file")
+    parser_run.add_argument("-w", "--max-workers", type=int, help="Size of the worker pool, overrides the job file")
+    parser_run.add_argument("--memory-budget", type=int, metavar="MB", help="Memory budget shared by all jobs, overrides the job file")
+
+    # Subcommand to replicate MySQL tables from the binlog
+    parser_cdc = subparsers.add_parser("cdc", help="Replicate MySQL tables into a sink conn_id from the binlog (change data capture)")
+    parser_cdc.add_argument("--src", required=True, help="Source MySQL connection ID")
+    parser_cdc.add_argument("--dst", required=True, help="Sink connection ID")
+    parser_cdc.add_argument("--table", required=True, nargs="+", help="Source table(s) to replicate, as database.table")
+    parser_cdc.add_argument("--name", help="Replication name identifying its checkpoint under ~/.dataxi/cdc")
+    parser_cdc.add_argument("--server-id", type=int, help="Replica server id of the binlog connection, default is random")
+    parser_cdc.add_argument("--batch-rows", default=10000, type=int, help="Changes of a micro-batch, default is 10000")
+    parser_cdc.add_argument("--batch-seconds", default=1.0, type=float, help="Maximum seconds a change waits in a micro-batch, default is 1")
+    parser_cdc.add_argument("--no-follow", action="store_true", help="Stop at the current end of the binlog instead of waiting for changes")
+
+    args = parser.parse_args()
+
+    if args.command in ("transfer", "plan"):
+        if len(args.table) > 1 and (args.dst_table or args.query):
+            parser.error("--dst-table and --query are only available with a single --table.")
+        if args.tee and (args.command == "plan" or args.parallelism > 1 or args.resume or args.incremental or args.verify
+                         or args.load_mode not in ("insert", "upsert") or args.batch_size == "auto"):
+            parser.error("--tee only supports a single partition in the insert/upsert modes, without plan, --resume, "
+                         "--incremental, --verify and --batch-size auto.")
+        transport_kwargs = {}
+        if args.compression:
+            transport_kwargs["compress"] = False if args.compression == "none" else args.compression
+        if args.wire_format:
+            transport_kwargs["wire_format"] = args.wire_format
+        if args.query_timeout:
+            transport_kwargs["query_timeout"] = args.query_timeout
+        failed = False
+        for table in args.table:
+            progress = TransferProgress(enabled=not args.no_progress)
+            progress.label = f"[{table}]"
+            transfer = TableTransfer(src=args.src, dst=args.dst, table=table, dst_table=args.dst_table,
+                                     query=args.query, where=args.where, batch_size=args.batch_size,
+                                     parallelism=args.parallelism, partition_column=args.partition_column,
+                                     incremental_column=args.incremental, verify=args.verify, progress=progress,
+                                     load_mode=args.load_mode, key_columns=args.key_columns,
+                                     map_types=not args.no_type_mapping, resume=args.resume,
+                                     checkpoint_column=args.checkpoint_column, transforms=args.transform,
+                                     transform_processes=args.transform_processes,
+                                     src_kwargs=dict(transport_kwargs, routing=args.routing), dst_kwargs=transport_kwargs,
+                                     memory_budget=args.memory_budget and args.memory_budget * 1024 * 1024,
+                                     memory_profile=args.memory_profile,
+                                     profile=args.profile or args.profile is not None, timeout=args.timeout)
+            if args.tee:
+                sinks = [Sink(sink, table=args.dst_table, load_mode=args.load_mode,
+                              key_columns=args.key_columns, map_types=not args.no_type_mapping,
+                              dst_kwargs=transport_kwargs)
+                         for sink in [args.dst] + [tee.replace("{table}", table) for tee in args.tee]]
+                transfer = FanOutTransfer(src=args.src, table=table, sinks=sinks, query=args.query, where=args.where,
+                                          batch_size=args.batch_size, map_types=not args.no_type_mapping,
+                                          src_kwargs=dict(transport_kwargs, routing=args.routing), progress=progress)
+            try:
+                if args.command == "plan":
+                    print_plan(transfer.plan())
+                    continue
+                with progress:
+                    transfer.run()
+            except Exception as e:
+                print(f"dataxi: error: {args.command} of {table} failed: {e}", file=sys.stderr)
+                failed = True
+        sys.exit(1 if failed else 0)
+    elif args.command == "submit":
+        from ..operators.distributed import get_coordinator, submit_transfer
+
+        if args.tee or args.resume or args.load_mode not in ("insert", "upsert"):
+            parser.error("submit only supports the insert/upsert modes, without --tee and --resume.")
+        coordinator = get_coordinator(args.coordinator)
+        transport_kwargs = {"query_timeout": args.query_timeout} if args.query_timeout else {}
+        if args.compression:
+            transport_kwargs["compress"] = False if args.compression == "none" else args.compression
+        if args.wire_format:
+            transport_kwargs["wire_format"] = args.wire_format
+        transfer_ids = []
+        for table in args.table:
+            transfer_ids.append(submit_transfer(
+                coordinator, partitions=args.parallelism, max_attempts=args.max_attempts, src=args.src, dst=args.dst,
+                table=table, dst_table=args.dst_table, query=args.query, where=args.where, batch_size=args.batch_size,
+                partition_column=args.partition_column, incremental_column=args.incremental, verify=args.verify,
+                load_mode=args.load_mode, key_columns=args.key_columns, map_types=not args.no_type_mapping,
+                transforms=args.transform, transform_processes=args.transform_processes,
+                src_kwargs=dict(transport_kwargs, routing=args.routing), dst_kwargs=transport_kwargs,
+                memory_budget=args.memory_budget and args.memory_budget * 1024 * 1024,
+                profile=args.profile or args.profile is not None, timeout=args.timeout))
+            print(transfer_ids[-1])
+        if args.wait:
+            statuses = [coordinator.wait(transfer_id) for transfer_id in transfer_ids]
+            for status in statuses:
+                print(f"[transfer_history]Transfer {status['transfer_id']}: {status['done']} tasks done, "
+                      f"{status['failed']} failed, {status['rows']} rows")
+            sys.exit(1 if any(status["failed"] for status in statuses) else 0)
+    elif args.command == "worker":
+        from ..operators.distributed import TransferWorker
+
+        worker = TransferWorker(args.coordinator, worker_id=args.worker_id, lease_seconds=args.lease_seconds)
+        stats = worker.run(max_tasks=args.max_tasks, exit_when_idle=args.exit_when_idle)
+        sys.exit(1 if stats["failed"] else 0)
+    elif args.command == "run":
+        kwargs = {"max_workers": args.max_workers} if args.max_workers else {}
+        if args.memory_budget:
+            kwargs["memory_bytes"] = args.memory_budget * 1024 * 1024
+        summaries = JobScheduler.from_file(args.job_file, **kwargs).run()
+        sys.exit(0 if all(summary["status"] == "succeeded" for summary in summaries) else 1)
+    elif args.command == "cdc":
+        from ..operators.replication import BinlogReplication
+
+        replication = BinlogReplication(src=args.src, dst=args.dst, tables=args.table, name=args.name,
+                                        server_id=args.server_id, batch_rows=args.batch_rows,
+                                        batch_seconds=args.batch_seconds)
+        stats = replication.run(blocking=not args.no_follow)
+        print(f"[transfer_history]Replication {stats['name']}: {stats['changes']} changes in {stats['batches']} batches "
+              f"({stats['upserts']} upserts, {stats['deletes']} deletes) in {stats['seconds']:.1f}s")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
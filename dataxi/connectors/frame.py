@@ -0,0 +1,354 @@
+# File: frame.py
+
+# Description: This Package provides the lazy query frames of the SQL connectors: the column selections,
+#              filters, aggregations, sorts and limits are recorded and compiled into one query of the source
+#              dialect, so only the needed rows and columns are transferred.
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+
+import copy
+
+
+class Expr:
+    def __init__(self, op, args, alias=None):
+        """A column expression, compiled into SQL with the quoting and literals of a connector.
+
+        Build the expressions with col(), lit() and count(), then combine them with the comparison operators,
+        & (AND), | (OR), ~ (NOT) and the methods below.
+
+        Args:
+            op: operation name, e.g. 'col', 'lit', '=', 'and', 'sum'.
+            args: operands, Expr objects or Python values for the literals.
+            alias: output column name. Default is None.
+        """
+        self.op = op
+        self.args = args
+        self.alias_name = alias
+
+    def _binary(self, op, other):
+        return Expr(op, [self, other if isinstance(other, Expr) else lit(other)])
+
+    def __eq__(self, other):
+        if other is None:
+            return self.is_null()
+        return self._binary("=", other)
+
+    def __ne__(self, other):
+        if other is None:
+            return self.is_not_null()
+        return self._binary("<>", other)
+
+    def __lt__(self, other):
+        return self._binary("<", other)
+
+    def __le__(self, other):
+        return self._binary("<=", other)
+
+    def __gt__(self, other):
+        return self._binary(">", other)
+
+    def __ge__(self, other):
+        return self._binary(">=", other)
+
+    def __and__(self, other):
+        return self._binary("AND", other)
+
+    def __or__(self, other):
+        return self._binary("OR", other)
+
+    def __invert__(self):
+        return Expr("NOT", [self])
+
+    def __add__(self, other):
+        return self._binary("+", other)
+
+    def __sub__(self, other):
+        return self._binary("-", other)
+
+    def __mul__(self, other):
+        return self._binary("*", other)
+
+    def __truediv__(self, other):
+        return self._binary("/", other)
+
+    __hash__ = object.__hash__
+
+    def isin(self, values):
+        """The column is one of the values."""
+        return Expr("IN", [self] + [value if isinstance(value, Expr) else lit(value) for value in values])
+
+    def between(self, low, high):
+        """The column is between low and high, both included."""
+        return Expr("BETWEEN", [self, low if isinstance(low, Expr) else lit(low),
+                                high if isinstance(high, Expr) else lit(high)])
+
+    def like(self, pattern):
+        """The column matches the SQL LIKE pattern."""
+        return self._binary("LIKE", pattern)
+
+    def is_null(self):
+        return Expr("IS NULL", [self])
+
+    def is_not_null(self):
+        return Expr("IS NOT NULL", [self])
+
+    def sum(self):
+        return Expr("SUM", [self])
+
+    def min(self):
+        return Expr("MIN", [self])
+
+    def max(self):
+        return Expr("MAX", [self])
+
+    def mean(self):
+        return Expr("AVG", [self])
+
+    def count(self):
+        """Number of non-null values."""
+        return Expr("COUNT", [self])
+
+    def n_unique(self):
+        """Number of distinct non-null values."""
+        return Expr("COUNT DISTINCT", [self])
+
+    def alias(self, name):
+        """Name the output column of the expression."""
+        return Expr(self.op, self.args, alias=name)
+
+    @property
+    def is_aggregate(self):
+        return self.op in _AGGREGATES or any(isinstance(arg, Expr) and arg.is_aggregate for arg in self.args)
+
+    def to_sql(self, connector):
+        """Compile the expression with the identifier quoting and the literals of the connector."""
+        if self.op == "col":
+            return connector.quote_identifier(self.args[0])
+        if self.op == "lit":
+            return connector.literal(self.args[0])
+        if self.op == "star":
+            return "*"
+        if self.op == "sql":
+            return self.args[0]
+        args = [arg.to_sql(connector) for arg in self.args]
+        if self.op in ("IS NULL", "IS NOT NULL"):
+            return f"{args[0]} {self.op}"
+        if self.op == "NOT":
+            return f"NOT ({args[0]})"
+        if self.op == "IN":
+            # an empty list matches nothing, which IN () cannot express
+            return f"{args[0]} IN ({', '.join(args[1:])})" if len(args) > 1 else "1 = 0"
+        if self.op == "BETWEEN":
+            return f"{args[0]} BETWEEN {args[1]} AND {args[2]}"
+        if self.op == "COUNT DISTINCT":
+            return f"COUNT(DISTINCT {args[0]})"
+        if self.op in _AGGREGATES:
+            return f"{self.op}({args[0]})"
+        return f"({args[0]} {self.op} {args[1]})"
+
+    def __repr__(self):
+        return f"Expr({self.op}, {self.args!r}{', alias=' + repr(self.alias_name) if self.alias_name else ''})"
+
+
+_AGGREGATES = ("SUM", "MIN", "MAX", "AVG", "COUNT", "COUNT DISTINCT")
+
+
+def col(name):
+    """Reference a column, e.g. col("amount") > 100."""
+    return Expr("col", [name])
+
+
+def lit(value):
+    """A literal value, formatted with connector.literal()."""
+    return Expr("lit", [value])
+
+
+def sql(text):
+    """A raw SQL fragment of the source dialect, used as is."""
+    return Expr("sql", [text])
+
+
+def count():
+    """Number of rows, COUNT(*)."""
+    return Expr("COUNT", [Expr("star", [])])
+
+
+def _to_expr(value):
+    """Return a column name as an Expr, Expr objects as is."""
+    if isinstance(value, Expr):
+        return value
+    return col(value)
+
+
+class QueryFrame:
+    def __init__(self, connector, table=None, query=None):
+        """Initialize a lazy frame of a table or query of the connector.
+
+        The operations return new frames and run nothing. collect(), to_pandas(), stream() and count()
+        compile the operations into one query (see to_sql()) and run it on the server. An operation which
+        cannot be merged into the current query level (e.g. a filter after a limit or an aggregation) wraps
+        it into a subquery.
+
+        Args:
+            connector: SQL connector running the query.
+            table: source table, 'table' or 'database.table'. Default is None.
+            query: source query, used as a subquery when table is not given. Default is None.
+        """
+        if (table is None) == (query is None):
+            raise ValueError("A query frame needs either a table or a query.")
+        self.connector = connector
+        self._source = connector.quote_identifier(table) if table is not None else f"({query}) AS {_subquery_alias(0)}"
+        self._depth = 0
+        self._select = None  # list of Expr, None for all columns
+        self._where = []
+        self._group_by = []
+        self._aggs = None
+        self._order = []  # list of (Expr, descending)
+        self._limit = None
+
+    def _copy(self):
+        frame = copy.copy(self)
+        frame._where = list(self._where)
+        frame._order = list(self._order)
+        return frame
+
+    def _subquery(self):
+        """Return the query of the frame as a subquery. Without a limit the order moves to the outer query,
+        since a derived table has no order (MS SQL rejects its ORDER BY)."""
+        if self._order and self._limit is None:
+            inner = self._copy()
+            inner._order = []
+            return inner.to_sql(), [(col(expr.alias_name) if expr.alias_name else expr, descending)
+                                    for expr, descending in self._order]
+        return self.to_sql(), []
+
+    def _wrap(self):
+        """Return a frame selecting from this frame as a subquery."""
+        query, order = self._subquery()
+        frame = QueryFrame.__new__(QueryFrame)
+        frame.connector = self.connector
+        frame._depth = self._depth + 1
+        frame._source = f"({query}) AS {_subquery_alias(frame._depth)}"
+        frame._select, frame._where, frame._group_by, frame._aggs, frame._order, frame._limit = None, [], [], None, order, None
+        return frame
+
+    @property
+    def _projected(self):
+        """The level renames or computes columns, which its WHERE clause cannot reference."""
+        return self._select is not None and any(expr.op != "col" or expr.alias_name for expr in self._select)
+
+    def select(self, *columns, **named_columns):
+        """Keep the columns: names, Expr objects (e.g. (col("price") * col("qty")).alias("total")) or keyword
+        arguments alias=Expr."""
+        exprs = [_to_expr(column) for column in columns] + [expr.alias(name) for name, expr in named_columns.items()]
+        frame = self._wrap() if self._select is not None or self._aggs is not None or self._limit is not None \
+            else self._copy()
+        frame._select = exprs
+        return frame
+
+    def filter(self, *predicates):
+        """Keep the rows matching all the predicates: Expr objects or raw SQL conditions of the source dialect."""
+        exprs = [predicate if isinstance(predicate, Expr) else sql(predicate) for predicate in predicates]
+        frame = self._wrap() if self._aggs is not None or self._limit is not None or self._projected else self._copy()
+        frame._where += exprs
+        return frame
+
+    where = filter
+
+    def group_by(self, *keys):
+        """Group the rows by the key columns, followed by agg()."""
+        return _GroupBy(self, [_to_expr(key) for key in keys])
+
+    def agg(self, *aggs, **named_aggs):
+        """Aggregate all the rows into one, e.g. frame.agg(count().alias("n"), total=col("amount").sum())."""
+        return _GroupBy(self, []).agg(*aggs, **named_aggs)
+
+    def sort(self, *columns, descending=False):
+        """Sort the rows by the columns, descending a bool or a list of bools of the columns."""
+        flags = descending if isinstance(descending, (list, tuple)) else [descending] * len(columns)
+        frame = self._wrap() if self._limit is not None else self._copy()
+        frame._order = [(_to_expr(column), bool(flag)) for column, flag in zip(columns, flags)]
+        return frame
+
+    def limit(self, n):
+        """Keep the first n rows."""
+        frame = self._copy()
+        frame._limit = n if self._limit is None else min(n, self._limit)
+        return frame
+
+    head = limit
+
+    def to_sql(self):
+        """Return the query of the frame in the dialect of the connector."""
+        connector = self.connector
+        columns = []
+        for expr in (self._group_by + self._aggs) if self._aggs is not None else (self._select or []):
+            text = expr.to_sql(connector)
+            if expr.alias_name:
+                text += f" AS {connector.quote_identifier(expr.alias_name)}"
+            columns.append(text)
+        top = f"TOP {int(self._limit)} " if self._limit is not None and connector.limit_style == "top" else ""
+        query = f"SELECT {top}{', '.join(columns) or '*'} FROM {self._source}"
+        if self._where:
+            query += " WHERE " + " AND ".join(expr.to_sql(connector) for expr in self._where)
+        if self._group_by:
+            query += " GROUP BY " + ", ".join(expr.to_sql(connector) for expr in self._group_by)
+        if self._order:
+            query += " ORDER BY " + ", ".join(
+                (connector.quote_identifier(expr.alias_name) if expr.alias_name else expr.to_sql(connector))
+                + (" DESC" if descending else "") for expr, descending in self._order)
+        if self._limit is not None and connector.limit_style != "top":
+            query += f" LIMIT {int(self._limit)}"
+        return query
+
+    explain = to_sql
+
+    def collect(self):
+        """Run the query and return the result as a pyarrow Table."""
+        return self.connector.query_arrow(self.to_sql())
+
+    def to_pandas(self):
+        """Run the query and return the result as a pandas DataFrame."""
+        return self.collect().to_pandas()
+
+    def stream(self, batch_size=None, schema=None):
+        """Run the query and yield the result as pyarrow RecordBatches, with the column types of the schema if given."""
+        if schema is not None:
+            return self.connector.stream(self.to_sql(), batch_size=batch_size, schema=schema)
+        return self.connector.stream(self.to_sql(), batch_size=batch_size)
+
+    def count(self):
+        """Return the number of rows of the frame, counted on the server."""
+        query, _ = self._subquery()
+        result = self.connector.execute_query(
+            f"SELECT COUNT(*) AS {self.connector.quote_identifier('n')} FROM ({query}) AS {_subquery_alias(self._depth + 1)}")
+        row = result[0]
+        return int(next(iter(row.values())) if isinstance(row, dict) else row[0])
+
+    def __repr__(self):
+        return f"QueryFrame({self.to_sql()})"
+
+
+class _GroupBy:
+    def __init__(self, frame, keys):
+        self.frame = frame
+        self.keys = keys
+
+    def agg(self, *aggs, **named_aggs):
+        """Aggregate the groups: Expr aggregates, e.g. col("amount").sum().alias("total"), or total=col("amount").sum()."""
+        exprs = list(aggs) + [expr.alias(name) for name, expr in named_aggs.items()]
+        if not exprs or not all(isinstance(expr, Expr) and expr.is_aggregate for expr in exprs):
+            raise ValueError("agg() takes aggregate expressions, e.g. col('amount').sum() or count().")
+        frame = self.frame
+        frame = frame._wrap() if frame._select is not None or frame._aggs is not None or frame._limit is not None \
+            else frame._copy()
+        frame._group_by = self.keys
+        frame._aggs = exprs
+        frame._order = []
+        return frame
+
+
+def _subquery_alias(depth):
+    """Alias of a derived table, required by MySQL, PostgreSQL and MS SQL."""
+    return f"dataxi_q{depth}"
@@ -0,0 +1,277 @@
+# File: mssql_connector.py
+
+# Description: This Package aims to provide some reusable functions for connecting to MS SQL server.
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+# Change Log:
+
+# 2026.10.18:
+#     1. moved the MSSQLConnector class from backup.py, added conn_id support
+#     2. added stream(), query_arrow(), bulk_insert() with the shared interface
+#     3. added the staged merge load mode (MERGE statement)
+#     4. added column_types() from the sys.columns catalogue for the type mapping
+#     5. added table_stats() from sys.partitions and sys.allocation_units for the planner
+#     6. added the params binding of execute_query() and the prepared statements run with sp_executesql
+#     7. added the read replica routing (host override of conn_id, connect_attempts, release on close)
+#     8. added the literals of the dialect for the lazy query frames (frame())
+#     9. added the flush of the buffered writers (buffered_writer()) on close
+#     10. added the query deadlines, the next statements are not sent once a deadline expired
+#     11. the datetime literals are cast to datetime2, since a datetime string with microseconds does not convert to datetime
+#     12. the statements are stopped at their deadline: the driver timeout from query_timeout, and KILL of the
+#         session from a second connection (reset_connection()) for deadline()
+#     13. the table and column names are quoted on every path of the staged loads
+#     14. compress and wire_format are reported as not supported instead of being silently ignored
+
+
+import datetime
+import decimal
+import math
+import time
+import pymssql
+
+from ..cred_mgr import get_cred
+from .base_connector import BaseConnector, PreparedStatement
+from .query_cache import cached_result
+
+
+def mssql_param_type(value):
+    """Return the T-SQL type declaring an sp_executesql parameter from its Python value."""
+    if isinstance(value, bool):
+        return "bit"
+    if isinstance(value, int):
+        return "bigint"
+    if isinstance(value, float):
+        return "float"
+    if isinstance(value, decimal.Decimal):
+        return "decimal(38, 12)"
+    if isinstance(value, datetime.datetime):
+        return "datetime2"
+    if isinstance(value, datetime.date):
+        return "date"
+    if isinstance(value, (bytes, bytearray)):
+        return "varbinary(max)"
+    return "nvarchar(max)"
+
+
+class MSSQLPreparedStatement(PreparedStatement):
+    """Statement run with sp_executesql and typed @p parameters.
+
+    The statement text stays the same for every value, so the server compiles it once and reuses the
+    cached plan, instead of compiling a new ad hoc query for each literal.
+    """
+    def __init__(self, connector, query):
+        super().__init__(connector, query)
+        self.sql = self.segments[0] + "".join(f"@p{i}" + segment for i, segment in enumerate(self.segments[1:], 1))
+
+    def _execute(self, params):
+        declarations = ", ".join(f"@p{i} {mssql_param_type(value)}" for i, value in enumerate(params, 1))
+        assignments = "".join(f", @p{i} = %s" for i in range(1, len(params) + 1))
+        statement = "EXEC sp_executesql %s, %s" + assignments if params else "EXEC sp_executesql %s"
+        cursor = self.connector.mssql_connection.cursor()
+        try:
+            with self.connector._guard(self.query):
+                cursor.execute(statement, (self.sql, declarations, *params) if params else (self.sql,))
+                return cursor.fetchall() if cursor.description else []
+        finally:
+            cursor.close()
+
+
+class MSSQLConnector(BaseConnector):
+    db_type = "mssql"
+    identifier_quotes = ("[", "]")
+    limit_style = "top"
+    string_prefix = "N"
+    boolean_literals = ("1", "0")
+
+    def __init__(self, host=None, port=None, user=None, password=None, database='', conn_id=None, **kwargs):
+        """Connects to the MS SQL. The connection will be retried for 5 times if it fails.
+
+        Args:
+            host: MS SQL server.
+            port: MS SQL port. Default is None (use the default port 1433).
+            user: MS SQL user.
+            password: MS SQL password.
+            database: MS SQL database. Default is ''.
+            conn_id: Connection ID to load the credentials from the credential manager.
+            **kwargs: Additional keyword arguments. Especially for db_type and 'server' (alias of host).
+        """
+        host = host or kwargs.get("server")
+        if conn_id:
+            print(f"[connect_history]Connecting to MS SQL with connection ID: {conn_id}")
+            cred_dict = get_cred(conn_id)
+            # an explicit host/port (e.g. a replica chosen by the router) overrides the stored primary
+            host, port = host or cred_dict.get("host"), port or cred_dict.get("port")
+            user, password = cred_dict.get("user"), cred_dict.get("password")
+            database = database or cred_dict.get("database", '')
+
+        self.conn_id = conn_id
+        self.connect_attempts = kwargs.get("connect_attempts", self.connect_attempts)
+        self.query_timeout = kwargs.get("query_timeout", self.query_timeout)
+        # pymssql has no transport compression, report the transport options instead of ignoring them silently
+        self._ignore_transport_options(kwargs)
+        self.conn_params = dict(host=host, port=port, user=user, password=password, database=database)
+        self.get_connection(**self.conn_params)
+
+    def get_connection(self, host=None, port=None, user=None, password=None, database=''):
+        """Return the MS SQL connection object."""
+        if host is None and getattr(self, "flag_connected", False):
+            # Called without parameters on a connected object, return the existing connection
+            return self.mssql_connection, self.flag_connected
+        max_attempts = self.connect_attempts  # Set the maximum number of attempts
+        cur_attempt = 0  # Current attempt number
+        self.flag_connected = False  # Flag to indicate connection status
+        # the driver gives up on a statement after query_timeout seconds, 0 waits forever
+        timeout = math.ceil(self.query_timeout) if self.query_timeout else 0
+
+        while cur_attempt < max_attempts and not self.flag_connected:
+            try:
+                cur_attempt += 1
+                print(f"[connect_history]Attempting to connect to MS SQL, attempt number: {cur_attempt}.")
+                if port:
+                    self.mssql_connection = pymssql.connect(server=host, port=str(port), user=user,
+                                                            password=password, database=database, timeout=timeout)
+                else:
+                    self.mssql_connection = pymssql.connect(server=host, user=user,
+                                                            password=password, database=database, timeout=timeout)
+                # session id of the connection, killed by reset_connection() while a statement blocks it
+                cursor = self.mssql_connection.cursor()
+                cursor.execute("SELECT @@SPID")
+                self._spid = cursor.fetchone()[0]
+                print("[connect_history]Successfully connected to MS SQL.")
+                self.flag_connected = True  # Mark as successfully connected
+            except Exception as e:
+                print(f"[connect_history]Exception thrown. connect_history for {cur_attempt} attempt: " + str(e))
+                time.sleep(2)  # Wait for 2 seconds before retrying
+
+        if not self.flag_connected:
+            raise Exception("[connect_history]Unable to connect to the MS SQL.")
+        return self.mssql_connection, self.flag_connected
+
+    @cached_result
+    def execute_query(self, query, params=None):
+        """Execute the query and return the result.
+
+        Args:
+            query: MS SQL query to be executed.
+            params: sequence of the values bound to the %s placeholders of the query (%% for a literal %),
+                escaped by the driver. Default is None.
+
+        Returns:
+            The result of the query with the format of a list.
+        """
+        cursor = self.mssql_connection.cursor()
+        print(f"[query_history]Executing query: {query}")
+        with self._guard(query):
+            cursor.execute(query, params)
+            result = cursor.fetchall()
+
+        print(f"[query_history]Query executed successfully. Number of records: {len(result)}")
+
+        return result
+
+    def _connection(self):
+        """Return the pymssql connection object."""
+        return self.mssql_connection
+
+    def reset_connection(self):
+        """Kill the session with KILL from a second connection, the blocked call fails and the connection is lost.
+
+        The driver has no cancel request, so cancel() falls back to this. The login needs the ALTER ANY CONNECTION
+        permission.
+        """
+        params = self.conn_params
+        port = {"port": str(params["port"])} if params["port"] else {}
+        # KILL is not allowed in a transaction
+        killer = pymssql.connect(server=params["host"], user=params["user"], password=params["password"],
+                                 database=params["database"], login_timeout=10, autocommit=True, **port)
+        try:
+            killer.cursor().execute(f"KILL {int(self._spid)}")
+        finally:
+            killer.close()
+        self.flag_connected = False
+        print(f"[connect_history]Killed the MS SQL session {self._spid}.")
+
+    def literal(self, value):
+        """Format a Python value as a T-SQL literal. The datetimes are cast to datetime2 (datetimeoffset with a
+        time zone), which keeps their microseconds and compares with the datetime and datetime2 columns."""
+        if isinstance(value, datetime.datetime):
+            return f"CAST('{value.isoformat(sep=' ')}' AS {'datetimeoffset' if value.tzinfo else 'datetime2'})"
+        return super().literal(value)
+
+    def _prepare_statement(self, query):
+        """Return the prepared statement of the query, run with sp_executesql."""
+        return MSSQLPreparedStatement(self, query)
+
+    def _insert_columns(self, table_name):
+        """Return the column names of the MS SQL table."""
+        cursor = self.mssql_connection.cursor()
+        cursor.execute(f"SELECT TOP 0 * FROM {self.quote_identifier(table_name)}")
+        return [desc[0] for desc in cursor.description]
+
+    def column_types(self, table_name):
+        """Return the columns of the MS SQL table as a list of (name, arrow_type, nullable)."""
+        from .type_mapping import mssql_arrow_type
+
+        cursor = self.mssql_connection.cursor()
+        cursor.execute("SELECT c.name, t.name, c.precision, c.scale, c.is_nullable FROM sys.columns c "
+                       "JOIN sys.types t ON c.user_type_id = t.user_type_id "
+                       "WHERE c.object_id = OBJECT_ID(%s) ORDER BY c.column_id", (table_name,))
+        result = cursor.fetchall()
+        if not result:
+            raise ValueError(f"Table {table_name} does not exist in MS SQL.")
+        return [(name, mssql_arrow_type(type_name, precision, scale), bool(nullable))
+                for name, type_name, precision, scale, nullable in result]
+
+    def table_stats(self, table_name):
+        """Return the rows and used data size of the MS SQL table from sys.partitions and sys.allocation_units."""
+        def load():
+            cursor = self.mssql_connection.cursor()
+            cursor.execute("SELECT SUM(CASE WHEN a.type = 1 THEN p.rows ELSE 0 END), SUM(a.used_pages) * 8192 "
+                           "FROM sys.partitions p JOIN sys.allocation_units a ON a.container_id = p.partition_id "
+                           "WHERE p.object_id = OBJECT_ID(%s) AND p.index_id IN (0, 1)", (table_name,))
+            rows, num_bytes = cursor.fetchone()
+            if rows is None:
+                raise ValueError(f"Table {table_name} does not exist in MS SQL.")
+            return {"rows": int(rows), "bytes": int(num_bytes or 0)}
+        return self.cached_metadata(("table_stats", table_name), load)
+
+    def _create_stage_sql(self, table_name, stage_table):
+        """Return the SQL creating the stage table with the same columns."""
+        return f"SELECT TOP 0 * INTO {stage_table} FROM {table_name}"
+
+    def merge_stage_table(self, stage_table, table_name, mode="merge", key_columns=None):
+        """Apply the stage table to the MS SQL table.
+
+        Args:
+            stage_table: stage table created by create_stage_table().
+            table_name: target table in MS SQL.
+            mode: 'merge' (MERGE ... WHEN MATCHED THEN UPDATE WHEN NOT MATCHED THEN INSERT). Default is 'merge'.
+            key_columns: key columns of the MERGE condition.
+        """
+        if mode != "merge":
+            raise NotImplementedError(f"MSSQLConnector does not support the '{mode}' load mode.")
+        if not key_columns:
+            raise ValueError("The 'merge' mode of MS SQL requires key_columns.")
+        columns = self._insert_columns(table_name)
+        quoted = [self.quote_identifier(col) for col in columns]
+        on_clause = " AND ".join(f"tgt.{col} = src.{col}" for col in map(self.quote_identifier, key_columns))
+        update_columns = [self.quote_identifier(col) for col in columns if col not in key_columns]
+        statement = (f"MERGE {self.quote_identifier(table_name)} AS tgt "
+                     f"USING {self.quote_identifier(stage_table)} AS src ON {on_clause}")
+        if update_columns:
+            statement += " WHEN MATCHED THEN UPDATE SET " + ", ".join(f"tgt.{col} = src.{col}" for col in update_columns)
+        statement += (f" WHEN NOT MATCHED THEN INSERT ({', '.join(quoted)}) "
+                      f"VALUES ({', '.join(f'src.{col}' for col in quoted)});")
+        self._execute_statement(statement)
+        print(f"[insert_history]Merged {stage_table} into {table_name}")
+
+    def close(self):
+        """Close the MS SQL connection."""
+        self.close_writers()
+        self.release_route()
+        try:
+            self.mssql_connection.close()
+            print("[connect_history]MS SQL connection closed.")
+        except Exception as e:
+            print(f"[connect_history]Error while closing the connection: {e}")
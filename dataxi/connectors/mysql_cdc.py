@@ -0,0 +1,211 @@
+# File: mysql_cdc.py
+
+# Description: This Package provides the change data capture source of MySQL, which tails the row-based binlog
+#              like a replica and groups the insert/update/delete events into micro-batches ending on a
+#              transaction commit, each with the binlog position to resume from.
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+
+import time
+
+from ..cred_mgr import get_cred
+
+
+INSERT, UPDATE, DELETE = "insert", "update", "delete"
+
+
+def import_replication():
+    """Import python-mysql-replication lazily, since it is only required by the binlog source."""
+    try:
+        import pymysqlreplication
+    except ImportError as e:
+        raise ImportError("mysql-replication is required for the MySQL binlog source. "
+                          "Please install it with: pip install 'dataxi[cdc]'") from e
+    return pymysqlreplication
+
+
+class ChangeBatch:
+    def __init__(self, changes, position):
+        """A micro-batch of committed row changes.
+
+        Args:
+            changes: dictionary of 'database.table' -> list of (op, before, after) in binlog order. before is the
+                row before an update/delete, after the row after an insert/update, as column -> value dictionaries.
+            position: binlog position after the last committed transaction of the batch,
+                {"log_file": ..., "log_pos": ...}.
+        """
+        self.changes = changes
+        self.position = position
+
+    @property
+    def num_changes(self):
+        return sum(len(changes) for changes in self.changes.values())
+
+    def __repr__(self):
+        return f"ChangeBatch({self.num_changes} changes of {len(self.changes)} tables, position={self.position})"
+
+
+class MySQLBinlogSource:
+    def __init__(self, conn_id=None, host=None, port=None, user=None, password=None, tables=None, server_id=None,
+                 position=None, batch_rows=10000, batch_seconds=1.0, blocking=True):
+        """Initialize the binlog source, connecting as a replica of the MySQL server.
+
+        The server must log with binlog_format=ROW and binlog_row_image=FULL, and with binlog_row_metadata=FULL
+        (MySQL 8.0.14+) so the events carry the column names. The user needs the REPLICATION SLAVE and
+        REPLICATION CLIENT privileges. Only transactional (InnoDB) changes are captured, since the batches end on
+        the commit (Xid) events.
+
+        Args:
+            conn_id: Connection ID to load the credentials from the credential manager.
+            host: MySQL host.
+            port: MySQL port. Default is None (3306).
+            user: MySQL user.
+            password: MySQL password.
+            tables: list of 'database.table' to capture. Default is None (all tables).
+            server_id: replica server id, unique among the replicas of the server. Default is None (random).
+            position: binlog position to start from, {"log_file": ..., "log_pos": ...}.
+                Default is None (the current position of the server).
+            batch_rows: rows of a micro-batch, checked at each commit. Default is 10000.
+            batch_seconds: maximum seconds a change waits in a micro-batch. Default is 1.0.
+            blocking: wait for new events, False to stop once the current end of the binlog is reached.
+                Default is True.
+        """
+        if conn_id:
+            print(f"[connect_history]Connecting to the MySQL binlog with connection ID: {conn_id}")
+            cred_dict = get_cred(conn_id)
+            host, port = host or cred_dict.get("host"), port or cred_dict.get("port")
+            user, password = cred_dict.get("user"), cred_dict.get("password")
+        self.conn_id = conn_id
+        self.conn_params = dict(host=host, port=int(port or 3306), user=user, password=password)
+        self.tables = list(tables) if tables else None
+        self.server_id = server_id or int(time.time()) % 1000000 + 1000000
+        self.position = dict(position) if position else None
+        self.batch_rows = batch_rows
+        self.batch_seconds = batch_seconds
+        self.blocking = blocking
+        self._stream = None
+
+    def _query(self, query, params=None):
+        """Run a query on a regular connection of the server and return the rows as dictionaries."""
+        import pymysql
+
+        connection = pymysql.connect(cursorclass=pymysql.cursors.DictCursor, **self.conn_params)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(query, params)
+                return cursor.fetchall()
+        finally:
+            connection.close()
+
+    def check_server(self):
+        """Raise ValueError if the server does not log full row images, warn without the row metadata."""
+        variables = {row["Variable_name"]: row["Value"] for row in
+                     self._query("SHOW VARIABLES WHERE Variable_name IN ('log_bin', 'binlog_format', "
+                                 "'binlog_row_image', 'binlog_row_metadata')")}
+        if variables.get("log_bin", "ON").upper() != "ON":
+            raise ValueError("The binary log of the MySQL server is disabled (log_bin=OFF).")
+        if variables.get("binlog_format", "").upper() != "ROW":
+            raise ValueError(f"The binlog source requires binlog_format=ROW, the server uses {variables.get('binlog_format')}.")
+        if variables.get("binlog_row_image", "FULL").upper() != "FULL":
+            raise ValueError(f"The binlog source requires binlog_row_image=FULL, the server uses {variables['binlog_row_image']}.")
+        if variables.get("binlog_row_metadata", "FULL").upper() != "FULL":
+            print("[query_history]binlog_row_metadata is not FULL, the column names are read from the current table "
+                  "definitions, which is wrong for the events logged before an ALTER TABLE.")
+        return variables
+
+    def current_position(self):
+        """Return the current binlog position of the server."""
+        try:
+            rows = self._query("SHOW BINARY LOG STATUS")  # MySQL 8.4+
+        except Exception:
+            rows = self._query("SHOW MASTER STATUS")
+        if not rows:
+            raise ValueError("The binary log of the MySQL server is disabled.")
+        return {"log_file": rows[0]["File"], "log_pos": int(rows[0]["Position"])}
+
+    def primary_key(self, table):
+        """Return the primary key columns of a 'database.table'."""
+        database, name = table.split(".", 1)
+        rows = self._query("SELECT COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE "
+                           "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND CONSTRAINT_NAME = 'PRIMARY' "
+                           "ORDER BY ORDINAL_POSITION", (database, name))
+        return [row["COLUMN_NAME"] for row in rows]
+
+    def _open_stream(self):
+        """Open the binlog stream at the start position."""
+        replication = import_replication()
+        from pymysqlreplication.event import HeartbeatLogEvent, RotateEvent, XidEvent
+        from pymysqlreplication.row_event import DeleteRowsEvent, UpdateRowsEvent, WriteRowsEvent
+
+        if self.position is None:
+            self.position = self.current_position()
+        schemas = sorted({table.split(".", 1)[0] for table in self.tables}) if self.tables else None
+        names = sorted({table.split(".", 1)[1] for table in self.tables}) if self.tables else None
+        print(f"[connect_history]Reading the MySQL binlog from {self.position['log_file']}:{self.position['log_pos']} "
+              f"as server_id {self.server_id}")
+        # the heartbeats wake up an idle stream, so a partial micro-batch is flushed after batch_seconds
+        return replication.BinLogStreamReader(
+            connection_settings={"host": self.conn_params["host"], "port": self.conn_params["port"],
+                                 "user": self.conn_params["user"], "passwd": self.conn_params["password"]},
+            server_id=self.server_id, blocking=self.blocking, resume_stream=True,
+            log_file=self.position["log_file"], log_pos=self.position["log_pos"],
+            only_events=[WriteRowsEvent, UpdateRowsEvent, DeleteRowsEvent, XidEvent, RotateEvent, HeartbeatLogEvent],
+            only_schemas=schemas, only_tables=names, slave_heartbeat=max(self.batch_seconds, 0.1))
+
+    def micro_batches(self):
+        """Yield ChangeBatches of the committed changes, in commit order.
+
+        A batch ends on a commit once it has batch_rows changes or its first change waited batch_seconds.
+        Resuming from the position of a batch replays nothing before it; the changes after it may be replayed
+        if the consumer stopped before recording it, so the sinks must apply them idempotently.
+        """
+        from pymysqlreplication.event import HeartbeatLogEvent, RotateEvent, XidEvent
+        from pymysqlreplication.row_event import DeleteRowsEvent, UpdateRowsEvent, WriteRowsEvent
+
+        self._stream = self._open_stream()
+        changes, num_rows, first_time = {}, 0, None
+        pending = []  # changes of the open transaction
+        try:
+            for event in self._stream:
+                if isinstance(event, (WriteRowsEvent, UpdateRowsEvent, DeleteRowsEvent)):
+                    table = f"{event.schema}.{event.table}"
+                    if self.tables and table not in self.tables:
+                        continue
+                    for row in event.rows:
+                        if isinstance(event, WriteRowsEvent):
+                            pending.append((table, (INSERT, None, row["values"])))
+                        elif isinstance(event, UpdateRowsEvent):
+                            pending.append((table, (UPDATE, row["before_values"], row["after_values"])))
+                        else:
+                            pending.append((table, (DELETE, row["values"], None)))
+                    continue
+                if isinstance(event, XidEvent):
+                    # the transaction is committed, its changes join the batch and its end becomes the checkpoint
+                    self.position = {"log_file": self._stream.log_file, "log_pos": self._stream.log_pos}
+                    for table, change in pending:
+                        changes.setdefault(table, []).append(change)
+                    num_rows += len(pending)
+                    if pending and first_time is None:
+                        first_time = time.time()
+                    pending = []
+                elif isinstance(event, RotateEvent):
+                    if not pending:
+                        self.position = {"log_file": event.next_binlog, "log_pos": event.position}
+                    continue
+                elif not isinstance(event, HeartbeatLogEvent):
+                    continue
+                if num_rows and (num_rows >= self.batch_rows or time.time() - first_time >= self.batch_seconds):
+                    yield ChangeBatch(changes, dict(self.position))
+                    changes, num_rows, first_time = {}, 0, None
+            if num_rows:
+                yield ChangeBatch(changes, dict(self.position))
+        finally:
+            self.close()
+
+    def close(self):
+        """Close the binlog stream."""
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+            print("[connect_history]MySQL binlog stream closed.")
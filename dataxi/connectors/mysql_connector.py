@@ -42,16 +42,38 @@
 #     1. added the count_table() func for ClickHouseConnector class
 # 2025.02.24:
 #     1. fix: convert NaN and NaT in a list of tuples to None in insert_tuple_data() func
+# 2026.10.18:
+#     1. inherited from BaseConnector, added stream(), bulk_insert() with the shared interface
+#     2. fix: with_reconnection() now passes self and reconnects with the original parameters
+#     3. added the opt-in query result cache for execute_query()
+#     4. added batch_limits() from max_allowed_packet for the adaptive batching
+#     5. added the upsert mode (ON DUPLICATE KEY UPDATE) and the staged merge/swap load modes
+#     6. fix: insert_tuple_data() read the column names with a dict cursor only
+#     7. added column_types() from SHOW COLUMNS for the type mapping
+#     8. added table_stats() from information_schema.TABLES and estimate_rows() from EXPLAIN for the planner
+#     9. added the params binding of execute_query(), the prepared statements and quote_identifier()
+#     10. added the read replica routing (host override of conn_id, connect_attempts, release on close)
+#     11. added the literals of the dialect for the lazy query frames (frame())
+#     12. added the flush of the buffered writers (buffered_writer()) on close
+#     13. added the query deadlines: KILL QUERY from a second connection, socket reset, no retry of a timeout
+#     14. compress and wire_format are reported as not supported instead of being silently ignored
 
 
+import socket
 import time
+import uuid
 import pymysql.cursors
 
-import json
-from pathlib import Path
-from ..cred_mgr import CredSender
+from ..cred_mgr import get_cred
+from .base_connector import BaseConnector
+from .query_cache import cached_result
+
+
+class MySQLConnector(BaseConnector):
+    db_type = "mysql"
+    identifier_quotes = ("`", "`")
+    backslash_escapes = True
 
-class MySQLConnector:
     def __init__(self, host=None, port=None, user=None, password=None, database=None, cursorclass=None, conn_id=None, retries=3, **kwargs):
         """Initialize the MySQL connection object.
         
@@ -68,43 +90,49 @@ class MySQLConnector:
         
         if conn_id:
             print(f"[connect_history]Connecting to MySQL with connection ID: {conn_id}")
-            
-            config_dir = Path.home() / ".dataxi"
-            cred_path = config_dir / "creds.json"
-            with open(cred_path, "r") as f:
-                cred_data = json.load(f)
-                if conn_id in cred_data:
-                    cred_dict = cred_data[conn_id]
-                else:
-                    print(f"conn_id: '{conn_id}' does not exist.")
-                    return None
-            self.get_connection(**cred_dict)
-        else:
-            self.get_connection(host=host, port=port, user=user, password=password, database=database, cursorclass=cursorclass)
-        
+            cred_dict = get_cred(conn_id)
+            # an explicit host/port (e.g. a replica chosen by the router) overrides the stored primary
+            host, port = host or cred_dict.get("host"), port or cred_dict.get("port")
+            user, password = cred_dict.get("user"), cred_dict.get("password")
+            database = database or cred_dict.get("database")
+
+        self.conn_id = conn_id
+        self.connect_attempts = kwargs.get("connect_attempts", self.connect_attempts)
+        self.query_timeout = kwargs.get("query_timeout", self.query_timeout)
+        # PyMySQL has no compressed protocol, report the transport options instead of ignoring them silently
+        self._ignore_transport_options(kwargs)
+        self.conn_params = dict(host=host, port=port, user=user, password=password, database=database, cursorclass=cursorclass)
+        self.get_connection(**self.conn_params)
+
         
     def with_reconnection(func):
         def wrapper(self, *args, **kwargs):
             try:
-                return func(*args, **kwargs)
+                return func(self, *args, **kwargs)
             except Exception as e:
+                if isinstance(e, TimeoutError) or self._interrupted:
+                    # a cancelled query is not retried, the retries would extend its deadline
+                    raise
                 print(f"[connect_history] Connection failed: {e}")
                 
                 try:
                     self.mysql_connection.ping(reconnect=True)
-                    return func(*args, **kwargs)
+                    return func(self, *args, **kwargs)
                 except Exception as e:
                     print(f"[connect_history] Ping old connection failed: {e}")
                     
-                    self.get_connection()
-                    return func(*args, **kwargs)
+                    self.get_connection(**self.conn_params)
+                    return func(self, *args, **kwargs)
                     
         return wrapper
         
 
     def get_connection(self, host=None, port=None, user=None, password=None, database=None, cursorclass=None):
         """Return the MySQL connection object."""
-        max_attempts = 5  # Set the maximum number of attempts
+        if host is None and getattr(self, "flag_connected", False):
+            # Called without parameters on a connected object, return the existing connection
+            return self.mysql_connection, self.flag_connected
+        max_attempts = self.connect_attempts  # Set the maximum number of attempts
         cur_attempt = 0  # Current attempt number
         self.flag_connected = False  # Flag to indicate connection status
 
@@ -140,20 +168,24 @@ class MySQLConnector:
         else:
             return None, self.flag_connected
 
+    @cached_result
     @with_reconnection
-    def execute_query(self, query):
+    def execute_query(self, query, params=None):
         """Execute the query and return the result.
 
         Args:
             query: MySQL query to be executed.
+            params: sequence of the values bound to the %s placeholders of the query (%% for a literal %),
+                escaped by the driver. Default is None.
         
         Returns:
             The result of the query with the format of a list of dictionaries.
         """
         with self.mysql_connection.cursor() as cursor:
             print(f"[query_history]Executing query: {query}")
-            cursor.execute(query)
-            result = cursor.fetchall()
+            with self._guard(query):
+                cursor.execute(query, params)
+                result = cursor.fetchall()
         
         print(f"[query_history]Query executed successfully. Number of records: {len(result)}")
 
@@ -164,29 +196,30 @@ class MySQLConnector:
         self.mysql_connection.commit()
     
     @with_reconnection
-    def insert_tuple_data(self, table_name, data):
+    def insert_tuple_data(self, table_name, data, mode="insert"):
         """Insert the data in tuple list type into the MySQL table.
  
         Args:
             table_name: target table in MySQL.
             data: data in tuple list type ([(1, 'Alice'), (2, 'Bob'), (3, 'Charlie')]) to be inserted.
+            mode: 'insert' or 'upsert' (INSERT ... ON DUPLICATE KEY UPDATE). Default is 'insert'.
         """
         with self.mysql_connection.cursor() as cursor:
-            query = f"SHOW COLUMNS FROM {table_name};"
-            cursor.execute(query)
-            result = cursor.fetchall()
             # fetach all column names
-            columns = [column['Field'] for column in result]
+            columns = self._insert_columns(table_name)
             # convert the list of column names into a string
-            cols = ', '.join(columns)
+            cols = ', '.join(self.quote_identifier(col) for col in columns)
  
-            insert_query = f"INSERT INTO {table_name} ({cols}) VALUES ({', '.join(['%s' for _ in columns])})"
+            insert_query = f"INSERT INTO {self.quote_identifier(table_name)} ({cols}) VALUES ({', '.join(['%s' for _ in columns])})"
+            if mode == "upsert":
+                insert_query += " " + self._upsert_clause(columns)
  
             try:
                 # Insert data into MySQL using executemany
-                cursor.executemany(insert_query, data)
-                # Commit the changes to MySQL
-                self.mysql_connection.commit()
+                with self._guard(insert_query):
+                    cursor.executemany(insert_query, data)
+                    # Commit the changes to MySQL
+                    self.mysql_connection.commit()
  
                 # Number of rows inserted or replaced
                 num_rows_affected = cursor.rowcount
@@ -196,27 +229,31 @@ class MySQLConnector:
                 print("Error:", e)
 
     @with_reconnection
-    def insert_dict_data(self, table_name, data):
+    def insert_dict_data(self, table_name, data, mode="insert"):
         """Insert the data in dict list type into the MySQL table.
  
         Args:
             table_name: target table in MySQL.
             data: data in dict list type ([{'id': 921, 'name': '7G2CE', 'created': datetime.datetime(2024, 4, 2, 20, 59, 50)]) to be inserted.
+            mode: 'insert' or 'upsert' (INSERT ... ON DUPLICATE KEY UPDATE). Default is 'insert'.
         """
         with self.mysql_connection.cursor() as cursor:
             # fetach all column names in the import data
             columns = data[0].keys()
             # convert the list of column names into a string
-            cols = ', '.join(columns)
+            cols = ', '.join(self.quote_identifier(col) for col in columns)
  
-            insert_query = f"INSERT INTO {table_name} ({cols}) VALUES ({', '.join(['%s' for _ in columns])})"
+            insert_query = f"INSERT INTO {self.quote_identifier(table_name)} ({cols}) VALUES ({', '.join(['%s' for _ in columns])})"
+            if mode == "upsert":
+                insert_query += " " + self._upsert_clause(list(columns))
 
             tuple_data = [tuple(record.values()) for record in data]
             try:
                 # Insert data into MySQL using executemany
-                cursor.executemany(insert_query, tuple_data)
-                # Commit the changes to MySQL
-                self.mysql_connection.commit()
+                with self._guard(insert_query):
+                    cursor.executemany(insert_query, tuple_data)
+                    # Commit the changes to MySQL
+                    self.mysql_connection.commit()
  
                 # Number of rows inserted or replaced
                 num_rows_affected = cursor.rowcount
@@ -225,8 +262,134 @@ class MySQLConnector:
             except pymysql.Error as e:
                 print("Error:", e)
 
+    def _connection(self):
+        """Return the pymysql connection object."""
+        return self.mysql_connection
+
+    def cancel(self):
+        """Kill the running query with KILL QUERY from a second connection, the connection itself stays open."""
+        thread_id = self.mysql_connection.thread_id()
+        params = {key: value for key, value in self.conn_params.items() if key != "cursorclass"}
+        killer = pymysql.connect(connect_timeout=10, **params)
+        try:
+            with killer.cursor() as cursor:
+                cursor.execute(f"KILL QUERY {int(thread_id)}")
+        finally:
+            killer.close()
+        print(f"[query_history]Killed the running query of the MySQL connection {thread_id}.")
+
+    def reset_connection(self):
+        """Shut down the socket under the blocked call, the next query reconnects (see with_reconnection)."""
+        sock = getattr(self.mysql_connection, "_sock", None)
+        if sock is not None:
+            sock.shutdown(socket.SHUT_RDWR)
+            print("[connect_history]MySQL connection reset.")
+
+    def _stream_cursor(self):
+        """Use an unbuffered server-side cursor, so the result set is not loaded into memory at once."""
+        return self.mysql_connection.cursor(pymysql.cursors.SSCursor)
+
+    def batch_limits(self):
+        """Return the insert batch limit derived from the server max_allowed_packet."""
+        if not hasattr(self, "_max_allowed_packet"):
+            with self.mysql_connection.cursor() as cursor:
+                cursor.execute("SELECT @@max_allowed_packet")
+                row = cursor.fetchone()
+            self._max_allowed_packet = int(row[0] if isinstance(row, tuple) else list(row.values())[0])
+        # the SQL text of a row is usually larger than its Arrow size, keep half of the packet as margin
+        return {"max_rows": None, "max_bytes": self._max_allowed_packet // 2}
+
+    def _insert_cursor(self):
+        """Let executemany() build multi-row INSERT statements up to max_allowed_packet instead of 1 MB."""
+        cursor = self.mysql_connection.cursor()
+        cursor.max_stmt_length = int(self.batch_limits()["max_bytes"] * 1.8)
+        return cursor
+
+    def _show_columns(self, table_name):
+        """Return the SHOW COLUMNS rows of the MySQL table as dictionaries."""
+        with self.mysql_connection.cursor(pymysql.cursors.DictCursor) as cursor:
+            cursor.execute(f"SHOW COLUMNS FROM {self.quote_identifier(table_name)};")
+            return cursor.fetchall()
+
+    def _insert_columns(self, table_name):
+        """Return the column names of the MySQL table."""
+        return [column['Field'] for column in self._show_columns(table_name)]
+
+    def column_types(self, table_name):
+        """Return the columns of the MySQL table as a list of (name, arrow_type, nullable)."""
+        from .type_mapping import mysql_arrow_type
+
+        return [(column['Field'], mysql_arrow_type(column['Type']), column['Null'] == 'YES')
+                for column in self._show_columns(table_name)]
+
+    def table_stats(self, table_name):
+        """Return the approximate rows and data size of the MySQL table from information_schema.TABLES."""
+        def load():
+            database, table = table_name.split(".", 1) if "." in table_name else (None, table_name)
+            with self.mysql_connection.cursor(pymysql.cursors.DictCursor) as cursor:
+                cursor.execute("SELECT TABLE_ROWS, DATA_LENGTH FROM information_schema.TABLES "
+                               "WHERE TABLE_SCHEMA = COALESCE(%s, DATABASE()) AND TABLE_NAME = %s",
+                               (database and database.strip("`"), table.strip("`")))
+                row = cursor.fetchone()
+            if row is None:
+                raise ValueError(f"Table {table_name} does not exist in MySQL.")
+            return {"rows": int(row["TABLE_ROWS"] or 0), "bytes": int(row["DATA_LENGTH"] or 0)}
+        return self.cached_metadata(("table_stats", table_name), load)
+
+    def estimate_rows(self, query):
+        """Return the rows estimated by EXPLAIN, scaled by the estimated filtered percentage."""
+        with self.mysql_connection.cursor(pymysql.cursors.DictCursor) as cursor:
+            cursor.execute(f"EXPLAIN {query}")
+            plan = cursor.fetchall()
+        if len(plan) != 1 or plan[0].get("rows") is None:
+            return None  # joins and subqueries are not estimated
+        return int(plan[0]["rows"] * float(plan[0].get("filtered") or 100) / 100)
+
+    def _upsert_clause(self, column_names, key_columns=None):
+        """Return the ON DUPLICATE KEY UPDATE clause, updating the non-key columns (all columns if no key given)."""
+        update_columns = [col for col in column_names if col not in (key_columns or [])] or list(column_names)
+        quoted = [self.quote_identifier(col) for col in update_columns]
+        return "ON DUPLICATE KEY UPDATE " + ", ".join(f"{col} = VALUES({col})" for col in quoted)
+
+    def _create_stage_sql(self, table_name, stage_table):
+        """Return the SQL creating the stage table with the same columns and indexes."""
+        return f"CREATE TABLE {stage_table} LIKE {table_name}"
+
+    def merge_stage_table(self, stage_table, table_name, mode="merge", key_columns=None):
+        """Apply the stage table to the MySQL table.
+
+        Args:
+            stage_table: stage table created by create_stage_table().
+            table_name: target table in MySQL.
+            mode: 'merge' (INSERT ... SELECT ... ON DUPLICATE KEY UPDATE) or 'swap' (atomic RENAME TABLE). Default is 'merge'.
+            key_columns: key columns excluded from the update. Default is None (the unique keys of the table decide).
+        """
+        with self.mysql_connection.cursor() as cursor:
+            if mode == "merge":
+                columns = self._insert_columns(table_name)
+                cols = ", ".join(self.quote_identifier(col) for col in columns)
+                merge_query = (f"INSERT INTO {self.quote_identifier(table_name)} ({cols}) "
+                               f"SELECT {cols} FROM {self.quote_identifier(stage_table)} "
+                               f"{self._upsert_clause(columns, key_columns)}")
+                with self._guard(merge_query):
+                    cursor.execute(merge_query)
+                print(f"[insert_history]Merged {stage_table} into {table_name}, number of rows affected: {cursor.rowcount}")
+            elif mode == "swap":
+                # unique like the stage table, so concurrent or failed swaps never collide on a leftover table
+                old_table = self.quote_identifier(f"{table_name}__dataxi_old_{uuid.uuid4().hex[:8]}")
+                target, stage = self.quote_identifier(table_name), self.quote_identifier(stage_table)
+                # RENAME TABLE of several tables is atomic, readers never see a missing or partial table
+                cursor.execute(f"RENAME TABLE {target} TO {old_table}, {stage} TO {target}")
+                cursor.execute(f"DROP TABLE {old_table}")
+                print(f"[insert_history]Swapped {stage_table} with {table_name}")
+            else:
+                raise NotImplementedError(f"MySQLConnector does not support the '{mode}' load mode.")
+        self.mysql_connection.commit()
+
     def close(self):
         """Close the MySQL connection."""
+        self.close_writers()
+        self.release_route()
         try:
             self.mysql_connection.cursor().close()
             self.mysql_connection.close()
@@ -0,0 +1,329 @@
+# File: postgresql_connector.py
+
+# Description: This Package aims to provide some reusable functions for connecting to PostgreSQL.
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+# Change Log:
+
+# 2026.10.18:
+#     1. added the PostgreSQLConnector class with conn_id support and the shared interface
+#     2. added the upsert (ON CONFLICT DO UPDATE) and the staged merge load modes
+#     3. added column_types() from information_schema for the type mapping
+#     4. added table_stats() from pg_class and estimate_rows() from EXPLAIN for the planner
+#     5. added the params binding of execute_query() and the server-side prepared statements (PREPARE/EXECUTE)
+#     6. added the read replica routing (host override of conn_id, connect_attempts, release on close)
+#     7. added the flush of the buffered writers (buffered_writer()) on close
+#     8. added the query deadlines, cancelled with the cancel request of the protocol
+#     9. roll back the transaction aborted by any failed statement, so the connection stays usable
+#     10. the table and column names are quoted on every path of the loads, PostgreSQL folds the unquoted ones
+#     11. table_stats() reports no rows for a table never analyzed instead of 0 rows
+#     12. bulk_insert() sends multi-row INSERT statements (execute_values) instead of one INSERT per row
+#     13. compress and wire_format are reported as not supported instead of being silently ignored
+
+
+import contextlib
+import itertools
+import json
+import time
+import uuid
+import psycopg2
+import psycopg2.extras
+
+from ..cred_mgr import get_cred
+from .base_connector import BaseConnector, PreparedStatement, to_column_rows
+from .query_cache import cached_result
+
+
+_statement_ids = itertools.count(1)
+
+
+class PostgreSQLPreparedStatement(PreparedStatement):
+    """Server-side prepared statement: PREPARE once per connection, then EXECUTE with the parameters.
+
+    The server parses and plans the statement once, and switches to a generic plan after a few executions.
+    """
+    def __init__(self, connector, query):
+        super().__init__(connector, query)
+        self.name = f"dataxi_stmt_{next(_statement_ids)}"
+        self.sql = self.segments[0] + "".join(f"${i}" + segment for i, segment in enumerate(self.segments[1:], 1))
+        self._prepared_on = None  # connection the statement is prepared on, a reconnection prepares it again
+
+    def _execute(self, params):
+        connection = self.connector.pg_connection
+        try:
+            with connection.cursor() as cursor:
+                if self._prepared_on is not connection:
+                    cursor.execute(f"PREPARE {self.name} AS {self.sql}")
+                    self._prepared_on = connection
+                with self.connector._guard(self.query):
+                    if params:
+                        cursor.execute(f"EXECUTE {self.name} ({', '.join(['%s'] * len(params))})", params)
+                    else:
+                        cursor.execute(f"EXECUTE {self.name}")
+                    result = cursor.fetchall() if cursor.description else []
+            connection.commit()
+        except (psycopg2.Error, TimeoutError):
+            # leave the connection usable after a failed statement, prepared statements survive the rollback
+            connection.rollback()
+            raise
+        return result
+
+    def close(self):
+        connection = self.connector.pg_connection
+        if self._prepared_on is connection and not connection.closed:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DEALLOCATE {self.name}")
+            connection.commit()
+        self._prepared_on = None
+
+
+class PostgreSQLConnector(BaseConnector):
+    db_type = "postgresql"
+    insert_page_size = 1000  # Rows per INSERT statement of bulk_insert()
+
+    def __init__(self, host=None, port=None, user=None, password=None, database=None, conn_id=None, **kwargs):
+        """Connects to the PostgreSQL. The connection will be retried for 5 times if it fails.
+
+        Args:
+            host: PostgreSQL host.
+            port: PostgreSQL port.
+            user: PostgreSQL user.
+            password: PostgreSQL password.
+            database: PostgreSQL database. Default is None.
+            conn_id: Connection ID to load the credentials from the credential manager.
+            **kwargs: Additional keyword arguments. Especially for db_type.
+        """
+        if conn_id:
+            print(f"[connect_history]Connecting to PostgreSQL with connection ID: {conn_id}")
+            cred_dict = get_cred(conn_id)
+            # an explicit host/port (e.g. a replica chosen by the router) overrides the stored primary
+            host, port = host or cred_dict.get("host"), port or cred_dict.get("port")
+            user, password = cred_dict.get("user"), cred_dict.get("password")
+            database = database or cred_dict.get("database")
+
+        self.conn_id = conn_id
+        self.connect_attempts = kwargs.get("connect_attempts", self.connect_attempts)
+        self.query_timeout = kwargs.get("query_timeout", self.query_timeout)
+        # psycopg2 has no transport compression, report the transport options instead of ignoring them silently
+        self._ignore_transport_options(kwargs)
+        self.conn_params = dict(host=host, port=port, user=user, password=password, database=database)
+        self.get_connection(**self.conn_params)
+
+    def get_connection(self, host=None, port=None, user=None, password=None, database=None):
+        """Return the PostgreSQL connection object."""
+        if host is None and getattr(self, "flag_connected", False):
+            # Called without parameters on a connected object, return the existing connection
+            return self.pg_connection, self.flag_connected
+        max_attempts = self.connect_attempts  # Set the maximum number of attempts
+        cur_attempt = 0  # Current attempt number
+        self.flag_connected = False  # Flag to indicate connection status
+
+        while cur_attempt < max_attempts and not self.flag_connected:
+            try:
+                cur_attempt += 1
+                print(f"[connect_history]Attempting to connect to PostgreSQL, attempt number: {cur_attempt}.")
+                self.pg_connection = psycopg2.connect(host=host, port=port, user=user,
+                                                      password=password, dbname=database)
+                print("[connect_history]Successfully connected to PostgreSQL.")
+                self.flag_connected = True  # Mark as successfully connected
+            except Exception as e:
+                print(f"[connect_history]Exception thrown. connect_history for {cur_attempt} attempt: " + str(e))
+                time.sleep(2)  # Wait for 2 seconds before retrying
+
+        if not self.flag_connected:
+            raise Exception("[connect_history]Unable to connect to the PostgreSQL.")
+        return self.pg_connection, self.flag_connected
+
+    @cached_result
+    def execute_query(self, query, params=None):
+        """Execute the query and return the result.
+
+        Args:
+            query: PostgreSQL query to be executed.
+            params: sequence of the values bound to the %s placeholders of the query (%% for a literal %),
+                adapted by the driver. Default is None.
+
+        Returns:
+            The result of the query with the format of a list of tuples.
+        """
+        with self._rollback_on_error():
+            with self.pg_connection.cursor() as cursor:
+                print(f"[query_history]Executing query: {query}")
+                with self._guard(query):
+                    cursor.execute(query, params)
+                    result = cursor.fetchall() if cursor.description else []
+            self.pg_connection.commit()
+
+        print(f"[query_history]Query executed successfully. Number of records: {len(result)}")
+
+        return result
+
+    def commit(self):
+        """Commit the changes to PostgreSQL."""
+        self.pg_connection.commit()
+
+    def _connection(self):
+        """Return the psycopg2 connection object."""
+        return self.pg_connection
+
+    @contextlib.contextmanager
+    def _rollback_on_error(self):
+        """Roll back the transaction when a statement fails: PostgreSQL aborts the transaction on any error
+        (including a cancelled statement) and rejects every later statement until the rollback."""
+        try:
+            yield
+        except Exception:
+            if not self.pg_connection.closed:
+                try:
+                    self.pg_connection.rollback()
+                except psycopg2.Error as e:
+                    print(f"[query_history]Rollback after the failed statement failed: {e}")
+            raise
+
+    def stream(self, query, batch_size=None, schema=None):
+        """Execute the query and yield the result as pyarrow RecordBatches, see BaseConnector.stream()."""
+        with self._rollback_on_error():
+            yield from super().stream(query, batch_size=batch_size, schema=schema)
+
+    def bulk_insert(self, table_name, data, batch_size=None, mode="insert", key_columns=None):
+        """Insert the data into the target table with multi-row INSERT statements and commit.
+
+        psycopg2's executemany() sends one INSERT per row, execute_values() sends batch_size rows per statement.
+
+        Args:
+            table_name: target table in PostgreSQL.
+            data: pyarrow Table/RecordBatch, pandas DataFrame, list of dictionaries or list of tuples.
+            batch_size: number of rows per INSERT statement. Default is insert_page_size.
+            mode: 'insert' or 'upsert' (ON CONFLICT DO UPDATE, key_columns required). Default is 'insert'.
+            key_columns: key columns of the conflict target. Default is None.
+
+        Returns:
+            Number of rows inserted.
+        """
+        if mode not in ("insert", "upsert"):
+            raise ValueError(f"bulk_insert() supports the 'insert' and 'upsert' modes, got '{mode}'. "
+                             f"Staged modes are run with staged_load().")
+        column_names, rows = to_column_rows(data)
+        if not rows:
+            return 0
+        if column_names is None:
+            column_names = self._insert_columns(table_name)
+        insert_query = (f"INSERT INTO {self.quote_identifier(table_name)} "
+                        f"({', '.join(self.quote_identifier(col) for col in column_names)}) VALUES %s")
+        if mode == "upsert":
+            insert_query += " " + self._upsert_clause(column_names, key_columns)
+            # one statement cannot update a row twice, the last row of each key is kept like row by row
+            positions = [column_names.index(col) for col in key_columns]
+            rows = list({tuple(row[i] for i in positions): row for row in rows}.values())
+
+        with self._rollback_on_error(), self.pg_connection.cursor() as cursor:
+            with self._guard(insert_query):
+                psycopg2.extras.execute_values(cursor, insert_query, rows, page_size=batch_size or self.insert_page_size)
+                self.pg_connection.commit()
+        print(f"[insert_history]Number of rows inserted into {table_name}: {len(rows)}")
+        if self.query_cache is not None:
+            self.query_cache.invalidate(table_name)
+        return len(rows)
+
+    def _execute_statement(self, statement):
+        """Execute a statement without result set (DDL/DML) and commit, or roll back if it fails."""
+        with self._rollback_on_error():
+            super()._execute_statement(statement)
+
+    def cancel(self):
+        """Cancel the running query with a cancel request of the protocol, the connection stays open."""
+        self.pg_connection.cancel()
+        print("[query_history]Cancelled the running PostgreSQL query.")
+
+    def _prepare_statement(self, query):
+        """Return the server-side prepared statement of the query."""
+        return PostgreSQLPreparedStatement(self, query)
+
+    def _stream_cursor(self):
+        """Use a named server-side cursor, so the result set is not loaded into memory at once."""
+        return self.pg_connection.cursor(name=f"dataxi_{uuid.uuid4().hex}")
+
+    def _insert_columns(self, table_name):
+        """Return the column names of the PostgreSQL table."""
+        with self._rollback_on_error(), self.pg_connection.cursor() as cursor:
+            cursor.execute(f"SELECT * FROM {self.quote_identifier(table_name)} LIMIT 0")
+            return [desc[0] for desc in cursor.description]
+
+    def column_types(self, table_name):
+        """Return the columns of the PostgreSQL table as a list of (name, arrow_type, nullable)."""
+        from .type_mapping import postgresql_arrow_type
+
+        schema, table = table_name.split(".", 1) if "." in table_name else ("public", table_name)
+        with self._rollback_on_error(), self.pg_connection.cursor() as cursor:
+            cursor.execute("SELECT column_name, data_type, numeric_precision, numeric_scale, is_nullable "
+                           "FROM information_schema.columns WHERE table_schema = %s AND table_name = %s "
+                           "ORDER BY ordinal_position", (schema, table))
+            result = cursor.fetchall()
+        if not result:
+            raise ValueError(f"Table {table_name} does not exist in PostgreSQL.")
+        return [(name, postgresql_arrow_type(data_type, precision, scale), nullable == "YES")
+                for name, data_type, precision, scale, nullable in result]
+
+    def table_stats(self, table_name):
+        """Return the planner row estimate and the total size of the PostgreSQL table from pg_class."""
+        def load():
+            with self._rollback_on_error(), self.pg_connection.cursor() as cursor:
+                cursor.execute("SELECT reltuples::bigint, pg_table_size(oid) FROM pg_class WHERE oid = %s::regclass",
+                               (self.quote_identifier(table_name),))
+                rows, num_bytes = cursor.fetchone()
+            # reltuples is -1 for a table never analyzed, count_rows() falls back to the planner estimate
+            return {"rows": int(rows) if rows >= 0 else None, "bytes": int(num_bytes or 0)}
+        return self.cached_metadata(("table_stats", table_name), load)
+
+    def estimate_rows(self, query):
+        """Return the rows estimated by EXPLAIN."""
+        with self._rollback_on_error(), self.pg_connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {query}")
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    def _upsert_clause(self, column_names, key_columns):
+        """Return the ON CONFLICT (key_columns) DO UPDATE clause, updating the non-key columns."""
+        if not key_columns:
+            raise ValueError("The 'upsert'/'merge' modes of PostgreSQL require key_columns (a unique or primary key).")
+        update_columns = [self.quote_identifier(col) for col in column_names if col not in key_columns]
+        conflict_target = ", ".join(self.quote_identifier(col) for col in key_columns)
+        if not update_columns:
+            return f"ON CONFLICT ({conflict_target}) DO NOTHING"
+        return (f"ON CONFLICT ({conflict_target}) DO UPDATE SET "
+                + ", ".join(f"{col} = EXCLUDED.{col}" for col in update_columns))
+
+    def _create_stage_sql(self, table_name, stage_table):
+        """Return the SQL creating the stage table with the same columns and defaults."""
+        return f"CREATE TABLE {stage_table} (LIKE {table_name} INCLUDING DEFAULTS)"
+
+    def merge_stage_table(self, stage_table, table_name, mode="merge", key_columns=None):
+        """Apply the stage table to the PostgreSQL table.
+
+        Args:
+            stage_table: stage table created by create_stage_table().
+            table_name: target table in PostgreSQL.
+            mode: 'merge' (INSERT ... SELECT ... ON CONFLICT DO UPDATE). Default is 'merge'.
+            key_columns: key columns of the conflict target.
+        """
+        if mode != "merge":
+            raise NotImplementedError(f"PostgreSQLConnector does not support the '{mode}' load mode.")
+        columns = self._insert_columns(table_name)
+        cols = ", ".join(self.quote_identifier(col) for col in columns)
+        self._execute_statement(f"INSERT INTO {self.quote_identifier(table_name)} ({cols}) "
+                                f"SELECT {cols} FROM {self.quote_identifier(stage_table)} "
+                                f"{self._upsert_clause(columns, key_columns)}")
+        print(f"[insert_history]Merged {stage_table} into {table_name}")
+
+    def close(self):
+        """Close the PostgreSQL connection."""
+        self.close_writers()
+        self.release_route()
+        try:
+            self.pg_connection.close()
+            print("[connect_history]PostgreSQL connection closed.")
+        except Exception as e:
+            print(f"[connect_history]Error while closing the connection: {e}")
@@ -0,0 +1,351 @@
+# File: query_cache.py
+
+# Description: This Package provides an opt-in query result cache for the connectors, with an in-memory
+#              LRU tier bounded by bytes and an on-disk Arrow IPC tier with a TTL.
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+
+import functools
+import hashlib
+import json
+import os
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+
+# Quoted literals/identifiers are kept as is when normalizing the SQL
+_QUOTED_PATTERN = re.compile(r"""('(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.)*"|`[^`]*`)""")
+_LITERAL_PATTERN = re.compile(r"""'(?:[^'\\]|\\.|'')*'""")
+_TABLE_PATTERN = re.compile(r"""\b(?:FROM|JOIN)\s+([`"\[]?[\w$]+[`"\]]?(?:\.[`"\[]?[\w$]+[`"\]]?)?)""", re.IGNORECASE)
+_READ_PATTERN = re.compile(r"^\s*(?:\(\s*)*(?:SELECT|WITH|SHOW|DESCRIBE|DESC|EXPLAIN)\b", re.IGNORECASE)
+
+
+def normalize_sql(query):
+    """Collapse whitespace and drop the trailing semicolon, without touching quoted literals.
+
+    Args:
+        query: SQL query.
+    """
+    parts = _QUOTED_PATTERN.split(query.strip())
+    normalized = []
+    for i, part in enumerate(parts):
+        # odd indexes are the quoted literals captured by split()
+        normalized.append(part if i % 2 else re.sub(r"\s+", " ", part))
+    return "".join(normalized).strip().rstrip(";").strip()
+
+
+def extract_tables(query):
+    """Return the lower-cased table names referenced after FROM/JOIN in the query.
+
+    Args:
+        query: SQL query.
+    """
+    tables = set()
+    # the string literals are blanked, the quoted identifiers are table names too
+    for name in _TABLE_PATTERN.findall(_LITERAL_PATTERN.sub("''", query)):
+        name = re.sub(r"[`\"\[\]]", "", name).lower()
+        tables.add(name)
+        # also index the bare table name, so invalidate('orders') matches 'db.orders'
+        tables.add(name.split(".")[-1])
+    return tables
+
+
+def is_read_query(query):
+    """Return True if the query only reads data, so its result can be cached."""
+    return isinstance(query, str) and bool(_READ_PATTERN.match(query))
+
+
+def _import_pyarrow():
+    """Import pyarrow lazily, base_connector imports this module at load time."""
+    from .base_connector import import_pyarrow
+    return import_pyarrow()
+
+
+def _estimate_bytes(value):
+    """Estimate the memory size of a cached value."""
+    if hasattr(value, "nbytes") and hasattr(value, "schema"):
+        return value.nbytes  # pyarrow Table
+    if hasattr(value, "memory_usage"):
+        return int(value.memory_usage(deep=True).sum())  # pandas DataFrame
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+class QueryCache:
+    def __init__(self, max_bytes=256 * 1024 * 1024, ttl=3600, cache_dir=None, disk=True):
+        """Initialize the query result cache.
+
+        Args:
+            max_bytes: byte budget of the in-memory LRU tier. Default is 256 MB.
+            ttl: time-to-live of the cached results in seconds, for both tiers. Default is 3600.
+            cache_dir: folder of the on-disk tier. Default is ~/.dataxi/cache.
+            disk: whether to use the on-disk Arrow tier. Default is True.
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk = disk
+        self.cache_dir = Path(cache_dir) if cache_dir else Path.home() / ".dataxi" / "cache"
+        if self.disk:
+            # the results may hold personal data, only the user can read them
+            self.cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+            os.chmod(self.cache_dir, 0o700)
+
+        self._entries = OrderedDict()  # key -> (value, size, created, tables)
+        self._current_bytes = 0
+        self._last_sweep = 0.0  # time of the last removal of the expired files, see _sweep_disk()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(namespace, query, params=None):
+        """Build the cache key from the connection namespace, the normalized SQL and the parameters.
+
+        Args:
+            namespace: identifier of the connection, e.g. the conn_id.
+            query: SQL query.
+            params: query parameters (any repr-able object). Default is None.
+        """
+        raw = json.dumps([str(namespace), normalize_sql(query), repr(params)], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return (hit, value) of the key, looking in memory first and then on disk."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, size, created, tables = entry
+                if now - created <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, self._copy(value)
+                self._pop(key)
+
+        if self.disk:
+            value, created, tables = self._read_disk(key, now)
+            if value is not None:
+                with self._lock:
+                    self.hits += 1
+                    self._put_memory(key, value, created, tables)
+                return True, self._copy(value)
+
+        with self._lock:
+            self.misses += 1
+        return False, None
+
+    def put(self, key, value, tables=()):
+        """Store the value in both tiers.
+
+        Args:
+            key: cache key from make_key().
+            value: query result (pyarrow Table, pandas DataFrame or a list of rows).
+            tables: tables referenced by the query, used by invalidate().
+        """
+        created = time.time()
+        tables = sorted(tables)
+        with self._lock:
+            self._put_memory(key, value, created, tables)
+        if self.disk:
+            self._write_disk(key, value, created, tables)
+            if created - self._last_sweep >= min(self.ttl, 60):
+                self._sweep_disk(created)
+
+    def invalidate(self, table=None):
+        """Drop the cached results reading the table, or all results if table is None.
+
+        Args:
+            table: table name, with or without the database prefix. Default is None.
+
+        Returns:
+            Number of cached results dropped.
+        """
+        table = re.sub(r"[`\"\[\]]", "", table).lower() if table else None
+        # match the bare table name as well, a query may read 'db.orders' as 'orders' of its default database
+        names = {table, table.split(".")[-1]} if table else set()
+        dropped = set()
+        with self._lock:
+            for key, (_, _, _, tables) in list(self._entries.items()):
+                if table is None or names & set(tables):
+                    self._pop(key)
+                    dropped.add(key)
+
+        if self.disk:
+            for meta_path in self.cache_dir.glob("*.json"):
+                try:
+                    meta = json.loads(meta_path.read_text())
+                except (OSError, ValueError):
+                    continue
+                if table is None or names & set(meta.get("tables", [])):
+                    self._remove_disk(meta_path.stem)
+                    dropped.add(meta_path.stem)
+
+        print(f"[cache_history]Invalidated {len(dropped)} cached results for table: {table or '*'}")
+        return len(dropped)
+
+    def clear(self):
+        """Drop all cached results."""
+        return self.invalidate()
+
+    def stats(self):
+        """Return the hit/miss counters and the memory usage of the cache."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                    "bytes": self._current_bytes, "max_bytes": self.max_bytes}
+
+    def _copy(self, value):
+        """Return a copy of mutable results, so callers cannot modify the cached value."""
+        if isinstance(value, list):
+            return list(value)
+        if hasattr(value, "memory_usage") and hasattr(value, "copy"):
+            return value.copy()
+        return value
+
+    def _pop(self, key):
+        """Remove the key from the memory tier. The lock must be held."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._current_bytes -= entry[1]
+
+    def _put_memory(self, key, value, created, tables):
+        """Store the value in the memory tier and evict the least recently used results. The lock must be held."""
+        size = _estimate_bytes(value)
+        if size > self.max_bytes:
+            return  # larger than the whole budget, only kept on disk
+        self._pop(key)
+        self._entries[key] = (value, size, created, tables)
+        self._current_bytes += size
+        while self._current_bytes > self.max_bytes and self._entries:
+            evicted_key = next(iter(self._entries))
+            self._pop(evicted_key)
+
+    def _to_arrow(self, value):
+        """Convert the value into a pyarrow Table, with its kind and the container types needed to restore it:
+        [type of the rows sequence, type of a row] of the driver, e.g. ['tuple', 'tuple'] for pymysql."""
+        pa = _import_pyarrow()
+        if hasattr(value, "schema") and hasattr(value, "to_batches"):
+            return value, "arrow", None
+        if hasattr(value, "memory_usage"):
+            return pa.Table.from_pandas(value, preserve_index=False), "df", None
+        if isinstance(value, (list, tuple)):
+            container = ["tuple" if isinstance(value, tuple) else "list",
+                         "list" if value and isinstance(value[0], list) else "tuple"]
+            if value and isinstance(value[0], dict):
+                return pa.Table.from_pylist(list(value)), "dict_rows", container
+            width = len(value[0]) if value else 0
+            names = [f"c{i}" for i in range(width)]
+            columns = list(zip(*value)) if value else []
+            return pa.Table.from_arrays([pa.array(col) for col in columns], names=names), "tuple_rows", container
+        return None, None, None
+
+    def _from_arrow(self, table, kind, container=None):
+        """Restore the cached value from the pyarrow Table, in the container types of the driver's result."""
+        if kind == "df":
+            return table.to_pandas()
+        if kind not in ("dict_rows", "tuple_rows"):
+            return table
+        sequence_type, row_type = container or ["list", "tuple"]
+        if kind == "dict_rows":
+            rows = table.to_pylist()
+        else:
+            rows = zip(*[col.to_pylist() for col in table.columns])
+            rows = [list(row) for row in rows] if row_type == "list" else list(rows)
+        return tuple(rows) if sequence_type == "tuple" else rows
+
+    def _write_disk(self, key, value, created, tables):
+        """Write the value into an Arrow IPC file and its metadata into a JSON file."""
+        pa = _import_pyarrow()
+        try:
+            table, kind, container = self._to_arrow(value)
+        except Exception as e:
+            print(f"[cache_history]Result not cached on disk: {e}")
+            return
+        if table is None:
+            return
+
+        data_path = self.cache_dir / f"{key}.arrow"
+        meta_path = self.cache_dir / f"{key}.json"
+        tmp_path = self.cache_dir / f"{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            # create the files readable by the user only, then write them under a temporary name
+            os.close(os.open(tmp_path, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600))
+            with pa.OSFile(str(tmp_path), "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp_path, data_path)  # atomic, so readers never see a partial file
+            fd = os.open(tmp_path, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                f.write(json.dumps({"kind": kind, "container": container, "created": created, "tables": tables}))
+            os.replace(tmp_path, meta_path)
+        except Exception as e:
+            # the query succeeded, a full or read-only disk only loses the cached copy
+            print(f"[cache_history]Result not cached on disk: {e}")
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+
+    def _read_disk(self, key, now):
+        """Return (value, created, tables) from the disk tier, or (None, None, None) if missing or expired."""
+        pa = _import_pyarrow()
+        data_path = self.cache_dir / f"{key}.arrow"
+        meta_path = self.cache_dir / f"{key}.json"
+        try:
+            meta = json.loads(meta_path.read_text())
+            if now - meta["created"] > self.ttl:
+                self._remove_disk(key)
+                return None, None, None
+            with pa.memory_map(str(data_path), "r") as source:
+                table = pa.ipc.open_file(source).read_all()
+        except (OSError, ValueError, KeyError):
+            return None, None, None
+        return self._from_arrow(table, meta.get("kind"), meta.get("container")), meta["created"], meta.get("tables", [])
+
+    def _sweep_disk(self, now):
+        """Remove the files of the expired results, which are never read again, and the leftover temporary files."""
+        self._last_sweep = now
+        removed = 0
+        for path in self.cache_dir.iterdir():
+            try:
+                if now - path.stat().st_mtime > self.ttl:
+                    path.unlink()
+                    removed += path.suffix == ".arrow"
+            except OSError:
+                continue  # removed by another process, or a sweep of a read-only folder
+        if removed:
+            print(f"[cache_history]Removed {removed} expired results from the disk cache")
+
+    def _remove_disk(self, key):
+        """Remove the files of the key from the disk tier."""
+        for suffix in (".arrow", ".json"):
+            try:
+                (self.cache_dir / f"{key}{suffix}").unlink()
+            except FileNotFoundError:
+                pass
+
+
+def cached_result(func):
+    """Serve the result of a read query from the connector's query_cache, if the cache is enabled."""
+    @functools.wraps(func)
+    def wrapper(self, query, *args, **kwargs):
+        cache = getattr(self, "query_cache", None)
+        if cache is None or not is_read_query(query):
+            return func(self, query, *args, **kwargs)
+
+        key = cache.make_key(self.cache_namespace(), query, (func.__name__, args, sorted(kwargs.items())))
+        hit, value = cache.get(key)
+        if hit:
+            print(f"[cache_history]Cache hit for query: {query}")
+            return value
+        result = func(self, query, *args, **kwargs)
+        cache.put(key, result, tables=extract_tables(query))
+        return result
+
+    return wrapper
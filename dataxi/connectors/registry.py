@@ -0,0 +1,102 @@
+# File: registry.py
+
+# Description: This Package provides the connector registry and the factory building any connector
+#              from a db_type or a conn_id.
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+
+import importlib
+
+from ..cred_mgr import get_cred
+
+
+# Connector classes are registered as "module:ClassName" paths and imported on first use,
+# so only the driver of the requested backend has to be installed.
+CONNECTOR_REGISTRY = {
+    "mysql": "dataxi.connectors.mysql_connector:MySQLConnector",
+    "clickhouse": "dataxi.connectors.clickhouse_connector:ClickHouseConnector",
+    "mssql": "dataxi.connectors.mssql_connector:MSSQLConnector",
+    "postgresql": "dataxi.connectors.postgresql_connector:PostgreSQLConnector",
+    "splunk": "dataxi.connectors.splunk_connector:SplunkConnector",
+}
+
+# Aliases accepted by the credential manager for the same backend
+DB_TYPE_ALIASES = {
+    "ch": "clickhouse",
+    "sql_server": "mssql",
+    "postgres": "postgresql",
+}
+
+
+def resolve_db_type(db_type):
+    """Return the canonical db_type of a db_type or its alias.
+
+    Args:
+        db_type: database type, e.g. 'mysql', 'ch', 'sql_server'.
+    """
+    if db_type is None:
+        raise ValueError("db_type is required to build a connector.")
+    db_type = str(db_type).strip().lower()
+    db_type = DB_TYPE_ALIASES.get(db_type, db_type)
+    if db_type not in CONNECTOR_REGISTRY:
+        raise ValueError(f"Connector type {db_type} is not supported. "
+                         f"Supported types: {', '.join(sorted(CONNECTOR_REGISTRY))}.")
+    return db_type
+
+
+def register_connector(db_type, connector_class, aliases=()):
+    """Register a connector class (or its "module:ClassName" path) for a db_type.
+
+    Args:
+        db_type: database type used by the factory and in the credentials.
+        connector_class: the connector class, or its "module:ClassName" path for lazy import.
+        aliases: additional names of the db_type.
+    """
+    db_type = db_type.strip().lower()
+    CONNECTOR_REGISTRY[db_type] = connector_class
+    for alias in aliases:
+        DB_TYPE_ALIASES[alias.strip().lower()] = db_type
+
+
+def get_connector_class(db_type):
+    """Return the connector class registered for the db_type (or its alias).
+
+    Args:
+        db_type: database type, e.g. 'mysql', 'ch', 'sql_server'.
+    """
+    db_type = resolve_db_type(db_type)
+    connector_class = CONNECTOR_REGISTRY[db_type]
+    if isinstance(connector_class, str):
+        module_name, class_name = connector_class.split(":")
+        connector_class = getattr(importlib.import_module(module_name), class_name)
+        CONNECTOR_REGISTRY[db_type] = connector_class
+    return connector_class
+
+
+def get_connector(conn_id=None, db_type=None, route=None, routing=None, **kwargs):
+    """Build a connector from a conn_id (using its stored db_type) or an explicit db_type.
+
+    Args:
+        conn_id: Connection ID to load the credentials from the credential manager.
+        db_type: database type. Required when the credential has no db_type (e.g. a Splunk token).
+        route: 'read' or 'write', for a conn_id whose credential lists read replicas: reads are routed to a
+            healthy replica, writes to the primary. Default is None (the primary, without routing).
+        routing: strategy of the read routing, 'round_robin', 'least_connections' or 'latency'.
+            Default is None (the credential 'routing' key, then round_robin).
+        **kwargs: keyword arguments passed to the connector, e.g. host/port/user/password without conn_id.
+
+    Returns:
+        The connected connector instance.
+    """
+    cred = get_cred(conn_id) if conn_id else {}
+    if conn_id and db_type is None:
+        db_type = cred.get("db_type")
+        if db_type is None:
+            raise ValueError(f"conn_id: '{conn_id}' has no db_type, please specify db_type.")
+    connector_class = get_connector_class(db_type)
+    if route and cred.get("replicas") and "host" not in kwargs:
+        from .routing import connect_routed
+
+        return connect_routed(connector_class, conn_id, cred, route=route, strategy=routing, **kwargs)
+    return connector_class(conn_id=conn_id, **kwargs)
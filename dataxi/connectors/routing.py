@@ -0,0 +1,254 @@
+# File: routing.py
+
+# Description: This Package provides the read replica routing of the conn_ids whose credential lists replicas:
+#              reads are spread across the healthy replicas (round-robin, least connections or latency weighted),
+#              writes go to the primary, and a node failing to connect is skipped until its back-off expires.
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+
+import itertools
+import random
+import threading
+import time
+
+
+# Strategies choosing the replica of a read connection
+#   round_robin: each healthy replica in turn
+#   least_connections: the replica with the fewest open connections of this process
+#   latency: a random replica weighted by the inverse of its measured connect/probe latency
+ROUTING_STRATEGIES = ("round_robin", "least_connections", "latency")
+
+_routers = {}
+_routers_lock = threading.Lock()
+
+
+def parse_address(address, default_port=None):
+    """Return (host, port) of a 'host', 'host:port' or '[ipv6]:port' address."""
+    address = str(address).strip()
+    if address.startswith("["):
+        host, _, rest = address[1:].partition("]")
+        port = rest.lstrip(":") or default_port
+    elif address.count(":") == 1:
+        host, port = address.split(":")
+    else:
+        host, port = address, default_port
+    return host, int(port) if port else None
+
+
+class Node:
+    def __init__(self, host, port, role):
+        """A server of a conn_id.
+
+        Args:
+            host: server host.
+            port: server port.
+            role: 'primary' or 'replica'.
+        """
+        self.host = host
+        self.port = port
+        self.role = role
+        self.active = 0  # connections of this process open on the node
+        self.latency = None  # moving average of the connect/probe latency, in seconds
+        self.failures = 0  # consecutive failures
+        self.down_until = 0.0  # the node is skipped until this time after a failure
+
+    @property
+    def address(self):
+        return f"{self.host}:{self.port}" if self.port else self.host
+
+    def __repr__(self):
+        return f"Node({self.address}, {self.role})"
+
+
+class ReplicaRouter:
+    def __init__(self, conn_id, primary, replicas, strategy="round_robin", retry_after=30, latency_decay=0.3):
+        """Initialize the router of a conn_id.
+
+        Args:
+            conn_id: routed connection ID.
+            primary: (host, port) of the primary, which receives the writes.
+            replicas: list of (host, port) of the read replicas.
+            strategy: 'round_robin', 'least_connections' or 'latency'. Default is 'round_robin'.
+            retry_after: seconds a failed node is skipped, doubled after each consecutive failure up to 32 times.
+                Default is 30.
+            latency_decay: weight of the last measure in the latency moving average. Default is 0.3.
+        """
+        if strategy not in ROUTING_STRATEGIES:
+            raise ValueError(f"Invalid routing strategy '{strategy}', expected one of: {', '.join(ROUTING_STRATEGIES)}.")
+        self.conn_id = conn_id
+        self.strategy = strategy
+        self.retry_after = retry_after
+        self.latency_decay = latency_decay
+        self.primary = Node(*primary, role="primary")
+        self.replicas = [Node(host, port, role="replica") for host, port in replicas]
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
+
+    @classmethod
+    def from_cred(cls, conn_id, cred, strategy=None, **kwargs):
+        """Build the router of a credential with 'replicas' (list or comma separated 'host[:port]' addresses).
+
+        The strategy defaults to the credential 'routing' key, then round_robin.
+        """
+        replicas = cred.get("replicas") or []
+        if isinstance(replicas, str):
+            replicas = [address for address in replicas.split(",") if address.strip()]
+        default_port = cred.get("port")
+        return cls(conn_id, parse_address(cred["host"], default_port),
+                   [parse_address(address, default_port) for address in replicas],
+                   strategy=strategy or cred.get("routing") or "round_robin", **kwargs)
+
+    @property
+    def nodes(self):
+        return [self.primary] + self.replicas
+
+    def _choose(self, candidates):
+        """Choose a node among the healthy candidates with the strategy. The lock must be held."""
+        if self.strategy == "least_connections":
+            fewest = min(node.active for node in candidates)
+            return random.choice([node for node in candidates if node.active == fewest])
+        if self.strategy == "latency":
+            measured = [node.latency for node in candidates if node.latency is not None]
+            # an unmeasured node gets the weight of the fastest one, so it is tried and measured
+            default = min(measured) if measured else 1.0
+            weights = [1 / max(node.latency if node.latency is not None else default, 1e-4) for node in candidates]
+            return random.choices(candidates, weights=weights)[0]
+        return candidates[next(self._turn) % len(candidates)]
+
+    def acquire(self, read=True, exclude=()):
+        """Choose the node of a new connection and count it as active.
+
+        Reads go to the healthy replicas, or to the primary when none is healthy. Writes go to the primary.
+
+        Args:
+            read: route a read (True) or a write (False) connection. Default is True.
+            exclude: nodes already tried by this connection attempt.
+
+        Returns:
+            The Node, or None when every candidate was tried.
+        """
+        with self._lock:
+            now = time.time()
+            candidates = [node for node in (self.replicas if read else []) if node not in exclude]
+            healthy = [node for node in candidates if node.down_until <= now]
+            if not healthy and self.primary not in exclude:
+                healthy = [self.primary]
+            if healthy:
+                node = self._choose(healthy)
+            elif candidates:
+                # every replica is down, try the one recovering first rather than failing
+                node = min(candidates, key=lambda node: node.down_until)
+            else:
+                return None
+            node.active += 1
+            return node
+
+    def release(self, node):
+        """Count a connection of the node as closed."""
+        with self._lock:
+            node.active = max(node.active - 1, 0)
+
+    def record_success(self, node, latency=None):
+        """Mark the node healthy and update its latency average."""
+        with self._lock:
+            if node.failures:
+                print(f"[connect_history]{self.conn_id} node {node.address} is healthy again.")
+            node.failures = 0
+            node.down_until = 0.0
+            if latency is not None:
+                node.latency = latency if node.latency is None else \
+                    self.latency_decay * latency + (1 - self.latency_decay) * node.latency
+
+    def record_failure(self, node, error=None, release=True):
+        """Mark the node unhealthy for retry_after seconds, doubled by each consecutive failure.
+
+        Args:
+            node: failed node.
+            error: the exception, for the log. Default is None.
+            release: also count the connection of the failed attempt as closed. Default is True.
+        """
+        with self._lock:
+            if release:
+                node.active = max(node.active - 1, 0)
+            node.failures += 1
+            backoff = self.retry_after * 2 ** min(node.failures - 1, 5)
+            node.down_until = time.time() + backoff
+        print(f"[connect_history]{self.conn_id} {node.role} {node.address} marked down for {backoff:.0f}s: {error}")
+
+    def check_health(self, probe):
+        """Probe every node, updating its health and latency.
+
+        Args:
+            probe: function called with a Node, raising if the node is unhealthy, e.g. opening a connection
+                and running SELECT 1.
+
+        Returns:
+            The stats() after the probes.
+        """
+        for node in self.nodes:
+            start = time.time()
+            try:
+                probe(node)
+            except Exception as e:
+                self.record_failure(node, e, release=False)
+            else:
+                self.record_success(node, time.time() - start)
+        return self.stats()
+
+    def stats(self):
+        """Return the state of the nodes: address, role, healthy, active, latency and failures."""
+        now = time.time()
+        with self._lock:
+            return [{"address": node.address, "role": node.role, "healthy": node.down_until <= now,
+                     "active": node.active, "latency": node.latency, "failures": node.failures}
+                    for node in self.nodes]
+
+
+def get_router(conn_id, cred, strategy=None):
+    """Return the router of the conn_id shared by the connections of this process.
+
+    The router is rebuilt when the hosts of the credential or the strategy change.
+    """
+    key = (cred.get("host"), cred.get("port"), str(cred.get("replicas")), strategy or cred.get("routing"))
+    with _routers_lock:
+        entry = _routers.get(conn_id)
+        if entry is None or entry[0] != key:
+            entry = _routers[conn_id] = (key, ReplicaRouter.from_cred(conn_id, cred, strategy=strategy))
+        return entry[1]
+
+
+def connect_routed(connector_class, conn_id, cred, route="read", strategy=None, **kwargs):
+    """Open a connector of the conn_id on the node chosen by its router, failing over to the next node.
+
+    Each node gets a single connection attempt, the router skips the failed nodes on the next connections.
+
+    Args:
+        connector_class: connector class of the conn_id.
+        conn_id: Connection ID with replicas in its credential.
+        cred: credential of the conn_id.
+        route: 'read' (a replica) or 'write' (the primary). Default is 'read'.
+        strategy: routing strategy, see ROUTING_STRATEGIES. Default is None (credential 'routing', then round_robin).
+        **kwargs: keyword arguments for the connector.
+    """
+    if route not in ("read", "write"):
+        raise ValueError(f"Invalid route '{route}', expected 'read' or 'write'.")
+    router = get_router(conn_id, cred, strategy)
+    kwargs.setdefault("connect_attempts", 1)
+    tried = []
+    while True:
+        node = router.acquire(read=route == "read", exclude=tried)
+        if node is None:
+            raise Exception(f"[connect_history]Unable to connect to any node of {conn_id}: "
+                            f"{', '.join(node.address for node in tried)}.")
+        tried.append(node)
+        print(f"[connect_history]Routing the {route} connection of {conn_id} to {node.role} {node.address}")
+        start = time.time()
+        try:
+            connector = connector_class(conn_id=conn_id, host=node.host, port=node.port, **kwargs)
+        except Exception as e:
+            router.record_failure(node, e)
+            continue
+        router.record_success(node, time.time() - start)
+        connector.router, connector.route_node = router, node
+        return connector
@@ -0,0 +1,417 @@
+# File: splunk_connector.py
+
+# Description: This Package aims to provide some reusable functions for querying the Splunk server.
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+# Change Log:
+
+# 2026.10.18:
+#     1. moved the SplunkConnector class from backup.py, added conn_id support and configurable server url
+#     2. added stream(), query_arrow() with the shared interface
+#     3. added the gzip compression of the responses and the measure of the received wire bytes
+#     4. added the time-sliced searches: the earliest/latest window split into slices searched concurrently,
+#        each retried on its own, merged in time order into one columnar stream
+#     5. added the query deadlines: the searches under a deadline run as normal-mode jobs, cancelled when it expires
+#     6. added count_rows() with a "| stats count" search of the index
+
+
+import re
+import time
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from ..cred_mgr import get_cred
+from .base_connector import BaseConnector, _guarded_connectors, _typed_array, import_pyarrow
+
+
+_RELATIVE_TIME = re.compile(r"^-(\d+)(s|m|h|d|w)$")
+_UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def to_epoch(value, now=None):
+    """Convert a search time into epoch seconds.
+
+    Args:
+        value: epoch seconds, datetime, ISO 8601 string, 'now' or a relative '-<n><s|m|h|d|w>' (e.g. '-30d').
+            The snapped Splunk modifiers (e.g. '-1d@d') cannot be split into slices.
+        now: epoch seconds of 'now'. Default is None (the current time).
+    """
+    now = time.time() if now is None else now
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.timestamp()
+    value = str(value).strip()
+    if value == "now":
+        return now
+    match = _RELATIVE_TIME.match(value)
+    if match:
+        return now - int(match.group(1)) * _UNIT_SECONDS[match.group(2)]
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f"Unsupported search time '{value}' for the time slices, use epoch seconds, "
+                         f"an ISO 8601 time, 'now' or '-<n><s|m|h|d|w>'.") from None
+
+
+def split_time_range(earliest, latest, slices):
+    """Split the [earliest, latest) window into equal slices.
+
+    Returns:
+        List of (earliest, latest) epoch seconds in time order. The latest bound of a slice is exclusive in
+        Splunk, so the slices do not overlap.
+    """
+    now = time.time()
+    start, end = to_epoch(earliest, now), to_epoch(latest if latest is not None else "now", now)
+    if end <= start:
+        raise ValueError(f"The latest time ({latest}) must be after the earliest time ({earliest}).")
+    step = (end - start) / max(int(slices), 1)
+    bounds = [start + step * i for i in range(max(int(slices), 1))] + [end]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+class SplunkConnector(BaseConnector):
+    db_type = "splunk"
+    poll_interval = 1  # Seconds between the status checks of a search job run under a deadline
+
+    def __init__(self, token=None, url=None, host=None, port=None, conn_id=None, verify=True, compress=True,
+                 earliest=None, latest=None, time_slices=1, max_concurrency=4, slice_attempts=3, **kwargs):
+        """Connects to the Splunk server.
+
+        Args:
+            token: Splunk token.
+            url: Splunk REST API base url, e.g. 'https://splunk.example.com:8089'.
+            host: Splunk host, used to build the url when url is not given.
+            port: Splunk management port, used with host. Default is None.
+            conn_id: Connection ID to load the token (and optional host/port) from the credential manager.
+            verify: Validate the Splunk server TLS/SSL certificate. Default is True.
+            compress: request gzip compressed responses. Default is True.
+            earliest: default earliest time of the searches, see to_epoch(). Default is None (the search decides).
+            latest: default latest time of the searches. Default is None (now).
+            time_slices: number of time slices stream() splits the earliest/latest window into. Default is 1.
+            max_concurrency: maximum slices searched concurrently. Default is 4.
+            slice_attempts: attempts of each slice before the stream fails. Default is 3.
+            **kwargs: Additional keyword arguments. Especially for db_type and 'splunk_token' (alias of token).
+        """
+        token = token or kwargs.get("splunk_token")
+        if conn_id:
+            print(f"[connect_history]Loading Splunk token with connection ID: {conn_id}")
+            cred_dict = get_cred(conn_id)
+            token = cred_dict.get("token") or cred_dict.get("password")
+            host = host or cred_dict.get("host")
+            port = port or cred_dict.get("port")
+        if url is None and host:
+            url = f"https://{host}:{port}" if port else f"https://{host}"
+        if not url:
+            raise ValueError("Splunk server url is required, please provide 'url' or 'host'.")
+
+        self.url = url.rstrip("/")
+        self.verify = verify
+        self.headers = {
+            "Authorization": "Splunk " + token,
+            "Accept-Encoding": "gzip" if compress else "identity",
+        }
+        self.compression = "gzip" if compress else None
+        self.wire_format = "json"
+        self.wire_bytes = 0
+        self.decoded_bytes = 0
+        self.earliest = earliest
+        self.latest = latest
+        self.time_slices = time_slices
+        self.max_concurrency = max_concurrency
+        self.slice_attempts = slice_attempts
+        self.query_timeout = kwargs.get("query_timeout", self.query_timeout)
+        self._stats_lock = threading.Lock()
+        self._jobs = set()  # sids of the search jobs running under a deadline
+
+    def execute_query(self, query, earliest=None, latest=None, max_attempts=5):
+        """Execute the query and return the result.
+
+        The search is a oneshot request, or under a deadline (see deadline() and query_timeout) a normal-mode
+        job polled until it is done and cancelled on the server when the deadline expires. A timeout is not retried.
+
+        Args:
+            query: Splunk query to be executed.
+            earliest: earliest time of the search (Splunk earliest_time). Default is None.
+            latest: latest time of the search, exclusive (Splunk latest_time). Default is None.
+            max_attempts: attempts before raising. Default is 5.
+        """
+        data = {
+            'adhoc_search_level': 'fast',
+            'output_mode': 'json',
+            'exec_mode': 'oneshot',
+            'search': query,
+            'count': 0  # Avoid the record limitation of Splunk to retrieve all query records."
+        }
+        if earliest is not None:
+            data['earliest_time'] = earliest
+        if latest is not None:
+            data['latest_time'] = latest
+
+        cur_attempt = 0  # Current attempt number
+        connected = False  # Connection status, local since the time slices run concurrently
+        deadline = self.statement_deadline()
+
+        while cur_attempt < max_attempts and not connected:
+            self._check_search(query, deadline)
+            try:
+                cur_attempt += 1
+                print(f"[connect_history]Attempting to query from Splunk, attempt number: {cur_attempt}.")
+                if deadline is None:
+                    response = requests.post(url=f"{self.url}/services/search/jobs",
+                                             headers=self.headers, data=data, verify=self.verify)
+                else:
+                    response = self._search_job(data, deadline)
+                content = response.content
+                with self._stats_lock:
+                    # tell() counts the bytes read from the socket, before the gzip decoding
+                    self.wire_bytes += response.raw.tell() or len(content)
+                    self.decoded_bytes += len(content)
+                result = json.loads(content.decode('utf-8'))
+                print(f"[Splunk_query_history]Query executed successfully. Number of records: {len(result['results'])}.")
+                connected = True  # Mark as successfully connected
+            except Exception as e:
+                if isinstance(e, TimeoutError) or self._interrupted:
+                    raise
+                print(f"[connect_history]Exception thrown. connect_history for {cur_attempt} attempt: " + str(e))
+                if cur_attempt < max_attempts:
+                    time.sleep(2)  # Wait for 2 seconds before retrying
+
+        self.flag_connected = connected
+        if not connected:
+            raise Exception("[connect_history]Unable to connect to the Splunk.")
+
+        return result
+
+    def _check_search(self, query, deadline):
+        """Raise before sending a search once the connector is interrupted or the deadline expired."""
+        if self._interrupted:
+            raise Exception(f"[query_history]SplunkConnector was interrupted, the search is not sent: {query}")
+        if deadline is not None and deadline <= time.time():
+            raise TimeoutError(f"[query_history]Deadline exceeded, the search is not sent: {query}")
+
+    def _search_job(self, data, deadline):
+        """Run the search as a normal-mode job polled until the deadline and return the response of its results.
+
+        The job is cancelled on the server when the deadline expires, on Ctrl-C and on any other failure.
+        """
+        _guarded_connectors.add(self)
+        response = requests.post(url=f"{self.url}/services/search/jobs", headers=self.headers,
+                                 data=dict(data, exec_mode="normal"), verify=self.verify,
+                                 timeout=max(deadline - time.time(), 1))
+        response.raise_for_status()
+        sid = json.loads(response.content.decode('utf-8'))["sid"]
+        with self._stats_lock:
+            self._jobs.add(sid)
+        try:
+            while True:
+                self._check_search(f"search job {sid}", deadline)
+                status = requests.get(url=f"{self.url}/services/search/jobs/{sid}", headers=self.headers,
+                                      params={"output_mode": "json"}, verify=self.verify,
+                                      timeout=max(deadline - time.time(), 1))
+                status.raise_for_status()
+                content = json.loads(status.content.decode('utf-8'))["entry"][0]["content"]
+                if content.get("isFailed"):
+                    messages = "; ".join(message.get("text", "") for message in content.get("messages", []))
+                    raise Exception(f"[query_history]Search job {sid} failed: {messages}")
+                if content.get("isDone"):
+                    break
+                time.sleep(max(min(self.poll_interval, deadline - time.time()), 0))
+            return requests.get(url=f"{self.url}/services/search/jobs/{sid}/results", headers=self.headers,
+                                params={"output_mode": "json", "count": 0}, verify=self.verify,
+                                timeout=max(deadline - time.time(), 1))
+        except BaseException:
+            self._cancel_job(sid)
+            raise
+        finally:
+            with self._stats_lock:
+                self._jobs.discard(sid)
+
+    def _cancel_job(self, sid):
+        """Cancel the search job on the server, reporting the failures instead of raising them."""
+        try:
+            requests.post(url=f"{self.url}/services/search/jobs/{sid}/control", headers=self.headers,
+                          data={"action": "cancel"}, verify=self.verify, timeout=30).raise_for_status()
+            print(f"[query_history]Cancelled the Splunk search job {sid}.")
+        except Exception as e:
+            print(f"[query_history]Cancellation of the Splunk search job {sid} failed: {e}")
+
+    def cancel(self):
+        """Cancel the search jobs running under a deadline, the oneshot searches cannot be cancelled."""
+        with self._stats_lock:
+            sids = list(self._jobs)
+        for sid in sids:
+            self._cancel_job(sid)
+
+    def interrupt(self):
+        """Cancel the running search jobs and make the next searches fail."""
+        self._interrupted = True
+        self.cancel()
+
+    def _search_slice(self, query, earliest, latest, order):
+        """Search one time slice, retrying it alone with exponential back-off, and return its records in time order."""
+        for attempt in range(1, self.slice_attempts + 1):
+            try:
+                records = self.execute_query(query, earliest=earliest, latest=latest, max_attempts=1)['results']
+                break
+            except Exception as e:
+                if isinstance(e, TimeoutError) or self._interrupted:
+                    raise
+                if attempt == self.slice_attempts:
+                    raise Exception(f"[connect_history]Time slice [{earliest}, {latest}) failed after {attempt} attempts: {e}") from e
+                print(f"[connect_history]Time slice [{earliest}, {latest}) failed, retrying it in {2 ** attempt}s.")
+                time.sleep(2 ** attempt)
+        # the events come newest first, the slices are only ordered by their _time
+        if order and records and all("_time" in record for record in records):
+            records.sort(key=lambda record: record["_time"], reverse=order == "desc")
+        return records
+
+    def search_slices(self, query, earliest=None, latest=None, slices=None, max_concurrency=None, order="asc"):
+        """Split the earliest/latest window into time slices, search them concurrently and yield them in time order.
+
+        At most 2 * max_concurrency slices are searched or buffered ahead of the slice being yielded, so a slow
+        slice does not let the buffered results grow with the window.
+
+        Args:
+            query: Splunk query to be executed, without earliest/latest in it.
+            earliest: earliest time of the window, see to_epoch(). Default is the connector earliest.
+            latest: latest time of the window. Default is the connector latest, then now.
+            slices: number of time slices. Default is the connector time_slices.
+            max_concurrency: maximum slices searched concurrently. Default is the connector max_concurrency.
+            order: 'asc' (oldest first), 'desc' (newest first) or None (slices in time order, records as returned).
+                Default is 'asc'.
+
+        Yields:
+            ((earliest, latest), records) of each slice.
+        """
+        earliest = earliest if earliest is not None else self.earliest
+        latest = latest if latest is not None else self.latest
+        if earliest is None:
+            raise ValueError("The time sliced search requires an earliest time.")
+        ranges = split_time_range(earliest, latest, slices or self.time_slices)
+        if order == "desc":
+            ranges.reverse()
+        max_concurrency = max_concurrency or self.max_concurrency
+        print(f"[query_history]Searching {len(ranges)} time slices of {(ranges[0][1] - ranges[0][0]):.0f}s "
+              f"with {max_concurrency} concurrent searches: {query}")
+        with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="dataxi-splunk") as pool:
+            futures, submitted = {}, 0
+            try:
+                for index, time_range in enumerate(ranges):
+                    while submitted < len(ranges) and submitted < index + 2 * max_concurrency:
+                        futures[submitted] = pool.submit(self._search_slice, query, *ranges[submitted], order)
+                        submitted += 1
+                    yield time_range, futures.pop(index).result()
+            finally:
+                for future in futures.values():
+                    future.cancel()
+
+    def _records_to_batches(self, records, column_names, batch_size, schema=None):
+        """Yield the records as RecordBatches of the columns, strings unless the schema declares the type."""
+        pa = import_pyarrow()
+        fetch_size = batch_size if callable(batch_size) else (lambda: batch_size)
+        start = 0
+        while start < len(records):
+            size = int(fetch_size())
+            chunk = records[start:start + size]
+            start += size
+            # Splunk may return multivalue fields as lists, keep the column type as string
+            columns = [[None if record.get(col) is None else
+                        (record[col] if isinstance(record[col], str) else json.dumps(record[col]))
+                        for record in chunk] for col in column_names]
+            types = [schema.field(col).type if schema is not None and col in schema.names else pa.string()
+                     for col in column_names]
+            yield pa.RecordBatch.from_arrays([_typed_array(pa, col, arrow_type) for col, arrow_type in zip(columns, types)],
+                                             names=column_names)
+
+    def normalize_result(self, result):
+        """Normalize the result and return a DataFrame.
+
+        Args:
+            result: the result from the Splunk query.
+        """
+        import pandas as pd
+
+        results = result['results']
+        train_df = pd.json_normalize(results)
+
+        return train_df
+
+    def stream(self, query, batch_size=None, schema=None, earliest=None, latest=None, slices=None, columns=None):
+        """Execute the query and yield the result as pyarrow RecordBatches.
+
+        With more than one time slice, the earliest/latest window is searched slice by slice (see search_slices())
+        and the batches follow the time order. The columns of a batch are the columns of the slices seen so far,
+        so a later batch may add columns; give the columns to keep the same ones in every batch.
+
+        Args:
+            query: Splunk query to be executed.
+            batch_size: number of records per batch, or a function returning it before each batch.
+                Default is stream_batch_size.
+            schema: Arrow schema of the columns, the other columns are strings. Default is None.
+            earliest: earliest time of the search. Default is the connector earliest.
+            latest: latest time of the search. Default is the connector latest.
+            slices: number of time slices. Default is the connector time_slices.
+            columns: column names of the batches. Default is None (the fields of the records).
+        """
+        batch_size = batch_size or self.stream_batch_size
+        earliest = earliest if earliest is not None else self.earliest
+        latest = latest if latest is not None else self.latest
+        slices = slices or self.time_slices
+        if slices > 1:
+            slice_results = self.search_slices(query, earliest, latest, slices)
+        else:
+            slice_results = [((earliest, latest), self.execute_query(query, earliest=earliest, latest=latest)['results'])]
+        column_names = list(columns) if columns else []
+        num_records = 0
+        for _, records in slice_results:
+            if not columns:
+                column_names += sorted({key for record in records for key in record} - set(column_names))
+            num_records += len(records)
+            yield from self._records_to_batches(records, list(column_names), batch_size, schema)
+        if slices > 1:
+            print(f"[Splunk_query_history]Time sliced search streamed successfully. Number of records: {num_records}.")
+
+    def query_arrow(self, query, earliest=None, latest=None, slices=None):
+        """Execute the query and return the result as a pyarrow Table, the columns of all the slices merged.
+
+        Args:
+            query: Splunk query to be executed.
+            earliest: earliest time of the search. Default is the connector earliest.
+            latest: latest time of the search. Default is the connector latest.
+            slices: number of time slices. Default is the connector time_slices.
+        """
+        pa = import_pyarrow()
+        batches = list(self.stream(query, earliest=earliest, latest=latest, slices=slices))
+        if not batches:
+            return pa.table({})
+        return pa.concat_tables([pa.Table.from_batches([batch]) for batch in batches], promote_options="default")
+
+    def count_rows(self, table_name, where=None, exact=False):
+        """Splunk has no tables, count the events of the index with a '| stats count' search.
+
+        Args:
+            table_name: Splunk index.
+            where: search terms filtering the events, e.g. 'sourcetype=access_combined'. Default is None.
+            exact: unused, the search count is exact. Default is False.
+        """
+        query = f"search index={table_name}" + (f" {where}" if where else "") + " | stats count"
+        results = self.execute_query(query, earliest=self.earliest, latest=self.latest)["results"]
+        return int(results[0]["count"]) if results else 0
+
+    def bulk_insert(self, table_name, data, batch_size=None):
+        """Splunk is a read-only source in Dataxi."""
+        raise NotImplementedError("SplunkConnector does not support bulk_insert().")
+
+    def close(self):
+        """Nothing to close, each Splunk query is an independent HTTP request."""
+        pass
@@ -0,0 +1,222 @@
+# File: type_mapping.py
+
+# Description: This Package maps the column types of each DBMS to Arrow types, and compiles one column-wise
+#              converter per table, so batches are converted in vectorized form instead of cell by cell.
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+
+import re
+
+from .base_connector import import_pyarrow
+
+
+def _decimal_type(pa, precision, scale):
+    """Return the Arrow decimal type of the precision and scale."""
+    precision, scale = int(precision), int(scale)
+    if precision <= 38:
+        return pa.decimal128(precision, scale)
+    return pa.decimal256(min(precision, 76), scale)
+
+
+def _timestamp_unit(precision):
+    """Return the Arrow timestamp unit of a fractional seconds precision."""
+    precision = int(precision or 0)
+    if precision == 0:
+        return "s"
+    if precision <= 3:
+        return "ms"
+    if precision <= 6:
+        return "us"
+    return "ns"
+
+
+def mysql_arrow_type(type_name):
+    """Return the Arrow type of a MySQL column type (as in SHOW COLUMNS), or None if unknown."""
+    pa = import_pyarrow()
+    type_name = type_name.lower().strip()
+    unsigned = "unsigned" in type_name
+    base = re.match(r"[a-z]+", type_name).group(0)
+    args = re.findall(r"\d+", type_name)
+
+    integers = {"tinyint": (pa.int8(), pa.uint8()), "smallint": (pa.int16(), pa.uint16()),
+                "mediumint": (pa.int32(), pa.uint32()), "int": (pa.int32(), pa.uint32()),
+                "integer": (pa.int32(), pa.uint32()), "bigint": (pa.int64(), pa.uint64())}
+    if base in integers:
+        return integers[base][1 if unsigned else 0]
+    if base == "float":
+        return pa.float32()
+    if base in ("double", "real"):
+        return pa.float64()
+    if base in ("decimal", "numeric", "dec", "fixed"):
+        precision, scale = (args + ["10", "0"])[:2] if args else ("10", "0")
+        return _decimal_type(pa, precision, scale)
+    if base == "date":
+        return pa.date32()
+    if base in ("datetime", "timestamp"):
+        return pa.timestamp("us")
+    if base == "time":
+        return pa.duration("us")  # pymysql returns TIME as timedelta
+    if base == "year":
+        return pa.int16()
+    if base in ("char", "varchar", "tinytext", "text", "mediumtext", "longtext", "enum", "set", "json"):
+        return pa.string()
+    if base in ("binary", "varbinary", "tinyblob", "blob", "mediumblob", "longblob", "bit"):
+        return pa.binary()
+    return None
+
+
+def clickhouse_arrow_type(type_name):
+    """Return the Arrow type of a ClickHouse column type (as in system.columns), or None if unknown."""
+    pa = import_pyarrow()
+    type_name = type_name.strip()
+    # Nullable and LowCardinality do not change the Arrow value type
+    wrapper = re.match(r"^(Nullable|LowCardinality)\((.*)\)$", type_name)
+    if wrapper:
+        return clickhouse_arrow_type(wrapper.group(2))
+
+    simple = {"Int8": pa.int8(), "Int16": pa.int16(), "Int32": pa.int32(), "Int64": pa.int64(),
+              "UInt8": pa.uint8(), "UInt16": pa.uint16(), "UInt32": pa.uint32(), "UInt64": pa.uint64(),
+              "Float32": pa.float32(), "Float64": pa.float64(), "Bool": pa.bool_(),
+              "String": pa.string(), "UUID": pa.string(), "Date": pa.date32(), "Date32": pa.date32(),
+              "IPv4": pa.string(), "IPv6": pa.string()}
+    if type_name in simple:
+        return simple[type_name]
+    match = re.match(r"^Decimal\((\d+),\s*(\d+)\)$", type_name)
+    if match:
+        return _decimal_type(pa, match.group(1), match.group(2))
+    match = re.match(r"^Decimal(32|64|128|256)\((\d+)\)$", type_name)
+    if match:
+        precision = {"32": 9, "64": 18, "128": 38, "256": 76}[match.group(1)]
+        return _decimal_type(pa, precision, match.group(2))
+    match = re.match(r"^DateTime(?:\('([^']+)'\))?$", type_name)
+    if match:
+        return pa.timestamp("s", tz=match.group(1))
+    match = re.match(r"^DateTime64\((\d+)(?:,\s*'([^']+)')?\)$", type_name)
+    if match:
+        return pa.timestamp(_timestamp_unit(match.group(1)), tz=match.group(2))
+    if type_name.startswith("FixedString"):
+        return pa.binary()
+    if type_name.startswith("Enum"):
+        return pa.string()
+    return None
+
+
+def mssql_arrow_type(type_name, precision=None, scale=None):
+    """Return the Arrow type of a MS SQL column type (as in sys.types), or None if unknown."""
+    pa = import_pyarrow()
+    type_name = type_name.lower().strip()
+    simple = {"bit": pa.bool_(), "tinyint": pa.uint8(), "smallint": pa.int16(), "int": pa.int32(),
+              "bigint": pa.int64(), "real": pa.float32(), "float": pa.float64(),
+              "money": pa.decimal128(19, 4), "smallmoney": pa.decimal128(10, 4),
+              "date": pa.date32(), "datetime": pa.timestamp("ms"), "smalldatetime": pa.timestamp("s"),
+              "datetime2": pa.timestamp("us"), "datetimeoffset": pa.timestamp("us", tz="UTC"),
+              "time": pa.time64("us"), "uniqueidentifier": pa.string(), "xml": pa.string()}
+    if type_name in simple:
+        return simple[type_name]
+    if type_name in ("decimal", "numeric"):
+        return _decimal_type(pa, precision or 18, scale or 0)
+    if type_name in ("char", "varchar", "nchar", "nvarchar", "text", "ntext"):
+        return pa.string()
+    if type_name in ("binary", "varbinary", "image", "timestamp", "rowversion"):
+        return pa.binary()
+    return None
+
+
+def postgresql_arrow_type(type_name, precision=None, scale=None):
+    """Return the Arrow type of a PostgreSQL column type (as in information_schema), or None if unknown."""
+    pa = import_pyarrow()
+    type_name = type_name.lower().strip()
+    simple = {"smallint": pa.int16(), "integer": pa.int32(), "bigint": pa.int64(), "real": pa.float32(),
+              "double precision": pa.float64(), "boolean": pa.bool_(), "date": pa.date32(),
+              "timestamp without time zone": pa.timestamp("us"), "timestamp with time zone": pa.timestamp("us", tz="UTC"),
+              "time without time zone": pa.time64("us"), "text": pa.string(), "character varying": pa.string(),
+              "character": pa.string(), "uuid": pa.string(), "json": pa.string(), "jsonb": pa.string(),
+              "bytea": pa.binary()}
+    if type_name in simple:
+        return simple[type_name]
+    if type_name == "numeric" and precision is not None:
+        return _decimal_type(pa, precision, scale or 0)
+    return None
+
+
+def arrow_schema(connector, table_name, columns=None):
+    """Return the Arrow schema of a table from the column types reported by the connector.
+
+    Columns whose type cannot be mapped get the null type, which means "infer from the values".
+
+    Args:
+        connector: connector with a column_types() method.
+        table_name: table name.
+        columns: only keep these columns, in this order. Default is None (all columns).
+    """
+    pa = import_pyarrow()
+    fields = {}
+    for name, arrow_type, nullable in connector.column_types(table_name):
+        fields[name] = pa.field(name, arrow_type if arrow_type is not None else pa.null(), nullable=True)
+    if columns:
+        missing = [col for col in columns if col not in fields]
+        if missing:
+            raise ValueError(f"Columns {missing} do not exist in {table_name}.")
+        return pa.schema([fields[col] for col in columns])
+    return pa.schema(list(fields.values()))
+
+
+class ColumnConverter:
+    def __init__(self, target_schema, nan_to_null=True):
+        """Compile the column-wise conversion of batches into the target schema.
+
+        The conversion plan of each column is compiled once per source schema and reused for every batch,
+        so each batch is converted with one vectorized Arrow kernel per column.
+
+        Args:
+            target_schema: Arrow schema of the sink table, e.g. from arrow_schema(). Fields with the null type are kept as is.
+            nan_to_null: convert floating NaN to null, for sinks without NaN support. Default is True.
+        """
+        self.target_schema = target_schema
+        self.nan_to_null = nan_to_null
+        self._plans = {}  # source schema -> list of per-column functions
+
+    def _compile_column(self, source_field):
+        """Return the function converting one source column, or None if it is kept as is."""
+        pa = import_pyarrow()
+        import pyarrow.compute as pc
+
+        target_index = self.target_schema.get_field_index(source_field.name)
+        target_type = self.target_schema.field(target_index).type if target_index >= 0 else None
+        source_type = source_field.type
+        steps = []
+
+        if self.nan_to_null and pa.types.is_floating(source_type):
+            steps.append(lambda arr: pc.if_else(pc.is_nan(arr), pa.scalar(None, arr.type), arr))
+        if target_type is not None and not pa.types.is_null(target_type) and target_type != source_type:
+            # truncating temporal units (e.g. us -> s) is what the drivers did per value, allow it
+            safe = not (pa.types.is_temporal(source_type) and pa.types.is_temporal(target_type))
+            if pa.types.is_binary(source_type) and pa.types.is_string(target_type):
+                steps.append(lambda arr: arr.cast(pa.string()))
+            else:
+                steps.append(lambda arr, t=target_type, s=safe: pc.cast(arr, t, safe=s))
+        if not steps:
+            return None
+
+        def convert(arr):
+            for step in steps:
+                arr = step(arr)
+            return arr
+        return convert
+
+    def plan(self, source_schema):
+        """Return the compiled conversion plan of the source schema."""
+        key = source_schema.to_string()
+        if key not in self._plans:
+            self._plans[key] = [self._compile_column(field) for field in source_schema]
+        return self._plans[key]
+
+    def __call__(self, batch):
+        """Convert a pyarrow RecordBatch into the target types."""
+        pa = import_pyarrow()
+        plan = self.plan(batch.schema)
+        if all(step is None for step in plan):
+            return batch
+        arrays = [batch.column(i) if step is None else step(batch.column(i)) for i, step in enumerate(plan)]
+        return pa.RecordBatch.from_arrays(arrays, names=batch.schema.names)
@@ -1,3 +1,4 @@
 # __init__.py
-from .cred_mgr import CredMgr, save_cred_env
-from .cred_sender import CredSender
\ No newline at end of file
+from .cred_mgr import CredMgr, get_cred, save_cred_env
+from .cred_sender import CredSender
+from .cred_store import CredStore
@@ -6,6 +6,8 @@ import getpass
 import random
 import string
 
+from .cred_store import CredStore
+
 
 def dict_to_table(data: dict) -> str:
     """
@@ -64,14 +66,12 @@ class CredMgr:
     def __init__(self):
         """Initialize credentials storage path. If it does not exist, create the path."""
         self.config_dir = Path.home() / ".dataxi"    # placing a "." (period) in front of the folder, will hide it in finder
-        self.cred_path = self.config_dir / "creds.json"
+        self.cred_path = self.config_dir / "creds.db"
         self.initialize_cred_path()
     
     def initialize_cred_path(self):
-        """Check if the file path exists; if not, create the file and folder."""
-        self.config_dir.mkdir(parents=True, exist_ok=True)
-        if not self.cred_path.exists():
-            self.cred_path.write_text("{}")
+        """Check if the file path exists; if not, create the store file and folder."""
+        self.store = CredStore(self.cred_path)
     
     def get_cred_path(self):
         """Get the credential storage path."""
@@ -85,9 +85,7 @@ class CredMgr:
         """
         
         # Check if the conn_id already exists
-        with open(self.cred_path, "r") as f:
-            cred_data = json.load(f)
-        if conn_id in cred_data:
+        if self.store.get(conn_id) is not None:
             print(f"conn_id: '{conn_id}' already exists. If want to overwrite it, please use 'delete' command to remove it first.")
             return None
         
@@ -120,6 +118,10 @@ class CredMgr:
                 cred_dict = {"db_type": db_type, "host": host, "port": int(port), "user": user, "password": password}
             else:
                 cred_dict = {"db_type": db_type, "host": host, "port": int(port), "user": user, "password": password, "database": database}
+            
+            replicas = input("Enter read replicas as host[:port], comma separated (optional, press Enter to skip): ").strip()
+            if replicas:
+                cred_dict["replicas"] = [address.strip() for address in replicas.split(",") if address.strip()]
         
         elif cred_type == "2":
             # Secret credentials
@@ -134,39 +136,28 @@ class CredMgr:
             print("Invalid option. Exiting...")
             return None
         
-        cred_data[conn_id] = cred_dict
-        with open(self.cred_path, "w") as f:
-            json.dump(cred_data, f, indent=4)
-        
-        os.chmod(self.cred_path, 0o600)  # grant the file access
+        if not self.store.add(conn_id, cred_dict):
+            # added by another process meanwhile
+            print(f"conn_id: '{conn_id}' already exists. If want to overwrite it, please use 'delete' command to remove it first.")
+            return None
         
         print(f"Added credential: {conn_id}")
 
     def list_conn_id(self):
         """List all conn_id."""
-        with open(self.cred_path, "r") as f:
-            cred_data = json.load(f)
-            for key in sorted(cred_data.keys()):
-                print(key)
+        conn_ids = self.store.conn_ids()
+        for key in conn_ids:
+            print(key)
         
         # Print the system time and the number of records retrieved
-        print(f"[{time.strftime("%H:%M:%S")}] {len(cred_data.keys())} records retrieved")
+        print(f"[{time.strftime('%H:%M:%S')}] {len(conn_ids)} records retrieved")
 
     def delete_cred(self, conn_id: str):
         """Delete the specific credential using conn_id from the local credential file."""
-        with open(self.cred_path, "r") as f:
-            cred_data = json.load(f)
-            
-        if conn_id not in cred_data:
+        if not self.store.delete(conn_id):
             print(f"conn_id: '{conn_id}' does not exist.")
             return None
         
-        cred_data.pop(conn_id)
-        with open(self.cred_path, "w") as f:
-            json.dump(cred_data, f, indent=4)
-        
-        os.chmod(self.cred_path, 0o600)  # grant the file access
-        
         print(f"Successfully deleted credential: {conn_id}")
 
     def load_cred(self, conn_id=None, all=False):
@@ -176,18 +167,61 @@ class CredMgr:
             conn_id: the customized connection id of the database.
             all: flag to load all credentials. If True, will load all credentials.
         """
-        with open(self.cred_path, "r") as f:
-            cred_data = json.load(f)
-            if all:
-                print(dict_to_table(cred_data))
-                
-                # Print the system time and the number of records retrieved
-                print(f"[{time.strftime("%H:%M:%S")}] {len(cred_data.keys())} records retrieved")
-                return None
-            if conn_id in cred_data:
-                print(cred_data[conn_id])
-            else:
-                print(f"conn_id: '{conn_id}' does not exist.")
+        if all:
+            cred_data = self.store.all()
+            print(dict_to_table(cred_data))
+            
+            # Print the system time and the number of records retrieved
+            print(f"[{time.strftime('%H:%M:%S')}] {len(cred_data.keys())} records retrieved")
+            return None
+        cred_dict = self.store.get(conn_id)
+        if cred_dict is not None:
+            print(cred_dict)
+        else:
+            print(f"conn_id: '{conn_id}' does not exist.")
+
+    def import_creds(self, path: str, overwrite=False):
+        """Import the credentials of a JSON file ({conn_id: credential}, like the export) in one transaction.
+
+        Args:
+            path: path of the JSON file, or '-' to read the standard input.
+            overwrite: replace the existing conn_ids instead of skipping them. Default is False.
+        """
+        if path == "-":
+            import sys
+            cred_data = json.load(sys.stdin)
+        else:
+            with open(path, "r") as f:
+                cred_data = json.load(f)
+        if not isinstance(cred_data, dict):
+            print("cred_mgr: error: The file must contain a JSON object of the credentials by conn_id.")
+            return None
+        try:
+            written = self.store.add_many(cred_data, overwrite=overwrite)
+        except ValueError as e:
+            print(f"cred_mgr: error: {e} Nothing imported.")
+            return None
+        skipped = "" if overwrite else f", {len(cred_data) - written} existing skipped"
+        print(f"Imported {written} credentials{skipped}.")
+
+    def export_creds(self, path=None, conn_ids=None):
+        """Export the credentials, passwords included, as a JSON file readable by the import.
+
+        Args:
+            path: path of the JSON file, written with restricted access. Default is None (the standard output).
+            conn_ids: conn_ids to export. Default is None (all).
+        """
+        cred_data = self.store.all(conn_ids)
+        if path is None or path == "-":
+            print(json.dumps(cred_data, indent=4))
+            return None
+        # write a temporary file next to the target and rename it, so the file is never partial
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(cred_data, f, indent=4)
+        os.replace(tmp_path, path)
+        print(f"Exported {len(cred_data)} credentials to {path}")
                 
     def generate_password(self,
                         length=12,
@@ -262,6 +296,21 @@ class CredMgr:
         print("Credential storage file reset.")
 
 
+def get_cred(conn_id: str) -> dict:
+    """Return the stored credential dictionary of the conn_id.
+
+    Args:
+        conn_id: the customized connection id of the database.
+
+    Raises:
+        ValueError: if the conn_id does not exist.
+    """
+    cred_dict = CredStore().get(conn_id)
+    if cred_dict is None:
+        raise ValueError(f"conn_id: '{conn_id}' does not exist.")
+    return cred_dict
+
+
 def save_cred_env(conn_id: str, db_type: str, host: str, port: str, user: str, password: str, database: str=None):
     """(Beta) Save the credential to the local global env (only for MacOS).
 
@@ -25,6 +25,14 @@ def main():
     load_group.add_argument("-id", "--conn_id", help="Connection ID to load")
     load_group.add_argument("-a", "--all", action="store_true", help="Load all credentials")
     
+    # Subcommands to import and export credentials in bulk
+    parser_import = subparsers.add_parser("import", help="Import the credentials of a JSON file ({conn_id: credential}) in one transaction")
+    parser_import.add_argument("file", help="JSON file to import, '-' to read the standard input")
+    parser_import.add_argument("-o", "--overwrite", action="store_true", help="Replace the existing conn_ids instead of skipping them")
+    parser_export = subparsers.add_parser("export", help="Export the credentials, passwords included, as a JSON file")
+    parser_export.add_argument("file", nargs="?", help="JSON file to write with restricted access, default is the standard output")
+    parser_export.add_argument("-id", "--conn_id", nargs="+", help="Connection IDs to export, default is all")
+    
     # Subcommand to generate a new password
     parser_gen = subparsers.add_parser("gen", help="Generate a new password")
     parser_gen.add_argument("-len", "--length", default=12, help="Password length, default is 12 characters, from 6 to 50 characters", type=int)
@@ -67,6 +75,10 @@ def main():
         cred_mgr.delete_cred(conn_id=args.conn_id)
     elif args.command == "load":
         cred_mgr.load_cred(conn_id=args.conn_id, all=args.all)
+    elif args.command == "import":
+        cred_mgr.import_creds(path=args.file, overwrite=args.overwrite)
+    elif args.command == "export":
+        cred_mgr.export_creds(path=args.file, conn_ids=args.conn_id)
     elif args.command == "gen":
         cred_mgr.generate_password(length=args.length,
                                     include_uppercase=args.uppercase,
@@ -83,17 +83,12 @@ class CredSender:
     def send_conn_id(self, conn_id, passphrase=None, ttl=None):
         """Send the conn_id corresponding credential securely and return the secret URL."""
         # Initialize CredMgr to make sure the credential file exists
-        CredMgr()
-        config_dir = Path.home() / ".dataxi"
-        cred_path = config_dir / "creds.json"
-        with open(cred_path, "r") as f:
-            cred_data = json.load(f)
-            if conn_id in cred_data:
-                cred_dict = cred_data[conn_id]
-                print(cred_dict)
-            else:
-                print(f"conn_id: '{conn_id}' does not exist.")
-                return
+        cred_dict = CredMgr().store.get(conn_id)
+        if cred_dict is not None:
+            print(cred_dict)
+        else:
+            print(f"conn_id: '{conn_id}' does not exist.")
+            return
 
         secret_text = "\n".join(f"{key}: {value}" for key, value in cred_dict.items())
         secret_text += f'''\n\nOriginal JSON:\n"{conn_id}": {json.dumps(cred_dict)}'''
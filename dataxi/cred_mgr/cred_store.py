@@ -0,0 +1,129 @@
+# File: cred_store.py
+
+# Description: This Package stores the credentials of the conn_ids in a SQLite file, so that concurrent
+#              processes can add, read and delete them without corrupting the store.
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+
+class CredStore:
+    def __init__(self, path=None):
+        """Initialize the credential store, a SQLite file indexed by conn_id.
+
+        The file is in WAL mode: every write is one transaction under the SQLite file lock, and the readers resolving
+        conn_ids neither wait for the writers nor see their partial changes. The creds.json of the previous versions,
+        next to the file, is imported once and renamed to creds.json.bak.
+
+        Args:
+            path: path of the SQLite file. Default is None (~/.dataxi/creds.db).
+        """
+        self.path = Path(path) if path else Path.home() / ".dataxi" / "creds.db"
+        self.json_path = self.path.parent / "creds.json"
+        if not self.path.exists() or self.json_path.exists():
+            self.initialize()
+
+    def _connect(self):
+        return sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+
+    def _write(self, operation):
+        """Run operation(db) in an IMMEDIATE transaction and return its result."""
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                result = operation(db)
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+            return result
+        finally:
+            db.close()
+
+    def _read(self, query, params=()):
+        db = self._connect()
+        try:
+            return db.execute(query, params).fetchall()
+        except sqlite3.OperationalError as e:
+            if "no such table" in str(e):
+                return []  # another process is creating the store
+            raise
+        finally:
+            db.close()
+
+    def initialize(self):
+        """Create the store file and import the legacy creds.json."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not self.path.exists():
+            # create the file with restricted access, SQLite gives the same mode to its -wal and -shm files
+            os.close(os.open(str(self.path), os.O_CREAT | os.O_WRONLY, 0o600))
+            os.chmod(self.path, 0o600)
+        db = self._connect()
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+        finally:
+            db.close()
+
+        def migrate(db):
+            db.execute("CREATE TABLE IF NOT EXISTS creds (conn_id TEXT PRIMARY KEY, cred TEXT NOT NULL, "
+                       "updated_at REAL NOT NULL)")
+            # checked under the lock, so only one process imports the file
+            if self.json_path.exists():
+                with open(self.json_path, "r") as f:
+                    cred_data = json.load(f)
+                added = self._insert(db, cred_data, overwrite=False)
+                os.replace(self.json_path, self.json_path.with_name("creds.json.bak"))
+                print(f"Imported {added} credentials from {self.json_path} (renamed to creds.json.bak).")
+
+        self._write(migrate)
+
+    @staticmethod
+    def _insert(db, cred_data, overwrite):
+        """Insert the credentials, and return the number of conn_ids written."""
+        for conn_id, cred in cred_data.items():
+            if not isinstance(cred, dict):
+                raise ValueError(f"The credential of conn_id: '{conn_id}' is not a JSON object.")
+        verb = "INSERT OR REPLACE" if overwrite else "INSERT OR IGNORE"
+        now = time.time()
+        before = db.total_changes
+        db.executemany(f"{verb} INTO creds (conn_id, cred, updated_at) VALUES (?, ?, ?)",
+                       [(str(conn_id), json.dumps(cred), now) for conn_id, cred in cred_data.items()])
+        return db.total_changes - before
+
+    def get(self, conn_id):
+        """Return the credential dictionary of the conn_id, or None if it does not exist."""
+        rows = self._read("SELECT cred FROM creds WHERE conn_id = ?", (conn_id,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def conn_ids(self):
+        """Return the sorted conn_ids."""
+        return [row[0] for row in self._read("SELECT conn_id FROM creds ORDER BY conn_id")]
+
+    def all(self, conn_ids=None):
+        """Return {conn_id: credential} of all conn_ids, or of the given ones, from one consistent snapshot."""
+        rows = self._read("SELECT conn_id, cred FROM creds ORDER BY conn_id")
+        return {conn_id: json.loads(cred) for conn_id, cred in rows if conn_ids is None or conn_id in conn_ids}
+
+    def add(self, conn_id, cred, overwrite=False):
+        """Save the credential, and return False if the conn_id already exists (without overwrite)."""
+        return self.add_many({conn_id: cred}, overwrite=overwrite) == 1
+
+    def add_many(self, cred_data, overwrite=False):
+        """Save the {conn_id: credential} dictionary in one transaction, and return the number of conn_ids written.
+
+        Args:
+            cred_data: dictionary of the credentials by conn_id.
+            overwrite: replace the existing conn_ids instead of skipping them. Default is False.
+        """
+        return self._write(lambda db: self._insert(db, cred_data, overwrite))
+
+    def delete(self, conn_id):
+        """Delete the credential, and return False if the conn_id does not exist."""
+        return self._write(lambda db: db.execute("DELETE FROM creds WHERE conn_id = ?", (conn_id,)).rowcount == 1)
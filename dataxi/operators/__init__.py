@@ -0,0 +1,10 @@
+# __init__.py
+from .transfer import TableTransfer
+from .scheduler import Job, JobScheduler, load_jobs
+from .transform import TransformStage
+from .memory import MemoryBudget, MemoryProfiler
+from .profiling import ColumnProfiler, HyperLogLog
+from .replication import BinlogReplication
+from .federated import FederatedJoin, JoinSide
+from .fanout import FanOutTransfer, ParquetSink, Sink
+from .distributed import Coordinator, SQLiteCoordinator, TransferWorker, submit_transfer
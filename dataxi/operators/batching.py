@@ -0,0 +1,141 @@
+# File: batching.py
+
+# Description: This Package provides the adaptive batching controller, which tunes the rows per batch
+#              at runtime toward a target batch byte size and load latency, within the server limits.
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+
+import time
+
+from ..connectors.base_connector import import_pyarrow
+
+
+class AdaptiveBatcher:
+    def __init__(self, target_bytes=16 * 1024 * 1024, target_seconds=2.0, initial_rows=10000,
+                 min_rows=100, max_rows=1000000, max_bytes=None, smoothing=0.5, max_growth=2.0):
+        """Initialize the adaptive batching controller.
+
+        Args:
+            target_bytes: target size of a batch in bytes. Default is 16 MB.
+            target_seconds: target load latency of a batch in seconds. Default is 2.0.
+            initial_rows: rows of the first batch. Default is 10000.
+            min_rows: lower bound of the rows per batch. Default is 100.
+            max_rows: upper bound of the rows per batch, e.g. ClickHouse max_insert_block_size. Default is 1000000.
+            max_bytes: hard upper bound of a batch in bytes, e.g. derived from MySQL max_allowed_packet. Default is None.
+            smoothing: weight of the newest measurement in the moving averages, from 0 to 1. Default is 0.5.
+            max_growth: maximum growth factor of the batch size between two batches. Default is 2.0.
+        """
+        self.target_bytes = target_bytes
+        self.target_seconds = target_seconds
+        self.min_rows = min_rows
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.smoothing = smoothing
+        self.max_growth = max_growth
+
+        self.bytes_per_row = None  # moving average of the measured bytes per row
+        self.seconds_per_row = None  # moving average of the measured load seconds per row
+        self.rows = self._clamp(initial_rows)
+        self.num_batches = 0
+
+    @classmethod
+    def for_connector(cls, connector, **kwargs):
+        """Build a controller respecting the batch limits reported by the sink connector.
+
+        Args:
+            connector: sink connector, see BaseConnector.batch_limits().
+            **kwargs: keyword arguments of AdaptiveBatcher.
+        """
+        limits = connector.batch_limits() if hasattr(connector, "batch_limits") else {}
+        if limits.get("max_rows"):
+            kwargs["max_rows"] = min(kwargs.get("max_rows", limits["max_rows"]), limits["max_rows"])
+        if limits.get("max_bytes"):
+            kwargs["max_bytes"] = min(kwargs.get("max_bytes") or limits["max_bytes"], limits["max_bytes"])
+        return cls(**kwargs)
+
+    def _clamp(self, rows):
+        """Clamp the rows into [min_rows, max_rows] and under max_bytes."""
+        if self.max_bytes and self.bytes_per_row:
+            rows = min(rows, int(self.max_bytes / self.bytes_per_row))
+        return int(max(self.min_rows, min(self.max_rows, rows)))
+
+    def _average(self, current, value):
+        """Exponential moving average."""
+        if current is None:
+            return value
+        return self.smoothing * value + (1 - self.smoothing) * current
+
+    def estimate_size(self, bytes_per_row):
+        """Return the rows of a batch for the estimated row size, e.g. from the table statistics."""
+        self.bytes_per_row = bytes_per_row
+        return self._clamp(self.target_bytes / max(bytes_per_row, 1e-9))
+
+    def next_size(self):
+        """Return the rows of the next batch."""
+        return self.rows
+
+    def record(self, rows, num_bytes, seconds):
+        """Update the controller with the measurement of a loaded batch.
+
+        Args:
+            rows: number of rows of the batch.
+            num_bytes: size of the batch in bytes.
+            seconds: load latency of the batch in seconds.
+        """
+        if rows <= 0:
+            return
+        self.num_batches += 1
+        self.bytes_per_row = self._average(self.bytes_per_row, num_bytes / rows)
+        self.seconds_per_row = self._average(self.seconds_per_row, max(seconds, 1e-6) / rows)
+
+        candidates = [self.target_bytes / max(self.bytes_per_row, 1e-9),
+                      self.target_seconds / self.seconds_per_row]
+        new_rows = min(candidates)
+        # grow gradually to avoid overshooting the server limits, shrink immediately
+        new_rows = min(new_rows, self.rows * self.max_growth)
+        self.rows = self._clamp(new_rows)
+
+    def rebatch(self, batches):
+        """Re-slice a stream of pyarrow RecordBatches into batches of next_size() rows.
+
+        The size is decided when each batch is yielded, so call record() after loading a batch
+        and before requesting the next one.
+
+        Args:
+            batches: iterable of pyarrow RecordBatches.
+        """
+        pa = import_pyarrow()
+        pending = []
+        pending_rows = 0
+        for batch in batches:
+            if batch.num_rows == 0:
+                continue
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            while pending_rows >= self.next_size():
+                size = self.next_size()
+                table = pa.Table.from_batches(pending)
+                chunk = table.slice(0, size).combine_chunks()
+                rest = table.slice(size)
+                pending = rest.to_batches() if rest.num_rows else []
+                pending_rows = rest.num_rows
+                yield chunk.to_batches()[0] if chunk.num_rows else chunk
+        if pending_rows:
+            yield pa.Table.from_batches(pending).combine_chunks().to_batches()[0]
+
+    def load(self, batches, load_func):
+        """Rebatch the stream, call load_func on each batch and record its latency.
+
+        Args:
+            batches: iterable of pyarrow RecordBatches.
+            load_func: function called with each re-sliced batch, e.g. a bound bulk_insert().
+
+        Yields:
+            Each loaded batch.
+        """
+        for batch in self.rebatch(batches):
+            start_time = time.time()
+            load_func(batch)
+            self.record(batch.num_rows, batch.nbytes, time.time() - start_time)
+            yield batch
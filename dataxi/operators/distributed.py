@@ -0,0 +1,361 @@
+# File: distributed.py
+
+# Description: This Package provides the distributed transfers: a transfer is planned into partition tasks queued
+#              in a coordinator shared by worker processes, on one host or many. The workers lease the tasks,
+#              extend their leases with heartbeats and complete them, and the tasks of a lost worker are leased
+#              again once their lease expires.
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from .transfer import TableTransfer, open_connector, render_conditions
+
+
+PENDING, LEASED, DONE, FAILED = "pending", "leased", "done", "failed"
+
+# Parameters of a TableTransfer handled by the planning of the tasks, not by the task transfers
+PLANNED_KEYS = ("parallelism", "partition_column", "incremental_column", "resume", "progress")
+
+
+class Coordinator:
+    """Queue of the partition tasks shared by the workers.
+
+    A task is leased by one worker at a time for lease_seconds, extended by its heartbeats. A task whose lease
+    expires is leased again by another worker. Subclass it to coordinate through another backend, e.g. a
+    database table or a message queue with visibility timeouts.
+    """
+
+    def submit(self, transfer_id, tasks, max_attempts=3):
+        """Queue the tasks of a transfer and return their ids.
+
+        Args:
+            transfer_id: identifier of the transfer.
+            tasks: list of JSON-serializable task parameters.
+            max_attempts: leases of a task before it fails. Default is 3.
+        """
+        raise NotImplementedError
+
+    def lease(self, worker_id, lease_seconds):
+        """Lease the oldest pending or expired task, and return {"id", "transfer_id", "params", "attempts"} or None."""
+        raise NotImplementedError
+
+    def heartbeat(self, task_id, worker_id, lease_seconds):
+        """Extend the lease of the task, and return False if the worker lost it."""
+        raise NotImplementedError
+
+    def complete(self, task_id, worker_id, result):
+        """Record the result of the task, and return False if the worker lost its lease."""
+        raise NotImplementedError
+
+    def fail(self, task_id, worker_id, error):
+        """Release the task after a failed attempt, and return its new status (pending, or failed after max_attempts)."""
+        raise NotImplementedError
+
+    def status(self, transfer_id):
+        """Return {"transfer_id", "pending", "leased", "done", "failed", "rows", "errors"} of a transfer."""
+        raise NotImplementedError
+
+    def wait(self, transfer_id, poll_interval=5, timeout=None):
+        """Wait until no task of the transfer is pending or leased, and return its status.
+
+        Args:
+            transfer_id: identifier of the transfer.
+            poll_interval: seconds between the status checks. Default is 5.
+            timeout: maximum seconds to wait before raising TimeoutError. Default is None (no limit).
+        """
+        start_time = time.time()
+        while True:
+            status = self.status(transfer_id)
+            if not status[PENDING] and not status[LEASED]:
+                return status
+            if timeout is not None and time.time() - start_time > timeout:
+                raise TimeoutError(f"[transfer_history]Transfer {transfer_id} not finished after {timeout}s: {status}")
+            time.sleep(poll_interval)
+
+
+class SQLiteCoordinator(Coordinator):
+    def __init__(self, path=None):
+        """Initialize the coordinator of the tasks stored in a SQLite file.
+
+        The workers of one host use the same file. Each operation is one short IMMEDIATE transaction in WAL mode,
+        so the readers never wait for it. WAL needs the shared memory of one host, so the workers of several hosts
+        need another Coordinator, e.g. on a database table.
+
+        Args:
+            path: path of the SQLite file. Default is None (~/.dataxi/coordinator.db).
+        """
+        self.path = Path(path) if path else Path.home() / ".dataxi" / "coordinator.db"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._transaction() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS tasks (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                       "transfer_id TEXT NOT NULL, params TEXT NOT NULL, status TEXT NOT NULL, worker TEXT, "
+                       "lease_until REAL, attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL, "
+                       "result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, id)")
+            db.execute("CREATE INDEX IF NOT EXISTS tasks_transfer ON tasks (transfer_id)")
+
+    def _transaction(self):
+        """Return a context manager running one IMMEDIATE transaction on a new connection."""
+        coordinator = self
+
+        class _Transaction:
+            def __enter__(self):
+                self.db = sqlite3.connect(str(coordinator.path), timeout=60, isolation_level=None)
+                self.db.execute("PRAGMA journal_mode=WAL")
+                self.db.execute("BEGIN IMMEDIATE")
+                return self.db
+
+            def __exit__(self, exc_type, exc_value, traceback):
+                try:
+                    self.db.execute("COMMIT" if exc_type is None else "ROLLBACK")
+                finally:
+                    self.db.close()
+
+        return _Transaction()
+
+    def submit(self, transfer_id, tasks, max_attempts=3):
+        now = time.time()
+        with self._transaction() as db:
+            ids = [db.execute("INSERT INTO tasks (transfer_id, params, status, max_attempts, created_at, updated_at) "
+                              "VALUES (?, ?, ?, ?, ?, ?)",
+                              (transfer_id, json.dumps(params), PENDING, max_attempts, now, now)).lastrowid
+                   for params in tasks]
+        print(f"[transfer_history]Queued {len(ids)} tasks of {transfer_id} in {self.path}")
+        return ids
+
+    def lease(self, worker_id, lease_seconds):
+        now = time.time()
+        with self._transaction() as db:
+            while True:
+                row = db.execute("SELECT id, transfer_id, params, status, attempts, max_attempts FROM tasks "
+                                 "WHERE status = ? OR (status = ? AND lease_until < ?) ORDER BY id LIMIT 1",
+                                 (PENDING, LEASED, now)).fetchone()
+                if row is None:
+                    return None
+                task_id, transfer_id, params, status, attempts, max_attempts = row
+                if status == LEASED and attempts >= max_attempts:
+                    # the worker of the last attempt was lost
+                    db.execute("UPDATE tasks SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                               (FAILED, "lease expired on the last attempt", now, task_id))
+                    continue
+                if status == LEASED:
+                    print(f"[transfer_history]Lease of task {task_id} expired, leasing it again.")
+                db.execute("UPDATE tasks SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1, "
+                           "updated_at = ? WHERE id = ?", (LEASED, worker_id, now + lease_seconds, now, task_id))
+                return {"id": task_id, "transfer_id": transfer_id, "params": json.loads(params), "attempts": attempts + 1}
+
+    def heartbeat(self, task_id, worker_id, lease_seconds):
+        now = time.time()
+        with self._transaction() as db:
+            cursor = db.execute("UPDATE tasks SET lease_until = ?, updated_at = ? WHERE id = ? AND worker = ? AND status = ?",
+                                (now + lease_seconds, now, task_id, worker_id, LEASED))
+            return cursor.rowcount == 1
+
+    def complete(self, task_id, worker_id, result):
+        with self._transaction() as db:
+            cursor = db.execute("UPDATE tasks SET status = ?, result = ?, error = NULL, lease_until = NULL, updated_at = ? "
+                                "WHERE id = ? AND worker = ? AND status = ?",
+                                (DONE, json.dumps(result, default=str), time.time(), task_id, worker_id, LEASED))
+            return cursor.rowcount == 1
+
+    def fail(self, task_id, worker_id, error):
+        with self._transaction() as db:
+            row = db.execute("SELECT attempts, max_attempts FROM tasks WHERE id = ? AND worker = ? AND status = ?",
+                             (task_id, worker_id, LEASED)).fetchone()
+            if row is None:
+                return None  # leased again by another worker meanwhile
+            status = PENDING if row[0] < row[1] else FAILED
+            db.execute("UPDATE tasks SET status = ?, error = ?, lease_until = NULL, updated_at = ? WHERE id = ?",
+                       (status, str(error), time.time(), task_id))
+            return status
+
+    def status(self, transfer_id):
+        with self._transaction() as db:
+            rows = db.execute("SELECT id, status, result, error FROM tasks WHERE transfer_id = ?", (transfer_id,)).fetchall()
+        status = {"transfer_id": transfer_id, PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0, "rows": 0, "errors": {}}
+        for task_id, task_status, result, error in rows:
+            status[task_status] += 1
+            if task_status == DONE and result:
+                status["rows"] += json.loads(result).get("rows") or 0
+            elif task_status == FAILED:
+                status["errors"][task_id] = error
+        return status
+
+
+def get_coordinator(coordinator=None):
+    """Return the coordinator of a Coordinator object or the path of a SQLite coordinator file."""
+    if isinstance(coordinator, Coordinator):
+        return coordinator
+    return SQLiteCoordinator(coordinator)
+
+
+def submit_transfer(coordinator, transfer_id=None, partitions=1, max_attempts=3, **params):
+    """Plan a transfer into partition tasks and queue them in the coordinator.
+
+    The incremental watermark and the partition ranges are computed once here, each task is the TableTransfer of one
+    range. The staged load modes and resume are not distributed: the retry of a task deletes the rows of its range
+    loaded by the previous attempt instead (insert mode), or overwrites them (upsert mode). The deleted range is
+    the partition range only, a source where does not apply to the sink, so it is rejected in the insert mode
+    with retries.
+
+    Args:
+        coordinator: Coordinator object or path of a SQLite coordinator file.
+        transfer_id: identifier of the transfer. Default is None (the sink table and a random suffix).
+        partitions: number of partition tasks, split on partition_column. Default is 1.
+        max_attempts: leases of a task before it fails. Default is 3.
+        **params: keyword arguments for TableTransfer, JSON-serializable: conn_ids for src and dst.
+
+    Returns:
+        The transfer_id.
+    """
+    if not isinstance(params.get("src"), str) or not isinstance(params.get("dst"), str):
+        raise ValueError("A distributed transfer needs conn_ids for src and dst, the workers open their own connections.")
+    if params.get("load_mode", "insert") not in ("insert", "upsert"):
+        raise ValueError("A distributed transfer supports the 'insert' and 'upsert' load modes.")
+    if params.get("where") and params.get("load_mode", "insert") == "insert" and max_attempts > 1:
+        raise ValueError("The retry of an insert-mode task deletes its partition range from the sink, which a source "
+                         "where would not restrict: use the upsert mode, or max_attempts=1.")
+    coordinator = get_coordinator(coordinator)
+    transfer = TableTransfer(**dict(params, parallelism=partitions, resume=False))
+    base = {key: value for key, value in params.items() if key not in PLANNED_KEYS}
+    user_where = [f"({transfer.where})"] if transfer.where else []
+    tasks = []
+    src, own_src = open_connector(transfer.src, route="read", **transfer.src_kwargs)
+    try:
+        dst, own_dst = open_connector(transfer.dst, route="write", **transfer.dst_kwargs)
+        try:
+            conditions = transfer._incremental_conditions(dst)
+            for partition in transfer._partition_conditions(src, conditions):
+                # the range filters the source, and is deleted from the sink before an insert-mode retry
+                where = " AND ".join(user_where + render_conditions(partition, src)) or None
+                cleanup = " AND ".join(render_conditions(partition, dst)) or None
+                tasks.append(dict(base, where=where, cleanup=cleanup))
+        finally:
+            if own_dst:
+                dst.close()
+    finally:
+        if own_src:
+            src.close()
+
+    transfer_id = transfer_id or f"{transfer.dst_table}-{uuid.uuid4().hex[:8]}"
+    coordinator.submit(transfer_id, tasks, max_attempts=max_attempts)
+    return transfer_id
+
+
+class TransferWorker:
+    def __init__(self, coordinator=None, worker_id=None, lease_seconds=60, poll_interval=5):
+        """Initialize a worker running the partition tasks of a coordinator.
+
+        Args:
+            coordinator: Coordinator object or path of a SQLite coordinator file. Default is None (~/.dataxi/coordinator.db).
+            worker_id: identifier of the worker. Default is None (host name and process id).
+            lease_seconds: lease of a task, extended by a heartbeat every third of it. A worker silent for longer
+                loses its task to another worker. Default is 60.
+            poll_interval: seconds between the lease attempts when the queue is empty. Default is 5.
+        """
+        self.coordinator = get_coordinator(coordinator)
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.stats = {"worker": self.worker_id, "tasks": 0, "succeeded": 0, "failed": 0, "rows": 0}
+
+    def run(self, max_tasks=None, exit_when_idle=False):
+        """Lease and run tasks until max_tasks are run, or the queue is empty with exit_when_idle.
+
+        Returns:
+            The statistics of the worker: worker, tasks, succeeded, failed, rows.
+        """
+        print(f"[transfer_history]Worker {self.worker_id} started.")
+        while max_tasks is None or self.stats["tasks"] < max_tasks:
+            task = self.coordinator.lease(self.worker_id, self.lease_seconds)
+            if task is None:
+                if exit_when_idle:
+                    break
+                time.sleep(self.poll_interval)
+                continue
+            self.run_task(task)
+        print(f"[transfer_history]Worker {self.worker_id} stopped: {self.stats}")
+        return self.stats
+
+    def _heartbeat(self, task, stop, connectors):
+        """Extend the lease of the task until stop is set.
+
+        The connectors of the task are interrupted when the lease is lost, or would expire before the next
+        heartbeat, so the transfer stops before another worker leases the task again.
+        """
+        interval = self.lease_seconds / 3
+        lease_until = time.time() + self.lease_seconds
+        while not stop.wait(interval):
+            renewed_at = time.time()
+            try:
+                if not self.coordinator.heartbeat(task["id"], self.worker_id, self.lease_seconds):
+                    print(f"[transfer_history]Worker {self.worker_id} lost the lease of task {task['id']}.")
+                    break
+                lease_until = renewed_at + self.lease_seconds
+            except Exception as e:
+                # a missed heartbeat is retried while the lease lasts
+                print(f"[transfer_history]Heartbeat of task {task['id']} failed: {e}")
+            if time.time() + interval >= lease_until:
+                print(f"[transfer_history]Lease of task {task['id']} not renewed, stopping the task.")
+                break
+        else:
+            return
+        for connector in connectors:
+            connector.interrupt()
+
+    def _cleanup(self, dst, params, cleanup):
+        """Delete the rows of the task range loaded by a previous attempt, before an insert reloads them."""
+        if cleanup is None:
+            raise Exception("[transfer_history]Cannot retry the task safely: it has no partition range to delete. "
+                            "Use the upsert mode or partition the transfer.")
+        dst.delete_rows(params.get("dst_table") or params["table"], cleanup)
+
+    def run_task(self, task):
+        """Run one leased task, heartbeating its lease, and report its outcome to the coordinator."""
+        self.stats["tasks"] += 1
+        params = dict(task["params"])
+        cleanup = params.pop("cleanup", None)
+        print(f"[transfer_history]Worker {self.worker_id} running task {task['id']} of {task['transfer_id']}, "
+              f"attempt number: {task['attempts']}.")
+        connectors = []
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(task, stop, connectors), daemon=True)
+        heartbeat.start()
+        try:
+            # the task connections are opened here, so that a lost lease interrupts their statements
+            src, _ = open_connector(params["src"], route="read", **params.get("src_kwargs", {}))
+            connectors.append(src)
+            dst, _ = open_connector(params["dst"], route="write", **params.get("dst_kwargs", {}))
+            connectors.append(dst)
+            if task["attempts"] > 1 and params.get("load_mode", "insert") == "insert":
+                self._cleanup(dst, params, cleanup)
+            result = TableTransfer(**dict(params, src=src, dst=dst)).run()
+        except KeyboardInterrupt:
+            # release the task for the other workers right away instead of at the end of its lease
+            self.coordinator.fail(task["id"], self.worker_id, "worker interrupted")
+            raise
+        except Exception as e:
+            status = self.coordinator.fail(task["id"], self.worker_id, e)
+            self.stats["failed"] += 1
+            print(f"[transfer_history]Task {task['id']} failed ({status}): {e}")
+            return None
+        finally:
+            stop.set()
+            heartbeat.join()
+            for connector in connectors:
+                connector.close()
+        if self.coordinator.complete(task["id"], self.worker_id, result):
+            self.stats["succeeded"] += 1
+            self.stats["rows"] += result["rows"]
+        else:
+            print(f"[transfer_history]Task {task['id']} was leased again by another worker, its result is dropped.")
+        return result
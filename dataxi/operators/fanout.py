@@ -0,0 +1,410 @@
+# File: fanout.py
+
+# Description: This Package provides the fan-out (tee) transfers: the source is read once and every batch is
+#              loaded into several sinks at the same time (connectors or Parquet archives). Each sink has its own
+#              writer thread, buffer, retries and backpressure, and a slow sink spills its backlog to disk instead
+#              of slowing the source and the other sinks.
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+
+import collections
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from ..connectors.base_connector import import_pyarrow
+from ..connectors.type_mapping import ColumnConverter, arrow_schema
+from .metrics import record_transfer
+from .transfer import TableTransfer, conn_label, open_connector
+
+
+class ParquetSink:
+    def __init__(self, path, compression="zstd"):
+        """Parquet archive of a fan-out transfer, written batch by batch into one file.
+
+        The file is written under a temporary name and renamed when the transfer completes, so an archive is
+        never left half written.
+
+        Args:
+            path: path of the Parquet file.
+            compression: Parquet compression codec. Default is 'zstd'.
+        """
+        self.path = Path(path)
+        self.compression = compression
+        self._part_path = self.path.with_name(self.path.name + ".part")
+        self._writer = None
+        self._schema = None
+
+    @property
+    def label(self):
+        return f"parquet:{self.path}"
+
+    def write(self, batch):
+        """Append the batch to the file, cast into the schema of the first batch."""
+        import pyarrow.parquet as pq
+
+        pa = import_pyarrow()
+        table = pa.Table.from_batches([batch])
+        if self._writer is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._schema = table.schema
+            self._writer = pq.ParquetWriter(str(self._part_path), self._schema, compression=self.compression)
+        elif table.schema != self._schema:
+            table = table.cast(self._schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        """Complete the file."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            os.replace(self._part_path, self.path)
+            print(f"[insert_history]Parquet archive written: {self.path}")
+
+    def abort(self):
+        """Remove the incomplete file."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._part_path.unlink(missing_ok=True)
+
+
+class Sink:
+    def __init__(self, dst, table=None, load_mode="insert", key_columns=None, map_types=True, dst_kwargs=None,
+                 attempts=3, retry_delay=2, buffer_bytes=256 * 1024 * 1024, spill=True, spill_limit=None):
+        """A sink of a fan-out transfer.
+
+        Args:
+            dst: conn_id, connector object, ParquetSink or path of a .parquet file.
+            table: sink table. Default is None (the source table).
+            load_mode: 'insert' or 'upsert'. An upsert makes the retry of a failed batch idempotent. Default is 'insert'.
+            key_columns: key columns of the upsert. Default is None.
+            map_types: convert each batch into the sink column types. Default is True.
+            dst_kwargs: keyword arguments for building the sink connector. Default is None.
+            attempts: attempts of each batch before the sink fails. Default is 3.
+            retry_delay: seconds before the first retry of a batch, doubled on every attempt. Default is 2.
+            buffer_bytes: bytes of the batches waiting in memory for the sink. Default is 256 MB.
+            spill: spill the batches above buffer_bytes to disk instead of blocking the source. Default is True.
+            spill_limit: bytes of the spilled batches above which the source waits for the sink. Default is None
+                (no limit).
+        """
+        if isinstance(dst, (str, os.PathLike)) and str(dst).endswith(".parquet"):
+            dst = ParquetSink(dst)
+        if load_mode not in ("insert", "upsert"):
+            raise ValueError(f"A fan-out sink supports the 'insert' and 'upsert' load modes, got '{load_mode}'.")
+        self.dst = dst
+        self.table = table
+        self.load_mode = load_mode
+        self.key_columns = key_columns
+        self.map_types = map_types
+        self.dst_kwargs = dst_kwargs or {}
+        self.attempts = max(1, int(attempts))
+        self.retry_delay = retry_delay
+        self.buffer_bytes = buffer_bytes
+        self.spill = spill
+        self.spill_limit = spill_limit
+
+    @classmethod
+    def of(cls, sink):
+        """Return a Sink of a Sink, a dictionary of its arguments, or a conn_id/connector/path."""
+        if isinstance(sink, Sink):
+            return sink
+        if isinstance(sink, dict):
+            return cls(**sink)
+        return cls(sink)
+
+    @property
+    def label(self):
+        if isinstance(self.dst, ParquetSink):
+            return self.dst.label
+        return conn_label(self.dst) if self.table is None else f"{conn_label(self.dst)}:{self.table}"
+
+
+class _SinkWriter:
+    def __init__(self, sink, table, spill_dir):
+        """Writer thread of one sink, fed in order through a queue of in-memory and spilled batches."""
+        self.sink = sink
+        self.table = sink.table or table
+        self.label = sink.label
+        self.stats = {"rows": 0, "bytes": 0, "retries": 0, "spilled_batches": 0, "spilled_bytes": 0,
+                      "blocked_seconds": 0.0, "seconds": 0.0, "error": None}
+        self.error = None
+        self._spill_dir = spill_dir
+        self._spill_path = None
+        self._queue = collections.deque()  # (batch or spill file path, nbytes)
+        self._memory_bytes = 0
+        self._pending_spill_bytes = 0
+        self._closed = False
+        self._aborted = False
+        self._cond = threading.Condition()
+        self._start_time = time.time()
+
+        self._parquet = sink.dst if isinstance(sink.dst, ParquetSink) else None
+        self._connector, self._owned = (None, False) if self._parquet else open_connector(sink.dst, route="write",
+                                                                                          **sink.dst_kwargs)
+        self._converter = None
+        if self._connector is not None and sink.map_types:
+            try:
+                # ClickHouse stores NaN, the other sinks reject it
+                self._converter = ColumnConverter(arrow_schema(self._connector, self.table),
+                                                  nan_to_null=getattr(self._connector, "db_type", None) != "clickhouse")
+            except Exception as e:
+                print(f"[transfer_history]Sink column types of {self.label} not available, leaving the conversion to the driver: {e}")
+        self._thread = threading.Thread(target=self._run, name=f"dataxi-sink-{self.label}", daemon=True)
+        self._thread.start()
+
+    def put(self, batch):
+        """Queue the batch for the sink: in memory, spilled above the buffer, or waiting above the spill limit."""
+        nbytes = batch.nbytes
+        start_time = time.time()
+        with self._cond:
+            while self.error is None:
+                if not self._memory_bytes or self._memory_bytes + nbytes <= self.sink.buffer_bytes:
+                    self._queue.append((batch, nbytes))
+                    self._memory_bytes += nbytes
+                    break
+                if self.sink.spill and (self.sink.spill_limit is None
+                                        or self._pending_spill_bytes + nbytes <= self.sink.spill_limit):
+                    self._queue.append((self._spill(batch), nbytes))
+                    self._pending_spill_bytes += nbytes
+                    break
+                # backpressure: the source waits for this sink only
+                self._cond.wait(1)
+            # a failed sink drops the rest, the other sinks continue
+            self._cond.notify_all()
+        self.stats["blocked_seconds"] += time.time() - start_time
+
+    def _spill(self, batch):
+        """Write the batch into an Arrow IPC file and return its path."""
+        pa = import_pyarrow()
+        if self._spill_path is None:
+            self._spill_path = Path(tempfile.mkdtemp(prefix="dataxi-tee-", dir=self._spill_dir))
+            print(f"[transfer_history]Sink {self.label} is behind, spilling its batches under {self._spill_path}")
+        path = self._spill_path / f"{self.stats['spilled_batches']}.arrow"
+        with pa.ipc.new_file(str(path), batch.schema) as writer:
+            writer.write_batch(batch)
+        self.stats["spilled_batches"] += 1
+        self.stats["spilled_bytes"] += batch.nbytes
+        return path
+
+    def _next(self):
+        """Return the next (batch, nbytes), or None when the queue is closed and empty."""
+        pa = import_pyarrow()
+        with self._cond:
+            while not self._queue and not self._closed and not self._aborted:
+                self._cond.wait()
+            if self._aborted or not self._queue:
+                return None
+            item, nbytes = self._queue.popleft()
+            if isinstance(item, Path):
+                self._pending_spill_bytes -= nbytes
+            else:
+                self._memory_bytes -= nbytes
+            self._cond.notify_all()
+        if isinstance(item, Path):
+            with pa.OSFile(str(item)) as source:
+                batch = pa.ipc.open_file(source).get_batch(0)
+            item.unlink(missing_ok=True)
+            return batch, nbytes
+        return item, nbytes
+
+    def _insert(self, batch):
+        if self._parquet is not None:
+            self._parquet.write(batch)
+            return
+        if self._converter is not None:
+            batch = self._converter(batch)
+        self._connector.bulk_insert(self.table, batch, mode=self.sink.load_mode, key_columns=self.sink.key_columns)
+
+    def _rollback(self):
+        """Roll back the uncommitted rows of a failed batch, for the sinks with transactions."""
+        try:
+            rollback = getattr(self._connector._connection(), "rollback", None)
+            if rollback is not None:
+                rollback()
+        except Exception:
+            pass
+
+    def _run(self):
+        while True:
+            entry = self._next()
+            if entry is None:
+                break
+            batch, nbytes = entry
+            for attempt in range(1, self.sink.attempts + 1):
+                try:
+                    self._insert(batch)
+                    break
+                except Exception as e:
+                    if self._connector is not None:
+                        self._rollback()
+                    if attempt == self.sink.attempts:
+                        self._fail(e)
+                        return
+                    delay = self.sink.retry_delay * (2 ** (attempt - 1))
+                    self.stats["retries"] += 1
+                    print(f"[transfer_history]Batch of {self.label} failed, retrying it in {delay}s. Error: {e}")
+                    time.sleep(delay)
+            self.stats["rows"] += batch.num_rows
+            self.stats["bytes"] += nbytes
+
+    def _fail(self, error):
+        """Stop the sink after a batch failed all its attempts, dropping its backlog."""
+        print(f"[transfer_history]Sink {self.label} failed, the other sinks continue. Error: {error}")
+        with self._cond:
+            self.error = error
+            self.stats["error"] = str(error)
+            self._queue.clear()
+            self._memory_bytes = self._pending_spill_bytes = 0
+            self._cond.notify_all()
+
+    def finish(self):
+        """Wait until the queued batches are loaded, and complete the sink."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._cleanup(completed=self.error is None)
+
+    def abort(self):
+        """Stop the writer without loading its backlog."""
+        with self._cond:
+            self._aborted = True
+            self._queue.clear()
+            self._cond.notify_all()
+        self._thread.join()
+        self._cleanup(completed=False)
+
+    def _cleanup(self, completed):
+        self.stats["seconds"] = time.time() - self._start_time
+        if self._spill_path is not None:
+            shutil.rmtree(self._spill_path, ignore_errors=True)
+        try:
+            if self._parquet is not None:
+                if completed:
+                    self._parquet.close()
+                else:
+                    self._parquet.abort()
+        finally:
+            if self._owned:
+                self._connector.close()
+
+
+class FanOutTransfer:
+    # the extraction query is built like the one of a TableTransfer
+    build_query = TableTransfer.build_query
+
+    def __init__(self, src, table, sinks, query=None, where=None, columns=None, batch_size=None, map_types=True,
+                 src_kwargs=None, spill_dir=None, progress=None, fail_on_error=True):
+        """Initialize the transfer of one table into several sinks, reading the source once.
+
+        Each sink is loaded by its own thread from its own queue, so a slow sink only delays itself: its backlog
+        is buffered in memory up to buffer_bytes, then spilled to disk (or waited for, see Sink). A batch failing
+        all its attempts stops its sink only, the others complete.
+
+        Args:
+            src: source conn_id or connector object.
+            table: source table, and sink table of the sinks without one.
+            sinks: list of sinks: Sink objects, dictionaries of Sink arguments, conn_ids, connectors or .parquet paths.
+            query: custom extraction query, replacing the generated SELECT. Default is None.
+            where: filter condition of the generated SELECT. Default is None.
+            columns: list of columns of the generated SELECT. Default is None (all columns).
+            batch_size: number of rows per batch. Default is None (connector default).
+            map_types: read the source column types to build the batches. Default is True.
+            src_kwargs: keyword arguments for building the source connector. Default is None.
+            spill_dir: folder of the spilled batches. Default is None (the temporary folder).
+            progress: TransferProgress object updated after each extracted batch. Default is None.
+            fail_on_error: raise at the end when a sink failed, after the other sinks completed. Default is True.
+        """
+        self.src = src
+        self.table = table
+        self.sinks = [Sink.of(sink) for sink in sinks]
+        if not self.sinks:
+            raise ValueError("A fan-out transfer needs at least one sink.")
+        labels = [sink.label for sink in self.sinks]
+        if len(set(labels)) != len(labels):
+            raise ValueError(f"Duplicated sinks: {', '.join(labels)}")
+        self.query = query
+        self.where = where
+        self.columns = columns
+        self.batch_size = batch_size
+        self.map_types = map_types
+        self.src_kwargs = src_kwargs or {}
+        self.spill_dir = spill_dir
+        self.progress = progress
+        self.fail_on_error = fail_on_error
+
+    def run(self):
+        """Run the transfer and return its statistics.
+
+        Returns:
+            A dictionary with table, rows, bytes and seconds of the extraction, and sinks (label -> rows, bytes,
+            retries, spilled_batches, spilled_bytes, blocked_seconds, seconds and error of each sink).
+        """
+        start_time = time.time()
+        src, own_src = open_connector(self.src, route="read", **self.src_kwargs)
+        writers = []
+        batches = None
+        completed = False
+        try:
+            schema = None
+            if self.map_types and not self.query:
+                try:
+                    schema = arrow_schema(src, self.table, self.columns)
+                except Exception as e:
+                    print(f"[transfer_history]Source column types of {self.table} not available, inferring them: {e}")
+            for sink in self.sinks:
+                writers.append(_SinkWriter(sink, self.table, self.spill_dir))
+            print(f"[transfer_history]Transferring {self.table} -> {', '.join(writer.label for writer in writers)}")
+
+            num_rows = num_bytes = 0
+            query = self.build_query()
+            batches = src.stream(query, batch_size=self.batch_size, schema=schema) if schema is not None \
+                else src.stream(query, batch_size=self.batch_size)
+            for batch in batches:
+                if not batch.num_rows:
+                    continue
+                for writer in writers:
+                    writer.put(batch)
+                num_rows += batch.num_rows
+                num_bytes += batch.nbytes
+                if self.progress is not None:
+                    self.progress.update(batch.num_rows, batch.nbytes)
+                if all(writer.error is not None for writer in writers):
+                    raise Exception(f"[transfer_history]All the sinks of {self.table} failed.")
+            for writer in writers:
+                writer.finish()
+            completed = True
+        finally:
+            # the stream is closed before the connection, the garbage collector would close its cursor after it
+            if batches is not None:
+                batches.close()
+            if not completed:
+                for writer in writers:
+                    writer.abort()
+            if own_src:
+                src.close()
+
+        seconds = time.time() - start_time
+        result = {"table": self.table, "rows": num_rows, "bytes": num_bytes, "seconds": seconds,
+                  "sinks": {writer.label: writer.stats for writer in writers}}
+        for writer in writers:
+            stats = writer.stats
+            print(f"[transfer_history]Sink {writer.label}: {stats['rows']} rows in {stats['seconds']:.1f}s, "
+                  f"{stats['retries']} retries, {stats['spilled_bytes']} bytes spilled, "
+                  f"blocked the source {stats['blocked_seconds']:.1f}s" + (f", failed: {stats['error']}" if stats["error"] else ""))
+            if writer.error is None and writer._connector is not None:
+                record_transfer(conn_label(self.src), conn_label(writer.sink.dst),
+                                {"table": self.table, "dst_table": writer.table, "rows": stats["rows"],
+                                 "bytes": stats["bytes"], "seconds": stats["seconds"]})
+        print(f"[transfer_history]Read {num_rows} rows ({num_bytes} bytes) of {self.table} once for "
+              f"{len(writers)} sinks in {seconds:.1f}s")
+        failed = [writer for writer in writers if writer.error is not None]
+        if failed and self.fail_on_error:
+            raise Exception(f"[transfer_history]Fan-out of {self.table} failed for the sinks: "
+                            + "; ".join(f"{writer.label} ({writer.error})" for writer in failed))
+        return result
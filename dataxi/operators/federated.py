@@ -0,0 +1,373 @@
+# File: federated.py
+
+# Description: This Package provides the federated joins across conn_ids: the filters and columns of each side
+#              are pushed into its source query, both sides are streamed as Arrow batches and joined locally by
+#              the vectorized hash join of Arrow (Acero). A build side larger than the memory limit is hash
+#              partitioned to disk with the probe side and joined partition by partition (grace hash join).
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+
+import itertools
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from ..connectors.base_connector import import_pyarrow
+from .transfer import conn_label, open_connector
+
+
+# Join types of FederatedJoin and the Acero join types they run as
+JOIN_TYPES = {
+    "inner": "inner",
+    "left": "left outer",
+    "right": "right outer",
+    "outer": "full outer",
+    "semi": "left semi",
+    "anti": "left anti",
+}
+
+
+class JoinSide:
+    def __init__(self, conn, table=None, query=None, columns=None, filters=None, batch_size=None, conn_kwargs=None):
+        """A side of a federated join: the table or query of a conn_id, with the filters and columns pushed into it.
+
+        Args:
+            conn: conn_id or connector object.
+            table: source table of a SQL connector. Default is None.
+            query: source query, the search of a Splunk side. Default is None.
+            columns: columns to read, the join keys are added. Default is None (all columns). Required for Splunk,
+                whose events do not share their fields.
+            filters: conditions pushed into the source query: Expr objects (see connectors.col) or raw conditions
+                of the source dialect, Splunk 'where' expressions for a Splunk side. Default is None.
+            batch_size: rows per streamed batch. Default is None (the connector default).
+            conn_kwargs: keyword arguments for building the connector, e.g. earliest/latest/time_slices of
+                Splunk. Default is None.
+        """
+        if (table is None) == (query is None):
+            raise ValueError("A join side needs either a table or a query.")
+        self.conn = conn
+        self.table = table
+        self.query = query
+        self.columns = list(columns) if columns else None
+        self.filters = list(filters or [])
+        self.batch_size = batch_size
+        self.conn_kwargs = conn_kwargs or {}
+
+    @classmethod
+    def of(cls, side):
+        """Return a JoinSide of a JoinSide or a dictionary of its arguments."""
+        return side if isinstance(side, JoinSide) else cls(**side)
+
+    @property
+    def label(self):
+        return f"{conn_label(self.conn)}:{self.table or 'query'}"
+
+    def batches(self, connector, keys):
+        """Stream the side, with the filters and the columns (and keys) pushed into the source query."""
+        columns = self.columns and self.columns + [key for key in keys if key not in self.columns]
+        if connector.db_type == "splunk":
+            if not columns:
+                raise ValueError(f"The Splunk side {self.label} needs its columns.")
+            if not all(isinstance(condition, str) for condition in self.filters):
+                raise ValueError(f"The filters of the Splunk side {self.label} must be 'where' expressions.")
+            search = self.query + "".join(f" | where {condition}" for condition in self.filters)
+            search += " | table " + " ".join(columns)
+            return connector.stream(search, batch_size=self.batch_size, columns=columns)
+        frame = connector.frame(table=self.table, query=self.query)
+        if self.filters:
+            frame = frame.filter(*self.filters)
+        if columns:
+            frame = frame.select(*columns)
+        schema = None
+        if self.table is not None:
+            from ..connectors.type_mapping import arrow_schema
+            try:
+                schema = arrow_schema(connector, self.table, columns)
+            except Exception as e:
+                print(f"[query_history]Column types of {self.table} not available, inferring them: {e}")
+        return frame.stream(self.batch_size, schema=schema)
+
+
+def _conform(pa, batches, schema):
+    """Yield the batches with the columns and types of the schema, the inferred types may differ between batches."""
+    for batch in batches:
+        if batch.schema.equals(schema):
+            yield batch
+            continue
+        columns = []
+        for field in schema:
+            index = batch.schema.get_field_index(field.name)
+            column = batch.column(index) if index >= 0 else pa.nulls(batch.num_rows, field.type)
+            columns.append(column if column.type == field.type else column.cast(field.type, safe=False))
+        yield pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def _reader_schema(pa, batch):
+    """Return the schema of a side from its first batch. The columns null in it are read as strings."""
+    return pa.schema([pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field
+                      for field in batch.schema])
+
+
+def _common_key_type(pa, left_type, right_type):
+    """Return the type both key columns are cast to, so they can be compared."""
+    if left_type == right_type:
+        return left_type
+    if pa.types.is_integer(left_type) and pa.types.is_integer(right_type):
+        return pa.int64()
+    if all(pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_decimal(t) for t in (left_type, right_type)):
+        return pa.float64()
+    return pa.string()
+
+
+def partition_ids(batch, keys, num_partitions):
+    """Return the hash partition (numpy array) of each row of the batch by its keys.
+
+    The keys are hashed as strings, so a value gets the same partition whatever the batch it is in.
+    """
+    import numpy as np
+    import pandas as pd
+    import pyarrow.compute as pc
+
+    pa = import_pyarrow()
+    hashes = np.zeros(batch.num_rows, dtype=np.uint64)
+    for key in keys:
+        values = pc.fill_null(pc.cast(batch.column(key), pa.string()), "")
+        hashes = hashes * np.uint64(1000003) + pd.util.hash_array(values.to_numpy(zero_copy_only=False))
+    return hashes % np.uint64(num_partitions)
+
+
+class _SpillFiles:
+    def __init__(self, spill_dir, num_partitions, build_schema, probe_schema, build_keys, probe_keys):
+        """Hash partitions of both sides of a join, written as Arrow IPC streams into a temporary folder."""
+        pa = import_pyarrow()
+        self.path = Path(tempfile.mkdtemp(prefix="dataxi-join-", dir=spill_dir))
+        self.num_partitions = num_partitions
+        self.schemas = {"build": build_schema, "probe": probe_schema}
+        self.keys = {"build": build_keys, "probe": probe_keys}
+        self.bytes = 0
+        self._writers = {side: [pa.ipc.new_stream(str(self._file(side, p)), self.schemas[side])
+                                for p in range(num_partitions)] for side in ("build", "probe")}
+
+    def _file(self, side, partition):
+        return self.path / f"{side}_{partition}.arrow"
+
+    def write(self, side, batch):
+        """Split the batch by partition and append each part to its file."""
+        import numpy as np
+
+        if not batch.num_rows:
+            return
+        ids = partition_ids(batch, self.keys[side], self.num_partitions)
+        order = np.argsort(ids, kind="stable")
+        batch = batch.take(order)
+        counts = np.bincount(ids.astype(np.int64), minlength=self.num_partitions)
+        start = 0
+        for partition, count in enumerate(counts):
+            if count:
+                self._writers[side][partition].write_batch(batch.slice(start, int(count)))
+                start += int(count)
+        self.bytes += batch.nbytes
+
+    def close_writers(self):
+        for writer in itertools.chain(*self._writers.values()):
+            writer.close()
+
+    def read(self, side, partition):
+        """Return the RecordBatchReader of a partition."""
+        pa = import_pyarrow()
+        return pa.ipc.open_stream(pa.memory_map(str(self._file(side, partition))))
+
+    def cleanup(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class FederatedJoin:
+    def __init__(self, left, right, on, right_on=None, how="inner", suffixes=("", "_right"),
+                 memory_limit=512 * 1024 * 1024, spill_partitions=16, spill_dir=None):
+        """Initialize the join of two sources, possibly of different conn_ids.
+
+        The right side is the build side of the hash join, held in memory, and the left side is streamed
+        through it: put the smaller side on the right. When the right side exceeds memory_limit, both sides
+        are hash partitioned to disk and the partitions are joined one by one; each build partition must fit
+        in memory, raise spill_partitions for larger sides.
+
+        Args:
+            left: JoinSide, or a dictionary of its arguments, e.g. {"conn": "ch_dw", "table": "events",
+                "filters": [col("dt") >= "2026-10-01"]}.
+            right: JoinSide or dictionary of the build side.
+            on: join key column(s) of the left side, and of the right side without right_on.
+            right_on: join key column(s) of the right side. Default is None (on).
+            how: 'inner', 'left', 'right', 'outer', 'semi' or 'anti'. Default is 'inner'.
+            suffixes: suffixes of the left and right columns with the same name. Default is ("", "_right").
+            memory_limit: bytes of the right side held in memory before spilling. Default is 512 MB.
+            spill_partitions: number of hash partitions of the spilled sides. Default is 16.
+            spill_dir: folder of the spilled partitions. Default is None (the temporary folder).
+        """
+        if how not in JOIN_TYPES:
+            raise ValueError(f"Invalid join type '{how}', expected one of: {', '.join(JOIN_TYPES)}.")
+        self.left = JoinSide.of(left)
+        self.right = JoinSide.of(right)
+        self.left_keys = [on] if isinstance(on, str) else list(on)
+        self.right_keys = self.left_keys if right_on is None else ([right_on] if isinstance(right_on, str) else list(right_on))
+        if len(self.left_keys) != len(self.right_keys):
+            raise ValueError("on and right_on must have the same number of columns.")
+        self.how = how
+        self.suffixes = suffixes
+        self.memory_limit = memory_limit
+        self.spill_partitions = spill_partitions
+        self.spill_dir = spill_dir
+        self.stats = {}
+
+    def _key_types(self, pa, left_schema, right_schema):
+        """Return the common type of each key pair whose types differ, {index: type}."""
+        casts = {}
+        for index, (left_key, right_key) in enumerate(zip(self.left_keys, self.right_keys)):
+            left_type, right_type = left_schema.field(left_key).type, right_schema.field(right_key).type
+            if left_type != right_type:
+                casts[index] = _common_key_type(pa, left_type, right_type)
+        return casts
+
+    @staticmethod
+    def _cast_keys(pa, schema, keys, casts):
+        """Return the schema with the key columns of the casts retyped."""
+        for index, key_type in casts.items():
+            position = schema.get_field_index(keys[index])
+            schema = schema.set(position, pa.field(keys[index], key_type))
+        return schema
+
+    def _join(self, pa, probe_reader, build_table):
+        """Yield the joined batches of a probe stream and an in-memory build table with Acero."""
+        from pyarrow import acero
+
+        left = acero.Declaration("record_batch_reader_source", acero.RecordBatchReaderSourceNodeOptions(probe_reader))
+        right = acero.Declaration("table_source", acero.TableSourceNodeOptions(build_table))
+        options = acero.HashJoinNodeOptions(JOIN_TYPES[self.how], left_keys=self.left_keys, right_keys=self.right_keys,
+                                            output_suffix_for_left=self.suffixes[0],
+                                            output_suffix_for_right=self.suffixes[1])
+        join = acero.Declaration("hashjoin", options, inputs=[left, right])
+        for batch in join.to_reader(use_threads=True):
+            if batch.num_rows:
+                yield self._coalesce_keys(batch)
+
+    def _coalesce_keys(self, batch):
+        """Merge the key columns of the same name into the left one, like a SQL USING join."""
+        import pyarrow.compute as pc
+
+        if self.how in ("semi", "anti"):
+            return batch
+        for left_key, right_key in zip(self.left_keys, self.right_keys):
+            if left_key != right_key:
+                continue
+            right_name = right_key + self.suffixes[1]
+            left_name = left_key + self.suffixes[0]
+            left_index, right_index = batch.schema.get_field_index(left_name), batch.schema.get_field_index(right_name)
+            if left_index < 0 or right_index < 0:
+                continue
+            if self.how in ("right", "outer"):
+                # the rows of the right side without a match have a null left key
+                batch = batch.set_column(left_index, left_key, pc.coalesce(batch.column(left_index), batch.column(right_index)))
+            else:
+                batch = batch.set_column(left_index, left_key, batch.column(left_index))
+            batch = batch.remove_column(batch.schema.get_field_index(right_name))
+        return batch
+
+    def stream(self):
+        """Run the join and yield the joined rows as pyarrow RecordBatches, in no particular order."""
+        pa = import_pyarrow()
+        start_time = time.time()
+        self.stats = {"left_rows": 0, "right_rows": 0, "rows": 0, "spilled_bytes": 0, "partitions": 0}
+        left_conn, own_left = open_connector(self.left.conn, route="read", **self.left.conn_kwargs)
+        right_conn, own_right = None, False
+        probe = build = spill = None
+        try:
+            right_conn, own_right = open_connector(self.right.conn, route="read", **self.right.conn_kwargs)
+            print(f"[query_history]Federated {self.how} join of {self.left.label} with {self.right.label} "
+                  f"on {', '.join(self.left_keys)}")
+            probe = iter(self.left.batches(left_conn, self.left_keys))
+            build = iter(self.right.batches(right_conn, self.right_keys))
+            probe_first, build_first = next(probe, None), next(build, None)
+            if probe_first is None or build_first is None:
+                # a side without rows has no schema to join with, the result is the other side or nothing
+                kept = {"left": build_first is None and self.how in ("left", "outer", "anti"),
+                        "right": probe_first is None and self.how in ("right", "outer")}
+                for side, first, rest in (("left", probe_first, probe), ("right", build_first, build)):
+                    if kept[side] and first is not None:
+                        for batch in itertools.chain([first], rest):
+                            self.stats[f"{side}_rows"] += batch.num_rows
+                            self.stats["rows"] += batch.num_rows
+                            yield batch
+                return
+            probe_schema, build_schema = _reader_schema(pa, probe_first), _reader_schema(pa, build_first)
+            casts = self._key_types(pa, probe_schema, build_schema)
+            probe_schema = self._cast_keys(pa, probe_schema, self.left_keys, casts)
+            build_schema = self._cast_keys(pa, build_schema, self.right_keys, casts)
+            probe = _conform(pa, itertools.chain([probe_first], probe), probe_schema)
+            build = _conform(pa, itertools.chain([build_first], build), build_schema)
+
+            build_batches, build_bytes = [], 0
+            for batch in build:
+                self.stats["right_rows"] += batch.num_rows
+                if spill is not None:
+                    spill.write("build", batch)
+                    continue
+                build_batches.append(batch)
+                build_bytes += batch.nbytes
+                if build_bytes > self.memory_limit:
+                    spill = _SpillFiles(self.spill_dir, self.spill_partitions, build_schema, probe_schema,
+                                        self.right_keys, self.left_keys)
+                    print(f"[query_history]The right side exceeds {self.memory_limit} bytes, spilling both sides "
+                          f"into {self.spill_partitions} partitions under {spill.path}")
+                    for buffered in build_batches:
+                        spill.write("build", buffered)
+                    build_batches = None
+
+            def counted(batches):
+                for batch in batches:
+                    self.stats["left_rows"] += batch.num_rows
+                    yield batch
+
+            if spill is None:
+                build_table = pa.Table.from_batches(build_batches, schema=build_schema)
+                reader = pa.RecordBatchReader.from_batches(probe_schema, counted(probe))
+                joined = self._join(pa, reader, build_table)
+            else:
+                for batch in counted(probe):
+                    spill.write("probe", batch)
+                spill.close_writers()
+                self.stats["spilled_bytes"] = spill.bytes
+                self.stats["partitions"] = spill.num_partitions
+                joined = itertools.chain.from_iterable(
+                    self._join(pa, spill.read("probe", partition), spill.read("build", partition).read_all())
+                    for partition in range(spill.num_partitions))
+            for batch in joined:
+                self.stats["rows"] += batch.num_rows
+                yield batch
+        finally:
+            # the side streams are closed before their connections, the garbage collector would close them after
+            for side in (probe, build):
+                if hasattr(side, "close"):
+                    side.close()
+            if spill is not None:
+                spill.cleanup()
+            if own_left:
+                left_conn.close()
+            if own_right:
+                right_conn.close()
+            self.stats["seconds"] = time.time() - start_time
+            print(f"[query_history]Federated join done: {self.stats['left_rows']} x {self.stats['right_rows']} rows "
+                  f"-> {self.stats['rows']} rows in {self.stats['seconds']:.1f}s"
+                  + (f", {self.stats['spilled_bytes']} bytes spilled" if self.stats["spilled_bytes"] else ""))
+
+    def collect(self):
+        """Run the join and return the result as a pyarrow Table."""
+        pa = import_pyarrow()
+        tables = [pa.Table.from_batches([batch]) for batch in self.stream()]
+        if not tables:
+            return pa.table({})
+        return pa.concat_tables(tables, promote_options="default")
+
+    def to_pandas(self):
+        """Run the join and return the result as a pandas DataFrame."""
+        return self.collect().to_pandas()
@@ -0,0 +1,166 @@
+# File: journal.py
+
+# Description: This Package provides the on-disk progress journal of the transfers, which records the state
+#              of each partition (pending, loading with its checkpoint, loaded, verified), so that a crashed
+#              or cancelled transfer resumes where it stopped.
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+
+PENDING, LOADING, LOADED, VERIFIED = "pending", "loading", "loaded", "verified"
+
+NULL_CHECKPOINT = {"null": True}  # checkpoint of a partition whose last loaded value is NULL
+
+
+def journal_key(**fields):
+    """Return the journal file name identifying a transfer by its definition."""
+    digest = hashlib.sha1(json.dumps(fields, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    name = "".join(ch if ch.isalnum() or ch in "._-" else "_" for ch in str(fields.get("dst_table", "transfer")))
+    return f"{name}-{digest}"
+
+
+class TransferJournal:
+    def __init__(self, key, journal_dir=None):
+        """Open the journal of a transfer, loading its state if a previous run left one.
+
+        The journal is a JSON file rewritten atomically after every loaded batch. Each partition records its
+        status, the rows and bytes loaded, and with a checkpoint column the JSON form of the last loaded value
+        (rows below it are loaded) with the number of loaded rows equal to it (reloaded on resume). The
+        conditions are stored in their JSON form too, and formatted in the dialect of the source or the sink.
+
+        Args:
+            key: journal name, see journal_key().
+            journal_dir: folder of the journals. Default is None (~/.dataxi/journal).
+        """
+        self.journal_dir = Path(journal_dir) if journal_dir else Path.home() / ".dataxi" / "journal"
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        self.path = self.journal_dir / f"{key}.json"
+        self._lock = threading.Lock()
+        self.state = None
+        if self.path.exists():
+            try:
+                self.state = json.loads(self.path.read_text())
+            except ValueError as e:
+                print(f"[transfer_history]Ignoring the unreadable journal {self.path}: {e}")
+
+    @property
+    def resumable(self):
+        """Return True if a previous run left partitions to load."""
+        return bool(self.state and self.state.get("partitions"))
+
+    def start(self, conditions, partitions):
+        """Record the plan of a new run.
+
+        Args:
+            conditions: base filter conditions of the run (e.g. the incremental watermark).
+            partitions: list of the filter conditions of each partition.
+        """
+        with self._lock:
+            self.state = {"created_at": time.time(), "conditions": list(conditions), "stage_table": None,
+                          "partitions": [{"conditions": list(cond), "status": PENDING, "rows": 0, "bytes": 0,
+                                          "checkpoint": None, "provisional": 0} for cond in partitions]}
+            self._save()
+
+    @property
+    def conditions(self):
+        return self.state["conditions"]
+
+    @property
+    def partitions(self):
+        return [entry["conditions"] for entry in self.state["partitions"]]
+
+    @property
+    def stage_table(self):
+        return self.state.get("stage_table")
+
+    def set_stage_table(self, stage_table):
+        """Record the stage table, kept after a failure so the resumed run loads the same one."""
+        with self._lock:
+            self.state["stage_table"] = stage_table
+            self._save()
+
+    @property
+    def merged(self):
+        return bool(self.state.get("merged"))
+
+    def set_merged(self):
+        """Record that the stage table was applied to the sink, so a resumed run does not apply it twice."""
+        with self._lock:
+            self.state["merged"] = True
+            self._save()
+
+    def partition(self, index):
+        """Return a copy of the journal entry of a partition."""
+        with self._lock:
+            return dict(self.state["partitions"][index])
+
+    def start_partition(self, index):
+        """Mark the partition as loading."""
+        self.update(index, status=LOADING)
+
+    def rewind(self, index):
+        """Forget the loaded rows at the checkpoint, which the resumed run deletes and reloads.
+
+        Returns:
+            The partition entry after the rewind.
+        """
+        with self._lock:
+            entry = self.state["partitions"][index]
+            if entry["checkpoint"] is None:
+                entry["rows"] = entry["bytes"] = 0
+            else:
+                entry["rows"] -= entry["provisional"]
+            entry["provisional"] = 0
+            self._save()
+            return dict(entry)
+
+    def record(self, index, rows, num_bytes, checkpoint=None, provisional=0):
+        """Record a loaded batch of the partition.
+
+        Args:
+            index: partition index.
+            rows: rows of the batch.
+            num_bytes: bytes of the batch.
+            checkpoint: JSON form of the last checkpoint value of the batch. Default is None.
+            provisional: rows of the batch equal to the checkpoint value. Default is 0.
+        """
+        with self._lock:
+            entry = self.state["partitions"][index]
+            entry["rows"] += rows
+            entry["bytes"] += num_bytes
+            if checkpoint is not None:
+                # rows equal to an unchanged checkpoint keep accumulating, since the next batch may still contain some
+                entry["provisional"] = (entry["provisional"] if checkpoint == entry["checkpoint"] else 0) + provisional
+                entry["checkpoint"] = checkpoint
+            self._save()
+
+    def update(self, index, **fields):
+        """Update the fields of a partition entry, e.g. its status."""
+        with self._lock:
+            self.state["partitions"][index].update(fields)
+            self._save()
+
+    def _save(self):
+        """Write the state atomically and durably. The lock must be held."""
+        self.state["updated_at"] = time.time()
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)  # atomic, a crash never leaves a partial journal
+
+    def remove(self):
+        """Delete the journal after a completed transfer."""
+        with self._lock:
+            self.state = None
+            if self.path.exists():
+                self.path.unlink()
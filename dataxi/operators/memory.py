@@ -0,0 +1,324 @@
+# File: memory.py
+
+# Description: This Package provides the memory accounting of the pipelines: a budget of the batch bytes
+#              buffered by each stage, which blocks the producers when it is exceeded, and an optional profiler
+#              sampling the RSS (and tracemalloc) of the process to report the peak usage of each stage.
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+
+import contextlib
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+
+def batch_nbytes(batch):
+    """Return the size of a batch: pyarrow RecordBatch/Table, pandas DataFrame or list of rows (estimated)."""
+    if hasattr(batch, "nbytes") and not callable(batch.nbytes):
+        return int(batch.nbytes)
+    if hasattr(batch, "memory_usage"):
+        return int(batch.memory_usage(index=True, deep=True).sum())
+    if isinstance(batch, (list, tuple)):
+        # shallow estimate from a sample of the rows, the values of a row are rarely shared
+        sample = batch[:100]
+        if not sample:
+            return 0
+        row_bytes = sum(sys.getsizeof(row) + sum(sys.getsizeof(value) for value in
+                                                 (row.values() if isinstance(row, dict) else row))
+                        for row in sample) / len(sample)
+        return int(row_bytes * len(batch))
+    return 0
+
+
+def current_rss():
+    """Return the resident set size of the process in bytes, or None if it cannot be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+class MemoryBudget:
+    def __init__(self, limit_bytes=None, timeout=None):
+        """Initialize the memory budget shared by the stages of one or several pipelines.
+
+        Each stage reserves the bytes of the batch it hands over and releases them when the next stage has
+        consumed it. A blocking reservation (the producers, e.g. the extraction) waits while the reserved bytes
+        would exceed the limit, so the consumers catch up. A single batch larger than the limit is still let
+        through when nothing else is reserved, so the pipeline never deadlocks. The bytes reserved by the waiting
+        thread itself (e.g. its batches in flight in the transform pool) are not waited for, since only that thread
+        can release them: release the bytes from the thread which reserved them.
+
+        Args:
+            limit_bytes: maximum bytes reserved by all stages. Default is None (only account).
+            timeout: seconds a producer waits for the budget before raising TimeoutError. Default is None (no limit).
+        """
+        self.limit_bytes = limit_bytes
+        self.timeout = timeout
+        self.used = 0
+        self.peak = 0
+        self._stages = {}
+        self._owned = {}  # thread ident -> bytes reserved by the thread
+        self._cond = threading.Condition()
+
+    def _stage(self, stage):
+        """Return the accounting entry of the stage. The lock must be held."""
+        entry = self._stages.get(stage)
+        if entry is None:
+            entry = self._stages[stage] = {"current": 0, "peak": 0, "batches": 0, "bytes": 0,
+                                           "waits": 0, "wait_seconds": 0.0}
+        return entry
+
+    def reserve(self, stage, nbytes, blocking=True):
+        """Reserve the bytes of a batch buffered by the stage.
+
+        Args:
+            stage: stage name, e.g. 'extract'.
+            nbytes: bytes of the batch.
+            blocking: wait while the limit would be exceeded. Default is True.
+        """
+        owner = threading.get_ident()
+        with self._cond:
+            entry = self._stage(stage)
+            if blocking and self.limit_bytes and self._over_limit(owner, nbytes):
+                start_time = time.time()
+                entry["waits"] += 1
+                while self._over_limit(owner, nbytes):
+                    remaining = None if self.timeout is None else self.timeout - (time.time() - start_time)
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError(f"[transfer_history]Memory budget of {self.limit_bytes} bytes not available "
+                                           f"for {stage} after {self.timeout}s, {self.used} bytes reserved.")
+                    self._cond.wait(remaining)
+                entry["wait_seconds"] += time.time() - start_time
+            self.used += nbytes
+            self._owned[owner] = self._owned.get(owner, 0) + nbytes
+            self.peak = max(self.peak, self.used)
+            entry["current"] += nbytes
+            entry["peak"] = max(entry["peak"], entry["current"])
+            entry["batches"] += 1
+            entry["bytes"] += nbytes
+
+    def release(self, stage, nbytes):
+        """Release the bytes reserved by the stage and wake up the waiting producers."""
+        owner = threading.get_ident()
+        with self._cond:
+            self.used -= nbytes
+            self._stage(stage)["current"] -= nbytes
+            owned = self._owned.get(owner, 0) - nbytes
+            if owned > 0:
+                self._owned[owner] = owned
+            else:
+                self._owned.pop(owner, None)
+            self._cond.notify_all()
+
+    def _over_limit(self, owner, nbytes):
+        """Return True if the bytes reserved by the other threads leave no room for nbytes. The lock must be held."""
+        others = self.used - self._owned.get(owner, 0)
+        return others > 0 and others + nbytes > self.limit_bytes
+
+    @contextlib.contextmanager
+    def hold(self, stage, nbytes, blocking=False):
+        """Reserve the bytes for the duration of the block, e.g. an insert call."""
+        self.reserve(stage, nbytes, blocking=blocking)
+        try:
+            yield
+        finally:
+            self.release(stage, nbytes)
+
+    def track(self, stage, batches, blocking=False):
+        """Yield the batches, each reserved until the consumer requests the next one.
+
+        Args:
+            stage: stage name.
+            batches: iterable of batches, see batch_nbytes().
+            blocking: wait for the budget before handing a batch over, for the producer stages. Default is False.
+        """
+        for batch in batches:
+            nbytes = batch_nbytes(batch)
+            self.reserve(stage, nbytes, blocking=blocking)
+            try:
+                yield batch
+            finally:
+                self.release(stage, nbytes)
+
+    def report(self):
+        """Return the limit, the peak of all stages and the accounting of each stage."""
+        with self._cond:
+            return {"limit_bytes": self.limit_bytes, "peak_bytes": self.peak,
+                    "stages": {stage: dict(entry) for stage, entry in self._stages.items()}}
+
+
+class MemoryProfiler:
+    def __init__(self, interval=0.2, trace=False):
+        """Initialize the profiler sampling the memory of the process while the stages run.
+
+        The peak of a stage is the peak RSS of the process while the stage was active. Stages running
+        concurrently in other threads are included, so the peaks overlap.
+
+        Args:
+            interval: seconds between two samples. Default is 0.2.
+            trace: also sample the Python allocations with tracemalloc, which slows the allocations down.
+                Default is False.
+        """
+        self.interval = interval
+        self.trace = trace
+        self.peak_rss = None
+        self.peak_traced = None
+        self._stages = {}
+        self._active = {}  # stage -> number of running calls
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._started_tracing = False
+
+    def start(self):
+        """Start the sampling thread."""
+        if self._thread is not None:
+            return self
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="dataxi-memory-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the sampling thread, taking a last sample."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.sample()
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """Take a sample, raising the peaks of the process and of the active stages."""
+        rss = current_rss()
+        traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        with self._lock:
+            if rss is not None:
+                self.peak_rss = max(self.peak_rss or 0, rss)
+            if traced is not None:
+                self.peak_traced = max(self.peak_traced or 0, traced)
+            for stage, count in self._active.items():
+                if count:
+                    entry = self._stages[stage]
+                    if rss is not None:
+                        entry["peak_rss"] = max(entry["peak_rss"] or 0, rss)
+                    if traced is not None:
+                        entry["peak_traced"] = max(entry["peak_traced"] or 0, traced)
+
+    @contextlib.contextmanager
+    def stage(self, stage):
+        """Profile a block as the stage: number of calls, seconds and peak memory while it runs."""
+        with self._lock:
+            entry = self._stages.setdefault(stage, {"calls": 0, "seconds": 0.0, "peak_rss": None, "peak_traced": None})
+            entry["calls"] += 1
+            self._active[stage] = self._active.get(stage, 0) + 1
+        self.sample()
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            self.sample()
+            with self._lock:
+                entry["seconds"] += time.time() - start_time
+                self._active[stage] -= 1
+
+    def track(self, stage, iterable):
+        """Yield the items of the iterable, profiling the production of each item as the stage."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(stage):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def instrument(self, obj, methods=("execute_query", "query_df", "query_arrow", "stream", "normalize_result",
+                                       "bulk_insert", "insert", "insert_tuple_data", "insert_dict_data")):
+        """Profile the methods of an object (e.g. a connector) as stages named '<Class>.<method>'.
+
+        The instance attributes shadow the methods, remove them with uninstrument(). Generator methods
+        (stream) are profiled while they produce their items.
+
+        Args:
+            obj: object to instrument.
+            methods: names of the methods, the missing ones are skipped.
+        """
+        for name in methods:
+            method = getattr(obj, name, None)
+            if method is None or not callable(method):
+                continue
+            stage = f"{type(obj).__name__}.{name}"
+            if inspect.isgeneratorfunction(method):
+                def wrapper(*args, _method=method, _stage=stage, **kwargs):
+                    return self.track(_stage, _method(*args, **kwargs))
+            else:
+                def wrapper(*args, _method=method, _stage=stage, **kwargs):
+                    with self.stage(_stage):
+                        return _method(*args, **kwargs)
+            setattr(obj, name, functools.wraps(method)(wrapper))
+        return obj
+
+    @staticmethod
+    def uninstrument(obj, methods=("execute_query", "query_df", "query_arrow", "stream", "normalize_result",
+                                   "bulk_insert", "insert", "insert_tuple_data", "insert_dict_data")):
+        """Remove the instrumentation of instrument()."""
+        for name in methods:
+            obj.__dict__.pop(name, None)
+
+    def report(self):
+        """Return the peak RSS (and traced) bytes of the process and of each stage."""
+        with self._lock:
+            return {"peak_rss": self.peak_rss, "peak_traced": self.peak_traced,
+                    "stages": {stage: dict(entry) for stage, entry in self._stages.items()}}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def format_memory_report(report):
+    """Return the lines of a memory report of TableTransfer.run(), peaks in MB."""
+    def mb(value):
+        return "n/a" if value is None else f"{value / 1024 / 1024:,.1f} MB"
+
+    lines = []
+    budget = report.get("budget")
+    if budget:
+        lines.append(f"budget {mb(budget['limit_bytes']) if budget['limit_bytes'] else 'unlimited'}, "
+                     f"peak reserved {mb(budget['peak_bytes'])}")
+        for stage, entry in budget["stages"].items():
+            lines.append(f"  {stage}: peak {mb(entry['peak'])}, {entry['batches']} batches, "
+                         f"{entry['waits']} waits ({entry['wait_seconds']:.1f}s)")
+    profile = report.get("profile")
+    if profile:
+        lines.append(f"process peak RSS {mb(profile['peak_rss'])}"
+                     + (f", peak traced {mb(profile['peak_traced'])}" if profile["peak_traced"] is not None else ""))
+        for stage, entry in profile["stages"].items():
+            lines.append(f"  {stage}: peak RSS {mb(entry['peak_rss'])}, {entry['calls']} calls, {entry['seconds']:.1f}s"
+                         + (f", peak traced {mb(entry['peak_traced'])}" if entry["peak_traced"] is not None else ""))
+    return lines
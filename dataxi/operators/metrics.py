@@ -0,0 +1,119 @@
+# File: metrics.py
+
+# Description: This Package keeps the history of the transfer metrics under ~/.dataxi/metrics, which the
+#              planner uses to estimate the runtime of a transfer at the measured throughput.
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+
+import json
+import os
+import statistics
+import time
+from pathlib import Path
+
+# Records kept per route (src, dst, table): the planner reads the latest 20, and the history is
+# compacted to this many once a route holds twice as many, so the file stays bounded
+MAX_RECORDS_PER_ROUTE = 20
+
+
+def metrics_path(metrics_dir=None):
+    """Return the path of the transfer metrics history."""
+    metrics_dir = Path(metrics_dir) if metrics_dir else Path.home() / ".dataxi" / "metrics"
+    return metrics_dir / "transfers.jsonl"
+
+
+def read_records(path):
+    """Return the records of the history file, skipping the unreadable lines (e.g. a torn write)."""
+    records = []
+    for line in path.read_text().splitlines():
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    return records
+
+
+def route_key(record):
+    """Return the route of a recorded transfer: source, sink and source table."""
+    return record.get("src"), record.get("dst"), record.get("table")
+
+
+def compact_history(path, max_records=MAX_RECORDS_PER_ROUTE):
+    """Rewrite the history with the latest max_records records of each route, dropping the unreadable lines.
+
+    A record appended by another process during the rewrite may be lost, which only costs a throughput sample.
+    """
+    kept, counts = [], {}
+    for record in reversed(read_records(path)):
+        key = route_key(record)
+        counts[key] = counts.get(key, 0) + 1
+        if counts[key] <= max_records:
+            kept.append(record)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text("".join(json.dumps(record) + "\n" for record in reversed(kept)))
+    os.replace(tmp_path, path)
+
+
+def record_transfer(src, dst, result, parallelism=1, metrics_dir=None):
+    """Append the metrics of a completed transfer to the history. Errors are printed, never raised.
+
+    The history keeps the latest MAX_RECORDS_PER_ROUTE transfers of each route, see compact_history().
+
+    Args:
+        src: source conn_id.
+        dst: sink conn_id.
+        result: dictionary returned by TableTransfer.run().
+        parallelism: number of partitions of the transfer. Default is 1.
+        metrics_dir: folder of the history. Default is None (~/.dataxi/metrics).
+    """
+    record = {"time": time.time(), "src": src, "dst": dst, "table": result["table"], "dst_table": result["dst_table"],
+              "rows": result["rows"], "bytes": result["bytes"], "seconds": result["seconds"], "parallelism": parallelism}
+    try:
+        path = metrics_path(metrics_dir)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        route = route_key(record)
+        if sum(route_key(other) == route for other in read_records(path)) > 2 * MAX_RECORDS_PER_ROUTE:
+            compact_history(path, MAX_RECORDS_PER_ROUTE)
+    except OSError as e:
+        print(f"[transfer_history]Metrics not recorded: {e}")
+
+
+def load_history(src=None, dst=None, table=None, limit=20, metrics_dir=None):
+    """Return the latest recorded transfers matching the filters, newest first.
+
+    Args:
+        src: source conn_id. Default is None (any).
+        dst: sink conn_id. Default is None (any).
+        table: source table. Default is None (any).
+        limit: maximum number of records. Default is 20.
+        metrics_dir: folder of the history. Default is None (~/.dataxi/metrics).
+    """
+    path = metrics_path(metrics_dir)
+    if not path.exists():
+        return []
+    records = [record for record in read_records(path)
+               if (src is None or record.get("src") == src) and (dst is None or record.get("dst") == dst)
+               and (table is None or record.get("table") == table)]
+    return records[::-1][:limit]
+
+
+def measured_throughput(src, dst, table=None, metrics_dir=None):
+    """Return the median throughput per partition of the past transfers, preferring the same table.
+
+    Small transfers are ignored, since their rate is dominated by the connection and planning time.
+
+    Returns:
+        A dictionary with rows_per_second, bytes_per_second, runs and scope ('table' or 'connections'),
+        or None without history.
+    """
+    for scope, records in (("table", load_history(src, dst, table, metrics_dir=metrics_dir) if table else []),
+                           ("connections", load_history(src, dst, metrics_dir=metrics_dir))):
+        records = [record for record in records if record["rows"] >= 1000 and record["seconds"] > 0]
+        if records:
+            return {"rows_per_second": statistics.median(r["rows"] / r["seconds"] / r["parallelism"] for r in records),
+                    "bytes_per_second": statistics.median(r["bytes"] / r["seconds"] / r["parallelism"] for r in records),
+                    "runs": len(records), "scope": scope}
+    return None
@@ -0,0 +1,270 @@
+# File: profiling.py
+
+# Description: This Package provides the column profiling of the transfers: the statistics of each column
+#              (nulls, min/max, mean, HyperLogLog distinct estimate, histogram or top values) are updated batch by
+#              batch with vectorized Arrow/numpy kernels while the batches stream through, without another scan.
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+
+import threading
+from collections import Counter
+
+from ..connectors.base_connector import import_pyarrow
+
+
+def hash_values(array):
+    """Return the 64-bit hashes (numpy uint64) of the non-null values of an Arrow array.
+
+    The integers are hashed as themselves (a float64 cast fails above 2 ** 53, e.g. on Snowflake IDs), and the
+    values are hashed as strings for the non-numeric types, so equal values hash equally in every batch.
+    """
+    import pandas as pd
+    import pyarrow.compute as pc
+
+    pa = import_pyarrow()
+    array = array.drop_null()
+    if pa.types.is_integer(array.type):
+        values = array.to_numpy(zero_copy_only=False)
+    elif pa.types.is_floating(array.type):
+        values = array.cast(pa.float64()).to_numpy(zero_copy_only=False)
+    else:
+        values = pc.cast(array, pa.string()).to_numpy(zero_copy_only=False)
+    return pd.util.hash_array(values)
+
+
+class HyperLogLog:
+    def __init__(self, precision=14):
+        """Initialize the HyperLogLog sketch of the distinct values, 2 ** precision registers of one byte.
+
+        The standard error of the estimate is 1.04 / sqrt(2 ** precision), 0.8% with the default precision.
+
+        Args:
+            precision: bits of the hash indexing the registers, 4 to 18. Default is 14.
+        """
+        import numpy as np
+
+        if not 4 <= precision <= 18:
+            raise ValueError("The HyperLogLog precision must be between 4 and 18.")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        """Add the 64-bit hashes (numpy uint64) of values to the sketch."""
+        import numpy as np
+
+        if not len(hashes):
+            return
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.int64)
+        rest = hashes << np.uint64(p)
+        # the rank is the position of the first 1 bit of the rest, the bit length is computed on 32-bit halves
+        # so the float logarithm is exact
+        high = (rest >> np.uint64(32)).astype(np.float64)
+        low = (rest & np.uint64(0xFFFFFFFF)).astype(np.float64)
+        with np.errstate(divide="ignore"):
+            bit_length = np.where(high > 0, 33 + np.floor(np.log2(np.maximum(high, 1))),
+                                  np.where(low > 0, 1 + np.floor(np.log2(np.maximum(low, 1))), 0))
+        rank = np.minimum(65 - bit_length, 65 - p).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        """Merge the registers of another sketch of the same precision."""
+        import numpy as np
+
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        """Return the estimated number of distinct values."""
+        import numpy as np
+
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # linear counting is more accurate for the small cardinalities
+            return int(round(m * np.log(m / zeros)))
+        return int(round(raw))
+
+
+class _Histogram:
+    def __init__(self, num_bins):
+        """Equal-width histogram whose range grows with the values: the bins are merged in pairs and the width
+        doubled until the new values fit, so the batches are never binned twice."""
+        self.num_bins = num_bins
+        self.low = None
+        self.width = None
+        self.counts = None
+
+    def add(self, values):
+        """Add the numpy float values to the histogram, the NaN and infinite values are skipped."""
+        import numpy as np
+
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+        low, high = float(values.min()), float(values.max())
+        if self.low is None:
+            self.low = low
+            self.width = (high - low) / self.num_bins or 1.0
+            self.counts = np.zeros(self.num_bins, dtype=np.int64)
+        half = self.num_bins // 2
+        while low < self.low or high >= self.low + self.width * self.num_bins:
+            merged = self.counts[0::2] + self.counts[1::2]
+            if low < self.low:
+                self.low -= self.width * self.num_bins
+                self.counts = np.concatenate([np.zeros(half, dtype=np.int64), merged])
+            else:
+                self.counts = np.concatenate([merged, np.zeros(half, dtype=np.int64)])
+            self.width *= 2
+        bins = np.minimum(((values - self.low) / self.width).astype(np.int64), self.num_bins - 1)
+        self.counts += np.bincount(bins, minlength=self.num_bins)
+
+    def report(self):
+        if self.counts is None:
+            return None
+        # trim the empty bins at both ends left by the growth
+        nonzero = [i for i, count in enumerate(self.counts) if count]
+        first, last = nonzero[0], nonzero[-1] + 1
+        return {"edges": [self.low + self.width * i for i in range(first, last + 1)],
+                "counts": [int(count) for count in self.counts[first:last]]}
+
+
+class _ColumnStats:
+    def __init__(self, name, arrow_type, bins, top_values, precision):
+        self.name = name
+        self.type = str(arrow_type)
+        self.rows = 0
+        self.nulls = 0
+        self.min = None
+        self.max = None
+        self.sum = 0.0
+        self.numeric_rows = 0
+        self.infinities = 0
+        self.hll = HyperLogLog(precision)
+        self.histogram = _Histogram(bins) if bins else None
+        self.top_values = Counter() if top_values else None
+        self.max_top = top_values
+
+    def update(self, array):
+        import numpy as np
+        import pyarrow.compute as pc
+
+        pa = import_pyarrow()
+        if isinstance(array, pa.ChunkedArray):
+            array = array.combine_chunks()
+        if pa.types.is_dictionary(array.type):
+            array = array.dictionary_decode()
+        self.rows += len(array)
+        self.nulls += array.null_count
+        if array.null_count == len(array) or pa.types.is_null(array.type):
+            return
+        numeric = pa.types.is_integer(array.type) or pa.types.is_floating(array.type) or pa.types.is_decimal(array.type)
+        if numeric:
+            # the large integers lose their low digits, which only shifts the mean and histogram
+            values = array.drop_null().cast(pa.float64(), safe=False).to_numpy(zero_copy_only=False)
+            # the infinities are counted apart, the min/max, mean and histogram are of the finite values
+            self.infinities += int(np.count_nonzero(np.isinf(values)))
+            values = values[np.isfinite(values)]
+        if pa.types.is_floating(array.type):
+            if len(values):
+                self._update_min_max(float(values.min()), float(values.max()))
+        elif not (pa.types.is_nested(array.type) or pa.types.is_binary(array.type)):
+            min_max = pc.min_max(array)
+            if min_max["min"].is_valid:
+                self._update_min_max(min_max["min"].as_py(), min_max["max"].as_py())
+        self.hll.add_hashes(hash_values(array))
+        if numeric:
+            self.sum += float(values.sum())
+            self.numeric_rows += len(values)
+            if self.histogram is not None:
+                self.histogram.add(values)
+        elif self.top_values is not None and (pa.types.is_string(array.type) or pa.types.is_large_string(array.type)
+                                              or pa.types.is_boolean(array.type)):
+            counts = pc.value_counts(array.drop_null())
+            self.top_values.update(dict(zip(counts.field("values").to_pylist(), counts.field("counts").to_pylist())))
+            if len(self.top_values) > self.max_top * 10:
+                # keep the most frequent values, the counts of the pruned ones become lower bounds
+                self.top_values = Counter(dict(self.top_values.most_common(self.max_top * 5)))
+
+    def _update_min_max(self, low, high):
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    def report(self):
+        report = {"type": self.type, "rows": self.rows, "nulls": self.nulls,
+                  "null_rate": self.nulls / self.rows if self.rows else None,
+                  "min": self.min, "max": self.max, "distinct": self.hll.estimate() if self.rows > self.nulls else 0}
+        if self.numeric_rows:
+            report["mean"] = self.sum / self.numeric_rows
+        if self.infinities:
+            report["infinities"] = self.infinities
+        if self.histogram is not None and self.histogram.counts is not None:
+            report["histogram"] = self.histogram.report()
+        if self.top_values:
+            report["top_values"] = self.top_values.most_common(self.max_top)
+        return report
+
+
+class ColumnProfiler:
+    def __init__(self, columns=None, bins=20, top_values=10, precision=14):
+        """Initialize the profiler of the columns of the batches of a stream, thread-safe for the partitions.
+
+        Args:
+            columns: columns to profile. Default is None (all columns).
+            bins: bins of the histograms of the numeric columns, 0 to disable them. Default is 20.
+            top_values: most frequent values reported for the string and boolean columns, 0 to disable them.
+                Default is 10.
+            precision: HyperLogLog precision of the distinct estimates. Default is 14.
+        """
+        self.columns = list(columns) if columns else None
+        self.bins = bins - bins % 2
+        self.top_values = top_values
+        self.precision = precision
+        self.rows = 0
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def update(self, batch):
+        """Update the statistics with a RecordBatch or Table."""
+        with self._lock:
+            self.rows += batch.num_rows
+            for index, name in enumerate(batch.schema.names):
+                if self.columns is not None and name not in self.columns:
+                    continue
+                stats = self._stats.get(name)
+                if stats is None:
+                    stats = self._stats[name] = _ColumnStats(name, batch.schema.field(index).type, self.bins,
+                                                             self.top_values, self.precision)
+                stats.update(batch.column(index))
+
+    def track(self, batches):
+        """Yield the batches, profiling each one on the way."""
+        for batch in batches:
+            self.update(batch)
+            yield batch
+
+    def report(self):
+        """Return {"rows": rows profiled, "columns": {name: statistics}}."""
+        with self._lock:
+            return {"rows": self.rows, "columns": {name: stats.report() for name, stats in self._stats.items()}}
+
+
+def format_profile(report):
+    """Return the lines of a profile report, one per column."""
+    lines = []
+    for name, stats in report["columns"].items():
+        line = (f"{name} ({stats['type']}): {stats['nulls']} nulls"
+                + (f" ({stats['null_rate']:.1%})" if stats["null_rate"] is not None else "")
+                + f", ~{stats['distinct']} distinct")
+        if stats["min"] is not None:
+            line += f", min {stats['min']}, max {stats['max']}"
+        if "mean" in stats:
+            line += f", mean {stats['mean']:.4g}"
+        if stats.get("infinities"):
+            line += f", {stats['infinities']} infinite"
+        if stats.get("top_values"):
+            line += ", top " + ", ".join(f"{value!r} x{count}" for value, count in stats["top_values"][:3])
+        lines.append(line)
+    return lines
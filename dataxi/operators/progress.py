@@ -0,0 +1,94 @@
+# File: progress.py
+
+# Description: This Package provides the live rows/sec and MB/sec progress display of the transfers.
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+
+import sys
+import threading
+import time
+
+
+def format_rate(rows, num_bytes, seconds):
+    """Return the "rows (rows/s) | MB (MB/s)" text of a transfer."""
+    seconds = max(seconds, 1e-9)
+    mb = num_bytes / 1024 / 1024
+    return f"{rows:,} rows ({rows / seconds:,.0f} rows/s) | {mb:,.1f} MB ({mb / seconds:,.1f} MB/s)"
+
+
+class TransferProgress:
+    def __init__(self, interval=0.5, stream=None, enabled=True):
+        """Initialize the progress display. Counters are thread-safe, so parallel partitions can share it.
+
+        Args:
+            interval: refresh interval in seconds. Default is 0.5.
+            stream: output stream. Default is None (sys.stderr).
+            enabled: whether to display the progress. Default is True.
+        """
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self.enabled = enabled
+        self.rows = 0
+        self.bytes = 0
+        self.total_rows = None  # Optional expected number of rows, shown as a percentage
+        self.label = ""
+        self.start_time = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        # a terminal gets a refreshed single line, a log file gets a line every 10 refreshes
+        self._is_tty = hasattr(self.stream, "isatty") and self.stream.isatty()
+
+    def update(self, rows, num_bytes):
+        """Add the rows and bytes of a loaded batch."""
+        with self._lock:
+            self.rows += rows
+            self.bytes += num_bytes
+
+    def render(self):
+        """Return the progress line."""
+        with self._lock:
+            rows, num_bytes = self.rows, self.bytes
+        elapsed = time.time() - (self.start_time or time.time())
+        line = f"{self.label} {format_rate(rows, num_bytes, elapsed)} | {elapsed:,.0f}s".strip()
+        if self.total_rows:
+            line += f" | {min(100.0, rows * 100 / self.total_rows):.1f}%"
+        return line
+
+    def _display(self):
+        """Refresh the progress line until stopped."""
+        count = 0
+        while not self._stop.wait(self.interval):
+            count += 1
+            if self._is_tty:
+                self.stream.write("\r\033[K" + self.render())
+                self.stream.flush()
+            elif count % 10 == 0:
+                self.stream.write(self.render() + "\n")
+                self.stream.flush()
+
+    def start(self):
+        """Start the timer and the display thread."""
+        self.start_time = time.time()
+        if self.enabled and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._display, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the display thread and print the final line."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        if self.enabled:
+            self.stream.write(("\r\033[K" if self._is_tty else "") + self.render() + "\n")
+            self.stream.flush()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
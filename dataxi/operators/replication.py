@@ -0,0 +1,212 @@
+# File: replication.py
+
+# Description: This Package provides the near-real-time replication of MySQL tables from the binlog: the
+#              micro-batches of the binlog source are collapsed by primary key, applied to the sink as upserts
+#              and deletes, and the binlog position is checkpointed after each applied batch.
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+
+import json
+import os
+import time
+from pathlib import Path
+
+from ..connectors.mysql_cdc import DELETE, MySQLBinlogSource
+from .transfer import open_connector
+
+
+class CDCCheckpoint:
+    def __init__(self, name, checkpoint_dir=None):
+        """Open the checkpoint of a replication, the binlog position after the last applied micro-batch.
+
+        Args:
+            name: replication name.
+            checkpoint_dir: folder of the checkpoints. Default is None (~/.dataxi/cdc).
+        """
+        self.checkpoint_dir = Path(checkpoint_dir) if checkpoint_dir else Path.home() / ".dataxi" / "cdc"
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        self.path = self.checkpoint_dir / f"{name}.json"
+
+    def load(self):
+        """Return the saved state ({"position": ..., "changes": ..., "updated_at": ...}), or None."""
+        if not self.path.exists():
+            return None
+        return json.loads(self.path.read_text())
+
+    def save(self, position, num_changes=0):
+        """Save the position atomically, after the batch ending at it is applied."""
+        state = self.load() or {"changes": 0}
+        state.update({"position": position, "changes": state["changes"] + num_changes, "updated_at": time.time()})
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def collapse_changes(changes, key_columns):
+    """Collapse the changes of a table to the last state of each key.
+
+    An update changing the key deletes the old key.
+
+    Args:
+        changes: list of (op, before, after) in binlog order, see ChangeBatch.
+        key_columns: primary key columns.
+
+    Returns:
+        (upserts, deletes): the rows to upsert and the rows whose key to delete.
+    """
+    def key(row):
+        return tuple(row[col] for col in key_columns)
+
+    final = {}
+    for op, before, after in changes:
+        if before is not None and (after is None or key(before) != key(after)):
+            final[key(before)] = (DELETE, before)
+        if after is not None:
+            final[key(after)] = ("upsert", after)
+    upserts = [row for op, row in final.values() if op != DELETE]
+    deletes = [row for op, row in final.values() if op == DELETE]
+    return upserts, deletes
+
+
+class BinlogReplication:
+    def __init__(self, src, dst, tables, dst_tables=None, key_columns=None, name=None, checkpoint_dir=None,
+                 position=None, server_id=None, batch_rows=10000, batch_seconds=1.0, delete_chunk=1000,
+                 progress=None, dst_kwargs=None):
+        """Initialize the replication of MySQL tables into a sink from the binlog.
+
+        The sink tables must exist with the source columns and a unique key on the primary key columns
+        (a ReplacingMergeTree sorted by them in ClickHouse). Load them once with TableTransfer, then start the
+        replication at the binlog position read before that load.
+
+        Args:
+            src: MySQL conn_id, or a MySQLBinlogSource.
+            dst: sink conn_id or connector object (ClickHouse, MySQL or PostgreSQL).
+            tables: list of the 'database.table' to replicate.
+            dst_tables: dictionary of source 'database.table' -> sink table. Default is None (the table name).
+            key_columns: dictionary of source table -> primary key columns. Default is None (read from MySQL).
+            name: replication name, identifying its checkpoint. Default is None (derived from src, dst and tables).
+            checkpoint_dir: folder of the checkpoints. Default is None (~/.dataxi/cdc).
+            position: binlog position to start from when there is no checkpoint, {"log_file": ..., "log_pos": ...}.
+                Default is None (the current position of the server).
+            server_id: replica server id of the binlog connection. Default is None (random).
+            batch_rows: changes of a micro-batch. Default is 10000.
+            batch_seconds: maximum seconds a change waits in a micro-batch. Default is 1.0.
+            delete_chunk: keys per DELETE statement. Default is 1000.
+            progress: TransferProgress object updated after each applied micro-batch. Default is None.
+            dst_kwargs: keyword arguments for building the sink connector. Default is None.
+        """
+        self.tables = [tables] if isinstance(tables, str) else list(tables)
+        if any("." not in table for table in self.tables):
+            raise ValueError("The replicated tables must be given as 'database.table'.")
+        self.dst_tables = {table: (dst_tables or {}).get(table, table.split(".", 1)[1]) for table in self.tables}
+        self.key_columns = dict(key_columns or {})
+        self.name = name or "-".join([str(src if isinstance(src, str) else "mysql"),
+                                      str(dst if isinstance(dst, str) else getattr(dst, "conn_id", "sink"))]
+                                     + [table.replace(".", "_") for table in self.tables])
+        self.checkpoint = CDCCheckpoint(self.name, checkpoint_dir)
+        state = self.checkpoint.load()
+        if state is not None:
+            position = state["position"]
+            print(f"[transfer_history]Resuming the replication {self.name} from "
+                  f"{position['log_file']}:{position['log_pos']}")
+        if isinstance(src, MySQLBinlogSource):
+            self.source = src
+            if position is not None:
+                self.source.position = dict(position)
+            self.source.tables = self.tables
+        else:
+            self.source = MySQLBinlogSource(conn_id=src, tables=self.tables, server_id=server_id, position=position,
+                                            batch_rows=batch_rows, batch_seconds=batch_seconds)
+        self.dst = dst
+        self.dst_kwargs = dst_kwargs or {}
+        self.delete_chunk = delete_chunk
+        self.progress = progress
+
+    def _keys(self, table):
+        """Return the primary key columns of a source table."""
+        if table not in self.key_columns:
+            keys = self.source.primary_key(table)
+            if not keys:
+                raise ValueError(f"Table {table} has no primary key, please specify its key_columns.")
+            self.key_columns[table] = keys
+        return self.key_columns[table]
+
+    def _delete(self, dst, dst_table, keys, rows):
+        """Delete the keys of the rows from the sink table, delete_chunk keys per statement."""
+        columns = [dst.quote_identifier(col) for col in keys]
+        for start in range(0, len(rows), self.delete_chunk):
+            chunk = rows[start:start + self.delete_chunk]
+            if len(keys) == 1:
+                condition = f"{columns[0]} IN ({', '.join(dst.literal(row[keys[0]]) for row in chunk)})"
+            else:
+                condition = " OR ".join("(" + " AND ".join(f"{col} = {dst.literal(row[key])}" for col, key in zip(columns, keys)) + ")"
+                                        for row in chunk)
+            dst.delete_rows(dst_table, condition)
+
+    def apply(self, dst, batch):
+        """Apply a ChangeBatch to the sink: the deleted keys first, then the upserts.
+
+        Collapsing by key makes the apply idempotent, so a batch replayed after a crash converges to the same state.
+
+        Returns:
+            (upserted rows, deleted rows).
+        """
+        num_upserts = num_deletes = 0
+        for table, changes in batch.changes.items():
+            keys = self._keys(table)
+            upserts, deletes = collapse_changes(changes, keys)
+            dst_table = self.dst_tables[table]
+            if deletes:
+                self._delete(dst, dst_table, keys, deletes)
+            if upserts:
+                dst.bulk_insert(dst_table, upserts, mode="upsert", key_columns=keys)
+            num_upserts += len(upserts)
+            num_deletes += len(deletes)
+        return num_upserts, num_deletes
+
+    def run(self, max_batches=None, blocking=True):
+        """Replicate the changes until interrupted, checkpointing the position after each applied micro-batch.
+
+        Args:
+            max_batches: stop after this number of micro-batches. Default is None (no limit).
+            blocking: wait for new changes, False to stop at the current end of the binlog. Default is True.
+
+        Returns:
+            A dictionary with name, batches, changes, upserts, deletes, seconds and position.
+        """
+        start_time = time.time()
+        self.source.blocking = blocking
+        for table in self.tables:
+            self._keys(table)
+        self.source.check_server()
+        dst, own_dst = open_connector(self.dst, route="write", **self.dst_kwargs)
+        stats = {"name": self.name, "batches": 0, "changes": 0, "upserts": 0, "deletes": 0, "position": self.source.position}
+        print(f"[transfer_history]Replicating {', '.join(self.tables)} from the MySQL binlog")
+        try:
+            for batch in self.source.micro_batches():
+                batch_start = time.time()
+                num_upserts, num_deletes = self.apply(dst, batch)
+                self.checkpoint.save(batch.position, batch.num_changes)
+                stats["batches"] += 1
+                stats["changes"] += batch.num_changes
+                stats["upserts"] += num_upserts
+                stats["deletes"] += num_deletes
+                stats["position"] = batch.position
+                print(f"[transfer_history]Applied {batch.num_changes} changes ({num_upserts} upserts, {num_deletes} deletes) "
+                      f"in {time.time() - batch_start:.2f}s, checkpoint {batch.position['log_file']}:{batch.position['log_pos']}")
+                if self.progress is not None:
+                    self.progress.update(batch.num_changes, 0)
+                if max_batches is not None and stats["batches"] >= max_batches:
+                    break
+        except KeyboardInterrupt:
+            print(f"[transfer_history]Replication {self.name} stopped, it resumes from its checkpoint.")
+        finally:
+            self.source.close()
+            if own_dst:
+                dst.close()
+        stats["seconds"] = time.time() - start_time
+        return stats
@@ -0,0 +1,341 @@
+# File: scheduler.py
+
+# Description: This Package provides the multi-table job scheduler, which runs a declarative list of table
+#              transfers on a worker pool with per-source/per-sink concurrency limits, dependency ordering,
+#              priority and retry per job.
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from ..connectors.base_connector import interrupt_statements
+from .memory import MemoryBudget
+from .transfer import TableTransfer
+
+
+# Keys of a job spec used by the scheduler, the other keys are passed to TableTransfer
+SCHEDULER_KEYS = ("name", "depends_on", "priority", "retries", "retry_delay")
+
+PENDING, RUNNING, SUCCEEDED, FAILED, SKIPPED = "pending", "running", "succeeded", "failed", "skipped"
+
+
+def load_jobs(path):
+    """Load the job specs from a YAML or JSON file.
+
+    The file contains a list of job specs, or a dictionary with "jobs", optional "defaults" applied
+    to every job, and optional "limits" ({"source": 2, "sink": 4, "max_workers": 8, "per_conn": {conn_id: n},
+    "memory_bytes": n}).
+
+    Args:
+        path: path of the .yaml/.yml/.json file.
+
+    Returns:
+        (jobs, limits).
+    """
+    path = Path(path)
+    text = path.read_text()
+    if path.suffix in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError as e:
+            raise ImportError("pyyaml is required to load YAML job files. "
+                              "Please install it with: pip install 'dataxi[yaml]'") from e
+        spec = yaml.safe_load(text)
+    else:
+        spec = json.loads(text)
+
+    if isinstance(spec, list):
+        spec = {"jobs": spec}
+    defaults = spec.get("defaults", {})
+    jobs = [Job(**{**defaults, **job_spec}) for job_spec in spec.get("jobs", [])]
+    return jobs, spec.get("limits", {})
+
+
+class Job:
+    def __init__(self, name=None, depends_on=None, priority=0, retries=0, retry_delay=10, **params):
+        """Initialize a job of the scheduler.
+
+        Args:
+            name: unique job name. Default is None (use dst_table or table).
+            depends_on: list of job names which must succeed before this job starts. Default is None.
+            priority: jobs with higher priority start first when several are ready. Default is 0.
+            retries: number of retries after a failed attempt. Default is 0.
+            retry_delay: seconds to wait before a retry, doubled on every attempt. Default is 10.
+            **params: keyword arguments for TableTransfer (src, dst, table, ...), e.g. timeout for the seconds of
+                each attempt.
+        """
+        self.name = name or params.get("dst_table") or params.get("table")
+        if not self.name:
+            raise ValueError("Job requires a name or a table.")
+        if isinstance(depends_on, str):
+            depends_on = [depends_on]
+        self.depends_on = list(depends_on or [])
+        self.priority = priority
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.params = params
+
+        self.status = PENDING
+        self.attempts = 0
+        self.not_before = 0  # earliest start time of the next attempt
+        self.result = None
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def source(self):
+        """Return the source conn_id (or connector) of the job."""
+        return self.params.get("src")
+
+    @property
+    def sink(self):
+        """Return the sink conn_id (or connector) of the job."""
+        return self.params.get("dst")
+
+    def summary(self):
+        """Return the job status as a dictionary."""
+        duration = None
+        if self.started_at and self.finished_at:
+            duration = self.finished_at - self.started_at
+        return {"name": self.name, "status": self.status, "attempts": self.attempts,
+                "seconds": duration, "result": self.result, "error": self.error}
+
+
+class JobScheduler:
+    def __init__(self, jobs, max_workers=8, source_limit=2, sink_limit=4, per_conn=None, runner=None, memory_bytes=None):
+        """Initialize the scheduler.
+
+        Args:
+            jobs: list of Job objects (or job spec dictionaries).
+            max_workers: size of the worker pool. Default is 8.
+            source_limit: maximum concurrent jobs reading from the same source. Default is 2.
+            sink_limit: maximum concurrent jobs writing into the same sink. Default is 4.
+            per_conn: dictionary of conn_id -> maximum concurrent jobs using it (as source or sink),
+                overriding source_limit/sink_limit. Default is None.
+            runner: function called with a Job and returning its result. Default is None (run TableTransfer).
+            memory_bytes: memory budget shared by the transfers of all jobs, see MemoryBudget. A job with its own
+                memory_budget keeps it. Default is None.
+        """
+        self.jobs = [job if isinstance(job, Job) else Job(**job) for job in jobs]
+        limits = {"max_workers": max_workers, "source_limit": source_limit, "sink_limit": sink_limit,
+                  **{f"per_conn[{conn}]": limit for conn, limit in (per_conn or {}).items()}}
+        for name, limit in limits.items():
+            if not isinstance(limit, int) or limit < 1:
+                raise ValueError(f"The {name} limit must be an integer of at least 1, got {limit!r}.")
+        self.max_workers = max_workers
+        self.source_limit = source_limit
+        self.sink_limit = sink_limit
+        self.per_conn = per_conn or {}
+        self.runner = runner or self.run_transfer
+        self.memory_budget = MemoryBudget(memory_bytes) if memory_bytes else None
+        if self.memory_budget is not None:
+            for job in self.jobs:
+                job.params.setdefault("memory_budget", self.memory_budget)
+
+        self._jobs_by_name = {}
+        for job in self.jobs:
+            if job.name in self._jobs_by_name:
+                raise ValueError(f"Duplicated job name: {job.name}")
+            self._jobs_by_name[job.name] = job
+        self._check_dependencies()
+
+        self._lock = threading.Lock()
+        self._running_sources = {}  # source key -> number of running jobs
+        self._running_sinks = {}  # sink key -> number of running jobs
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        """Build the scheduler from a YAML/JSON job file, see load_jobs().
+
+        Args:
+            path: path of the job file.
+            **kwargs: keyword arguments overriding the "limits" of the file.
+        """
+        jobs, limits = load_jobs(path)
+        options = {"max_workers": limits.get("max_workers", 8),
+                   "source_limit": limits.get("source", 2),
+                   "sink_limit": limits.get("sink", 4),
+                   "per_conn": limits.get("per_conn"),
+                   "memory_bytes": limits.get("memory_bytes")}
+        options.update(kwargs)
+        return cls(jobs, **options)
+
+    @staticmethod
+    def run_transfer(job):
+        """Default runner, run the TableTransfer described by the job params."""
+        return TableTransfer(**job.params).run()
+
+    def _check_dependencies(self):
+        """Raise ValueError on unknown dependencies or dependency cycles."""
+        for job in self.jobs:
+            for dep in job.depends_on:
+                if dep not in self._jobs_by_name:
+                    raise ValueError(f"Job '{job.name}' depends on unknown job '{dep}'.")
+
+        visiting, visited = set(), set()
+
+        def visit(name, path):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle: {' -> '.join(path + [name])}")
+            visiting.add(name)
+            for dep in self._jobs_by_name[name].depends_on:
+                visit(dep, path + [name])
+            visiting.discard(name)
+            visited.add(name)
+
+        for job in self.jobs:
+            visit(job.name, [])
+
+    @staticmethod
+    def _conn_key(conn):
+        """Return the key used for the concurrency limits of a conn_id or connector object."""
+        if conn is None or isinstance(conn, str):
+            return conn
+        return getattr(conn, "conn_id", None) or id(conn)
+
+    def _limit(self, key, default):
+        """Return the concurrency limit of a connection."""
+        return self.per_conn.get(key, default)
+
+    def _can_start(self, job):
+        """Return True if the job's source and sink are below their concurrency limits. The lock must be held."""
+        src, dst = self._conn_key(job.source), self._conn_key(job.sink)
+        if src is not None and self._running_sources.get(src, 0) >= self._limit(src, self.source_limit):
+            return False
+        if dst is not None and self._running_sinks.get(dst, 0) >= self._limit(dst, self.sink_limit):
+            return False
+        return True
+
+    def _acquire(self, job):
+        """Count the job as running on its source and sink. The lock must be held."""
+        src, dst = self._conn_key(job.source), self._conn_key(job.sink)
+        if src is not None:
+            self._running_sources[src] = self._running_sources.get(src, 0) + 1
+        if dst is not None:
+            self._running_sinks[dst] = self._running_sinks.get(dst, 0) + 1
+
+    def _release(self, job):
+        """Release the job's slots on its source and sink."""
+        src, dst = self._conn_key(job.source), self._conn_key(job.sink)
+        with self._lock:
+            if src is not None:
+                self._running_sources[src] -= 1
+            if dst is not None:
+                self._running_sinks[dst] -= 1
+
+    def _ready_jobs(self, now):
+        """Return the pending jobs whose dependencies succeeded, ordered by priority."""
+        ready = []
+        for job in self.jobs:
+            if job.status != PENDING or job.not_before > now:
+                continue
+            dep_status = [self._jobs_by_name[dep].status for dep in job.depends_on]
+            if any(status in (FAILED, SKIPPED) for status in dep_status):
+                job.status = SKIPPED
+                job.error = "dependency failed"
+                print(f"[job_history]Job skipped, dependency failed: {job.name}")
+                continue
+            if all(status == SUCCEEDED for status in dep_status):
+                ready.append(job)
+        # stable sort keeps the file order among jobs of the same priority
+        return sorted(ready, key=lambda job: -job.priority)
+
+    def _execute(self, job):
+        """Run one attempt of the job in a worker thread."""
+        try:
+            return self.runner(job)
+        finally:
+            self._release(job)
+
+    def run(self):
+        """Run all jobs and return their summaries.
+
+        Returns:
+            A list of job summary dictionaries, in the order of the jobs.
+        """
+        start_time = time.time()
+        print(f"[job_history]Scheduling {len(self.jobs)} jobs on {self.max_workers} workers.")
+        futures = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                now = time.time()
+                # Submit the ready jobs as long as there are free workers and connection slots
+                for job in self._ready_jobs(now):
+                    if len(futures) >= self.max_workers:
+                        break
+                    with self._lock:
+                        if not self._can_start(job):
+                            continue
+                        self._acquire(job)
+                    job.status = RUNNING
+                    job.attempts += 1
+                    job.started_at = job.started_at or now
+                    print(f"[job_history]Starting job: {job.name}, attempt number: {job.attempts}.")
+                    futures[executor.submit(self._execute, job)] = job
+
+                if not futures:
+                    if not any(job.status == PENDING for job in self.jobs):
+                        break
+                    # the pending jobs wait for retries in back-off (or are their dependents), sleep until the earliest
+                    timeout = self._next_retry_timeout()
+                    if timeout is None:
+                        raise Exception("[job_history]No job can start, the pending jobs wait for no running job.")
+                    time.sleep(timeout)
+                    continue
+
+                timeout = self._next_retry_timeout()
+                try:
+                    done, _ = wait(list(futures), timeout=timeout, return_when=FIRST_COMPLETED)
+                except KeyboardInterrupt:
+                    # cancel the running statements, so the workers stop instead of finishing their jobs
+                    print("[job_history]Interrupted, cancelling the running jobs.")
+                    interrupt_statements()
+                    raise
+                for future in done:
+                    job = futures.pop(future)
+                    self._finish(job, future)
+
+        summaries = [job.summary() for job in self.jobs]
+        num_succeeded = sum(1 for job in self.jobs if job.status == SUCCEEDED)
+        print(f"[job_history]{num_succeeded}/{len(self.jobs)} jobs succeeded in {time.time() - start_time:.1f}s.")
+        if self.memory_budget is not None:
+            report = self.memory_budget.report()
+            print(f"[job_history]Peak memory reserved by the jobs: {report['peak_bytes']} bytes of {report['limit_bytes']}, "
+                  + ", ".join(f"{stage} {entry['peak']}" for stage, entry in report["stages"].items()))
+        return summaries
+
+    def _next_retry_timeout(self):
+        """Return seconds until the earliest retry still in back-off, so waiting workers do not delay it, or None."""
+        now = time.time()
+        pending = [job.not_before for job in self.jobs if job.status == PENDING and job.not_before > now]
+        if not pending:
+            return None
+        return min(pending) - now
+
+    def _finish(self, job, future):
+        """Record the outcome of a job attempt and schedule its retry if needed."""
+        try:
+            job.result = future.result()
+            job.status = SUCCEEDED
+            job.error = None
+            job.finished_at = time.time()
+            print(f"[job_history]Job succeeded: {job.name}")
+        except Exception as e:
+            job.error = str(e)
+            if job.attempts <= job.retries:
+                delay = job.retry_delay * (2 ** (job.attempts - 1))
+                job.status = PENDING
+                job.not_before = time.time() + delay
+                print(f"[job_history]Job failed: {job.name}, retrying in {delay}s. Error: {e}")
+            else:
+                job.status = FAILED
+                job.finished_at = time.time()
+                print(f"[job_history]Job failed after {job.attempts} attempts: {job.name}. Error: {e}")
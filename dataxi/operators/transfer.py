@@ -0,0 +1,706 @@
+# File: transfer.py
+
+# Description: This Package provides the table transfer between any source/sink pair of connectors,
+#              streaming Arrow batches from the source into the sink.
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+
+import contextlib
+import datetime
+import decimal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ..connectors import get_connector
+from ..connectors.base_connector import LOAD_MODES, STAGED_LOAD_MODES, interrupt_statements
+from ..connectors.frame import Expr, sql
+from ..connectors.type_mapping import ColumnConverter, arrow_schema
+from .batching import AdaptiveBatcher
+from .memory import MemoryBudget, MemoryProfiler, format_memory_report
+from .journal import LOADED, LOADING, NULL_CHECKPOINT, VERIFIED, TransferJournal, journal_key
+from .metrics import measured_throughput, record_transfer
+from .profiling import ColumnProfiler, format_profile
+from .transform import TransformStage
+
+
+def open_connector(conn, route=None, **kwargs):
+    """Return (connector, owned). A conn_id is resolved with get_connector(), a connector object is used as is.
+
+    Args:
+        conn: conn_id or a connector object.
+        route: 'read' or 'write', routes a conn_id with read replicas, see get_connector(). Default is None.
+        **kwargs: keyword arguments for get_connector(), e.g. db_type.
+    """
+    if isinstance(conn, str):
+        return get_connector(conn_id=conn, route=route, **kwargs), True
+    return conn, False
+
+
+def conn_label(conn):
+    """Return the conn_id of a conn_id or connector object, used to identify it in the journals and metrics."""
+    if isinstance(conn, str):
+        return conn
+    return getattr(conn, "conn_id", None) or conn.cache_namespace()
+
+
+def first_value(result):
+    """Return the first value of the first row of a query result (list of tuples or dictionaries)."""
+    if not result:
+        return None
+    row = result[0]
+    if isinstance(row, dict):
+        return next(iter(row.values()), None)
+    return row[0]
+
+
+def encode_value(value):
+    """Return the JSON form of a watermark, partition bound or checkpoint value, see decode_value()."""
+    if isinstance(value, datetime.datetime):
+        return {"datetime": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"date": value.isoformat()}
+    if isinstance(value, decimal.Decimal):
+        return {"decimal": str(value)}
+    return value
+
+
+def decode_value(value):
+    """Return the value of its JSON form, see encode_value()."""
+    if isinstance(value, dict):
+        if "datetime" in value:
+            return datetime.datetime.fromisoformat(value["datetime"])
+        if "date" in value:
+            return datetime.date.fromisoformat(value["date"])
+        if "decimal" in value:
+            return decimal.Decimal(value["decimal"])
+    return value
+
+
+def encode_conditions(conditions):
+    """Return the JSON form of filter conditions, SQL strings or Expr objects, e.g. for the journal."""
+    def encode(condition):
+        if isinstance(condition, Expr):
+            return {"op": condition.op, "args": [encode(arg) if isinstance(arg, Expr) else encode_value(arg)
+                                                 for arg in condition.args]}
+        return condition
+    return [encode(condition) for condition in conditions]
+
+
+def decode_conditions(conditions):
+    """Return the filter conditions of their JSON form, see encode_conditions()."""
+    def decode(condition):
+        if isinstance(condition, dict) and "op" in condition:
+            return Expr(condition["op"], [decode(arg) if isinstance(arg, dict) and "op" in arg else decode_value(arg)
+                                          for arg in condition["args"]])
+        return condition
+    return [decode(condition) for condition in conditions]
+
+
+def render_conditions(conditions, connector):
+    """Return the SQL of filter conditions, with the literals of the Expr conditions in the dialect of the connector.
+
+    The watermark, partition and checkpoint conditions are kept as Expr objects, since they filter the source
+    and also delete the reloaded rows from the sink, two dialects with different literals.
+    """
+    return [condition.to_sql(connector) if isinstance(condition, Expr) else condition for condition in conditions]
+
+
+def split_range(low, high, num_parts):
+    """Split the inclusive range [low, high] of a numeric or datetime column into boundaries.
+
+    Returns:
+        A sorted list of num_parts + 1 boundaries, or None if the type cannot be split.
+    """
+    if isinstance(low, bool) or low is None or high is None:
+        return None
+    if isinstance(low, int) and isinstance(high, int):
+        step = max(1, (high - low + 1) // num_parts)
+        bounds = [low + i * step for i in range(num_parts)] + [high]
+    elif isinstance(low, (float, decimal.Decimal)):
+        step = (high - low) / num_parts
+        bounds = [low + i * step for i in range(num_parts)] + [high]
+    elif isinstance(low, datetime.datetime) or isinstance(low, datetime.date):
+        step = (high - low) / num_parts
+        bounds = [low + i * step for i in range(num_parts)] + [high]
+    else:
+        return None
+    return sorted(set(bounds))
+
+
+class TableTransfer:
+    def __init__(self, src, dst, table, dst_table=None, query=None, where=None, columns=None,
+                 batch_size=None, parallelism=1, partition_column=None, incremental_column=None,
+                 verify=False, progress=None, batcher_options=None, load_mode="insert", key_columns=None,
+                 map_types=True, resume=False, checkpoint_column=None, journal_dir=None, transforms=None,
+                 transform_processes=None, src_kwargs=None, dst_kwargs=None, memory_budget=None, memory_profile=False,
+                 profile=False, timeout=None):
+        """Initialize the transfer of one table.
+
+        Args:
+            src: source conn_id or connector object.
+            dst: sink conn_id or connector object.
+            table: source table.
+            dst_table: sink table. Default is None (same as table).
+            query: custom extraction query, replacing the generated SELECT. Default is None.
+            where: filter condition of the generated SELECT. Default is None.
+            columns: list of columns of the generated SELECT. Default is None (all columns).
+            batch_size: number of rows per batch, or 'auto' to tune it at runtime with an AdaptiveBatcher
+                toward batcher_options (target_bytes, target_seconds, ...). Default is None (connector default).
+            parallelism: number of partitions read and loaded concurrently. Default is 1.
+                Requires conn_ids for src and dst, since each partition opens its own connections. With read replicas
+                in the source credential, the partitions are read from the replicas chosen by its router.
+            partition_column: numeric or datetime column split into ranges when parallelism > 1. Default is None.
+            incremental_column: only transfer rows whose column is greater than its maximum in the sink. Default is None.
+            verify: compare the number of source rows with the number of loaded rows. Default is False.
+            progress: TransferProgress object updated after each loaded batch. Default is None.
+            batcher_options: keyword arguments of AdaptiveBatcher when batch_size is 'auto'. Default is None.
+            load_mode: 'insert', 'upsert' (update existing keys batch by batch), or a staged mode loading a stage
+                table first: 'merge', 'replace_partitions' (ClickHouse) or 'swap' (full reload). Default is 'insert'.
+            key_columns: key columns of the upsert/merge, required by PostgreSQL and MS SQL. Default is None.
+            map_types: read the source and sink column types and convert each batch column-wise into the sink types,
+                instead of the per-value conversion of the drivers. Default is True.
+            resume: keep a progress journal under ~/.dataxi/journal and resume the unfinished partitions of a previous
+                failed run of the same transfer. The journal is deleted when the transfer completes. Default is False.
+            checkpoint_column: column ordering the extraction of each partition when resume is on, so a partial
+                partition resumes from its last loaded value instead of reloading. Index it in the source.
+                Default is None (partition_column).
+            journal_dir: folder of the journals. Default is None (~/.dataxi/journal).
+            transforms: function(s) applied to each extracted batch before the load, see TransformStage
+                (callables, 'module:function' strings or {"function": ..., **kwargs} dictionaries). Default is None.
+            transform_processes: size of the process pool running the transforms, 0 to run them in the extracting
+                thread. Default is None (number of CPUs).
+            src_kwargs: keyword arguments for building the source connector. Default is None.
+            dst_kwargs: keyword arguments for building the sink connector. Default is None.
+            memory_budget: maximum bytes of the batches buffered by the extract/transform/convert/load stages of all
+                partitions, the extraction waits while it is exceeded. An int, or a MemoryBudget shared with other
+                transfers. The peak of each stage is reported at the end. Default is None (no budget).
+            memory_profile: sample the RSS of the process while each stage runs and report its peak, True or a
+                MemoryProfiler (e.g. with trace=True for tracemalloc). Default is False.
+            profile: profile the extracted columns on the way (nulls, min/max, mean, distinct estimate, histogram or
+                top values) and report them with the result: True, a list of columns, or a ColumnProfiler.
+                With resume, only the rows extracted by this run are profiled. Default is False.
+            timeout: seconds of the run. The statements of its connections are bounded by the deadline, the running
+                ones are cancelled on the server when it expires and the run raises TimeoutError. Default is None.
+        """
+        self.src = src
+        self.dst = dst
+        self.table = table
+        self.dst_table = dst_table or table
+        self.query = query
+        self.where = where
+        self.columns = columns
+        self.batch_size = batch_size
+        self.parallelism = max(1, int(parallelism or 1))
+        self.partition_column = partition_column
+        self.incremental_column = incremental_column
+        self.verify = verify
+        self.progress = progress
+        self.batcher_options = batcher_options or {}
+        if load_mode not in LOAD_MODES:
+            raise ValueError(f"Invalid load_mode '{load_mode}', expected one of: {', '.join(LOAD_MODES)}.")
+        self.load_mode = load_mode
+        self.key_columns = key_columns
+        self._load_table = self.dst_table  # stage table during a staged load
+        self.map_types = map_types
+        self._source_schema = None  # Arrow schema of the extracted columns, compiled once by _prepare_types()
+        self._converter = None  # ColumnConverter into the sink types, compiled once by _prepare_types()
+        self.src_kwargs = src_kwargs or {}
+        self.dst_kwargs = dst_kwargs or {}
+
+        if self.query and (self.parallelism > 1 or self.incremental_column):
+            raise ValueError("parallelism and incremental_column are not supported with a custom query.")
+        if self.parallelism > 1 and not (isinstance(src, str) and isinstance(dst, str)):
+            raise ValueError("parallelism > 1 requires conn_ids for src and dst.")
+        self.resume = resume
+        self.checkpoint_column = checkpoint_column or partition_column
+        self.journal_dir = journal_dir
+        self._journal = None  # TransferJournal of the running transfer when resume is on
+        self._partitions = []  # filter conditions of each partition of the running transfer
+        if self.resume and self.query:
+            raise ValueError("resume is not supported with a custom query.")
+        self.transforms = transforms
+        self.transform_processes = transform_processes
+        self._transform_stage = None  # TransformStage of the running transfer
+        self.memory_budget = memory_budget
+        self.memory_profile = memory_profile
+        self._budget = None  # MemoryBudget of the running transfer
+        self._profiler = None  # MemoryProfiler of the running transfer
+        self.profile = profile
+        self._column_profiler = None  # ColumnProfiler of the running transfer
+        self.timeout = timeout
+        self._deadline = None  # deadline of the running transfer, set on the connections of the partitions
+
+    def build_query(self, conditions=None, select=None, order_by=None, connector=None):
+        """Return the extraction query.
+
+        Args:
+            conditions: list of additional filter conditions, SQL strings or Expr objects. Default is None.
+            select: select list replacing the columns, e.g. 'COUNT(*)'. Default is None.
+            order_by: column ordering the rows, NULLs last on every backend. Default is None.
+        """
+        if self.query:
+            return self.query
+        cols = select or (", ".join(self.columns) if self.columns else "*")
+        query = f"SELECT {cols} FROM {self.table}"
+        conditions = ([f"({self.where})"] if self.where else []) + render_conditions(conditions or [], connector)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        if order_by:
+            query += f" ORDER BY CASE WHEN {order_by} IS NULL THEN 1 ELSE 0 END, {order_by}"
+        return query
+
+    def _incremental_conditions(self, dst):
+        """Return the filter selecting the rows newer than the sink watermark, as an Expr."""
+        if not self.incremental_column:
+            return []
+        watermark = first_value(dst.execute_query(f"SELECT MAX({self.incremental_column}) "
+                                                 f"FROM {dst.quote_identifier(self.dst_table)}"))
+        print(f"[transfer_history]Incremental watermark of {self.dst_table}.{self.incremental_column}: {watermark}")
+        if watermark is None:
+            return []
+        return [sql(self.incremental_column) > watermark]
+
+    def _partition_conditions(self, src, conditions):
+        """Return one list of filter conditions per partition."""
+        if self.parallelism == 1 or not self.partition_column:
+            if self.parallelism > 1:
+                print("[transfer_history]No partition_column given, transferring in a single partition.")
+            return [conditions]
+
+        col = self.partition_column
+        result = src.execute_query(self.build_query(conditions, select=f"MIN({col}), MAX({col})", connector=src))
+        row = result[0] if result else (None, None)
+        low, high = list(row.values()) if isinstance(row, dict) else row
+        bounds = split_range(low, high, self.parallelism)
+        if not bounds or len(bounds) < 2:
+            print(f"[transfer_history]Cannot split {col} ({low} - {high}), transferring in a single partition.")
+            return [conditions]
+
+        partitions = []
+        column = sql(col)
+        for i in range(len(bounds) - 1):
+            upper = column <= bounds[i + 1] if i == len(bounds) - 2 else column < bounds[i + 1]
+            condition = (column >= bounds[i]) & upper
+            if i == 0:
+                condition = condition | column.is_null()  # rows without a partition value go to the first partition
+            partitions.append(conditions + [condition])
+        print(f"[transfer_history]Split {self.table} into {len(partitions)} partitions on {col}.")
+        return partitions
+
+    def _prepare_types(self, src, dst):
+        """Read the source and sink column types and compile the converter of the table."""
+        self._source_schema = self._converter = None
+        if not self.map_types:
+            return
+        if not self.query:
+            try:
+                self._source_schema = arrow_schema(src, self.table, self.columns)
+            except Exception as e:
+                print(f"[transfer_history]Source column types of {self.table} not available, inferring them: {e}")
+        try:
+            # ClickHouse stores NaN, the other sinks reject it
+            self._converter = ColumnConverter(arrow_schema(dst, self.dst_table),
+                                              nan_to_null=getattr(dst, "db_type", None) != "clickhouse")
+        except Exception as e:
+            print(f"[transfer_history]Sink column types of {self.dst_table} not available, leaving the conversion to the driver: {e}")
+
+    def _extract(self, src, query, batch_size):
+        """Stream the query with the source schema, transform each batch and convert it into the sink types.
+
+        Returns:
+            (stream, batches): the source stream, to close before the source connection, and the converted batches.
+        """
+        if self._source_schema is not None:
+            stream = src.stream(query, batch_size=batch_size, schema=self._source_schema)
+        else:
+            stream = src.stream(query, batch_size=batch_size)
+        batches = self._stage("extract", stream, blocking=True)
+        if self._column_profiler is not None:
+            # the source columns are profiled, before the transforms and the conversion
+            batches = self._column_profiler.track(batches)
+        if self._transform_stage is not None:
+            batches = self._stage("transform", self._transform_stage.map(batches))
+        if self._converter is not None:
+            batches = self._stage("convert", (self._converter(batch) for batch in batches))
+        return stream, batches
+
+    def _stage(self, stage, batches, blocking=False):
+        """Account the batches of a stage in the memory budget and the profiler of the running transfer."""
+        if self._profiler is not None:
+            batches = self._profiler.track(stage, batches)
+        if self._budget is not None:
+            batches = self._budget.track(stage, batches, blocking=blocking)
+        return batches
+
+    def _run_partition(self, index, src=None, dst=None):
+        """Extract and load one partition, opening its own connections if none are given.
+
+        Returns:
+            (rows, bytes) loaded, including the rows loaded by the previous runs when resuming.
+        """
+        journal = self._journal
+        entry = journal.partition(index) if journal is not None else None
+        if entry is not None and (entry["status"] == VERIFIED or (entry["status"] == LOADED and not self.verify)):
+            print(f"[transfer_history]Partition {index} of {self.table} already loaded, skipped.")
+            return entry["rows"], entry["bytes"]
+
+        own_src = own_dst = False
+        stream = batches = None
+        if src is None:
+            src, own_src = open_connector(self.src, route="read", **self.src_kwargs)
+            src.set_deadline(self._deadline)
+        try:
+            if entry is not None and entry["status"] == LOADED:
+                # loaded by the previous run, which stopped before verifying it
+                self._verify(src, self._partitions[index], entry["rows"], label=f"partition {index} of {self.table}")
+                journal.update(index, status=VERIFIED)
+                return entry["rows"], entry["bytes"]
+            if dst is None:
+                dst, own_dst = open_connector(self.dst, route="write", **self.dst_kwargs)
+                dst.set_deadline(self._deadline)
+            conditions = self._partitions[index]
+            order_by = None
+            num_rows = num_bytes = 0
+            if journal is not None:
+                conditions = conditions + self._resume_partition(dst, index)
+                order_by = self.checkpoint_column
+                entry = journal.partition(index)
+                num_rows, num_bytes = entry["rows"], entry["bytes"]
+                journal.start_partition(index)
+            query = self.build_query(conditions, order_by=order_by, connector=src)
+            if self.batch_size == "auto":
+                # each partition tunes its own batch size, since the partitions load concurrently
+                batcher = AdaptiveBatcher.for_connector(dst, **self.batcher_options)
+                stream, extracted = self._extract(src, query, batcher.next_size)
+                batches = batcher.load(extracted, lambda batch: self._insert(dst, batch))
+            else:
+                stream, extracted = self._extract(src, query, self.batch_size)
+                batches = self._load(dst, extracted)
+
+            for batch in batches:
+                num_rows += batch.num_rows
+                num_bytes += batch.nbytes
+                if journal is not None:
+                    journal.record(index, batch.num_rows, batch.nbytes, *self._checkpoint(batch))
+                if self.progress is not None:
+                    self.progress.update(batch.num_rows, batch.nbytes)
+            if journal is not None:
+                journal.update(index, status=LOADED)
+                if self.verify:
+                    self._verify(src, self._partitions[index], num_rows, label=f"partition {index} of {self.table}")
+                    journal.update(index, status=VERIFIED)
+            return num_rows, num_bytes
+        finally:
+            # an open stream left to the garbage collector would close its cursor on the closed connection
+            for generator in (batches, stream):
+                if generator is not None:
+                    generator.close()
+            if own_src:
+                src.close()
+            if own_dst:
+                dst.close()
+
+    def _checkpoint(self, batch):
+        """Return (checkpoint, provisional) of a loaded batch: the JSON form of its last checkpoint value
+        (NULL_CHECKPOINT for NULL), and the number of its rows equal to that value."""
+        if not self.checkpoint_column:
+            return None, 0
+        import pyarrow.compute as pc
+
+        column = batch.column(batch.schema.get_field_index(self.checkpoint_column))
+        last = column[-1]
+        if not last.is_valid:
+            # NULLs are extracted last, the batch ends in the NULL tail
+            return NULL_CHECKPOINT, column.null_count
+        return encode_value(last.as_py()), pc.sum(pc.equal(column, last)).as_py()
+
+    def _resume_partition(self, dst, index):
+        """Delete the rows of an interrupted partition which are reloaded, and return the resume conditions."""
+        entry = self._journal.partition(index)
+        if entry["status"] != LOADING:
+            return []
+        entry = self._journal.rewind(index)
+        col = self.checkpoint_column
+        if entry["checkpoint"] is None:
+            resume_conditions = []
+        elif entry["checkpoint"] == NULL_CHECKPOINT:
+            resume_conditions = [f"{col} IS NULL"]
+        else:
+            resume_conditions = [(sql(col) >= decode_value(entry["checkpoint"])) | sql(col).is_null()]
+
+        if self.load_mode != "upsert":
+            # rows at or after the checkpoint may have been loaded without being journaled, delete them before reloading
+            delete_conditions = ([f"({self.where})"] if self.where else []) + self._partitions[index] + resume_conditions
+            if not delete_conditions and self._load_table == self.dst_table:
+                raise Exception(f"[transfer_history]Cannot resume {self.table} safely: the interrupted load has no "
+                                f"partition range or checkpoint to delete. Set partition_column or checkpoint_column.")
+            dst.delete_rows(self._load_table, " AND ".join(render_conditions(delete_conditions, dst)) or "1 = 1")
+        print(f"[transfer_history]Resuming partition {index} of {self.table} with {entry['rows']} rows loaded, "
+              f"checkpoint: {entry['checkpoint']}")
+        return resume_conditions
+
+    def _load(self, dst, batches):
+        """Load each non-empty batch into the sink and yield it."""
+        for batch in batches:
+            if batch.num_rows == 0:
+                continue
+            self._insert(dst, batch)
+            yield batch
+
+    def _insert(self, dst, batch):
+        """Insert one batch into the sink (or the stage table) with the load mode."""
+        with contextlib.ExitStack() as stack:
+            if self._budget is not None:
+                stack.enter_context(self._budget.hold("load", batch.nbytes))
+            if self._profiler is not None:
+                stack.enter_context(self._profiler.stage("load"))
+            if self.load_mode == "upsert":
+                dst.bulk_insert(self._load_table, batch, mode="upsert", key_columns=self.key_columns)
+            else:
+                dst.bulk_insert(self._load_table, batch)
+
+    def _approximate_rows(self, src, conditions):
+        """Return the approximate rows of the extraction for the progress display, without a COUNT(*) scan, or None."""
+        try:
+            rows = None if self.query or self.where or conditions else src.table_stats(self.table)["rows"]
+            if rows is None:
+                rows = src.estimate_rows(self.build_query(conditions, connector=src))
+            return rows
+        except Exception:
+            return None
+
+    def _verify(self, src, conditions, num_rows, label=None):
+        """Compare the number of source rows matching the extraction filter with the loaded rows."""
+        label = label or self.table
+        if self.query:
+            count_query = f"SELECT COUNT(*) FROM ({self.query}) AS dataxi_verify"
+        else:
+            count_query = self.build_query(conditions, select="COUNT(*)", connector=src)
+        src_count = first_value(src.execute_query(count_query))
+        if src_count != num_rows:
+            raise Exception(f"[transfer_history]Verification failed for {label}: "
+                            f"{src_count} source rows, {num_rows} rows loaded.")
+        print(f"[transfer_history]Verification passed for {label}: {num_rows} rows.")
+
+    def _open_journal(self):
+        """Open the journal of the transfer, identified by its definition."""
+        key = journal_key(src=conn_label(self.src), dst=conn_label(self.dst),
+                          table=self.table, dst_table=self.dst_table, where=self.where, columns=self.columns,
+                          partition_column=self.partition_column, parallelism=self.parallelism,
+                          incremental_column=self.incremental_column, load_mode=self.load_mode,
+                          checkpoint_column=self.checkpoint_column)
+        return TransferJournal(key, self.journal_dir)
+
+    def _planned_batch_size(self, src, dst, row_bytes):
+        """Return the rows per batch the transfer would start with."""
+        if self.batch_size != "auto":
+            return self.batch_size or src.stream_batch_size
+        batcher = AdaptiveBatcher.for_connector(dst, **self.batcher_options)
+        return batcher.estimate_size(row_bytes) if row_bytes else batcher.next_size()
+
+    def plan(self):
+        """Estimate the transfer without moving any data (dry run).
+
+        The rows come from the query planner of the source (estimate_rows(), e.g. EXPLAIN) when the extraction is
+        filtered, otherwise from its catalogue statistics (table_stats(), e.g. information_schema, system.parts).
+        The runtime is estimated at the median throughput per partition of the past transfers of the same table,
+        or else of the same source/sink pair, recorded under ~/.dataxi/metrics.
+
+        Returns:
+            A dictionary with table, dst_table, rows, rows_source, bytes, row_bytes, partitions, parallelism,
+            batch_size, load_mode, throughput and estimated_seconds (None when unknown).
+        """
+        src, own_src = open_connector(self.src, route="read", **self.src_kwargs)
+        try:
+            dst, own_dst = open_connector(self.dst, route="write", **self.dst_kwargs)
+        except Exception:
+            if own_src:
+                src.close()
+            raise
+
+        try:
+            conditions = self._incremental_conditions(dst)
+            partitions = [render_conditions(partition, src) for partition in self._partition_conditions(src, conditions)]
+            stats = {}
+            if not self.query:
+                try:
+                    stats = src.table_stats(self.table)
+                except Exception as e:
+                    print(f"[transfer_history]Statistics of {self.table} not available: {e}")
+            rows, rows_source = None, None
+            if self.query or self.where or conditions or stats.get("rows") is None:
+                try:
+                    rows = src.estimate_rows(self.build_query(conditions, connector=src))
+                    rows_source = "explain" if rows is not None else None
+                except Exception as e:
+                    print(f"[transfer_history]Query estimate of {self.table} not available: {e}")
+            if rows is None and stats.get("rows") is not None:
+                # an upper bound when the extraction is filtered
+                rows, rows_source = stats["rows"], "table_stats"
+            row_bytes = stats["bytes"] / stats["rows"] if stats.get("rows") else None
+            num_bytes = int(rows * row_bytes) if rows is not None and row_bytes else None
+            batch_size = self._planned_batch_size(src, dst, row_bytes)
+        finally:
+            if own_src:
+                src.close()
+            if own_dst:
+                dst.close()
+
+        parallelism = len(partitions)
+        throughput = measured_throughput(conn_label(self.src), conn_label(self.dst), self.table)
+        seconds = None
+        if throughput and rows is not None:
+            if throughput["scope"] == "table" or not num_bytes:
+                seconds = rows / (throughput["rows_per_second"] * parallelism)
+            else:
+                # other tables of the pair have other row widths, their byte rate transfers better
+                seconds = num_bytes / (throughput["bytes_per_second"] * parallelism)
+
+        plan = {"table": self.table, "dst_table": self.dst_table, "rows": rows, "rows_source": rows_source,
+                "bytes": num_bytes, "row_bytes": row_bytes, "partitions": partitions, "parallelism": parallelism,
+                "batch_size": batch_size, "load_mode": self.load_mode, "throughput": throughput,
+                "estimated_seconds": seconds}
+        print(f"[transfer_history]Plan of {self.table} -> {self.dst_table}: {rows} rows ({rows_source}), {num_bytes} bytes, "
+              f"{parallelism} partitions, batch size {batch_size}, estimated runtime: "
+              f"{'unknown (no history)' if seconds is None else f'{seconds:.0f}s'}")
+        return plan
+
+    def _memory_report(self):
+        """Stop the profiler of the run, print and return the peak memory of each stage."""
+        report = {}
+        if self._budget is not None:
+            report["budget"] = self._budget.report()
+            self._budget = None
+        if self._profiler is not None:
+            self._profiler.stop()
+            report["profile"] = self._profiler.report()
+            self._profiler = None
+        for line in format_memory_report(report):
+            print(f"[transfer_history]Memory of {self.table}: {line}")
+        return report
+
+    def run(self):
+        """Run the transfer and return its statistics.
+
+        Returns:
+            A dictionary with table, dst_table, rows, bytes, seconds, verified and transport
+            (compression, wire format and measured wire bytes of the source and sink), and memory
+            (the budget and profile reports) with memory_budget or memory_profile, and profile (rows and
+            statistics of each column, see ColumnProfiler.report()) with profile.
+        """
+        start_time = time.time()
+        src, own_src = open_connector(self.src, route="read", **self.src_kwargs)
+        try:
+            dst, own_dst = open_connector(self.dst, route="write", **self.dst_kwargs)
+        except Exception:
+            if own_src:
+                src.close()
+            raise
+
+        if self.memory_budget is not None:
+            self._budget = self.memory_budget if isinstance(self.memory_budget, MemoryBudget) \
+                else MemoryBudget(int(self.memory_budget))
+        if self.memory_profile:
+            self._profiler = self.memory_profile if isinstance(self.memory_profile, MemoryProfiler) else MemoryProfiler()
+            self._profiler.start()
+        if self.profile:
+            if isinstance(self.profile, ColumnProfiler):
+                self._column_profiler = self.profile
+            else:
+                self._column_profiler = ColumnProfiler(columns=None if self.profile is True else self.profile)
+
+        deadlines = contextlib.ExitStack()
+        if self.timeout:
+            self._deadline = time.time() + self.timeout
+            # the deadline of a connector passed by the caller is restored at the end
+            deadlines.enter_context(src.deadline(self.timeout))
+            deadlines.enter_context(dst.deadline(self.timeout))
+
+        try:
+            print(f"[transfer_history]Transferring {self.table} -> {self.dst_table}")
+            journal = self._journal = self._open_journal() if self.resume else None
+            if journal is not None and journal.resumable:
+                # the plan of the interrupted run is reused, the watermark and partition ranges are not recomputed
+                conditions = decode_conditions(journal.conditions)
+                self._partitions = [decode_conditions(partition) for partition in journal.partitions]
+                print(f"[transfer_history]Resuming {self.table} from the journal {journal.path}")
+            else:
+                conditions = self._incremental_conditions(dst)
+                self._partitions = self._partition_conditions(src, conditions)
+                if journal is not None:
+                    journal.start(encode_conditions(conditions),
+                                  [encode_conditions(partition) for partition in self._partitions])
+            self._prepare_types(src, dst)
+            if self.progress is not None and self.progress.total_rows is None:
+                self.progress.total_rows = self._approximate_rows(src, conditions)
+            if self.transforms:
+                # one pool shared by all partitions
+                self._transform_stage = TransformStage(self.transforms, processes=self.transform_processes,
+                                                       budget=self._budget).start()
+            if self.load_mode in STAGED_LOAD_MODES:
+                # all partitions load the same stage table, which is applied to the sink once at the end
+                if journal is not None and journal.stage_table:
+                    self._load_table = journal.stage_table
+                else:
+                    self._load_table = dst.create_stage_table(self.dst_table)
+                    if journal is not None:
+                        journal.set_stage_table(self._load_table)
+            completed = False
+            try:
+                if len(self._partitions) == 1:
+                    num_rows, num_bytes = self._run_partition(0, src, dst)
+                else:
+                    with ThreadPoolExecutor(max_workers=self.parallelism) as executor:
+                        try:
+                            results = list(executor.map(self._run_partition, range(len(self._partitions))))
+                        except KeyboardInterrupt:
+                            # cancel the statements of the other partitions instead of waiting for their end
+                            interrupt_statements()
+                            raise
+                    num_rows = sum(rows for rows, _ in results)
+                    num_bytes = sum(nbytes for _, nbytes in results)
+                if self.load_mode in STAGED_LOAD_MODES and not (journal is not None and journal.merged):
+                    dst.merge_stage_table(self._load_table, self.dst_table, mode=self.load_mode, key_columns=self.key_columns)
+                    if journal is not None:
+                        journal.set_merged()
+                completed = True
+            finally:
+                # the stage table of an interrupted resumable transfer is kept for the next run
+                if self._load_table != self.dst_table and (completed or journal is None):
+                    dst.drop_table(self._load_table)
+                self._load_table = self.dst_table
+                if not completed and journal is not None:
+                    print(f"[transfer_history]Transfer of {self.table} interrupted, run it again with resume to continue.")
+            if self.verify and journal is None:
+                self._verify(src, conditions, num_rows)
+            if journal is not None:
+                journal.remove()
+                self._journal = None
+            transport = {"src": src.transport_stats(), "dst": dst.transport_stats()}
+        finally:
+            if self._transform_stage is not None:
+                self._transform_stage.stop()
+                self._transform_stage = None
+            deadlines.close()
+            self._deadline = None
+            if own_src:
+                src.close()
+            if own_dst:
+                dst.close()
+            memory = self._memory_report()
+            profile, self._column_profiler = self._column_profiler, None
+
+        seconds = time.time() - start_time
+        result = {"table": self.table, "dst_table": self.dst_table, "rows": num_rows, "bytes": num_bytes,
+                  "seconds": seconds, "verified": bool(self.verify), "transport": transport}
+        if memory:
+            result["memory"] = memory
+        if profile is not None:
+            result["profile"] = profile.report()
+            for line in format_profile(result["profile"]):
+                print(f"[transfer_history]Profile of {self.table}: {line}")
+        record_transfer(conn_label(self.src), conn_label(self.dst), result, parallelism=len(self._partitions))
+        print(f"[transfer_history]Transferred {num_rows} rows ({num_bytes} bytes) in {seconds:.1f}s: {self.table} -> {self.dst_table}")
+        print(f"[transfer_history]Transport of {self.table}: source {transport['src']}, sink {transport['dst']}")
+        return result
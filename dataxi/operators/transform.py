@@ -0,0 +1,273 @@
+# File: transform.py
+
+# Description: This Package provides the transform stage of the transfers, which runs user functions over the
+#              Arrow batches between extract and load, in a process pool for the CPU-heavy transformations.
+#              The batches cross the process boundary as Arrow IPC streams in shared memory instead of pickles.
+
+# Creator: Yuan Yuan (yyccphil@gmail.com)
+
+
+import functools
+import hashlib
+import importlib
+import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from ..connectors.base_connector import import_pyarrow
+
+
+def resolve_transform(spec):
+    """Return the transform function of a spec.
+
+    Args:
+        spec: a callable, a 'module:function' string, or a dictionary {"function": 'module:function', **kwargs}
+            whose other keys are bound as keyword arguments (e.g. from a job file).
+    """
+    if callable(spec):
+        return spec
+    kwargs = {}
+    if isinstance(spec, dict):
+        spec = dict(spec)
+        kwargs = spec.pop("kwargs", None) or {key: spec.pop(key) for key in list(spec) if key != "function"}
+        spec = spec["function"]
+    if not isinstance(spec, str) or ":" not in spec:
+        raise ValueError(f"Invalid transform '{spec}', expected a callable or 'module:function'.")
+    module_name, func_name = spec.split(":", 1)
+    func = getattr(importlib.import_module(module_name), func_name)
+    return functools.partial(func, **kwargs) if kwargs else func
+
+
+def apply_transforms(functions, batch):
+    """Apply the functions in order to a RecordBatch. A function may return a RecordBatch or a Table."""
+    pa = import_pyarrow()
+    for func in functions:
+        batch = func(batch)
+        if isinstance(batch, pa.Table):
+            batch = batch.combine_chunks().to_batches()[0] if batch.num_rows else pa.RecordBatch.from_pylist([], schema=batch.schema)
+    return batch
+
+
+def _write_shared(batch):
+    """Write the batch as an Arrow IPC stream into a new shared memory block and return (block, size)."""
+    pa = import_pyarrow()
+    sink = pa.MockOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    size = sink.size()
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    stream = pa.FixedSizeBufferWriter(pa.py_buffer(shm.buf))
+    with pa.ipc.new_stream(stream, batch.schema) as writer:
+        writer.write_batch(batch)
+    return shm, size
+
+
+def _read_shared(shm, size):
+    """Read the RecordBatch of a shared memory block without copying it."""
+    pa = import_pyarrow()
+    reader = pa.ipc.open_stream(pa.py_buffer(shm.buf)[:size])
+    return reader.read_next_batch()
+
+
+def _transform_shared(functions, shm, size):
+    """Transform the batch of the input block into a new block, the views of the input block end with the call."""
+    return _write_shared(apply_transforms(functions, _read_shared(shm, size)))
+
+
+def _transform_worker(functions, name, size):
+    """Run in a pool process: transform the batch of the input block, return the name and size of the output block."""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        out, out_size = _transform_shared(functions, shm, size)
+    finally:
+        try:
+            shm.close()
+        except BufferError:
+            # the traceback of a failed transform still holds views of the block, keep its exception instead
+            pass
+    # the parent attaches, copies and unlinks the output block (the pool shares the parent's resource tracker)
+    out.close()
+    return out.name, out_size
+
+
+class TransformStage:
+    def __init__(self, functions, processes=None, max_pending=None, mp_context=None, budget=None):
+        """Initialize the transform stage.
+
+        Args:
+            functions: transform function or list of them, applied in order to each pyarrow RecordBatch and returning
+                a RecordBatch (or Table). See resolve_transform() for the accepted specs. With processes, the
+                functions must be importable module-level functions (or functools.partial of them).
+            processes: size of the process pool, 0 to run the functions in the calling thread.
+                Default is None (number of CPUs).
+            max_pending: maximum batches in flight in the pool, bounding the memory. Default is None (2 x processes).
+            mp_context: multiprocessing context of the pool, e.g. multiprocessing.get_context("spawn"). Default is None.
+            budget: MemoryBudget accounting the batches in flight in the pool as the 'transform_pool' stage.
+                Default is None.
+        """
+        if not isinstance(functions, (list, tuple)):
+            functions = [functions]
+        self.functions = [resolve_transform(func) for func in functions]
+        self.processes = processes
+        self.max_pending = max_pending
+        self.mp_context = mp_context
+        self.budget = budget
+        self._executor = None
+
+    def start(self):
+        """Start the process pool."""
+        if self.processes != 0 and self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=self.mp_context)
+            if self.max_pending is None:
+                self.max_pending = 2 * self._executor._max_workers
+            print(f"[transfer_history]Started the transform pool with {self._executor._max_workers} processes.")
+        return self
+
+    def stop(self):
+        """Stop the process pool."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _submit(self, batch):
+        """Copy the batch into shared memory and submit its transformation."""
+        shm, size = _write_shared(batch)
+        if self.budget is not None:
+            self.budget.reserve("transform_pool", shm.size, blocking=False)
+        return shm, self._executor.submit(_transform_worker, self.functions, shm.name, size)
+
+    def _release(self, shm):
+        """Release the shared memory block of an input batch."""
+        if self.budget is not None:
+            self.budget.release("transform_pool", shm.size)
+        shm.close()
+        shm.unlink()
+
+    def _collect(self, shm, future):
+        """Wait for a submitted batch, release its blocks and return the transformed batch."""
+        pa = import_pyarrow()
+        try:
+            name, size = future.result()
+        finally:
+            self._release(shm)
+        out = shared_memory.SharedMemory(name=name)
+        try:
+            # copy once out of the block, so it can be released while the batch is loaded
+            buffer = pa.py_buffer(bytes(out.buf[:size]))
+        finally:
+            out.close()
+            out.unlink()
+        return pa.ipc.open_stream(buffer).read_next_batch()
+
+    def transform(self, batch):
+        """Transform one batch in the calling thread."""
+        return apply_transforms(self.functions, batch)
+
+    def map(self, batches):
+        """Transform a stream of RecordBatches, yielding the results in order.
+
+        Up to max_pending batches are transformed concurrently by the pool, the others wait in the source.
+
+        Args:
+            batches: iterable of pyarrow RecordBatches.
+        """
+        if self._executor is None:
+            for batch in batches:
+                yield self.transform(batch)
+            return
+
+        pending = deque()
+        try:
+            for batch in batches:
+                if batch.num_rows == 0:
+                    continue
+                pending.append(self._submit(batch))
+                if len(pending) >= self.max_pending:
+                    yield self._collect(*pending.popleft())
+            while pending:
+                yield self._collect(*pending.popleft())
+        finally:
+            # release the blocks of the batches still in flight when the consumer stops early
+            while pending:
+                shm, future = pending.popleft()
+                future.cancel()
+                try:
+                    name, _ = future.result()
+                    out = shared_memory.SharedMemory(name=name)
+                    out.close()
+                    out.unlink()
+                except Exception:
+                    pass
+                self._release(shm)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+# Built-in transforms, bind their arguments with functools.partial or a job file dictionary
+
+
+def hash_columns(batch, columns, salt="", algorithm="sha256"):
+    """Replace the values of the columns with their hex digest, e.g. to pseudonymize PII. NULLs are kept."""
+    pa = import_pyarrow()
+    arrays = []
+    for name, column in zip(batch.schema.names, batch.columns):
+        if name in columns:
+            column = pa.array([None if value is None else
+                               hashlib.new(algorithm, (salt + str(value)).encode()).hexdigest()
+                               for value in column.to_pylist()], type=pa.string())
+        arrays.append(column)
+    return pa.RecordBatch.from_arrays(arrays, names=batch.schema.names)
+
+
+def extract_regex(batch, column="_raw", pattern=None, keep=True):
+    """Add the named groups of the regex pattern, matched on a string column (e.g. Splunk _raw), as columns.
+
+    Args:
+        batch: pyarrow RecordBatch.
+        column: string column to parse. Default is '_raw'.
+        pattern: regex with named groups, e.g. r'user=(?P<user>\\w+)'.
+        keep: keep the parsed column. Default is True.
+    """
+    pa = import_pyarrow()
+    import pyarrow.compute as pc
+
+    parsed = pc.extract_regex(batch.column(batch.schema.get_field_index(column)), pattern=pattern)
+    names = [name for name in batch.schema.names if keep or name != column]
+    arrays = [batch.column(batch.schema.get_field_index(name)) for name in names]
+    for field in parsed.type:
+        names.append(field.name)
+        arrays.append(pc.struct_field(parsed, field.name))
+    return pa.RecordBatch.from_arrays(arrays, names=names)
+
+
+def flatten_json(batch, column, fields=None, separator="_", keep=False):
+    """Flatten the JSON objects of a string column into columns named '<column><separator><key>'.
+
+    Args:
+        batch: pyarrow RecordBatch.
+        column: string column with JSON objects.
+        fields: keys to extract. Default is None (all keys found in the batch).
+        separator: separator of the column names. Default is '_'.
+        keep: keep the JSON column. Default is False.
+    """
+    pa = import_pyarrow()
+    records = [json.loads(value) if value else {} for value in batch.column(batch.schema.get_field_index(column)).to_pylist()]
+    if fields is None:
+        fields = sorted({key for record in records if isinstance(record, dict) for key in record})
+    names = [name for name in batch.schema.names if keep or name != column]
+    arrays = [batch.column(batch.schema.get_field_index(name)) for name in names]
+    for key in fields:
+        values = [record.get(key) if isinstance(record, dict) else None for record in records]
+        # nested values stay JSON text, so every column has a scalar type
+        values = [json.dumps(value) if isinstance(value, (dict, list)) else value for value in values]
+        names.append(f"{column}{separator}{key}")
+        try:
+            arrays.append(pa.array(values))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrays.append(pa.array([None if value is None else str(value) for value in values], type=pa.string()))
+    return pa.RecordBatch.from_arrays(arrays, names=names)
@@ -0,0 +1,84 @@
+import sqlite3
+
+import pytest
+
+from dataxi.connectors import register_connector
+from dataxi.connectors.base_connector import BaseConnector
+from dataxi.cred_mgr import CredStore, get_cred
+
+
+class SQLiteConnector(BaseConnector):
+    """Connector of a SQLite file, standing in for a database in the transfer tests."""
+    db_type = "sqlite_test"
+    paramstyle = "?"
+
+    def __init__(self, path=None, conn_id=None, **kwargs):
+        self.conn_id = conn_id
+        self.path = path or get_cred(conn_id)["path"]
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+
+    def _connection(self):
+        return self.connection
+
+    def execute_query(self, query, params=None):
+        cursor = self.connection.cursor()
+        with self._guard(query):
+            cursor.execute(query, params or ())
+            result = cursor.fetchall() if cursor.description else []
+        self.connection.commit()
+        return result
+
+    def _upsert_clause(self, column_names, key_columns):
+        return (f"ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET "
+                + ", ".join(f"{col} = excluded.{col}" for col in column_names if col not in key_columns))
+
+    def cancel(self):
+        self.connection.interrupt()
+
+    def close(self):
+        self.close_writers()
+        self.connection.close()
+
+
+register_connector("sqlite_test", SQLiteConnector)
+
+
+class Databases:
+    """Source and sink SQLite files, stored as the conn_ids 'src' and 'dst'."""
+
+    def __init__(self, path):
+        self.paths = {"src": str(path / "src.db"), "dst": str(path / "dst.db")}
+        CredStore().add_many({conn_id: {"db_type": "sqlite_test", "path": db_path}
+                              for conn_id, db_path in self.paths.items()})
+
+    def execute(self, conn_id, query, rows=None):
+        """Run a statement (executemany with rows) on a database and return the fetched rows."""
+        db = sqlite3.connect(self.paths[conn_id])
+        try:
+            cursor = db.executemany(query, rows) if rows is not None else db.execute(query)
+            result = cursor.fetchall()
+            db.commit()
+            return result
+        finally:
+            db.close()
+
+    def connector(self, conn_id):
+        return SQLiteConnector(conn_id=conn_id)
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    """Isolate ~/.dataxi (credentials, journals, coordinator, metrics) in a temporary home."""
+    monkeypatch.setenv("HOME", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def databases(home):
+    """Source and sink databases with the table t (id, k, v), the source holding 1000 rows."""
+    databases = Databases(home)
+    for conn_id in ("src", "dst"):
+        databases.execute(conn_id, "CREATE TABLE t (id INTEGER PRIMARY KEY, k INTEGER, v TEXT)")
+    databases.execute("src", "INSERT INTO t VALUES (?, ?, ?)",
+                      [(i, i // 10 if i % 50 else None, f"value {i}") for i in range(1000)])
+    return databases
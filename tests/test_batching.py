@@ -0,0 +1,61 @@
+import pytest
+
+from dataxi.operators import TableTransfer
+from dataxi.operators.batching import AdaptiveBatcher
+
+from .test_load_modes import connect
+
+pa = pytest.importorskip("pyarrow")
+
+
+class LimitedSink:
+    """Sink reporting the max_insert_block_size of a ClickHouse server."""
+
+    def batch_limits(self):
+        return {"max_rows": 5000, "max_bytes": None}
+
+
+def test_converges_toward_the_targets():
+    batcher = AdaptiveBatcher(target_bytes=100000, target_seconds=1.0, initial_rows=100, min_rows=10, smoothing=1.0)
+    # 10 bytes per row: the byte target allows 10000 rows, reached by doubling
+    sizes = []
+    for _ in range(8):
+        rows = batcher.next_size()
+        batcher.record(rows, rows * 10, rows * 1e-6)
+        sizes.append(batcher.next_size())
+    assert sizes[:3] == [200, 400, 800] and sizes[-1] == 10000
+    # a slow load shrinks the batch at once, toward the latency target
+    batcher.record(10000, 100000, 5.0)
+    assert batcher.next_size() == 2000
+
+
+def test_server_limits():
+    batcher = AdaptiveBatcher.for_connector(LimitedSink(), initial_rows=10000, max_rows=8000)
+    assert batcher.next_size() == 5000
+    batcher = AdaptiveBatcher(max_bytes=1000000, target_bytes=10 ** 9, initial_rows=100)
+    batcher.record(100, 100 * 1000, 0.001)
+    assert batcher.next_size() == 200
+    assert batcher.estimate_size(1000) == 1000
+
+
+def test_mysql_packet_limit(monkeypatch):
+    module = connect(monkeypatch, "mysql_connector", "pymysql")
+    mysql = module.MySQLConnector(host="mysql", user="u", password="p")
+    # half of max_allowed_packet (64 MB) as margin for the SQL text
+    assert AdaptiveBatcher.for_connector(mysql).max_bytes == 32 * 1024 * 1024
+
+
+def test_rebatch_follows_the_recorded_sizes():
+    batcher = AdaptiveBatcher(initial_rows=150, min_rows=1, target_seconds=1.0, target_bytes=10 ** 9)
+    source = [pa.record_batch({"id": list(range(start, start + 100))}) for start in range(0, 1000, 100)]
+    loaded = list(batcher.load(source, lambda batch: None))
+    assert loaded[0].num_rows == 150
+    assert sum(batch.num_rows for batch in loaded) == 1000
+    assert [value for batch in loaded for value in batch.column(0).to_pylist()] == list(range(1000))
+
+
+def test_auto_batch_size_transfer(databases):
+    result = TableTransfer("src", "dst", "t", batch_size="auto", verify=True,
+                           batcher_options={"initial_rows": 50, "min_rows": 10}).run()
+    assert result["rows"] == 1000
+    assert databases.execute("dst", "SELECT COUNT(DISTINCT id) FROM t") == [(1000,)]
@@ -0,0 +1,34 @@
+import threading
+import time
+
+
+def test_writes_are_coalesced(databases):
+    dst = databases.connector("dst")
+    writer = dst.buffered_writer("t", max_rows=250, max_seconds=None)
+    for i in range(1000):
+        writer.write([{"id": i, "k": i, "v": "x"}])
+    assert databases.execute("dst", "SELECT COUNT(*) FROM t") == [(1000,)]
+    writer.write([(1000, 1, "y")])
+    # the last row waits for the close, with the connector
+    dst.close()
+    assert databases.execute("dst", "SELECT COUNT(*) FROM t") == [(1001,)]
+    assert writer.stats == {"writes": 1001, "flushes": 5, "rows": 1001}
+
+
+def test_age_flush_runs_in_the_writing_thread(databases):
+    dst = databases.connector("dst")
+    flush_threads = []
+    bulk_insert = dst.bulk_insert
+    dst.bulk_insert = lambda *args, **kwargs: (flush_threads.append(threading.current_thread()),
+                                               bulk_insert(*args, **kwargs))[1]
+    threads = threading.active_count()
+    with dst.buffered_writer("t", max_seconds=0.1) as writer:
+        writer.write([{"id": 1, "k": 1, "v": "a"}])
+        assert threading.active_count() == threads
+        time.sleep(0.2)
+        # an idle buffer is not flushed in the background
+        assert databases.execute("dst", "SELECT COUNT(*) FROM t") == [(0,)]
+        writer.write([{"id": 2, "k": 2, "v": "b"}])
+        assert databases.execute("dst", "SELECT COUNT(*) FROM t") == [(2,)]
+    assert flush_threads == [threading.current_thread()]
+    dst.close()
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from .conftest import SQLiteConnector
+
+
+class EstimatingConnector(SQLiteConnector):
+    """SQLite connector with fixed catalogue statistics and planner estimates."""
+    stats_rows = None
+    stats_bytes = 0
+    estimate = None
+
+    def table_stats(self, table_name):
+        return {"rows": self.stats_rows, "bytes": self.stats_bytes}
+
+    def estimate_rows(self, query):
+        self.estimated = query
+        return self.estimate
+
+
+@pytest.fixture
+def src(databases):
+    connector = EstimatingConnector(conn_id="src")
+    yield connector
+    connector.close()
+
+
+def test_catalogue_statistics_first(src):
+    src.stats_rows, src.estimate = 990, 1200
+    assert src.count_rows("t") == 990
+    assert src.count_rows("t", where="k > 10") == 1200
+    assert src.estimated == 'SELECT * FROM "t" WHERE k > 10'
+    assert src.count_rows("t", exact=True) == 1000
+
+
+def test_missing_statistics_fall_back_to_the_estimate_then_the_count(src):
+    src.estimate = 1200
+    assert src.count_rows("t") == 1200
+    assert src.estimated == 'SELECT * FROM "t"'
+    src.estimate = None
+    assert src.count_rows("t") == 1000
+    assert src.count_rows("t", where="k IS NULL") == 20
+
+
+def test_backends_without_statistics_count(databases):
+    with SQLiteConnector(conn_id="src") as src:
+        assert src.count_rows("t") == 1000
+
+
+class PlannerConnection:
+    """psycopg2 connection of a table never analyzed: reltuples is -1 and EXPLAIN estimates from the pages."""
+    closed = False
+
+    def cursor(self, *args, **kwargs):
+        return PlannerCursor()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class PlannerCursor:
+    def execute(self, query, params=None):
+        self.row = (-1, 8192) if "pg_class" in query else (json.dumps([{"Plan": {"Plan Rows": 2550}}]),)
+
+    def fetchone(self):
+        return self.row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+def test_postgresql_table_never_analyzed(monkeypatch):
+    module = pytest.importorskip("dataxi.connectors.postgresql_connector")
+    monkeypatch.setattr(module.psycopg2, "connect", lambda **kwargs: PlannerConnection())
+    connector = module.PostgreSQLConnector(host="pg", user="u", password="p")
+    assert connector.table_stats("orders") == {"rows": None, "bytes": 8192}
+    assert connector.count_rows("orders") == 2550
+
+
+def test_splunk_counts_the_events_of_the_index(monkeypatch):
+    from dataxi.connectors import SplunkConnector
+
+    splunk = SplunkConnector(token="token", url="https://splunk:8089", earliest="-1d")
+    searches = []
+
+    def execute_query(query, earliest=None, latest=None):
+        searches.append((query, earliest, latest))
+        return {"results": [{"count": "42"}]}
+
+    monkeypatch.setattr(splunk, "execute_query", execute_query)
+    assert splunk.count_rows("web", where="status=500") == 42
+    assert searches == [("search index=web status=500 | stats count", "-1d", None)]
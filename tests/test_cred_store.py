@@ -0,0 +1,67 @@
+import json
+import multiprocessing
+import stat
+
+import pytest
+
+from dataxi.cred_mgr import CredMgr, CredStore, get_cred
+
+
+def add_creds(path, worker):
+    store = CredStore(path)
+    for i in range(25):
+        store.add(f"conn_{worker}_{i}", {"db_type": "mysql", "host": f"host{i}"})
+
+
+def test_add_get_delete(home):
+    store = CredStore()
+    assert store.add("mysql_prod", {"db_type": "mysql", "host": "db1"})
+    assert not store.add("mysql_prod", {"db_type": "mysql", "host": "db2"})
+    assert store.get("mysql_prod")["host"] == "db1"
+    assert store.add("mysql_prod", {"db_type": "mysql", "host": "db2"}, overwrite=True)
+    assert get_cred("mysql_prod")["host"] == "db2"
+    assert store.add_many({"a": {"db_type": "ch"}, "b": {"db_type": "pg"}, "mysql_prod": {}}) == 2
+    assert store.conn_ids() == ["a", "b", "mysql_prod"]
+    assert store.all(["a", "missing"]) == {"a": {"db_type": "ch"}}
+    assert store.delete("a") and not store.delete("a")
+    assert store.get("a") is None
+    with pytest.raises(ValueError, match="not a JSON object"):
+        store.add_many({"c": {"db_type": "ch"}, "d": "password"})
+    # the batch is one transaction
+    assert store.get("c") is None
+    assert stat.S_IMODE(store.path.stat().st_mode) == 0o600
+
+
+def test_legacy_json_is_imported_once(home):
+    folder = home / ".dataxi"
+    folder.mkdir()
+    (folder / "creds.json").write_text(json.dumps({"old": {"db_type": "mysql"}}))
+    assert CredStore().get("old") == {"db_type": "mysql"}
+    assert not (folder / "creds.json").exists() and (folder / "creds.json.bak").exists()
+
+
+def test_import_export(home, tmp_path):
+    manager = CredMgr()
+    manager.store.add("kept", {"db_type": "mysql", "host": "db1"})
+    path = tmp_path / "creds.json"
+    path.write_text(json.dumps({"kept": {"db_type": "mysql", "host": "db2"}, "new": {"db_type": "ch"}}))
+    manager.import_creds(str(path))
+    assert manager.store.get("kept")["host"] == "db1" and manager.store.get("new") == {"db_type": "ch"}
+    manager.import_creds(str(path), overwrite=True)
+    assert manager.store.get("kept")["host"] == "db2"
+    export_path = tmp_path / "export.json"
+    manager.export_creds(str(export_path), conn_ids=["new"])
+    assert json.loads(export_path.read_text()) == {"new": {"db_type": "ch"}}
+    assert stat.S_IMODE(export_path.stat().st_mode) == 0o600
+
+
+def test_concurrent_writers(tmp_path):
+    path = tmp_path / "creds.db"
+    CredStore(path)
+    processes = [multiprocessing.Process(target=add_creds, args=(path, worker)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+    assert len(CredStore(path).conn_ids()) == 100
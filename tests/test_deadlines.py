@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+from dataxi.operators import TableTransfer
+
+from .conftest import SQLiteConnector
+from .test_load_modes import RecordingConnection, connect
+
+# a query counting forever, until it is cancelled
+ENDLESS = "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) SELECT COUNT(*) FROM c"
+
+
+@pytest.fixture
+def src(databases):
+    connector = SQLiteConnector(conn_id="src")
+    yield connector
+    connector.close()
+
+
+def test_the_deadline_cancels_the_running_statement_and_the_next_ones(src):
+    start = time.time()
+    with src.deadline(0.3):
+        with pytest.raises(TimeoutError, match="cancelled at its deadline"):
+            src.execute_query(ENDLESS)
+        assert time.time() - start < 3
+        # a retry of the caller cannot extend the block
+        with pytest.raises(TimeoutError, match="the query is not sent"):
+            src.execute_query("SELECT 1")
+    assert src.execute_query("SELECT 1") == [(1,)]
+    # a nested block keeps the earlier deadline
+    with src.deadline(0.2), src.deadline(60):
+        with pytest.raises(TimeoutError):
+            src.execute_query(ENDLESS)
+
+
+def test_query_timeout_bounds_each_statement(src, monkeypatch):
+    monkeypatch.setattr(src, "query_timeout", 0.2)
+    with pytest.raises(TimeoutError):
+        src.execute_query(ENDLESS)
+    assert src.execute_query("SELECT COUNT(*) FROM t") == [(1000,)]
+
+
+def test_interrupt_cancels_and_stops_the_next_statements(src):
+    threading.Timer(0.2, src.interrupt).start()
+    with pytest.raises(Exception, match="interrupted"):
+        src.execute_query(ENDLESS)
+    with pytest.raises(Exception, match="was interrupted, the query is not sent"):
+        src.execute_query("SELECT 1")
+
+
+def test_a_statement_ignoring_the_cancellation_gets_its_connection_reset(src, monkeypatch):
+    resets = []
+    monkeypatch.setattr(src, "cancel_grace", 0.1)
+    monkeypatch.setattr(src, "cancel", lambda: None)
+    monkeypatch.setattr(src, "reset_connection", lambda: resets.append(time.time()) or src.connection.interrupt())
+    with src.deadline(0.1), pytest.raises(TimeoutError):
+        src.execute_query(ENDLESS)
+    assert len(resets) == 1
+
+
+def test_transfer_timeout(databases):
+    start = time.time()
+    with pytest.raises(TimeoutError):
+        TableTransfer("src", "dst", "t", query=ENDLESS, timeout=0.3).run()
+    assert time.time() - start < 5
+
+
+class KillableConnection(RecordingConnection):
+    def thread_id(self):
+        return 42
+
+
+def test_mysql_kills_the_query_from_a_second_connection(monkeypatch):
+    module = connect(monkeypatch, "mysql_connector", "pymysql")
+    monkeypatch.setattr(module.pymysql, "connect", KillableConnection)
+    connector = module.MySQLConnector(host="mysql", user="u", password="p")
+    connections = []
+    monkeypatch.setattr(module.pymysql, "connect", lambda **kwargs: connections.append(KillableConnection()) or connections[-1])
+    connector.cancel()
+    (killer,) = connections
+    assert killer.statements == [("KILL QUERY 42", None)] and killer.closed
+    assert not connector.mysql_connection.closed
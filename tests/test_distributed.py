@@ -0,0 +1,104 @@
+import time
+
+import pytest
+
+from dataxi.operators import SQLiteCoordinator, TransferWorker, submit_transfer
+
+from .conftest import SQLiteConnector
+
+
+@pytest.fixture
+def coordinator(tmp_path):
+    return SQLiteCoordinator(tmp_path / "coordinator.db")
+
+
+def test_lease_lifecycle(coordinator):
+    transfer_id = "orders"
+    first, second = coordinator.submit(transfer_id, [{"part": 0}, {"part": 1}], max_attempts=2)
+
+    task = coordinator.lease("w1", lease_seconds=60)
+    assert task == {"id": first, "transfer_id": transfer_id, "params": {"part": 0}, "attempts": 1}
+    assert coordinator.lease("w2", lease_seconds=60)["id"] == second
+    assert coordinator.lease("w3", lease_seconds=60) is None
+
+    assert coordinator.heartbeat(first, "w1", lease_seconds=60)
+    assert not coordinator.heartbeat(first, "w2", lease_seconds=60)
+    assert coordinator.complete(first, "w1", {"rows": 10})
+    assert not coordinator.complete(first, "w1", {"rows": 10})
+
+    # the first failure releases the task, the last attempt fails it
+    assert coordinator.fail(second, "w2", "boom") == "pending"
+    assert coordinator.lease("w3", lease_seconds=60)["attempts"] == 2
+    assert coordinator.fail(second, "w3", "boom again") == "failed"
+
+    status = coordinator.status(transfer_id)
+    assert (status["pending"], status["leased"], status["done"], status["failed"]) == (0, 0, 1, 1)
+    assert status["rows"] == 10
+    assert status["errors"] == {second: "boom again"}
+
+
+def test_expired_lease_is_leased_again(coordinator):
+    (task_id,) = coordinator.submit("orders", [{}], max_attempts=2)
+    coordinator.lease("lost", lease_seconds=0.1)
+    time.sleep(0.2)
+    task = coordinator.lease("w1", lease_seconds=60)
+    assert (task["id"], task["attempts"]) == (task_id, 2)
+    # the lost worker cannot report anymore
+    assert not coordinator.heartbeat(task_id, "lost", lease_seconds=60)
+    assert not coordinator.complete(task_id, "lost", {"rows": 1})
+    assert coordinator.fail(task_id, "lost", "late") is None
+
+
+def test_expired_last_attempt_fails_the_task(coordinator):
+    (task_id,) = coordinator.submit("orders", [{}], max_attempts=1)
+    coordinator.lease("lost", lease_seconds=0.1)
+    time.sleep(0.2)
+    assert coordinator.lease("w1", lease_seconds=60) is None
+    assert coordinator.status("orders")["errors"] == {task_id: "lease expired on the last attempt"}
+
+
+def test_workers_load_every_partition_once(databases, coordinator):
+    transfer_id = submit_transfer(coordinator, partitions=4, src="src", dst="dst", table="t", partition_column="id",
+                                  batch_size=100)
+    # a lost worker loaded part of the first partition
+    lost = coordinator.lease("lost", lease_seconds=0.1)
+    assert "id IS NULL" in lost["params"]["cleanup"]
+    databases.execute("dst", "INSERT INTO t SELECT * FROM (SELECT 0, 0, 'partial') UNION ALL SELECT 1, 0, 'partial'")
+    time.sleep(0.2)
+
+    stats = TransferWorker(coordinator, worker_id="w1", poll_interval=0.1).run(exit_when_idle=True)
+    assert stats["succeeded"] == 4
+    status = coordinator.wait(transfer_id, poll_interval=0.1)
+    assert (status["done"], status["rows"]) == (4, 1000)
+    assert databases.execute("dst", "SELECT COUNT(*), COUNT(DISTINCT id) FROM t") == [(1000, 1000)]
+    assert databases.execute("dst", "SELECT COUNT(*) FROM t WHERE v = 'partial'") == [(0,)]
+
+
+def test_insert_retries_reject_a_source_where(databases, coordinator):
+    with pytest.raises(ValueError, match="where"):
+        submit_transfer(coordinator, partitions=2, src="src", dst="dst", table="t", partition_column="id",
+                        where="k > 10")
+    # the cleanup of an upsert retry is never needed, the where only filters the source
+    transfer_id = submit_transfer(coordinator, partitions=2, src="src", dst="dst", table="t", partition_column="id",
+                                  where="k > 10", load_mode="upsert", key_columns=["id"])
+    tasks = [coordinator.lease("w1", lease_seconds=60) for _ in range(2)]
+    assert all("(k > 10)" in task["params"]["where"] and "k > 10" not in task["params"]["cleanup"] for task in tasks)
+    assert coordinator.status(transfer_id)["leased"] == 2
+
+
+def test_lost_lease_interrupts_the_task(databases, coordinator, monkeypatch):
+    class LossyCoordinator(SQLiteCoordinator):
+        def heartbeat(self, task_id, worker_id, lease_seconds):
+            return False
+
+    lossy = LossyCoordinator(coordinator.path)
+    submit_transfer(lossy, src="src", dst="dst", table="t", batch_size=10, max_attempts=1)
+    # a slow sink, the lease is lost long before the end of the transfer
+    bulk_insert = SQLiteConnector.bulk_insert
+    monkeypatch.setattr(SQLiteConnector, "bulk_insert",
+                        lambda self, *args, **kwargs: (time.sleep(0.05), bulk_insert(self, *args, **kwargs))[1])
+    start_time = time.time()
+    stats = TransferWorker(lossy, worker_id="w1", lease_seconds=0.3).run(max_tasks=1)
+    assert stats["failed"] == 1
+    assert time.time() - start_time < 3
+    assert databases.execute("dst", "SELECT COUNT(*) FROM t")[0][0] < 1000
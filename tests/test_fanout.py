@@ -0,0 +1,96 @@
+import time
+
+import pytest
+
+from dataxi.operators import FanOutTransfer, ParquetSink, Sink
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+# a stopped extraction closes its source stream before the connection
+pytestmark = pytest.mark.filterwarnings("error::pytest.PytestUnraisableExceptionWarning")
+
+
+@pytest.fixture
+def sinks(databases):
+    databases.execute("dst", "CREATE TABLE t2 (id INTEGER PRIMARY KEY, k INTEGER, v TEXT)")
+    return databases
+
+
+def test_every_sink_gets_every_row(sinks, tmp_path):
+    result = FanOutTransfer("src", "t", ["dst", Sink("dst", table="t2"), tmp_path / "t.parquet"], batch_size=100).run()
+    assert result["rows"] == 1000
+    assert sinks.execute("dst", "SELECT COUNT(*) FROM t") == [(1000,)]
+    assert sinks.execute("dst", "SELECT COUNT(*) FROM t2") == [(1000,)]
+    assert pq.read_table(tmp_path / "t.parquet").num_rows == 1000
+    assert all(stats["rows"] == 1000 and stats["error"] is None for stats in result["sinks"].values())
+
+
+def test_slow_sink_spills_and_retries(sinks, tmp_path):
+    slow = sinks.connector("dst")
+    bulk_insert, calls = slow.bulk_insert, {"count": 0}
+
+    def slow_insert(*args, **kwargs):
+        calls["count"] += 1
+        time.sleep(0.02)
+        if calls["count"] == 2:
+            raise RuntimeError("flaky sink")
+        return bulk_insert(*args, **kwargs)
+
+    slow.bulk_insert = slow_insert
+    spill_dir = tmp_path / "spill"
+    spill_dir.mkdir()
+    result = FanOutTransfer("src", "t", ["dst", Sink(slow, table="t2", buffer_bytes=1, retry_delay=0.01)],
+                            batch_size=50, spill_dir=spill_dir).run()
+    stats = result["sinks"]["dst:t2"]
+    assert stats["retries"] == 1
+    assert stats["spilled_batches"] > 0
+    assert stats["rows"] == 1000
+    assert sinks.execute("dst", "SELECT COUNT(*), COUNT(DISTINCT id) FROM t2") == [(1000, 1000)]
+    # the spilled batches are removed once loaded
+    assert not list(spill_dir.iterdir())
+    slow.close()
+
+
+def test_failed_sink_does_not_stop_the_others(sinks, tmp_path):
+    broken = sinks.connector("dst")
+
+    def failing_insert(*args, **kwargs):
+        raise RuntimeError("sink down")
+
+    broken.bulk_insert = failing_insert
+    fanout = FanOutTransfer("src", "t", [Sink(broken, table="t2", attempts=2, retry_delay=0.01),
+                                         tmp_path / "t.parquet"], batch_size=100)
+    with pytest.raises(Exception, match="sink down"):
+        fanout.run()
+    assert pq.read_table(tmp_path / "t.parquet").num_rows == 1000
+
+    fanout.fail_on_error = False
+    result = fanout.run()
+    assert result["sinks"]["dst:t2"]["error"] == "sink down"
+    assert result["sinks"][f"parquet:{tmp_path / 't.parquet'}"]["rows"] == 1000
+    broken.close()
+
+
+def test_all_sinks_failing_stops_the_source(sinks):
+    broken = sinks.connector("dst")
+
+    def failing_insert(*args, **kwargs):
+        raise RuntimeError("sink down")
+
+    broken.bulk_insert = failing_insert
+    with pytest.raises(Exception, match="All the sinks"):
+        FanOutTransfer("src", "t", [Sink(broken, attempts=1)], batch_size=10).run()
+    broken.close()
+
+
+def test_aborted_parquet_archive_is_removed(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    archive = ParquetSink(tmp_path / "t.parquet")
+    archive.write(pa.record_batch({"id": [1, 2]}))
+    archive.abort()
+    assert not list(tmp_path.iterdir())
+
+
+def test_duplicated_sinks_are_rejected():
+    with pytest.raises(ValueError, match="Duplicated"):
+        FanOutTransfer("src", "t", ["dst", "dst"])
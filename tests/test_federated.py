@@ -0,0 +1,71 @@
+from collections import Counter
+
+import pytest
+
+from dataxi.connectors import col
+from dataxi.operators import FederatedJoin
+
+pytest.importorskip("pyarrow")
+
+# the side streams are closed before the connections, also when a side is empty
+pytestmark = pytest.mark.filterwarnings("error::pytest.PytestUnraisableExceptionWarning")
+
+RIGHT_KEYS = range(50, 150)
+
+
+@pytest.fixture
+def users(databases):
+    """Right side in the sink database: one user per key, half of them without orders on the left."""
+    databases.execute("dst", "CREATE TABLE users (k INTEGER, name TEXT)")
+    databases.execute("dst", "INSERT INTO users VALUES (?, ?)", [(k, f"user {k}") for k in RIGHT_KEYS])
+    return databases
+
+
+def expected_keys(how, left_keys):
+    """Return the Counter of the join keys of the result, NULL keys never matching like in SQL."""
+    right = Counter(RIGHT_KEYS)
+    matched = Counter(key for key in left_keys if key in right)
+    if how == "inner":
+        return matched
+    if how == "left":
+        return Counter(left_keys)
+    if how == "right":
+        return matched + Counter(key for key in RIGHT_KEYS if key not in matched)
+    if how == "outer":
+        return Counter(left_keys) + Counter(key for key in RIGHT_KEYS if key not in matched)
+    if how == "semi":
+        return matched
+    return Counter(key for key in left_keys if key not in right)
+
+
+@pytest.mark.parametrize("memory_limit", [512 * 1024 * 1024, 100], ids=["in_memory", "spilled"])
+@pytest.mark.parametrize("how", ["inner", "left", "right", "outer", "semi", "anti"])
+def test_join_types(users, tmp_path, how, memory_limit):
+    left_keys = [row[0] for row in users.execute("src", "SELECT k FROM t WHERE id < 900")]
+    join = FederatedJoin({"conn": "src", "table": "t", "filters": [col("id") < 900], "batch_size": 128},
+                         {"conn": "dst", "table": "users", "batch_size": 16}, on="k", how=how,
+                         memory_limit=memory_limit, spill_partitions=4, spill_dir=tmp_path)
+    result = join.collect()
+    assert Counter(result.column("k").to_pylist()) == expected_keys(how, left_keys)
+    if how in ("semi", "anti"):
+        assert "name" not in result.column_names
+    else:
+        assert result.column_names.count("k") == 1
+    assert join.stats["rows"] == result.num_rows
+    assert join.stats["partitions"] == (4 if memory_limit == 100 else 0)
+    # the spilled partitions are removed
+    assert not list(tmp_path.glob("dataxi-join-*"))
+
+
+def test_join_with_an_empty_side(users):
+    join = FederatedJoin({"conn": "src", "table": "t", "filters": [col("id") < 0]}, {"conn": "dst", "table": "users"},
+                         on="k", how="right")
+    assert join.collect().num_rows == len(RIGHT_KEYS)
+    join = FederatedJoin({"conn": "src", "table": "t", "filters": [col("id") < 0]}, {"conn": "dst", "table": "users"},
+                         on="k", how="inner")
+    assert join.collect().num_rows == 0
+
+
+def test_invalid_join_type(users):
+    with pytest.raises(ValueError, match="join type"):
+        FederatedJoin({"conn": "src", "table": "t"}, {"conn": "dst", "table": "users"}, on="k", how="cross")
@@ -0,0 +1,73 @@
+import datetime
+
+import pytest
+
+from dataxi.connectors.frame import col, count, lit
+
+from .conftest import SQLiteConnector
+
+
+def dialect(module_name, class_name):
+    """Connector of the dialect without a connection, enough to compile the frames."""
+    module = pytest.importorskip(f"dataxi.connectors.{module_name}")
+    connector_class = getattr(module, class_name)
+    return connector_class.__new__(connector_class)
+
+
+@pytest.fixture
+def src(databases):
+    connector = SQLiteConnector(conn_id="src")
+    yield connector
+    connector.close()
+
+
+def test_mysql_dialect():
+    frame = (dialect("mysql_connector", "MySQLConnector").frame("shop.orders")
+             .filter(col("status").isin(["paid", "it's"]), col("created_at") >= datetime.date(2026, 1, 1))
+             .select("id", total=col("price") * col("qty"))
+             .sort("total", descending=True).limit(10))
+    assert frame.to_sql() == ("SELECT `id`, (`price` * `qty`) AS `total` FROM `shop`.`orders` "
+                              "WHERE `status` IN ('paid', 'it''s') AND (`created_at` >= '2026-01-01') "
+                              "ORDER BY `total` DESC LIMIT 10")
+
+
+def test_mssql_dialect():
+    frame = (dialect("mssql_connector", "MSSQLConnector").frame("dbo.events")
+             .filter(col("name") == "café", col("ts") < datetime.datetime(2026, 1, 1, 12, 30, 0, 5), col("flag") == True)
+             .limit(5))
+    assert frame.to_sql() == ("SELECT TOP 5 * FROM [dbo].[events] WHERE ([name] = N'café') "
+                              "AND ([ts] < CAST('2026-01-01 12:30:00.000005' AS datetime2)) AND ([flag] = 1)")
+
+
+def test_clickhouse_dialect():
+    frame = dialect("clickhouse_connector", "ClickHouseConnector").frame("logs").filter(col("path").like("C:\\tmp%"))
+    assert frame.to_sql() == "SELECT * FROM `logs` WHERE (`path` LIKE 'C:\\\\tmp%')"
+
+
+def test_operations_after_a_limit_or_an_aggregation_wrap_a_subquery(src):
+    frame = src.frame("t").sort("id").limit(100).filter(col("k") > 5)
+    assert frame.to_sql() == ('SELECT * FROM (SELECT * FROM "t" ORDER BY "id" LIMIT 100) AS dataxi_q1 '
+                              'WHERE ("k" > 5)')
+    grouped = src.frame("t").filter(col("k").is_not_null()).group_by("k").agg(n=count()).filter(col("n") < 10)
+    assert grouped.to_sql() == ('SELECT * FROM (SELECT "k", COUNT(*) AS "n" FROM "t" WHERE "k" IS NOT NULL '
+                                'GROUP BY "k") AS dataxi_q1 WHERE ("n" < 10)')
+    # the order of a subquery without a limit moves to the outer query
+    assert src.frame("t").select("v", double=col("k") * 2).sort("v").select("double").to_sql() == \
+        'SELECT "double" FROM (SELECT "v", ("k" * 2) AS "double" FROM "t") AS dataxi_q1 ORDER BY "v"'
+    with pytest.raises(ValueError, match="aggregate expressions"):
+        src.frame("t").group_by("k").agg(col("v"))
+    with pytest.raises(ValueError, match="either a table or a query"):
+        src.frame()
+
+
+def test_frames_run_on_the_server(src):
+    pytest.importorskip("pyarrow")
+    frame = src.frame("t").filter(col("k").between(10, 19), ~(col("id") == 151))
+    # k is NULL for the ids 100 and 150
+    assert frame.count() == 97
+    table = frame.group_by("k").agg(count().alias("n"), top=col("id").max()).sort("k", descending=True).limit(3).collect()
+    assert table.to_pydict() == {"k": [19, 18, 17], "n": [10, 10, 10], "top": [199, 189, 179]}
+    rows = src.frame(query="SELECT id, v FROM t WHERE id < 5").filter(col("v") != lit("value 2")).sort("id").collect()
+    assert rows.column("id").to_pylist() == [0, 1, 3, 4]
+    batches = list(src.frame("t").select("id").filter(col("k") == None).stream(batch_size=8))
+    assert [batch.num_rows for batch in batches] == [8, 8, 4]
@@ -0,0 +1,70 @@
+import pytest
+
+from dataxi.operators import TableTransfer
+from dataxi.operators.journal import NULL_CHECKPOINT, TransferJournal, journal_key
+
+from .conftest import SQLiteConnector
+
+# a failed partition closes its source stream before the connection
+pytestmark = pytest.mark.filterwarnings("error::pytest.PytestUnraisableExceptionWarning")
+
+
+@pytest.fixture
+def fail_after_insert(monkeypatch):
+    """Make the nth bulk_insert() raise after its rows are committed, like a connection lost before the reply."""
+    calls = {"count": 0, "fail_at": None}
+    bulk_insert = SQLiteConnector.bulk_insert
+
+    def flaky_insert(self, *args, **kwargs):
+        result = bulk_insert(self, *args, **kwargs)
+        calls["count"] += 1
+        if calls["count"] == calls["fail_at"]:
+            raise RuntimeError("connection lost after the commit")
+        return result
+
+    monkeypatch.setattr(SQLiteConnector, "bulk_insert", flaky_insert)
+    return calls
+
+
+def journal_files(home):
+    return list((home / ".dataxi" / "journal").glob("*.json"))
+
+
+@pytest.mark.parametrize("fail_at", [2, 4, 10])
+@pytest.mark.parametrize("partitions", [{}, {"parallelism": 3, "partition_column": "id"}])
+def test_resume_loads_each_row_once(databases, home, fail_after_insert, fail_at, partitions):
+    kwargs = dict(batch_size=100, resume=True, checkpoint_column="k", **partitions)
+    fail_after_insert["fail_at"] = fail_at
+    with pytest.raises(Exception):
+        TableTransfer("src", "dst", "t", **kwargs).run()
+    assert journal_files(home)
+
+    fail_after_insert["fail_at"] = None
+    result = TableTransfer("src", "dst", "t", **kwargs).run()
+    # the primary key of the sink rejects a row loaded twice
+    assert databases.execute("dst", "SELECT COUNT(*), COUNT(DISTINCT id) FROM t") == [(1000, 1000)]
+    assert result["rows"] == 1000
+    assert not journal_files(home)
+
+
+def test_resume_without_checkpoint_or_partition_range_refuses_to_reload(databases, fail_after_insert):
+    fail_after_insert["fail_at"] = 2
+    with pytest.raises(Exception):
+        TableTransfer("src", "dst", "t", batch_size=100, resume=True).run()
+    fail_after_insert["fail_at"] = None
+    with pytest.raises(Exception, match="Cannot resume"):
+        TableTransfer("src", "dst", "t", batch_size=100, resume=True).run()
+
+
+def test_journal_records_the_checkpoints(tmp_path):
+    journal = TransferJournal(journal_key(dst_table="t", src="src"), journal_dir=tmp_path)
+    assert not journal.resumable
+    journal.start([], [[], []])
+    journal.start_partition(0)
+    journal.record(0, 100, 1000, checkpoint=NULL_CHECKPOINT, provisional=3)
+    reopened = TransferJournal(journal_key(dst_table="t", src="src"), journal_dir=tmp_path)
+    assert reopened.resumable
+    assert reopened.partition(0)["rows"] == 100
+    assert reopened.partition(0)["checkpoint"] == NULL_CHECKPOINT
+    reopened.remove()
+    assert not list(tmp_path.iterdir())
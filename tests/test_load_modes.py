@@ -0,0 +1,154 @@
+import re
+
+import pytest
+
+ROWS = [{"ID": 1, "Name": "a"}, {"ID": 2, "Name": "b"}]
+
+
+class RecordingCursor:
+    """DB-API cursor recording the statements, with the answers of the metadata queries."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+        self.rowcount = 0
+        self._rows = []
+
+    def execute(self, query, params=None):
+        if isinstance(query, bytes):
+            query = query.decode()
+        self.connection.statements.append((query, params))
+        self.description, self._rows = None, []
+        if "LIMIT 0" in query or "TOP 0" in query:
+            self.description = [(name,) for name in self.connection.columns]
+        elif query.startswith("SHOW COLUMNS"):
+            self._rows = [{"Field": name} for name in self.connection.columns]
+        elif "@@max_allowed_packet" in query:
+            self._rows = [(64 * 1024 * 1024,)]
+        elif "@@SPID" in query:
+            self._rows = [(51,)]
+        elif "pg_class" in query:
+            self._rows = [(2, 8192)]
+
+    def executemany(self, query, rows):
+        self.connection.statements.append((query, list(rows)))
+
+    def mogrify(self, template, args):
+        return repr(tuple(args)).encode()
+
+    def fetchall(self):
+        return self._rows
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class RecordingConnection:
+    def __init__(self, *args, **kwargs):
+        self.columns = ["ID", "Name"]
+        self.statements = []
+        self.closed = False
+        self.encoding = "UTF8"
+
+    def cursor(self, *args, **kwargs):
+        return RecordingCursor(self)
+
+    def ping(self, reconnect=False):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def assert_quoted(statements, opening, closing):
+    """Assert the mixed-case table, stage and column names only appear whole and quoted."""
+    names = re.compile(r"(.)(Orders(?:__dataxi_stage_[0-9a-f]{8})?|ID|Name)(.)")
+    sql = " ".join(query for query, _ in statements)
+    found = names.findall(sql)
+    assert found
+    for before, name, after in found:
+        assert (before, after) == (opening, closing), f"{name} is not quoted in: {sql}"
+
+
+def connect(monkeypatch, module_name, driver):
+    """Return a connector of the module, its driver returning a recording connection."""
+    module = pytest.importorskip(f"dataxi.connectors.{module_name}")
+    monkeypatch.setattr(getattr(module, driver), "connect", RecordingConnection)
+    return module
+
+
+def test_postgresql_mixed_case_names(monkeypatch):
+    module = connect(monkeypatch, "postgresql_connector", "psycopg2")
+    connector = module.PostgreSQLConnector(host="pg", user="u", password="p")
+    connector.bulk_insert("Orders", ROWS, mode="upsert", key_columns=["ID"])
+    assert connector.staged_load("Orders", [ROWS], mode="merge", key_columns=["ID"]) == 2
+    connector.table_stats("Orders")
+    statements = connector.pg_connection.statements
+    assert_quoted(statements, '"', '"')
+    assert statements[-1][1] == ('"Orders"',)
+    assert any(query.startswith('CREATE TABLE "Orders__dataxi_stage_') for query, _ in statements)
+    assert any(query.startswith('DROP TABLE IF EXISTS "Orders__dataxi_stage_') for query, _ in statements)
+
+
+def test_postgresql_multi_row_inserts(monkeypatch):
+    module = connect(monkeypatch, "postgresql_connector", "psycopg2")
+    connector = module.PostgreSQLConnector(host="pg", user="u", password="p")
+    rows = [(i, f"value {i}") for i in range(2500)]
+    assert connector.bulk_insert("Orders", rows) == 2500
+    inserts = [query for query, _ in connector.pg_connection.statements if query.startswith("INSERT")]
+    assert len(inserts) == 3
+    assert inserts[0].startswith('INSERT INTO "Orders" ("ID", "Name") VALUES (0, \'value 0\'),(1, ')
+    # ON CONFLICT cannot update a row twice in one statement, the last row of a key is kept
+    assert connector.bulk_insert("Orders", [(1, "a"), (2, "b"), (1, "c")], mode="upsert", key_columns=["ID"]) == 2
+    upsert = connector.pg_connection.statements[-1][0]
+    assert "(1, 'c'),(2, 'b') ON CONFLICT (\"ID\")" in upsert
+
+
+def test_mysql_mixed_case_names(monkeypatch):
+    module = connect(monkeypatch, "mysql_connector", "pymysql")
+    connector = module.MySQLConnector(host="mysql", user="u", password="p")
+    connector.staged_load("Orders", [ROWS], mode="merge", key_columns=["ID"])
+    connector.staged_load("Orders", [ROWS], mode="swap")
+    statements = connector.mysql_connection.statements
+    # the rename of the swap moves the target to a unique old table
+    old_table = re.compile(r"`Orders__dataxi_old_[0-9a-f]{8}`")
+    assert len({name for query, _ in statements for name in old_table.findall(query)}) == 1
+    assert_quoted([(old_table.sub("", query), params) for query, params in statements], "`", "`")
+
+
+def test_mssql_mixed_case_names(monkeypatch):
+    module = connect(monkeypatch, "mssql_connector", "pymssql")
+    connector = module.MSSQLConnector(host="mssql", user="u", password="p")
+    connector.staged_load("Orders", [ROWS], mode="merge", key_columns=["ID"])
+    statements = [(query, params) for query, params in connector.mssql_connection.statements if "@@SPID" not in query]
+    assert_quoted(statements, "[", "]")
+    assert any(query.startswith("SELECT TOP 0 * INTO [Orders__dataxi_stage_") for query, _ in statements)
+
+
+@pytest.mark.parametrize("module_name, driver, class_name", [("mysql_connector", "pymysql", "MySQLConnector"),
+                                                              ("postgresql_connector", "psycopg2", "PostgreSQLConnector"),
+                                                              ("mssql_connector", "pymssql", "MSSQLConnector")])
+def test_unsupported_transport_options_are_reported(monkeypatch, capsys, module_name, driver, class_name):
+    module = connect(monkeypatch, module_name, driver)
+    connector = getattr(module, class_name)(host="db", user="u", password="p", compress="zstd", wire_format="native")
+    output = capsys.readouterr().out
+    assert f"{class_name} driver does not support compress='zstd'" in output
+    assert f"{class_name} driver does not support wire_format='native'" in output
+    assert connector.transport_stats() == {"compression": None, "wire_format": None}
+    getattr(module, class_name)(host="db", user="u", password="p", compress=False)
+    assert "does not support" not in capsys.readouterr().out
@@ -0,0 +1,67 @@
+import functools
+import threading
+
+import pytest
+
+from dataxi.operators.memory import MemoryBudget, batch_nbytes
+from dataxi.operators.transform import TransformStage, hash_columns
+
+pa = pytest.importorskip("pyarrow")
+
+
+def make_batches(count, rows=1000):
+    return [pa.record_batch({"id": list(range(i * rows, (i + 1) * rows)), "name": [f"user{i}"] * rows})
+            for i in range(count)]
+
+
+def test_batch_larger_than_limit_goes_through_alone():
+    budget = MemoryBudget(limit_bytes=10, timeout=1)
+    budget.reserve("extract", 100)
+    budget.release("extract", 100)
+    assert budget.used == 0
+    assert budget.report()["peak_bytes"] == 100
+
+
+def test_blocking_reserve_waits_for_other_threads():
+    budget = MemoryBudget(limit_bytes=100, timeout=0.2)
+    reserved, done = threading.Event(), threading.Event()
+
+    def load():
+        budget.reserve("load", 80)
+        reserved.set()
+        done.wait()
+        budget.release("load", 80)
+
+    thread = threading.Thread(target=load)
+    thread.start()
+    reserved.wait()
+    with pytest.raises(TimeoutError):
+        budget.reserve("extract", 50)
+    budget.timeout = 10
+    done.set()
+    budget.reserve("extract", 50)
+    thread.join()
+    assert budget.used == 50
+    assert budget.report()["stages"]["extract"]["waits"] >= 1
+
+
+def test_blocking_reserve_does_not_wait_for_own_bytes():
+    budget = MemoryBudget(limit_bytes=100, timeout=0.2)
+    budget.reserve("transform_pool", 80)
+    budget.reserve("extract", 50)
+    assert budget.used == 130
+    budget.release("extract", 50)
+    budget.release("transform_pool", 80)
+    assert budget.used == 0
+
+
+def test_transform_pool_does_not_deadlock_the_extraction():
+    batches = make_batches(6)
+    # room for about one batch, the pool keeps up to max_pending batches in flight
+    budget = MemoryBudget(limit_bytes=int(batch_nbytes(batches[0]) * 1.5), timeout=10)
+    transform = functools.partial(hash_columns, columns=["name"])
+    with TransformStage([transform], processes=1, max_pending=3, budget=budget) as stage:
+        results = list(stage.map(budget.track("extract", batches, blocking=True)))
+    assert sum(batch.num_rows for batch in results) == 6000
+    assert budget.used == 0
+    assert budget.report()["stages"]["transform_pool"]["batches"] == 6
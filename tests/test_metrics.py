@@ -0,0 +1,32 @@
+from dataxi.operators import metrics
+from dataxi.operators.metrics import load_history, measured_throughput, metrics_path, record_transfer
+
+
+def result(table, rows=10000, seconds=2.0):
+    return {"table": table, "dst_table": table, "rows": rows, "bytes": rows * 10, "seconds": seconds}
+
+
+def test_history_is_bounded_per_route(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "MAX_RECORDS_PER_ROUTE", 3)
+    for i in range(20):
+        record_transfer("src", "dst", result("orders", rows=1000 + i), metrics_dir=tmp_path)
+    record_transfer("src", "dst", result("users"), metrics_dir=tmp_path)
+    with open(metrics_path(tmp_path), "a") as f:
+        f.write("torn line\n")
+    lines = metrics_path(tmp_path).read_text().splitlines()
+    assert len(lines) <= 2 * 3 + 2
+    # the latest records of each route are kept
+    assert [record["rows"] for record in load_history("src", "dst", "orders", metrics_dir=tmp_path)][:3] == [1019, 1018, 1017]
+    assert len(load_history(table="users", metrics_dir=tmp_path)) == 1
+
+
+def test_measured_throughput_prefers_the_table(tmp_path):
+    assert measured_throughput("src", "dst", "orders", metrics_dir=tmp_path) is None
+    record_transfer("src", "dst", result("orders", rows=10000, seconds=2.0), parallelism=2, metrics_dir=tmp_path)
+    record_transfer("src", "dst", result("users", rows=30000, seconds=1.0), metrics_dir=tmp_path)
+    # too small to measure the rate
+    record_transfer("src", "dst", result("orders", rows=10, seconds=0.1), metrics_dir=tmp_path)
+    throughput = measured_throughput("src", "dst", "orders", metrics_dir=tmp_path)
+    assert throughput["scope"] == "table" and throughput["runs"] == 1
+    assert throughput["rows_per_second"] == 2500
+    assert measured_throughput("src", "dst", "events", metrics_dir=tmp_path)["scope"] == "connections"
@@ -0,0 +1,83 @@
+import sys
+
+import pytest
+
+from dataxi.connectors import conn_cli
+from dataxi.connectors.registry import CONNECTOR_REGISTRY
+from dataxi.operators import TableTransfer
+from dataxi.operators.metrics import record_transfer
+
+from .test_counts import EstimatingConnector
+
+pytest.importorskip("pyarrow")
+
+
+class StatsConnector(EstimatingConnector):
+    """Connector of the conn_ids 'src' and 'dst' with statistics, recording the queries sent to the planner."""
+    stats_rows, stats_bytes = 990, 99000
+    queries = []
+
+    def estimate_rows(self, query):
+        self.queries.append(query)
+        return self.estimate
+
+
+@pytest.fixture
+def stats(databases, monkeypatch):
+    monkeypatch.setitem(CONNECTOR_REGISTRY, "sqlite_test", StatsConnector)
+    monkeypatch.setattr(StatsConnector, "queries", [])
+    return StatsConnector
+
+
+def test_plan_from_the_statistics_without_moving_data(databases, stats):
+    plan = TableTransfer("src", "dst", "t", parallelism=4, partition_column="id").plan()
+    assert (plan["rows"], plan["rows_source"]) == (990, "table_stats")
+    assert plan["bytes"] == 99000 and plan["row_bytes"] == 100
+    assert plan["parallelism"] == 4 and len(plan["partitions"]) == 4
+    assert plan["partitions"][0] == ["(((id >= 0) AND (id < 250)) OR id IS NULL)"]
+    assert plan["batch_size"] == stats.stream_batch_size
+    # no transfer of this pair recorded yet
+    assert plan["throughput"] is None and plan["estimated_seconds"] is None
+    assert databases.execute("dst", "SELECT COUNT(*) FROM t") == [(0,)]
+
+
+def test_plan_of_a_filtered_extraction_asks_the_planner(stats, monkeypatch):
+    monkeypatch.setattr(stats, "estimate", 120)
+    plan = TableTransfer("src", "dst", "t", where="k > 80").plan()
+    assert (plan["rows"], plan["rows_source"]) == (120, "explain")
+    assert stats.queries == ["SELECT * FROM t WHERE (k > 80)"]
+    # without a planner estimate, the table size is the upper bound
+    monkeypatch.setattr(stats, "estimate", None)
+    assert TableTransfer("src", "dst", "t", where="k > 80").plan()["rows_source"] == "table_stats"
+
+
+def test_runtime_at_the_measured_throughput(stats, monkeypatch):
+    result = {"table": "t", "dst_table": "t", "rows": 20000, "bytes": 2000000, "seconds": 10.0}
+    record_transfer("src", "dst", result, parallelism=2)
+    plan = TableTransfer("src", "dst", "t", parallelism=2, partition_column="id").plan()
+    # 1000 rows/s per partition
+    assert plan["throughput"]["scope"] == "table"
+    assert plan["estimated_seconds"] == pytest.approx(990 / 2000)
+    # another table of the pair is estimated at the byte rate of the pair, 100000 bytes/s per partition,
+    # since its rows are 10 times wider
+    monkeypatch.setattr(stats, "stats_bytes", 990 * 1000)
+    plan = TableTransfer("src", "dst", "wide_t").plan()
+    assert plan["throughput"]["scope"] == "connections"
+    assert plan["estimated_seconds"] == pytest.approx(9.9)
+
+
+def test_plan_auto_batch_size_from_the_row_size(stats):
+    plan = TableTransfer("src", "dst", "t", batch_size="auto", batcher_options={"target_bytes": 10000}).plan()
+    assert plan["batch_size"] == 100
+
+
+def test_cli_plan(databases, stats, monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv", ["dataxi", "plan", "--src", "src", "--dst", "dst", "--table", "t", "--no-progress"])
+    with pytest.raises(SystemExit) as exit_info:
+        conn_cli.main()
+    assert exit_info.value.code == 0
+    output = capsys.readouterr().out
+    assert "Plan: t -> t (insert)" in output
+    assert "rows:        990 (from table_stats)" in output
+    assert "runtime:     unknown" in output
+    assert databases.execute("dst", "SELECT COUNT(*) FROM t") == [(0,)]
@@ -0,0 +1,87 @@
+import datetime
+
+import pytest
+
+from dataxi.connectors.base_connector import split_placeholders
+
+from .test_load_modes import RecordingConnection, connect
+
+
+def test_split_placeholders():
+    assert split_placeholders("SELECT * FROM t WHERE a = %s AND b LIKE 'x%%' AND c = %s") == \
+        ["SELECT * FROM t WHERE a = ", " AND b LIKE 'x%' AND c = ", ""]
+    assert split_placeholders("SELECT 1") == ["SELECT 1"]
+
+
+@pytest.fixture
+def postgresql(monkeypatch):
+    module = connect(monkeypatch, "postgresql_connector", "psycopg2")
+    return module.PostgreSQLConnector(host="pg", user="u", password="p")
+
+
+def test_postgresql_prepares_once_per_connection(postgresql):
+    query = "SELECT * FROM users WHERE id = %s AND name LIKE 'a%%'"
+    for user_id in (1, 2):
+        postgresql.execute_prepared(query, (user_id,))
+    statements = postgresql.pg_connection.statements
+    name = postgresql.prepare(query).name
+    assert statements == [(f"PREPARE {name} AS SELECT * FROM users WHERE id = $1 AND name LIKE 'a%'", None),
+                          (f"EXECUTE {name} (%s)", (1,)), (f"EXECUTE {name} (%s)", (2,))]
+    with pytest.raises(ValueError, match="expects 1 parameters, got 2"):
+        postgresql.execute_prepared(query, (1, 2))
+    # a reconnection prepares the statement again
+    postgresql.pg_connection = RecordingConnection()
+    postgresql.execute_prepared(query, (3,))
+    assert [query for query, _ in postgresql.pg_connection.statements] == [statements[0][0], f"EXECUTE {name} (%s)"]
+
+
+def test_postgresql_evicts_the_least_recently_used_statements(postgresql, monkeypatch):
+    monkeypatch.setattr(postgresql, "prepared_cache_size", 2)
+    first = postgresql.prepare("SELECT %s")
+    first.execute((1,))
+    postgresql.prepare("SELECT %s, %s").execute((1, 2))
+    postgresql.prepare("SELECT %s")
+    postgresql.prepare("SELECT 3").execute()
+    assert postgresql.prepare("SELECT %s") is first
+    evicted = [query for query, _ in postgresql.pg_connection.statements if query.startswith("DEALLOCATE")]
+    assert len(evicted) == 1 and not evicted[0].endswith(first.name)
+    postgresql.clear_prepared()
+    assert any(query == f"DEALLOCATE {first.name}" for query, _ in postgresql.pg_connection.statements)
+
+
+def test_mssql_runs_the_statements_with_sp_executesql(monkeypatch):
+    module = connect(monkeypatch, "mssql_connector", "pymssql")
+    connector = module.MSSQLConnector(host="mssql", user="u", password="p")
+    connector.execute_prepared("SELECT * FROM orders WHERE id = %s AND day = %s", (7, datetime.date(2026, 1, 2)))
+    query, params = connector.mssql_connection.statements[-1]
+    assert query == "EXEC sp_executesql %s, %s, @p1 = %s, @p2 = %s"
+    assert params == ("SELECT * FROM orders WHERE id = @p1 AND day = @p2", "@p1 bigint, @p2 date",
+                      7, datetime.date(2026, 1, 2))
+
+
+class QueryResult:
+    result_rows = [(1,)]
+
+
+class ParameterClient:
+    server_settings = {}
+
+    def __init__(self):
+        self.queries = []
+
+    def query(self, sql, parameters=None, settings=None):
+        self.queries.append((sql, parameters))
+        return QueryResult()
+
+
+def test_clickhouse_sends_server_side_parameters(monkeypatch):
+    module = pytest.importorskip("dataxi.connectors.clickhouse_connector")
+    monkeypatch.setattr(module, "get_client", lambda **kwargs: ParameterClient())
+    connector = module.ClickHouseConnector(host="ch", user="default")
+    query = "SELECT count() FROM events WHERE user = %s AND ts > %s"
+    assert connector.execute_prepared(query, ("o'brien", datetime.datetime(2026, 1, 1))) == [(1,)]
+    connector.execute_prepared(query, (None, datetime.datetime(2026, 1, 1)))
+    (first, first_params), (second, _) = connector.ch_client.queries[-2:]
+    assert first == "SELECT count() FROM events WHERE user = {p1:String} AND ts > {p2:DateTime64(6)}"
+    assert first_params == {"p1": "o'brien", "p2": datetime.datetime(2026, 1, 1)}
+    assert second.startswith("SELECT count() FROM events WHERE user = {p1:Nullable(String)}")
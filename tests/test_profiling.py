@@ -0,0 +1,77 @@
+import pytest
+
+from dataxi.operators import ColumnProfiler, HyperLogLog, TableTransfer
+from dataxi.operators.profiling import format_profile, hash_values
+
+pa = pytest.importorskip("pyarrow")
+np = pytest.importorskip("numpy")
+
+
+def test_hyperloglog_estimate():
+    sketch = HyperLogLog()
+    for start in range(0, 100000, 10000):
+        sketch.add_hashes(hash_values(pa.array(range(start, start + 10000))))
+    assert abs(sketch.estimate() - 100000) / 100000 < 0.03
+    small = HyperLogLog()
+    small.add_hashes(hash_values(pa.array([1, 2, 3, 3, 3])))
+    assert small.estimate() == 3
+
+
+def test_hyperloglog_merge_and_precision():
+    left, right = HyperLogLog(10), HyperLogLog(10)
+    left.add_hashes(hash_values(pa.array(range(0, 3000))))
+    right.add_hashes(hash_values(pa.array(range(2000, 5000))))
+    left.merge(right)
+    assert abs(left.estimate() - 5000) / 5000 < 0.1
+    with pytest.raises(ValueError):
+        HyperLogLog(3)
+
+
+def test_column_statistics():
+    profiler = ColumnProfiler(bins=4, top_values=2)
+    profiler.update(pa.record_batch({"n": [1, 2, None, 4], "s": ["a", "b", "a", None]}))
+    profiler.update(pa.record_batch({"n": [10, 2, 3, 4], "s": ["a", "c", "c", "a"]}))
+    report = profiler.report()
+    assert report["rows"] == 8
+    n, s = report["columns"]["n"], report["columns"]["s"]
+    assert (n["nulls"], n["min"], n["max"], n["distinct"]) == (1, 1, 10, 5)
+    assert n["mean"] == pytest.approx(26 / 7)
+    assert sum(n["histogram"]["counts"]) == 7
+    assert n["histogram"]["edges"][0] <= 1 and n["histogram"]["edges"][-1] >= 10
+    assert s["top_values"] == [("a", 4), ("c", 2)]
+    assert (s["nulls"], s["min"], s["max"]) == (1, "a", "c")
+    assert len(format_profile(report)) == 2
+
+
+def test_infinite_values_are_counted_apart():
+    profiler = ColumnProfiler(bins=4)
+    profiler.update(pa.record_batch({"x": [1.0, float("inf"), None, float("nan"), -float("inf"), 3.0]}))
+    profiler.update(pa.record_batch({"x": [float("inf")] * 3}))
+    stats = profiler.report()["columns"]["x"]
+    assert stats["infinities"] == 5
+    assert (stats["min"], stats["max"], stats["mean"]) == (1.0, 3.0, 2.0)
+    assert sum(stats["histogram"]["counts"]) == 2
+    assert "5 infinite" in format_profile(profiler.report())[0]
+
+
+def test_profile_of_a_transfer(databases):
+    result = TableTransfer("src", "dst", "t", batch_size=100, profile=["k"]).run()
+    stats = result["profile"]["columns"]
+    assert list(stats) == ["k"]
+    assert stats["k"]["nulls"] == 20
+    assert (stats["k"]["min"], stats["k"]["max"]) == (0, 99)
+    assert stats["k"]["distinct"] == 100
+
+
+def test_integers_above_the_float_precision():
+    ids = [10 ** 18 + i for i in range(1000)] + [2 ** 63 - 1]
+    profiler = ColumnProfiler()
+    profiler.update(pa.record_batch({"id": pa.array(ids, type=pa.int64()),
+                                     "hash": pa.array([2 ** 64 - 1 - i for i in range(1001)], type=pa.uint64())}))
+    stats = profiler.report()["columns"]
+    assert (stats["id"]["min"], stats["id"]["max"]) == (10 ** 18, 2 ** 63 - 1)
+    assert stats["hash"]["max"] == 2 ** 64 - 1
+    # consecutive ids are distinct although their float64 values collide
+    assert abs(stats["id"]["distinct"] - 1001) / 1001 < 0.03
+    assert abs(stats["hash"]["distinct"] - 1001) / 1001 < 0.03
+    assert stats["id"]["mean"] == pytest.approx(10 ** 18, rel=1e-2)
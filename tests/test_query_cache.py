@@ -0,0 +1,96 @@
+import os
+import time
+
+import pytest
+
+from dataxi.connectors import QueryCache
+from dataxi.connectors.query_cache import _estimate_bytes, cached_result, extract_tables, normalize_sql
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return tmp_path / "cache"
+
+
+def test_normalized_keys_and_tables():
+    assert normalize_sql("SELECT  a\n FROM t WHERE b = 'x  y';") == "SELECT a FROM t WHERE b = 'x  y'"
+    assert QueryCache.make_key("c", "SELECT 1") == QueryCache.make_key("c", " SELECT  1 ;")
+    assert QueryCache.make_key("c", "SELECT 1") != QueryCache.make_key("other", "SELECT 1")
+    assert extract_tables('SELECT * FROM db.`Orders` o JOIN "users" u ON o.id = u.id') == \
+        {"db.orders", "orders", "users"}
+
+
+@pytest.mark.parametrize("value", [((1, "a"), (2, None)), [(1, "a"), (2, None)], [[1, "a"], [2, None]],
+                                   ({"id": 1, "v": "a"},), [{"id": 1, "v": "a"}], []],
+                         ids=["tuple_of_tuples", "list_of_tuples", "list_of_lists", "tuple_of_dicts",
+                              "list_of_dicts", "empty"])
+def test_disk_hit_returns_the_driver_types(cache_dir, value):
+    QueryCache(cache_dir=cache_dir).put("key", value)
+    # a new process only finds the disk tier
+    hit, cached = QueryCache(cache_dir=cache_dir).get("key")
+    assert hit
+    assert cached == value and type(cached) is type(value)
+    assert all(type(row) is type(original) for row, original in zip(cached, value))
+
+
+def test_disk_hit_of_a_dataframe(cache_dir):
+    df = pd.DataFrame({"id": [1, 2], "v": ["a", "b"]})
+    QueryCache(cache_dir=cache_dir).put("key", df)
+    hit, cached = QueryCache(cache_dir=cache_dir).get("key")
+    assert hit and cached.equals(df)
+
+
+def test_memory_tier_is_bounded_and_copied():
+    rows = [(i, f"value {i}") for i in range(100)]
+    cache = QueryCache(max_bytes=int(_estimate_bytes(rows) * 1.5), disk=False)
+    cache.put("a", rows)
+    cache.get("a")[1].append(("mutated",))
+    assert cache.get("a")[1] == rows
+    cache.put("b", rows)
+    # the least recently used result is evicted
+    assert not cache.get("a")[0] and cache.get("b")[0]
+    assert cache.stats()["entries"] == 1
+
+
+def test_expired_results_are_swept_on_put(cache_dir):
+    cache = QueryCache(cache_dir=cache_dir, ttl=60)
+    cache.put("old", [(1,)])
+    (cache_dir / "crashed.123.456.tmp").write_bytes(b"")
+    expired = time.time() - 120
+    for path in cache_dir.iterdir():
+        os.utime(path, (expired, expired))
+    cache._last_sweep = 0
+    cache.put("new", [(2,)])
+    assert sorted(path.name for path in cache_dir.iterdir()) == ["new.arrow", "new.json"]
+
+
+def test_invalidate_by_table(cache_dir):
+    cache = QueryCache(cache_dir=cache_dir)
+    cache.put("orders", [(1,)], tables={"shop.orders", "orders"})
+    cache.put("users", [(1,)], tables={"users"})
+    assert cache.invalidate("`shop`.`Orders`") == 1
+    assert not cache.get("orders")[0]
+    assert QueryCache(cache_dir=cache_dir).get("users")[0]
+
+
+def test_cached_result_serves_the_read_queries(cache_dir):
+    class Connector:
+        calls = 0
+        query_cache = QueryCache(cache_dir=cache_dir)
+
+        def cache_namespace(self):
+            return "test"
+
+        @cached_result
+        def execute_query(self, query):
+            self.calls += 1
+            return [(self.calls,)]
+
+    connector = Connector()
+    assert connector.execute_query("SELECT n FROM t") == [(1,)]
+    assert connector.execute_query("SELECT  n FROM t;") == [(1,)]
+    assert connector.execute_query("DELETE FROM t") == [(2,)]
+    assert connector.execute_query("DELETE FROM t") == [(3,)]
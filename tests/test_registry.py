@@ -0,0 +1,51 @@
+import pytest
+
+from dataxi.connectors import get_connector, get_connector_class, register_connector, registry
+from dataxi.connectors.registry import CONNECTOR_REGISTRY, DB_TYPE_ALIASES, resolve_db_type
+from dataxi.cred_mgr import CredStore
+
+from .conftest import SQLiteConnector
+
+
+def test_aliases_and_unknown_types():
+    assert resolve_db_type(" CH ") == "clickhouse"
+    assert resolve_db_type("sql_server") == "mssql"
+    with pytest.raises(ValueError, match="not supported"):
+        resolve_db_type("oracle")
+    with pytest.raises(ValueError, match="required"):
+        resolve_db_type(None)
+
+
+def test_lazy_registration(monkeypatch):
+    monkeypatch.setitem(CONNECTOR_REGISTRY, "lazy_test", "tests.conftest:SQLiteConnector")
+    monkeypatch.setitem(DB_TYPE_ALIASES, "lazy", "lazy_test")
+    assert get_connector_class("lazy") is SQLiteConnector
+    # the imported class replaces its path
+    assert CONNECTOR_REGISTRY["lazy_test"] is SQLiteConnector
+
+
+def test_connector_of_a_conn_id(databases, monkeypatch):
+    with get_connector("src") as src:
+        assert isinstance(src, SQLiteConnector) and src.conn_id == "src"
+        assert src.execute_query("SELECT COUNT(*) FROM t") == [(1000,)]
+    CredStore().add("no_type", {"path": databases.paths["src"]})
+    with pytest.raises(ValueError, match="has no db_type"):
+        get_connector("no_type")
+    monkeypatch.setattr(registry, "DB_TYPE_ALIASES", dict(DB_TYPE_ALIASES))
+    register_connector("sqlite_test", SQLiteConnector, aliases=["sqlite"])
+    with get_connector("no_type", db_type="sqlite") as src:
+        assert src.execute_query("SELECT MAX(id) FROM t") == [(999,)]
+
+
+def test_shared_interface(databases):
+    pa = pytest.importorskip("pyarrow")
+    with get_connector("src") as src, get_connector("dst") as dst:
+        batches = list(src.stream("SELECT id, k, v FROM t ORDER BY id", batch_size=300))
+        assert [batch.num_rows for batch in batches] == [300, 300, 300, 100]
+        assert src.query_arrow("SELECT id FROM t WHERE id < 5").column("id").to_pylist() == list(range(5))
+        for batch in batches:
+            dst.bulk_insert("t", pa.Table.from_batches([batch]))
+        dst.bulk_insert("t", [{"id": 1, "k": 1, "v": "updated"}, {"id": 1000, "k": 0, "v": "new"}],
+                        mode="upsert", key_columns=["id"])
+    assert databases.execute("dst", "SELECT COUNT(*) FROM t") == [(1001,)]
+    assert databases.execute("dst", "SELECT v FROM t WHERE id = 1") == [("updated",)]
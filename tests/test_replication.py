@@ -0,0 +1,97 @@
+import pytest
+
+from dataxi.connectors.mysql_cdc import ChangeBatch, MySQLBinlogSource
+from dataxi.operators import BinlogReplication
+from dataxi.operators.replication import collapse_changes
+
+
+def test_collapse_keeps_the_last_state_of_each_key():
+    changes = [("insert", None, {"id": 1, "v": "a"}),
+               ("update", {"id": 1, "v": "a"}, {"id": 1, "v": "b"}),
+               ("insert", None, {"id": 2, "v": "c"}),
+               ("delete", {"id": 2, "v": "c"}, None),
+               ("delete", {"id": 3, "v": "d"}, None),
+               ("insert", None, {"id": 3, "v": "e"})]
+    upserts, deletes = collapse_changes(changes, ["id"])
+    assert sorted(upserts, key=lambda row: row["id"]) == [{"id": 1, "v": "b"}, {"id": 3, "v": "e"}]
+    assert deletes == [{"id": 2, "v": "c"}]
+
+
+def test_collapse_deletes_the_old_key_of_a_key_update():
+    changes = [("update", {"id": 1, "v": "a"}, {"id": 5, "v": "a"})]
+    upserts, deletes = collapse_changes(changes, ["id"])
+    assert upserts == [{"id": 5, "v": "a"}]
+    assert deletes == [{"id": 1, "v": "a"}]
+
+
+def test_collapse_with_a_composite_key():
+    changes = [("insert", None, {"a": 1, "b": 1, "v": 1}),
+               ("insert", None, {"a": 1, "b": 2, "v": 2}),
+               ("update", {"a": 1, "b": 1, "v": 1}, {"a": 1, "b": 1, "v": 3})]
+    upserts, deletes = collapse_changes(changes, ["a", "b"])
+    assert sorted(row["v"] for row in upserts) == [2, 3]
+    assert deletes == []
+
+
+class FakeBinlogSource(MySQLBinlogSource):
+    """Binlog source replaying fixed micro-batches, without a MySQL server."""
+
+    def __init__(self, batches):
+        super().__init__(host="mysql", user="replica", password="")
+        self.batches = batches
+
+    def check_server(self):
+        pass
+
+    def primary_key(self, table):
+        return ["id"]
+
+    def micro_batches(self):
+        yield from self.batches
+
+    def close(self):
+        pass
+
+
+def test_replication_applies_and_checkpoints(databases, tmp_path):
+    databases.execute("dst", "INSERT INTO t VALUES (?, ?, ?)", [(1, 1, "a"), (2, 2, "b"), (3, 3, "c")])
+    batch = ChangeBatch({"shop.t": [("update", {"id": 1, "k": 1, "v": "a"}, {"id": 1, "k": 1, "v": "a2"}),
+                                    ("delete", {"id": 2, "k": 2, "v": "b"}, None),
+                                    ("update", {"id": 3, "k": 3, "v": "c"}, {"id": 4, "k": 3, "v": "c"}),
+                                    ("insert", None, {"id": 5, "k": 5, "v": "e"})]},
+                        {"log_file": "binlog.000001", "log_pos": 400})
+    replication = BinlogReplication(FakeBinlogSource([batch, batch]), "dst", ["shop.t"], checkpoint_dir=tmp_path)
+    stats = replication.run()
+    # the replayed batch converges to the same state
+    assert (stats["batches"], stats["upserts"], stats["deletes"]) == (2, 6, 4)
+    assert databases.execute("dst", "SELECT id, v FROM t ORDER BY id") == [(1, "a2"), (4, "c"), (5, "e")]
+    assert replication.checkpoint.load()["position"] == {"log_file": "binlog.000001", "log_pos": 400}
+
+    resumed = BinlogReplication(FakeBinlogSource([]), "dst", ["shop.t"], checkpoint_dir=tmp_path)
+    assert resumed.source.position == {"log_file": "binlog.000001", "log_pos": 400}
+
+
+def test_replicated_tables_need_a_database():
+    with pytest.raises(ValueError, match="database.table"):
+        BinlogReplication(FakeBinlogSource([]), "dst", ["t"])
+
+
+class FakeClickHouseClient:
+    def __init__(self, server_settings):
+        self.server_settings = server_settings
+        self.commands = []
+
+    def command(self, statement, settings=None):
+        self.commands.append((statement, settings))
+
+
+@pytest.mark.parametrize("server_settings", [{"lightweight_deletes_sync": object()}, {}], ids=["recent", "older"])
+def test_clickhouse_deletes_send_the_known_settings(monkeypatch, server_settings):
+    module = pytest.importorskip("dataxi.connectors.clickhouse_connector")
+    monkeypatch.setattr(module, "get_client", lambda **kwargs: FakeClickHouseClient(server_settings))
+    connector = module.ClickHouseConnector(host="ch", user="default")
+    connector.delete_rows("shop.t", "id IN (1, 2)")
+    ((statement, settings),) = connector.ch_client.commands
+    assert statement == "DELETE FROM shop.t WHERE id IN (1, 2)"
+    assert settings["mutations_sync"] == 2
+    assert ("lightweight_deletes_sync" in settings) == bool(server_settings)
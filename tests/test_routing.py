@@ -0,0 +1,102 @@
+import pytest
+
+from dataxi.connectors import get_connector, routing
+from dataxi.connectors.routing import ReplicaRouter, parse_address
+from dataxi.cred_mgr import CredStore
+
+from .test_load_modes import RecordingConnection
+
+
+@pytest.fixture(autouse=True)
+def routers(monkeypatch):
+    """Routers of this test only, instead of the ones shared by the process."""
+    monkeypatch.setattr(routing, "_routers", {})
+
+
+def router(strategy="round_robin", replicas=("r1", "r2")):
+    return ReplicaRouter("db", ("primary", 3306), [(host, 3306) for host in replicas], strategy=strategy)
+
+
+def test_parse_address():
+    assert parse_address("db1", 3306) == ("db1", 3306)
+    assert parse_address(" db1:3307 ", 3306) == ("db1", 3307)
+    assert parse_address("[::1]:9000") == ("::1", 9000)
+    assert parse_address("::1", 9000) == ("::1", 9000)
+
+
+def test_reads_spread_over_the_replicas_and_writes_go_to_the_primary():
+    replicas = router()
+    assert [replicas.acquire().host for _ in range(4)] == ["r1", "r2", "r1", "r2"]
+    assert replicas.acquire(read=False).host == "primary"
+    with pytest.raises(ValueError, match="Invalid routing strategy"):
+        router("random")
+
+
+def test_least_connections():
+    replicas = router("least_connections")
+    busy = replicas.acquire()
+    idle = replicas.acquire()
+    assert idle is not busy
+    replicas.release(idle)
+    assert replicas.acquire() is idle
+    assert {node["address"]: node["active"] for node in replicas.stats()} == \
+        {"primary:3306": 0, "r1:3306": 1, "r2:3306": 1}
+
+
+def test_latency_weights(monkeypatch):
+    replicas = router("latency")
+    fast, slow = replicas.replicas
+    replicas.record_success(fast, 0.001)
+    replicas.record_success(slow, 0.1)
+    choices = []
+    monkeypatch.setattr(routing.random, "choices", lambda nodes, weights: choices.append(weights) or [nodes[0]])
+    replicas.acquire()
+    assert choices == [[1000.0, 10.0]]
+
+
+def test_failed_nodes_are_skipped_until_their_back_off(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(routing.time, "time", lambda: clock[0])
+    replicas = router()
+    r1, r2 = replicas.replicas
+    replicas.record_failure(r1, "refused", release=False)
+    replicas.record_failure(r1, "refused", release=False)
+    # the back-off doubles with the consecutive failures
+    assert r1.down_until == 1000.0 + 60
+    assert [replicas.acquire() for _ in range(3)] == [r2, r2, r2]
+    replicas.record_failure(r2, "refused", release=False)
+    # no healthy replica left, the reads fall back to the primary
+    assert replicas.acquire() is replicas.primary
+    # the primary itself failed: the replica recovering first is tried
+    assert replicas.acquire(exclude=[replicas.primary]) is r2
+    clock[0] += 61
+    replicas.record_success(r1, 0.01)
+    assert r1.failures == 0 and replicas.acquire() is r1
+
+
+def test_get_connector_fails_over_and_releases_on_close(home, monkeypatch):
+    module = pytest.importorskip("dataxi.connectors.mysql_connector")
+    hosts = []
+
+    def connect(host=None, port=None, **kwargs):
+        hosts.append((host, port))
+        if host == "r1":
+            raise ConnectionRefusedError("r1 is down")
+        return RecordingConnection()
+
+    monkeypatch.setattr(module.pymysql, "connect", connect)
+    monkeypatch.setattr(module.time, "sleep", lambda seconds: None)
+    CredStore().add("mysql_ro", {"db_type": "mysql", "host": "primary", "port": 3306, "user": "u", "password": "p",
+                                 "replicas": "r1, r2:3307"})
+    reader = get_connector("mysql_ro", route="read")
+    assert hosts == [("r1", 3306), ("r2", 3307)]
+    router = reader.router
+    assert [(node["address"], node["healthy"], node["active"]) for node in router.stats()] == \
+        [("primary:3306", True, 0), ("r1:3306", False, 0), ("r2:3307", True, 1)]
+    writer = get_connector("mysql_ro", route="write")
+    assert hosts[-1] == ("primary", 3306) and writer.router is router
+    reader.close()
+    writer.close()
+    assert [node["active"] for node in router.stats()] == [0, 0, 0]
+    # without a route the primary is used, without routing
+    assert get_connector("mysql_ro").router is None and hosts[-1] == ("primary", 3306)
@@ -0,0 +1,89 @@
+import threading
+import time
+
+import pytest
+
+from dataxi.operators import Job, JobScheduler
+
+
+def test_dependencies_run_in_order():
+    order = []
+    jobs = [Job(name="c", depends_on=["a", "b"], src="s", dst="d"),
+            Job(name="a", src="s", dst="d"),
+            Job(name="b", depends_on="a", src="s", dst="d")]
+    summaries = JobScheduler(jobs, runner=lambda job: order.append(job.name)).run()
+    assert order == ["a", "b", "c"]
+    assert [summary["status"] for summary in summaries] == ["succeeded"] * 3
+
+
+def test_failed_job_is_retried_then_skips_its_dependents():
+    def runner(job):
+        if job.name == "flaky" and job.attempts == 1:
+            raise RuntimeError("first attempt fails")
+        if job.name == "broken":
+            raise RuntimeError("always fails")
+        return {"rows": 1}
+
+    jobs = [Job(name="flaky", retries=1, retry_delay=0.1, src="s", dst="d"),
+            Job(name="broken", src="s", dst="d"),
+            Job(name="after_flaky", depends_on="flaky", src="s", dst="d"),
+            Job(name="after_broken", depends_on="broken", src="s", dst="d")]
+    summaries = {summary["name"]: summary for summary in JobScheduler(jobs, runner=runner).run()}
+    assert summaries["flaky"]["status"] == "succeeded"
+    assert summaries["flaky"]["attempts"] == 2
+    assert summaries["broken"]["status"] == "failed"
+    assert summaries["after_flaky"]["status"] == "succeeded"
+    assert summaries["after_broken"]["status"] == "skipped"
+
+
+def test_retry_back_off_sleeps_instead_of_spinning(monkeypatch):
+    sleeps = []
+    real_sleep = time.sleep
+    monkeypatch.setattr(time, "sleep", lambda seconds: (sleeps.append(seconds), real_sleep(seconds)))
+
+    def runner(job):
+        if job.name == "a" and job.attempts == 1:
+            raise RuntimeError("first attempt fails")
+
+    jobs = [Job(name="a", retries=1, retry_delay=0.3, src="s", dst="d"), Job(name="b", depends_on="a", src="s", dst="d")]
+    summaries = JobScheduler(jobs, runner=runner).run()
+    assert [summary["status"] for summary in summaries] == ["succeeded", "succeeded"]
+    assert len(sleeps) == 1
+    assert 0 < sleeps[0] <= 0.3
+
+
+def test_connection_limits_bound_the_concurrent_jobs():
+    lock = threading.Lock()
+    running = {"now": 0, "peak": 0}
+
+    def runner(job):
+        with lock:
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+        time.sleep(0.05)
+        with lock:
+            running["now"] -= 1
+
+    jobs = [Job(name=f"job{i}", src="shared", dst=f"sink{i}") for i in range(6)]
+    JobScheduler(jobs, max_workers=6, source_limit=2, runner=runner).run()
+    assert running["peak"] == 2
+
+
+@pytest.mark.parametrize("kwargs", [{"max_workers": 0}, {"source_limit": 0}, {"per_conn": {"s": 0}},
+                                    {"sink_limit": 1.5}])
+def test_limits_below_one_are_rejected(kwargs):
+    with pytest.raises(ValueError):
+        JobScheduler([], **kwargs)
+
+
+def test_dependency_cycle_is_rejected():
+    jobs = [Job(name="a", depends_on="b", src="s", dst="d"), Job(name="b", depends_on="a", src="s", dst="d")]
+    with pytest.raises(ValueError, match="cycle"):
+        JobScheduler(jobs, runner=lambda job: None)
+
+
+def test_transfer_jobs_load_the_sink(databases):
+    summaries = JobScheduler([Job(name="copy", src="src", dst="dst", table="t", batch_size=100)]).run()
+    assert summaries[0]["status"] == "succeeded"
+    assert summaries[0]["result"]["rows"] == 1000
+    assert databases.execute("dst", "SELECT COUNT(*) FROM t") == [(1000,)]
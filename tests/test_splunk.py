@@ -0,0 +1,99 @@
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+from dataxi.connectors import SplunkConnector
+from dataxi.connectors import splunk_connector
+from dataxi.connectors.splunk_connector import split_time_range, to_epoch
+
+pytest.importorskip("pyarrow")
+
+
+def test_search_times():
+    assert to_epoch("-2h", now=10000) == 2800
+    assert to_epoch("now", now=10000) == 10000
+    assert to_epoch("1700000000") == 1700000000
+    assert to_epoch(datetime(2026, 1, 1, tzinfo=timezone.utc)) == to_epoch("2026-01-01T00:00:00+00:00")
+    with pytest.raises(ValueError, match="Unsupported search time '-1d@d'"):
+        to_epoch("-1d@d")
+    assert split_time_range(0, 300, 3) == [(0, 100), (100, 200), (200, 300)]
+    with pytest.raises(ValueError, match="must be after"):
+        split_time_range(300, 0, 3)
+
+
+class SliceSearches:
+    """execute_query() of a Splunk connector, returning 10 events per 100s newest first, failing chosen slices once."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.lock = threading.Lock()
+        self.running = self.max_running = 0
+        self.calls = []
+
+    def __call__(self, query, earliest=None, latest=None, max_attempts=5):
+        with self.lock:
+            self.calls.append(earliest)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            # time.sleep() is patched away for the back-off of the retries
+            threading.Event().wait(0.01)
+            if earliest in self.failing:
+                self.failing.discard(earliest)
+                raise ConnectionError("search head busy")
+            step = (latest - earliest) / 10
+            events = [{"_time": f"{earliest + i * step:012.1f}", "host": f"web{int(earliest) // 100}"} for i in range(10)]
+            if earliest >= 200:
+                for event in events:
+                    event["status"] = "500"
+            return {"results": events[::-1]}
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+@pytest.fixture
+def splunk(monkeypatch):
+    monkeypatch.setattr(splunk_connector.time, "sleep", lambda seconds: None)
+    return SplunkConnector(token="token", url="https://splunk:8089", earliest=0, latest=600, max_concurrency=2)
+
+
+def test_slices_are_searched_concurrently_and_merged_in_time_order(splunk, monkeypatch):
+    searches = SliceSearches(failing=[300])
+    monkeypatch.setattr(splunk, "execute_query", searches)
+    table = splunk.query_arrow("search index=web", slices=6)
+    assert table.num_rows == 60
+    times = table.column("_time").to_pylist()
+    assert times == sorted(times)
+    # the failed slice is retried alone
+    assert sorted(searches.calls) == [0, 100, 200, 300, 300, 400, 500]
+    assert searches.max_running <= 2
+    # the columns of the later slices are added, the earlier rows have no value
+    assert table.column_names == ["_time", "host", "status"]
+    assert table.column("status").null_count == 20
+
+
+def test_newest_first_and_fixed_columns(splunk, monkeypatch):
+    monkeypatch.setattr(splunk, "execute_query", SliceSearches())
+    slices = list(splunk.search_slices("search index=web", slices=3, order="desc"))
+    assert [time_range for time_range, _ in slices] == [(400, 600), (200, 400), (0, 200)]
+    assert slices[0][1][0]["_time"] > slices[0][1][-1]["_time"]
+    batches = list(splunk.stream("search index=web", slices=3, columns=["host"], batch_size=4))
+    assert {tuple(batch.schema.names) for batch in batches} == {("host",)}
+    assert sum(batch.num_rows for batch in batches) == 30
+
+
+def test_a_slice_failing_every_attempt_fails_the_search(splunk, monkeypatch):
+    searches = SliceSearches()
+
+    def execute_query(query, earliest=None, latest=None, max_attempts=5):
+        if earliest == 200:
+            raise ConnectionError("search head down")
+        return searches(query, earliest, latest)
+
+    monkeypatch.setattr(splunk, "execute_query", execute_query)
+    with pytest.raises(Exception, match=r"Time slice \[200.0, 400.0\) failed after 3 attempts"):
+        list(splunk.stream("search index=web", slices=3))
+    with pytest.raises(ValueError, match="requires an earliest time"):
+        list(SplunkConnector(token="token", url="https://splunk:8089").search_slices("search index=web", slices=2))
@@ -0,0 +1,65 @@
+import sys
+
+import pytest
+
+from dataxi.connectors import conn_cli
+from dataxi.operators import TableTransfer
+
+pa = pytest.importorskip("pyarrow")
+
+# a failed partition closes its source stream before the connection
+pytestmark = pytest.mark.filterwarnings("error::pytest.PytestUnraisableExceptionWarning")
+
+
+def drop_odd_ids(batch):
+    return batch.filter(pa.array([value % 2 == 0 for value in batch.column("id").to_pylist()]))
+
+
+def sink_rows(databases):
+    return databases.execute("dst", "SELECT COUNT(*), COUNT(DISTINCT id), COUNT(k) FROM t")
+
+
+@pytest.mark.parametrize("partition_column", ["id", "k"])
+def test_parallel_partitions_load_each_row_once(databases, partition_column):
+    transfer = TableTransfer("src", "dst", "t", batch_size=64, parallelism=4, partition_column=partition_column, verify=True)
+    result = transfer.run()
+    assert len(transfer._partitions) == 4
+    # the rows without a partition value (k is NULL) go to the first partition
+    assert result["rows"] == 1000 and result["verified"]
+    assert sink_rows(databases) == [(1000, 1000, 980)]
+
+
+def test_incremental_copies_the_rows_above_the_sink_watermark(databases):
+    assert TableTransfer("src", "dst", "t", where="id < 600").run()["rows"] == 600
+    result = TableTransfer("src", "dst", "t", incremental_column="id", verify=True).run()
+    assert result["rows"] == 400
+    assert sink_rows(databases) == [(1000, 1000, 980)]
+    assert TableTransfer("src", "dst", "t", incremental_column="id").run()["rows"] == 0
+
+
+def test_verify_reports_the_missing_rows(databases):
+    with pytest.raises(Exception, match="Verification failed for t: 1000 source rows, 500 rows loaded"):
+        TableTransfer("src", "dst", "t", transforms=[drop_odd_ids], transform_processes=0, verify=True).run()
+
+
+def test_cli_transfer(databases, monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv", ["dataxi", "transfer", "--src", "src", "--dst", "dst", "--table", "t",
+                                      "-p", "2", "--partition-column", "id", "-b", "128", "--verify", "--no-progress"])
+    with pytest.raises(SystemExit) as exit_info:
+        conn_cli.main()
+    assert exit_info.value.code == 0
+    assert sink_rows(databases) == [(1000, 1000, 980)]
+    monkeypatch.setattr(sys, "argv", ["dataxi", "transfer", "--src", "src", "--dst", "dst", "--table", "missing",
+                                      "--no-progress"])
+    with pytest.raises(SystemExit) as exit_info:
+        conn_cli.main()
+    assert exit_info.value.code == 1
+    assert "transfer of missing failed" in capsys.readouterr().err
+
+
+def test_cli_rejects_invalid_batch_sizes(monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv", ["dataxi", "transfer", "--src", "src", "--dst", "dst", "--table", "t", "-b", "0"])
+    with pytest.raises(SystemExit) as exit_info:
+        conn_cli.main()
+    assert exit_info.value.code == 2
+    assert "batch size must be positive" in capsys.readouterr().err
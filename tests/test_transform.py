@@ -0,0 +1,85 @@
+import functools
+import hashlib
+
+import pytest
+
+from dataxi.operators import TableTransfer, TransformStage
+from dataxi.operators.transform import extract_regex, flatten_json, hash_columns, resolve_transform
+
+pa = pytest.importorskip("pyarrow")
+
+
+def double(batch):
+    """Module-level transform, so the pool can pickle it."""
+    return batch.set_column(0, "id", pa.compute.multiply(batch.column(0), 2))
+
+
+def fail_on_big_ids(batch, limit):
+    if max(batch.column(0).to_pylist()) >= limit:
+        raise ValueError(f"id over {limit}")
+    return batch
+
+
+def batches(count=10, size=100):
+    return [pa.record_batch({"id": list(range(start, start + size))}) for start in range(0, count * size, size)]
+
+
+@pytest.mark.parametrize("processes", [0, 2], ids=["in_thread", "pool"])
+def test_map_keeps_the_order(processes):
+    with TransformStage([double, double], processes=processes, max_pending=3) as stage:
+        result = list(stage.map(batches()))
+    assert [value for batch in result for value in batch.column(0).to_pylist()] == [4 * i for i in range(1000)]
+
+
+def test_pool_raises_the_error_of_the_transform():
+    with TransformStage(functools.partial(fail_on_big_ids, limit=550), processes=2, max_pending=2) as stage:
+        loaded = []
+        with pytest.raises(ValueError, match="id over 550"):
+            for batch in stage.map(batches()):
+                loaded.append(batch.num_rows)
+    assert sum(loaded) <= 500
+
+
+def test_resolve_transform_specs():
+    assert resolve_transform(double) is double
+    assert resolve_transform("tests.test_transform:double") is double
+    bound = resolve_transform({"function": "dataxi.operators.transform:hash_columns", "columns": ["v"], "salt": "s"})
+    assert bound.func is hash_columns and bound.keywords == {"columns": ["v"], "salt": "s"}
+    bound = resolve_transform({"function": "dataxi.operators.transform:hash_columns", "kwargs": {"columns": ["v"]}})
+    assert bound.keywords == {"columns": ["v"]}
+    with pytest.raises(ValueError, match="Invalid transform"):
+        resolve_transform("hash_columns")
+
+
+def test_hash_columns_keeps_the_nulls():
+    batch = hash_columns(pa.record_batch({"id": [1, 2], "email": ["a@b.c", None]}), columns=["email"], salt="s")
+    assert batch.column(0).to_pylist() == [1, 2]
+    assert batch.column(1).to_pylist() == [hashlib.sha256(b"sa@b.c").hexdigest(), None]
+
+
+def test_extract_regex():
+    batch = pa.record_batch({"_raw": ["user=ann code=200", "user=bob code=404", "no match"]})
+    batch = extract_regex(batch, pattern=r"user=(?P<user>\w+) code=(?P<code>\d+)", keep=False)
+    assert batch.schema.names == ["user", "code"]
+    assert batch.column(0).to_pylist() == ["ann", "bob", None]
+    assert batch.column(1).to_pylist() == ["200", "404", None]
+
+
+def test_flatten_json():
+    batch = pa.record_batch({"id": [1, 2, 3], "doc": ['{"a": 1, "b": {"c": 2}}', '{"a": "x"}', None]})
+    batch = flatten_json(batch, "doc")
+    assert batch.schema.names == ["id", "doc_a", "doc_b"]
+    # mixed types fall back to strings, nested values stay JSON text
+    assert batch.column(1).to_pylist() == ["1", "x", None]
+    assert batch.column(2).to_pylist() == ['{"c": 2}', None, None]
+    assert flatten_json(batch.select(["id"]).append_column("doc", pa.array(['{"a": 1}'] * 3)), "doc",
+                        fields=["a"], keep=True).schema.names == ["id", "doc", "doc_a"]
+
+
+@pytest.mark.parametrize("processes", [0, 2], ids=["in_thread", "pool"])
+def test_transfer_with_transforms(databases, processes):
+    result = TableTransfer("src", "dst", "t", batch_size=100,
+                           transforms=[{"function": "dataxi.operators.transform:hash_columns", "columns": ["v"]}],
+                           transform_processes=processes).run()
+    assert result["rows"] == 1000
+    assert databases.execute("dst", "SELECT COUNT(*) FROM t WHERE LENGTH(v) = 64") == [(1000,)]
@@ -0,0 +1,45 @@
+import gzip
+import io
+import json
+
+import pytest
+
+from dataxi.connectors import SplunkConnector
+from dataxi.connectors import splunk_connector
+
+
+@pytest.mark.parametrize("compress, compression", [(True, "lz4"), ("zstd", "zstd"), (False, None)])
+def test_clickhouse_compression_and_wire_format(monkeypatch, compress, compression):
+    module = pytest.importorskip("dataxi.connectors.clickhouse_connector")
+    clients = []
+    monkeypatch.setattr(module, "get_client", lambda **kwargs: clients.append(kwargs) or object())
+    connector = module.ClickHouseConnector(host="ch", user="default", compress=compress, wire_format="native")
+    assert clients[0]["compress"] == compress
+    assert connector.transport_stats() == {"compression": compression, "wire_format": "native"}
+    with pytest.raises(ValueError, match="Invalid wire_format 'rowbinary'"):
+        module.ClickHouseConnector(host="ch", user="default", wire_format="rowbinary")
+
+
+class GzipResponse:
+    """requests response of a gzip encoded body: raw.tell() counts the compressed bytes read."""
+
+    def __init__(self, payload):
+        self.content = json.dumps(payload).encode()
+        self.raw = io.BytesIO(gzip.compress(self.content))
+        self.raw.seek(0, io.SEEK_END)
+
+
+def test_splunk_measures_the_compression_ratio(monkeypatch):
+    payload = {"results": [{"host": "web1", "status": "200"}] * 200}
+    requests_sent = []
+    monkeypatch.setattr(splunk_connector.requests, "post",
+                        lambda **kwargs: requests_sent.append(kwargs) or GzipResponse(payload))
+    splunk = SplunkConnector(token="token", url="https://splunk:8089")
+    assert splunk.execute_query("search index=web") == payload
+    assert requests_sent[0]["headers"]["Accept-Encoding"] == "gzip"
+    stats = splunk.transport_stats()
+    assert stats["compression"] == "gzip" and stats["wire_format"] == "json"
+    assert stats["decoded_bytes"] == len(json.dumps(payload)) and stats["wire_bytes"] < stats["decoded_bytes"]
+    assert stats["ratio"] > 10
+    identity = SplunkConnector(token="token", url="https://splunk:8089", compress=False)
+    assert identity.headers["Accept-Encoding"] == "identity" and identity.transport_stats()["compression"] is None
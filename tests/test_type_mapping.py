@@ -0,0 +1,77 @@
+import datetime
+import decimal
+import math
+
+import pytest
+
+from dataxi.connectors.type_mapping import (ColumnConverter, arrow_schema, clickhouse_arrow_type, mssql_arrow_type,
+                                            mysql_arrow_type, postgresql_arrow_type)
+
+pa = pytest.importorskip("pyarrow")
+
+
+@pytest.mark.parametrize("type_name, expected", [
+    ("int(11) unsigned", pa.uint32()), ("bigint(20)", pa.int64()), ("decimal(12,3)", pa.decimal128(12, 3)),
+    ("decimal(65,30)", pa.decimal256(65, 30)), ("datetime(6)", pa.timestamp("us")), ("time", pa.duration("us")),
+    ("enum('a','b')", pa.string()), ("varbinary(16)", pa.binary()), ("geometry", None)])
+def test_mysql_types(type_name, expected):
+    assert mysql_arrow_type(type_name) == expected
+
+
+@pytest.mark.parametrize("type_name, expected", [
+    ("Nullable(LowCardinality(String))", pa.string()), ("Decimal64(4)", pa.decimal128(18, 4)),
+    ("Decimal(20, 2)", pa.decimal128(20, 2)), ("DateTime('Europe/Paris')", pa.timestamp("s", tz="Europe/Paris")),
+    ("DateTime64(3)", pa.timestamp("ms")), ("Enum8('a' = 1)", pa.string()), ("Array(UInt8)", None)])
+def test_clickhouse_types(type_name, expected):
+    assert clickhouse_arrow_type(type_name) == expected
+
+
+def test_mssql_and_postgresql_types():
+    assert mssql_arrow_type("money") == pa.decimal128(19, 4)
+    assert mssql_arrow_type("NUMERIC", 10, 2) == pa.decimal128(10, 2)
+    assert mssql_arrow_type("sql_variant") is None
+    assert postgresql_arrow_type("timestamp with time zone") == pa.timestamp("us", tz="UTC")
+    assert postgresql_arrow_type("numeric", 30, 5) == pa.decimal128(30, 5)
+    # a numeric without precision holds any scale, the driver keeps its values
+    assert postgresql_arrow_type("numeric") is None
+
+
+def test_arrow_schema_keeps_the_unknown_types_for_inference():
+    class Connector:
+        def column_types(self, table_name):
+            return [("id", pa.int64(), False), ("shape", None, True), ("v", pa.string(), True)]
+
+    schema = arrow_schema(Connector(), "t", columns=["v", "shape"])
+    assert schema.names == ["v", "shape"] and schema.field("shape").type == pa.null()
+    with pytest.raises(ValueError, match=r"\['missing'\] do not exist in t"):
+        arrow_schema(Connector(), "t", columns=["id", "missing"])
+
+
+def test_converter_casts_each_column_into_the_sink_types():
+    target = pa.schema([("id", pa.int32()), ("amount", pa.decimal128(12, 2)), ("ts", pa.timestamp("s")),
+                        ("ratio", pa.float64()), ("name", pa.string()), ("raw", pa.null())])
+    batch = pa.record_batch({
+        "id": pa.array([1, 2], pa.int64()),
+        "amount": pa.array([decimal.Decimal("1.50"), None], pa.decimal128(10, 2)),
+        "ts": pa.array([datetime.datetime(2026, 1, 1, 12, 0, 0, 999999), None], pa.timestamp("us")),
+        "ratio": pa.array([math.nan, 0.5]),
+        "name": pa.array([b"caf\xc3\xa9", None], pa.binary()),
+        "raw": pa.array([[1], [2]])})
+    converter = ColumnConverter(target)
+    converted = converter(batch)
+    assert converted.schema.types[:5] == target.types[:5]
+    # the columns without a mapped type are left to the drivers
+    assert converted.column(5).type == pa.list_(pa.int64())
+    assert converted.column("ts").to_pylist()[0] == datetime.datetime(2026, 1, 1, 12, 0, 0)
+    assert converted.column("ratio").to_pylist() == [None, 0.5]
+    assert converted.column("name").to_pylist() == ["café", None]
+    # the plan is compiled once per source schema
+    converter(batch)
+    assert len(converter._plans) == 1
+
+
+def test_converter_refuses_lossy_numeric_casts():
+    converter = ColumnConverter(pa.schema([("id", pa.int8())]), nan_to_null=False)
+    assert converter(pa.record_batch({"id": pa.array([1, 2])})).column(0).type == pa.int8()
+    with pytest.raises(pa.ArrowInvalid):
+        converter(pa.record_batch({"id": pa.array([1, 1000])}))